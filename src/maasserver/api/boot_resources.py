@@ -10,7 +10,6 @@ __all__ = [
 ]
 
 import http.client
-import os
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -389,18 +388,14 @@ class BootResourceFileUploadHandler(OperationsHandler):
         if rfile.largefile.complete:
             raise MAASAPIBadRequest("Cannot upload to a complete file.")
 
-        with rfile.largefile.content.open("wb") as stream:
-            stream.seek(0, os.SEEK_END)
+        # Check that the uploading data will not make the file larger
+        # than expected.
+        current_size = rfile.largefile.get_content_size()
+        if current_size + size > rfile.largefile.total_size:
+            raise MAASAPIBadRequest("Too much data recieved.")
 
-            # Check that the uploading data will not make the file larger
-            # than expected.
-            current_size = stream.tell()
-            if current_size + size > rfile.largefile.total_size:
-                raise MAASAPIBadRequest("Too much data recieved.")
-
-            stream.write(data)
-            rfile.largefile.size = current_size + size
-            rfile.largefile.save()
+        rfile.largefile.size = rfile.largefile.append_content(data)
+        rfile.largefile.save()
 
         if rfile.largefile.complete:
             if not rfile.largefile.valid:
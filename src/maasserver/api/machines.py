@@ -304,6 +304,37 @@ def get_allocation_options(request) -> AllocationOptions:
     )
 
 
+def set_allocation_constraints(machine, storage, interfaces, verbose):
+    """Set the constraints an allocated machine matched on `machine`."""
+    machine.constraint_map = storage.get(machine.id, {})
+    machine.constraints_by_type = {}
+    # Need to get the interface constraints map into the proper format
+    # to return it here.
+    # Backward compatibility: provide the storage constraints in both
+    # formats.
+    if len(machine.constraint_map) > 0:
+        machine.constraints_by_type["storage"] = {}
+        new_storage = machine.constraints_by_type["storage"]
+        # Convert this to the "new style" constraints map format.
+        for storage_key in machine.constraint_map:
+            # Each key in the storage map is actually a value which
+            # contains the ID of the matching storage device.
+            # Convert this to a label: list-of-matches format, to
+            # match how the constraints will be done going forward.
+            new_key = machine.constraint_map[storage_key]
+            matches = new_storage.get(new_key, [])
+            matches.append(storage_key)
+            new_storage[new_key] = matches
+    if len(interfaces) > 0:
+        machine.constraints_by_type["interfaces"] = {
+            label: interfaces.get(label, {}).get(machine.id)
+            for label in interfaces
+        }
+    if verbose:
+        machine.constraints_by_type["verbose_storage"] = storage
+        machine.constraints_by_type["verbose_interfaces"] = interfaces
+
+
 def get_allocated_composed_machine(
     request, data, storage, interfaces, pods, form, input_constraints
 ):
@@ -751,26 +782,27 @@ class MachineHandler(NodeHandler, OwnerDataMixin, PowerMixin):
                 "Cannot install KVM host for ephemeral deployments."
             )
         if machine.status == NODE_STATUS.READY:
-            with locks.node_acquire:
-                if machine.owner is not None and machine.owner != request.user:
-                    raise NodeStateViolation(
-                        "Can't allocate a machine belonging to another user."
-                    )
-                maaslog.info(
-                    "Request from user %s to acquire machine: %s (%s)",
-                    request.user.username,
-                    machine.fqdn,
-                    machine.system_id,
-                )
-                machine.acquire(
-                    request.user,
-                    agent_name=options.agent_name,
-                    comment=options.comment,
-                    bridge_all=options.bridge_all,
-                    bridge_type=options.bridge_type,
-                    bridge_stp=options.bridge_stp,
-                    bridge_fd=options.bridge_fd,
+            # Lock the machine so a concurrent allocation can't claim it.
+            Machine.objects.lock_for_acquisition(machine)
+            if machine.owner is not None and machine.owner != request.user:
+                raise NodeStateViolation(
+                    "Can't allocate a machine belonging to another user."
                 )
+            maaslog.info(
+                "Request from user %s to acquire machine: %s (%s)",
+                request.user.username,
+                machine.fqdn,
+                machine.system_id,
+            )
+            machine.acquire(
+                request.user,
+                agent_name=options.agent_name,
+                comment=options.comment,
+                bridge_all=options.bridge_all,
+                bridge_type=options.bridge_type,
+                bridge_stp=options.bridge_stp,
+                bridge_fd=options.bridge_fd,
+            )
         if NODE_STATUS.DEPLOYING not in NODE_TRANSITIONS[machine.status]:
             raise NodeStateViolation(
                 "Can't deploy a machine that is in the '{}' state".format(
@@ -2425,44 +2457,49 @@ class MachinesHandler(NodesHandler, PowersMixin):
         if not form.is_valid():
             raise MAASAPIValidationError(form.errors)
 
-        # This lock prevents a machine we've picked as available from
-        # becoming unavailable before our transaction commits.
-        with locks.node_acquire:
-            machines = (
-                self.base_model.objects.get_available_machines_for_acquisition(
-                    request.user
-                )
+        machines = (
+            self.base_model.objects.get_available_machines_for_acquisition(
+                request.user
             )
-            machines, storage, interfaces = form.filter_nodes(machines)
+        )
+        machines, storage, interfaces = form.filter_nodes(machines)
+        if dry_run:
             machine = get_first(machines)
-            if machine is None:
-                cores = form.cleaned_data.get("cpu_count")
-                if cores is not None:
-                    cores = int(cores)
-                memory = form.cleaned_data.get("mem")
-                if memory is not None:
-                    memory = int(memory)
-                architecture = None
-                architectures = form.cleaned_data.get("arch")
-                if architectures is not None:
-                    architecture = (
-                        None if len(architectures) == 0 else min(architectures)
-                    )
-                storage = form.cleaned_data.get("storage")
-                interfaces = form.cleaned_data.get("interfaces")
-                data = {
-                    "cores": cores,
-                    "memory": memory,
-                    "architecture": architecture,
-                    "storage": storage,
-                    "interfaces": interfaces,
-                }
-                pods = Pod.objects.get_pods(
-                    request.user, PodPermission.dynamic_compose
+        else:
+            machine = get_first(
+                self.base_model.objects.claim_available_machines(machines)
+            )
+        if machine is None:
+            cores = form.cleaned_data.get("cpu_count")
+            if cores is not None:
+                cores = int(cores)
+            memory = form.cleaned_data.get("mem")
+            if memory is not None:
+                memory = int(memory)
+            architecture = None
+            architectures = form.cleaned_data.get("arch")
+            if architectures is not None:
+                architecture = (
+                    None if len(architectures) == 0 else min(architectures)
                 )
-                if zone is not None:
-                    pods = pods.filter(zone__name=zone)
-                if pods:
+            storage = form.cleaned_data.get("storage")
+            interfaces = form.cleaned_data.get("interfaces")
+            data = {
+                "cores": cores,
+                "memory": memory,
+                "architecture": architecture,
+                "storage": storage,
+                "interfaces": interfaces,
+            }
+            pods = Pod.objects.get_pods(
+                request.user, PodPermission.dynamic_compose
+            )
+            if zone is not None:
+                pods = pods.filter(zone__name=zone)
+            if pods:
+                # Composing still takes the global lock, so that concurrent
+                # allocations don't both count on the same pod resources.
+                with locks.node_acquire:
                     (
                         machine,
                         storage,
@@ -2477,19 +2514,123 @@ class MachinesHandler(NodesHandler, PowersMixin):
                         input_constraints,
                     )
 
-            if machine is None:
-                constraints = form.describe_constraints()
-                if constraints == "":
-                    # No constraints. That means no machines at all were
-                    # available.
-                    message = "No machine available."
-                else:
-                    message = (
-                        "No available machine matches constraints: %s "
-                        '(resolved to "%s")'
-                        % (str(input_constraints), constraints)
-                    )
-                raise NodesNotAvailable(message)
+        if machine is None:
+            constraints = form.describe_constraints()
+            if constraints == "":
+                # No constraints. That means no machines at all were
+                # available.
+                message = "No machine available."
+            else:
+                message = (
+                    "No available machine matches constraints: %s "
+                    '(resolved to "%s")'
+                    % (str(input_constraints), constraints)
+                )
+            raise NodesNotAvailable(message)
+        if not dry_run:
+            machine.acquire(
+                request.user,
+                agent_name=options.agent_name,
+                comment=options.comment,
+                bridge_all=options.bridge_all,
+                bridge_type=options.bridge_type,
+                bridge_stp=options.bridge_stp,
+                bridge_fd=options.bridge_fd,
+            )
+        set_allocation_constraints(machine, storage, interfaces, verbose)
+        return machine
+
+    @operation(idempotent=False)
+    def allocate_many(self, request):
+        """@description-title Allocate several machines
+        @description Allocates a number of available machines for deployment
+        in a single request. Either all of the machines are allocated, or none
+        of them are.
+
+        Accepts the same constraints and options as the ``allocate``
+        operation, and every allocated machine matches all the constraints.
+        Unlike ``allocate``, no machines are composed in pods to make up the
+        requested number.
+
+        @param (int) "count" [required=true] Number of machines to allocate.
+
+        @param (string) "agent_name" [required=false] An optional agent name to
+        attach to the acquired machines.
+
+        @param (string) "comment" [required=false] Comment for the event log.
+
+        @param (boolean) "dry_run" [required=false] Optional boolean to
+        indicate that the machines should not actually be acquired. Defaults
+        to False.
+
+        @param (boolean) "verbose" [required=false] Optional boolean to
+        indicate that the user would like additional verbosity in the
+        constraints_by_type field of each machine.
+
+        @success (http-status-code) "200" 200
+        @success (json) "success-json" A JSON object containing a list of
+        the newly allocated machine objects.
+        @success-example "success-json" [exkey=machines-placeholder]
+        placeholder text
+
+        @error (http-status-code) "400" 400
+        @error (content) "bad-count" The count is not a positive number.
+
+        @error (http-status-code) "409" 409
+        @error (content) "no-match" Fewer than ``count`` machines matching the
+        given constraints could be found.
+        """
+        count = get_mandatory_param(
+            request.POST, "count", validator=Int(min=1)
+        )
+        form = AcquireNodeForm(data=request.data)
+        input_constraints = [
+            param
+            for param in request.data.lists()
+            if param[0] not in ("op", "count")
+        ]
+        maaslog.info(
+            "Request from user %s to acquire %d machines with constraints: "
+            "%s",
+            request.user.username,
+            count,
+            str(input_constraints),
+        )
+        options = get_allocation_options(request)
+        verbose = get_optional_param(
+            request.POST, "verbose", default=False, validator=StringBool
+        )
+        dry_run = get_optional_param(
+            request.POST, "dry_run", default=False, validator=StringBool
+        )
+
+        if not form.is_valid():
+            raise MAASAPIValidationError(form.errors)
+
+        machines = (
+            self.base_model.objects.get_available_machines_for_acquisition(
+                request.user
+            )
+        )
+        machines, storage, interfaces = form.filter_nodes(machines)
+        if dry_run:
+            machines = list(machines[:count])
+        else:
+            machines = self.base_model.objects.claim_available_machines(
+                machines, count=count, batch_size=max(count, 20)
+            )
+        if len(machines) < count:
+            raise NodesNotAvailable(
+                "Only %d of %d machines available matching constraints: %s "
+                '(resolved to "%s")'
+                % (
+                    len(machines),
+                    count,
+                    str(input_constraints),
+                    form.describe_constraints(),
+                )
+            )
+        for machine in machines:
             if not dry_run:
                 machine.acquire(
                     request.user,
@@ -2500,34 +2641,8 @@ class MachinesHandler(NodesHandler, PowersMixin):
                     bridge_stp=options.bridge_stp,
                     bridge_fd=options.bridge_fd,
                 )
-            machine.constraint_map = storage.get(machine.id, {})
-            machine.constraints_by_type = {}
-            # Need to get the interface constraints map into the proper format
-            # to return it here.
-            # Backward compatibility: provide the storage constraints in both
-            # formats.
-            if len(machine.constraint_map) > 0:
-                machine.constraints_by_type["storage"] = {}
-                new_storage = machine.constraints_by_type["storage"]
-                # Convert this to the "new style" constraints map format.
-                for storage_key in machine.constraint_map:
-                    # Each key in the storage map is actually a value which
-                    # contains the ID of the matching storage device.
-                    # Convert this to a label: list-of-matches format, to
-                    # match how the constraints will be done going forward.
-                    new_key = machine.constraint_map[storage_key]
-                    matches = new_storage.get(new_key, [])
-                    matches.append(storage_key)
-                    new_storage[new_key] = matches
-            if len(interfaces) > 0:
-                machine.constraints_by_type["interfaces"] = {
-                    label: interfaces.get(label, {}).get(machine.id)
-                    for label in interfaces
-                }
-            if verbose:
-                machine.constraints_by_type["verbose_storage"] = storage
-                machine.constraints_by_type["verbose_interfaces"] = interfaces
-            return machine
+            set_allocation_constraints(machine, storage, interfaces, verbose)
+        return machines
 
     def _get_chassis_param(self, request):
         power_type_names = [
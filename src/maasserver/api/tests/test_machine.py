@@ -854,6 +854,25 @@ class TestMachineAPI(APITestCase.ForUser):
         response = self.client.post(self.get_machine_uri(machine), request)
         self.assertEqual(http.client.OK, response.status_code)
 
+    def test_POST_deploy_locks_ready_machine(self):
+        self.patch(node_module.Node, "_start")
+        self.patch(machines_module, "get_curtin_merged_config")
+        lock_for_acquisition = self.patch(
+            Machine.objects, "lock_for_acquisition"
+        )
+        machine = factory.make_Node(
+            status=NODE_STATUS.READY,
+            interface=True,
+            power_type="manual",
+            architecture=make_usable_architecture(self),
+        )
+        osystem = make_usable_osystem(self)
+        distro_series = osystem["default_release"]
+        request = {"op": "deploy", "distro_series": distro_series}
+        response = self.client.post(self.get_machine_uri(machine), request)
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertThat(lock_for_acquisition, MockCalledOnceWith(machine))
+
     def test_POST_deploy_rejects_node_owned_by_another_user(self):
         self.patch(node_module.Node, "_start")
         user2 = factory.make_User()
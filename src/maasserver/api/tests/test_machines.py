@@ -9,6 +9,7 @@ import http.client
 import json
 import random
 from unittest import skip
+from unittest.mock import ANY
 
 from django.conf import settings
 from django.test import RequestFactory
@@ -1492,18 +1493,92 @@ class TestMachinesAPI(APITestCase.ForUser):
         machine = Machine.objects.get(system_id=machine.system_id)
         self.assertEqual(self.user, machine.owner)
 
-    def test_POST_allocate_uses_machine_acquire_lock(self):
-        # The "allocate" operation allocates the machine it returns.
+    def test_POST_allocate_claims_machine_without_global_lock(self):
         available_status = NODE_STATUS.READY
-        factory.make_Node(
+        machine = factory.make_Node(
             status=available_status, owner=None, with_boot_disk=True
         )
-        machine_acquire = self.patch(machines_module.locks, "node_acquire")
-        self.client.post(reverse("machines_handler"), {"op": "allocate"})
-        self.assertThat(machine_acquire.__enter__, MockCalledOnceWith())
-        self.assertThat(
-            machine_acquire.__exit__, MockCalledOnceWith(None, None, None)
+        node_acquire = self.patch(machines_module.locks, "node_acquire")
+        claim = Machine.objects.claim_available_machines
+        claim_available_machines = self.patch(
+            Machine.objects, "claim_available_machines"
+        )
+        claim_available_machines.side_effect = claim
+        response = self.client.post(
+            reverse("machines_handler"), {"op": "allocate"}
+        )
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertEqual(self.user, reload_object(machine).owner)
+        self.assertThat(claim_available_machines, MockCalledOnceWith(ANY))
+        self.assertThat(node_acquire.__enter__, MockNotCalled())
+
+    def test_POST_allocate_dry_run_does_not_claim_machine(self):
+        factory.make_Node(
+            status=NODE_STATUS.READY, owner=None, with_boot_disk=True
+        )
+        claim_available_machines = self.patch(
+            Machine.objects, "claim_available_machines"
+        )
+        response = self.client.post(
+            reverse("machines_handler"), {"op": "allocate", "dry_run": True}
+        )
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertThat(claim_available_machines, MockNotCalled())
+
+    def test_POST_allocate_many_allocates_machines(self):
+        for _ in range(3):
+            factory.make_Node(
+                status=NODE_STATUS.READY, owner=None, with_boot_disk=True
+            )
+        response = self.client.post(
+            reverse("machines_handler"), {"op": "allocate_many", "count": 2}
+        )
+        self.assertEqual(http.client.OK, response.status_code)
+        parsed_result = json.loads(
+            response.content.decode(settings.DEFAULT_CHARSET)
         )
+        self.assertItemsEqual(
+            Machine.objects.filter(owner=self.user).values_list(
+                "system_id", flat=True
+            ),
+            [machine["system_id"] for machine in parsed_result],
+        )
+        self.assertEqual(2, len(parsed_result))
+
+    def test_POST_allocate_many_allocates_nothing_if_not_enough(self):
+        for _ in range(2):
+            factory.make_Node(
+                status=NODE_STATUS.READY, owner=None, with_boot_disk=True
+            )
+        response = self.client.post(
+            reverse("machines_handler"), {"op": "allocate_many", "count": 3}
+        )
+        self.assertEqual(http.client.CONFLICT, response.status_code)
+        self.assertFalse(Machine.objects.filter(owner=self.user).exists())
+
+    def test_POST_allocate_many_dry_run_allocates_nothing(self):
+        machine = factory.make_Node(
+            status=NODE_STATUS.READY, owner=None, with_boot_disk=True
+        )
+        response = self.client.post(
+            reverse("machines_handler"),
+            {"op": "allocate_many", "count": 1, "dry_run": True},
+        )
+        self.assertEqual(http.client.OK, response.status_code)
+        parsed_result = json.loads(
+            response.content.decode(settings.DEFAULT_CHARSET)
+        )
+        self.assertEqual(
+            [machine.system_id],
+            [machine["system_id"] for machine in parsed_result],
+        )
+        self.assertIsNone(reload_object(machine).owner)
+
+    def test_POST_allocate_many_requires_positive_count(self):
+        response = self.client.post(
+            reverse("machines_handler"), {"op": "allocate_many", "count": 0}
+        )
+        self.assertEqual(http.client.BAD_REQUEST, response.status_code)
 
     def test_POST_allocate_sets_agent_name(self):
         available_status = NODE_STATUS.READY
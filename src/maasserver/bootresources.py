@@ -15,6 +15,7 @@ __all__ = [
 ]
 
 from datetime import timedelta
+import http.client
 from operator import itemgetter
 import os
 from subprocess import CalledProcessError
@@ -52,10 +53,10 @@ from maasserver.enum import (
     BOOT_RESOURCE_FILE_TYPE_CHOICES,
     BOOT_RESOURCE_TYPE,
     COMPONENT,
+    LARGEFILE_STORAGE,
 )
 from maasserver.eventloop import services
 from maasserver.exceptions import MAASAPINotFound
-from maasserver.fields import LargeObjectFile
 from maasserver.models import (
     BootResource,
     BootResourceFile,
@@ -130,9 +131,11 @@ class ConnectionWrapper:
     closed upon close of wrapper.
     """
 
-    def __init__(self, largeobject, alias="default"):
+    def __init__(self, largeobject, alias="default", offset=0, length=None):
         self.largeobject = largeobject
         self.alias = alias
+        self.offset = offset
+        self.remaining = length
         self._connection = None
         self._stream = None
 
@@ -157,15 +160,21 @@ class ConnectionWrapper:
             self._stream = self.largeobject.open(
                 "rb", connection=self._connection
             )
+            if self.offset:
+                self._stream.seek(self.offset)
 
     def __iter__(self):
         return self
 
     def __next__(self):
         self._set_up()
-        data = self._stream.read(self.largeobject.block_size)
+        data = self._stream.read(
+            _get_read_size(self.largeobject.block_size, self.remaining)
+        )
         if len(data) == 0:
             raise StopIteration
+        if self.remaining is not None:
+            self.remaining -= len(data)
         return data
 
     def close(self):
@@ -181,6 +190,89 @@ class ConnectionWrapper:
             self._connection = None
 
 
+class FileWrapper:
+    """Wraps a file with the content of a `LargeFile` stored on the
+    filesystem.
+
+    The file is closed upon close of wrapper.
+    """
+
+    block_size = 1 << 20
+
+    def __init__(self, stream, offset=0, length=None):
+        self._stream = stream
+        self.remaining = length
+        if offset:
+            self._stream.seek(offset)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self._stream.read(
+            _get_read_size(self.block_size, self.remaining)
+        )
+        if len(data) == 0:
+            raise StopIteration
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def close(self):
+        """Close the file."""
+        self._stream.close()
+
+
+def _get_read_size(block_size, remaining):
+    """Return how much to read next of content with `remaining` bytes left
+    to read, or with no limit if `remaining` is `None`."""
+    if remaining is None:
+        return block_size
+    return max(0, min(block_size, remaining))
+
+
+class RangeNotSatisfiable(Exception):
+    """The range requested is outside of the content."""
+
+
+def get_requested_range(request, size):
+    """Return the range of the content of `size` bytes that was requested.
+
+    Only a single range of bytes is supported. A `Range` header that can't
+    be parsed, or that asks for several ranges, is ignored, as RFC 7233
+    allows, and the whole content is returned.
+
+    :raise RangeNotSatisfiable: If the range starts past the end of the
+        content.
+    :return: A tuple of the first and last offsets of the range, both
+        inclusive, or `None` if the whole content was requested.
+    """
+    header = request.META.get("HTTP_RANGE")
+    if not header:
+        return None
+    unit, _, byte_range = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in byte_range:
+        return None
+    first, sep, last = byte_range.strip().partition("-")
+    if sep != "-" or not (first.isdigit() or last.isdigit()):
+        return None
+    if first == "":
+        # The last bytes of the content.
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix_length), size - 1
+    elif not first.isdigit() or not (last == "" or last.isdigit()):
+        return None
+    first = int(first)
+    last = size - 1 if last == "" else int(last)
+    if first >= size:
+        raise RangeNotSatisfiable()
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+
 class SimpleStreamsHandler:
     """Simplestreams endpoint, that the racks talk to.
 
@@ -360,11 +452,37 @@ class SimpleStreamsHandler:
             rfile = resource_set.files.get(filename=filename)
         except BootResourceFile.DoesNotExist:
             raise MAASAPINotFound()
+        largefile = rfile.largefile
+        size = largefile.total_size
+        try:
+            requested_range = get_requested_range(request, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(
+                status=http.client.REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = "bytes */%d" % size
+            return response
+        if requested_range is None:
+            first, last = 0, size - 1
+        else:
+            first, last = requested_range
+        length = last - first + 1
+        if largefile.storage == LARGEFILE_STORAGE.FILESYSTEM:
+            content = FileWrapper(
+                largefile.open_content(), offset=first, length=length
+            )
+        else:
+            content = ConnectionWrapper(
+                largefile.content, offset=first, length=length
+            )
         response = StreamingHttpResponse(
-            ConnectionWrapper(rfile.largefile.content),
-            content_type="application/octet-stream",
+            content, content_type="application/octet-stream"
         )
-        response["Content-Length"] = rfile.largefile.total_size
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Length"] = length
+        if requested_range is not None:
+            response.status_code = http.client.PARTIAL_CONTENT
+            response["Content-Range"] = "bytes %d-%d/%d" % (first, last, size)
         return response
 
 
@@ -705,11 +823,7 @@ class BootResourceStore(ObjectStore):
         if largefile is None:
             # No largefile exist for this resource file in the database, so a
             # new one will be created to store the data for this file.
-            largeobject = LargeObjectFile()
-            largeobject.open().close()
-            largefile = LargeFile.objects.create(
-                sha256=sha256, total_size=total_size, content=largeobject
-            )
+            largefile = LargeFile.objects.create_empty_file(sha256, total_size)
             needs_saving = True
             log.debug("New large file created {lf}.", lf=largefile)
 
@@ -767,29 +881,31 @@ class BootResourceStore(ObjectStore):
         cksummer = sutil.checksummer({"sha256": rfile.largefile.sha256})
         log.debug("Finalizing boot image {ident}.", ident=ident)
 
-        # Ensure that the size of the largefile starts at zero.
-        rfile.largefile.size = 0
-        transactional(rfile.largefile.save)(update_fields=["size"])
+        @transactional
+        def reset_content():
+            """Ensure that the content and size of the largefile start at
+            zero."""
+            rfile.largefile.reset_content()
+            rfile.largefile.size = 0
+            rfile.largefile.save(update_fields=["size"])
+
+        reset_content()
 
         @transactional
         def write_chunk():
-            """Write a chunk into the database with a transaction per trunk.
+            """Write a chunk of the content with a transaction per trunk.
 
             This ensures that the content and the size is committed into the
             database per chunk. This makes the process be reported correctly.
             """
-            with rfile.largefile.content.open("wb") as stream:
-                buf = reader.read(self.read_size)
-                stream.seek(0, 2)
-                stream.write(buf)
-                cksummer.update(buf)
-                buf_len = len(buf)
-                rfile.largefile.size += buf_len
-                rfile.largefile.save(update_fields=["size"])
-                if buf_len != self.read_size:
-                    return True
-                else:
-                    return False
+            buf = reader.read(self.read_size)
+            cksummer.update(buf)
+            rfile.largefile.size = rfile.largefile.append_content(buf)
+            rfile.largefile.save(update_fields=["size"])
+            if len(buf) != self.read_size:
+                return True
+            else:
+                return False
 
         # Write chunks until it says its done.
         while not self._cancel_finalize:
@@ -98,6 +98,15 @@ class RegionConfiguration(Configuration, metaclass=RegionConfigurationMeta):
         Int(if_missing=4, accept_python=False, min=1),
     )
 
+    # Boot resource options.
+    boot_resources_storage = ConfigurationOption(
+        "boot_resources_storage",
+        "Directory to store the content of new boot resources in, instead "
+        "of the database. With several region controllers, this must be "
+        "storage shared by all of them, at the same path on each.",
+        UnicodeString(if_missing="", accept_python=False),
+    )
+
     # Debug options.
     debug = ConfigurationOption(
         "debug",
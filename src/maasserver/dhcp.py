@@ -3,10 +3,10 @@
 
 """DHCP management module."""
 
-__all__ = ["configure_dhcp", "validate_dhcp_config"]
+__all__ = ["configure_dhcp", "configure_dhcp_hosts", "validate_dhcp_config"]
 
 from collections import defaultdict, namedtuple
-from itertools import groupby
+from itertools import chain, groupby
 from operator import itemgetter
 from typing import Iterable, Optional, Union
 
@@ -48,6 +48,8 @@ from provisioningserver.rpc.cluster import (
     ConfigureDHCPv4_V2,
     ConfigureDHCPv6,
     ConfigureDHCPv6_V2,
+    UpdateDHCPv4Hosts,
+    UpdateDHCPv6Hosts,
     ValidateDHCPv4Config,
     ValidateDHCPv4Config_V2,
     ValidateDHCPv6Config,
@@ -63,6 +65,10 @@ from provisioningserver.utils.twisted import asynchronous, synchronous
 
 log = LegacyLogger()
 
+# Hosts last sent to each rack controller by `configure_dhcp`, keyed by the
+# rack controller's system_id, then by VLAN ID. See `configure_dhcp_hosts`.
+_current_hosts = {}
+
 
 def get_omapi_key():
     """Return the OMAPI key for all DHCP servers that are ran by MAAS."""
@@ -713,6 +719,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
     ]
 
     # Configure both DHCPv4 and DHCPv6 on the rack controller.
+    hosts_by_vlan = {}
     failover_peers_v4 = []
     shared_networks_v4 = []
     hosts_v4 = []
@@ -741,6 +748,8 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
         if name != default_domain.name
     ]
     for vlan, (subnets_v4, subnets_v6) in vlan_subnets.items():
+        vlan_hosts_v4, vlan_hosts_v6 = [], []
+        hosts_by_vlan[vlan.id] = vlan_hosts_v4, vlan_hosts_v6
         # IPv4
         if len(subnets_v4) > 0:
             config = get_dhcp_configure_for(
@@ -764,6 +773,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
             }
             shared_networks_v4.append(shared_network)
             hosts_v4.extend(hosts)
+            vlan_hosts_v4.extend(hosts)
             if interface is not None:
                 interfaces_v4.add(interface)
                 shared_network["interface"] = interface
@@ -790,6 +800,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
             }
             shared_networks_v6.append(shared_network)
             hosts_v6.extend(hosts)
+            vlan_hosts_v6.extend(hosts)
             if interface is not None:
                 interfaces_v6.add(interface)
                 shared_network["interface"] = interface
@@ -810,6 +821,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
         interfaces_v6,
         get_omapi_key(),
         global_dhcp_snippets,
+        hosts_by_vlan,
     )
 
 
@@ -826,10 +838,61 @@ DHCPConfigurationForRack = namedtuple(
         "interfaces_v6",
         "omapi_key",
         "global_dhcp_snippets",
+        "hosts_by_vlan",
     ),
 )
 
 
+@synchronous
+@transactional
+def get_dhcp_hosts_for_vlans(rack_controller, vlan_ids, known_vlan_ids):
+    """Return the DHCP hosts on `vlan_ids` for the rack controller.
+
+    Only the hosts are computed; nothing else in the DHCP configuration.
+
+    :param vlan_ids: The IDs of the VLANs to compute the hosts for.
+    :param known_vlan_ids: The IDs of the VLANs the rack controller was
+        last configured for.
+    :return: Tuple of the OMAPI key and a dict of VLAN ID to a tuple of
+        IPv4 and IPv6 hosts, or None if the VLANs managed by the rack
+        controller are no longer `known_vlan_ids`.
+    """
+    vlans = {vlan.id: vlan for vlan in gen_managed_vlans_for(rack_controller)}
+    if vlans.keys() != set(known_vlan_ids):
+        return None
+    nodes_dhcp_snippets = list(
+        DHCPSnippet.objects.filter(enabled=True, node__isnull=False)
+    )
+    hosts_by_vlan = {}
+    for vlan_id in vlan_ids:
+        vlan_hosts = []
+        for subnets in split_managed_ipv4_ipv6_subnets(
+            vlans[vlan_id].subnet_set.all()
+        ):
+            if len(subnets) > 0:
+                hosts = make_hosts_for_subnets(subnets, nodes_dhcp_snippets)
+            else:
+                hosts = []
+            vlan_hosts.append(hosts)
+        hosts_by_vlan[vlan_id] = tuple(vlan_hosts)
+    return get_omapi_key(), hosts_by_vlan
+
+
+def get_hosts_delta(previous_hosts, hosts):
+    """Return the change from `previous_hosts` to `hosts`.
+
+    :return: Tuple of the hosts that are new or have changed, and the MAC
+        addresses of the hosts that were removed.
+    """
+    previous_hosts = {host["mac"]: host for host in previous_hosts}
+    hosts = {host["mac"]: host for host in hosts}
+    changed = [
+        host for mac, host in hosts.items() if previous_hosts.get(mac) != host
+    ]
+    removed = sorted(previous_hosts.keys() - hosts.keys())
+    return changed, removed
+
+
 @asynchronous
 @inlineCallbacks
 def configure_dhcp(rack_controller):
@@ -941,6 +1004,13 @@ def configure_dhcp(rack_controller):
 
     yield deferToDatabase(update_services)
 
+    # Remember the hosts sent so that later changes to them can be sent on
+    # their own by `configure_dhcp_hosts`.
+    if ipv4_exc is None and ipv6_exc is None:
+        _current_hosts[rack_controller.system_id] = config.hosts_by_vlan
+    else:
+        _current_hosts.pop(rack_controller.system_id, None)
+
     # Raise the exceptions to the caller, it might want to retry. This raises
     # IPv4 before IPv6 if they both fail. No specific reason for this, if
     # the function is called again both will be performed.
@@ -950,6 +1020,78 @@ def configure_dhcp(rack_controller):
         raise ipv6_exc
 
 
+@asynchronous
+@inlineCallbacks
+def configure_dhcp_hosts(rack_controller, vlan_ids):
+    """Update the DHCP hosts on `vlan_ids` on the rack controller.
+
+    Only the hosts on `vlan_ids` are computed, and only the hosts that
+    changed since they were last sent are sent to the rack controller. This
+    falls back to `configure_dhcp` when the rack controller has not been
+    configured by this process, when the VLANs it manages have changed, or
+    when it cannot apply the change.
+
+    :raises: :py:class:`~.exceptions.NoConnectionsAvailable` when there
+        are no open connections to the specified cluster controller.
+    """
+    if not settings.DHCP_CONNECT:
+        return
+
+    previous_hosts_by_vlan = _current_hosts.get(rack_controller.system_id)
+    if previous_hosts_by_vlan is None:
+        yield configure_dhcp(rack_controller)
+        return
+
+    client = yield getClientFor(rack_controller.system_id)
+    result = yield deferToDatabase(
+        get_dhcp_hosts_for_vlans,
+        rack_controller,
+        vlan_ids,
+        previous_hosts_by_vlan.keys(),
+    )
+    if result is None:
+        yield configure_dhcp(rack_controller)
+        return
+
+    omapi_key, changed_hosts_by_vlan = result
+    hosts_by_vlan = dict(previous_hosts_by_vlan)
+    hosts_by_vlan.update(changed_hosts_by_vlan)
+    try:
+        for index, command in enumerate(
+            (UpdateDHCPv4Hosts, UpdateDHCPv6Hosts)
+        ):
+            hosts, removed_macs = get_hosts_delta(
+                chain.from_iterable(
+                    hosts[index] for hosts in previous_hosts_by_vlan.values()
+                ),
+                chain.from_iterable(
+                    hosts[index] for hosts in hosts_by_vlan.values()
+                ),
+            )
+            if len(hosts) > 0 or len(removed_macs) > 0:
+                yield client(
+                    command,
+                    _timeout=DHCP_TIMEOUT + 5,
+                    omapi_key=omapi_key,
+                    hosts=hosts,
+                    removed_macs=removed_macs,
+                )
+    except Exception as exc:
+        log.msg(
+            "Updating DHCP hosts on rack controller '%s (%s)' failed (%s); "
+            "configuring DHCP instead."
+            % (rack_controller.hostname, rack_controller.system_id, exc)
+        )
+        _current_hosts.pop(rack_controller.system_id, None)
+        yield configure_dhcp(rack_controller)
+    else:
+        _current_hosts[rack_controller.system_id] = hosts_by_vlan
+        log.msg(
+            "Successfully updated DHCP hosts on rack controller '%s (%s)'."
+            % (rack_controller.hostname, rack_controller.system_id)
+        )
+
+
 def validate_dhcp_config(test_dhcp_snippet=None):
     """Validate a DHCPD config with uncommitted values.
 
@@ -23,8 +23,11 @@ from maasserver.models.domain import Domain
 from maasserver.models.node import RackController
 from maasserver.models.subnet import Subnet
 from provisioningserver.dns.actions import (
+    bind_freeze_zones,
     bind_reload,
     bind_reload_with_retries,
+    bind_thaw_zones,
+    bind_update_zones,
     bind_write_configuration,
     bind_write_options,
     bind_write_zones,
@@ -48,12 +51,69 @@ def dns_force_reload():
     DNSPublication(source="Force reload").save()
 
 
+def get_zone_key(zone):
+    """Return a key identifying `zone` and the zone files it is written to."""
+    return zone.domain, tuple(
+        (zone_info.zone_name, zone_info.target_path)
+        for zone_info in zone.zone_info
+    )
+
+
+class PublishedZones:
+    """The DNS zones and configuration last published by this region.
+
+    This lets `dns_update_all_zones` rewrite and reload only the zones whose
+    records have changed, provided that the set of zones and the rest of
+    BIND's configuration have not.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget what was published; the next update will be a full one."""
+        self.zones = None
+        self.configuration = None
+
+    def get_changed_zones(self, zones, configuration):
+        """Return the zones in `zones` that need to be published.
+
+        :return: A list of `(zone, previous_zone)` tuples, or `None` if
+            BIND's configuration must be rewritten and fully reloaded.
+        """
+        if self.zones is None or self.configuration != configuration:
+            return None
+        keys = [get_zone_key(zone) for zone in zones]
+        if len(set(keys)) != len(keys) or set(keys) != set(self.zones):
+            # Zones have been added or removed, so BIND's configuration
+            # needs to change too.
+            return None
+        return [
+            (zone, self.zones[key])
+            for key, zone in zip(keys, zones)
+            if not zone.has_same_records(self.zones[key])
+        ]
+
+    def update(self, zones, configuration):
+        """Record `zones` and `configuration` as published."""
+        self.zones = {get_zone_key(zone): zone for zone in zones}
+        self.configuration = configuration
+
+
+published_zones = PublishedZones()
+
+
 def dns_update_all_zones(reload_retry=False, reload_timeout=2):
     """Update all zone files for all domains.
 
     Serving these zone files means updating BIND's configuration to include
     them, then asking it to load the new configuration.
 
+    When only the records within existing zones have changed since the last
+    update, only those zones are published, keeping their serial for the
+    others. Changes to host records alone are sent to BIND as dynamic
+    updates; other changes rewrite and reload the zone files.
+
     :param reload_retry: Should the DNS server reload be retried in case
         of failure? Defaults to `False`.
     :type reload_retry: bool
@@ -72,6 +132,39 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
         serial,
         internal_domains=[get_internal_domain()],
     ).as_list()
+    upstream_dns = get_upstream_dns()
+    dnssec_validation = get_dnssec_validation()
+    trusted_networks = get_trusted_networks()
+    configuration = (
+        upstream_dns,
+        dnssec_validation,
+        sorted(trusted_networks),
+    )
+
+    changed_zones = published_zones.get_changed_zones(zones, configuration)
+    # Drop what was published first, so a failure part way through results
+    # in a full update next time.
+    published_zones.clear()
+    if changed_zones is not None:
+        reloaded = _update_changed_zones(changed_zones)
+        if reloaded:
+            published_zones.update(zones, configuration)
+            changed_domains = {zone.domain for zone, _ in changed_zones}
+            return (
+                serial,
+                reloaded,
+                [
+                    domain.name
+                    for domain in domains
+                    if domain.name in changed_domains
+                ],
+            )
+        # For example, nsupdate is not installed, or BIND could not freeze
+        # the zones; fall back to rewriting and reloading everything.
+
+    # Write out any dynamic updates held by BIND before the zone files are
+    # replaced. Freezing fails harmlessly when BIND is not running.
+    bind_freeze_zones()
     bind_write_zones(zones)
 
     # We should not be calling bind_write_options() here; call-sites should be
@@ -80,15 +173,14 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
     # some that call it for this side-effect alone. At present all it does is
     # set the upstream DNS servers, nothing to do with serving zones at all!
     bind_write_options(
-        upstream_dns=get_upstream_dns(),
-        dnssec_validation=get_dnssec_validation(),
+        upstream_dns=upstream_dns, dnssec_validation=dnssec_validation
     )
 
     # Nor should we be rewriting ACLs that are related only to allowing
     # recursive queries to the upstream DNS servers. Again, this is legacy,
     # where the "trusted" ACL ended up in the same configuration file as the
     # zone stanzas, and so both need to be rewritten at the same time.
-    bind_write_configuration(zones, trusted_networks=get_trusted_networks())
+    bind_write_configuration(zones, trusted_networks=trusted_networks)
 
     # Reloading with retries may be a legacy from Celery days, or it may be
     # necessary to recover from races during start-up. We're not sure if it is
@@ -98,11 +190,53 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
         reloaded = bind_reload_with_retries(timeout=reload_timeout)
     else:
         reloaded = bind_reload(timeout=reload_timeout)
+    # Thawing reloads the frozen zones and lets them be updated again.
+    thawed = bind_thaw_zones()
+    if reloaded and thawed:
+        published_zones.update(zones, configuration)
 
     # Return the current serial and list of domain names.
     return serial, reloaded, [domain.name for domain in domains]
 
 
+def _update_changed_zones(changed_zones):
+    """Publish only `changed_zones`.
+
+    Changes to host records alone are sent to BIND as dynamic updates;
+    zones with other changes are rewritten and reloaded.
+
+    :param changed_zones: A list of `(zone, previous_zone)` tuples, as
+        returned by `PublishedZones.get_changed_zones`.
+    :return: True if success, False otherwise. Zones may then be left
+        partly updated, so everything must be published again.
+    """
+    updates = [
+        (zone, previous_zone)
+        for zone, previous_zone in changed_zones
+        if zone.has_same_structure(previous_zone)
+    ]
+    rewrites = [
+        zone
+        for zone, previous_zone in changed_zones
+        if not zone.has_same_structure(previous_zone)
+    ]
+    if not bind_update_zones(updates):
+        return False
+    if len(rewrites) > 0:
+        # Zones accept dynamic updates, so BIND must not be holding
+        # unwritten changes to them while their files are replaced.
+        zone_names = [
+            zone_info.zone_name
+            for zone in rewrites
+            for zone_info in zone.zone_info
+        ]
+        if not bind_freeze_zones(zone_names):
+            return False
+        bind_write_zones(rewrites)
+        return bind_thaw_zones(zone_names)
+    return True
+
+
 def get_upstream_dns():
     """Return the IP addresses of configured upstream DNS servers.
 
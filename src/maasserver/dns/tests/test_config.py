@@ -8,6 +8,7 @@ __all__ = []
 from argparse import ArgumentParser
 import random
 import time
+from unittest.mock import call
 
 from django.conf import settings
 import dns.resolver
@@ -42,11 +43,17 @@ from maasserver.models.dnspublication import DNSPublication
 from maasserver.testing.config import RegionConfigurationFixture
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnce,
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from provisioningserver.dns.commands import get_named_conf, setup_dns
 from provisioningserver.dns.config import compose_config_path, DNSConfig
 from provisioningserver.dns.testing import (
     patch_dns_config_path,
+    patch_dns_port,
     patch_dns_rndc_port,
 )
 from provisioningserver.testing.bindfixture import allocate_ports, BINDServer
@@ -125,6 +132,9 @@ class TestDNSServer(MAASServerTestCase):
         )
         # Reload BIND.
         self.bind.runner.rndc("reload")
+        # Start each test from a full update.
+        dns_config_module.published_zones.clear()
+        self.addCleanup(dns_config_module.published_zones.clear)
 
     def create_node_with_static_ip(self, domain=None, subnet=None):
         if domain is None:
@@ -307,6 +317,148 @@ class TestDNSConfigModifications(TestDNSServer):
             reverse=False,
         )
 
+    def test_dns_update_all_zones_only_updates_changed_zones(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        domain = factory.make_Domain()
+        other_domain = factory.make_Domain()
+        node, static = self.create_node_with_static_ip(domain=domain)
+        self.create_node_with_static_ip(
+            domain=other_domain, subnet=static.subnet
+        )
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_write_zones = self.patch_autospec(
+            dns_config_module, "bind_write_zones"
+        )
+        bind_update_zones = self.patch_autospec(
+            dns_config_module, "bind_update_zones"
+        )
+        bind_update_zones.return_value = True
+        self.create_node_with_static_ip(domain=domain, subnet=static.subnet)
+        DNSPublication(source="Test").save()
+        serial, reloaded, domains = dns_update_all_zones()
+        self.assertThat(bind_reload, MockNotCalled())
+        self.assertThat(bind_write_zones, MockNotCalled())
+        [updates] = bind_update_zones.call_args[0]
+        updated_domains = {zone.domain for zone, _ in updates}
+        self.assertIn(domain.name, updated_domains)
+        self.assertNotIn(other_domain.name, updated_domains)
+        self.assertTrue(reloaded)
+        self.assertEqual([domain.name], domains)
+
+    def test_dns_update_all_zones_serves_dynamically_updated_records(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        patch_dns_port(self, self.bind.config.port)
+        node, static = self.create_node_with_static_ip()
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        other_node, other_static = self.create_node_with_static_ip(
+            subnet=static.subnet
+        )
+        DNSPublication(source="Test").save()
+        serial, reloaded, domains = dns_update_all_zones()
+        self.assertTrue(reloaded)
+        self.assertThat(bind_reload, MockNotCalled())
+        self.assertDNSMatches(
+            other_node.hostname, other_node.domain.name, other_static.ip
+        )
+
+    def test_dns_update_all_zones_rewrites_zones_with_new_ttl(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        domain = factory.make_Domain()
+        self.create_node_with_static_ip(domain=domain)
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_freeze_zones = self.patch_autospec(
+            dns_config_module, "bind_freeze_zones"
+        )
+        bind_freeze_zones.return_value = True
+        bind_thaw_zones = self.patch_autospec(
+            dns_config_module, "bind_thaw_zones"
+        )
+        bind_thaw_zones.return_value = True
+        bind_update_zones = self.patch_autospec(
+            dns_config_module, "bind_update_zones"
+        )
+        bind_update_zones.return_value = True
+        domain.ttl = random.randint(100, 199)
+        domain.save()
+        DNSPublication(source="Test").save()
+        serial, reloaded, domains = dns_update_all_zones()
+        self.assertThat(bind_reload, MockNotCalled())
+        self.assertThat(bind_freeze_zones, MockCalledOnceWith([domain.name]))
+        self.assertThat(bind_thaw_zones, MockCalledOnceWith([domain.name]))
+        self.assertTrue(reloaded)
+        self.assertEqual([domain.name], domains)
+
+    def test_dns_update_all_zones_fully_reloads_for_new_zone(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        self.create_node_with_static_ip()
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_reload.return_value = True
+        bind_update_zones = self.patch_autospec(
+            dns_config_module, "bind_update_zones"
+        )
+        factory.make_Domain()
+        dns_update_all_zones()
+        self.assertThat(bind_reload, MockCalledOnceWith(timeout=2))
+        self.assertThat(bind_update_zones, MockNotCalled())
+
+    def test_dns_update_all_zones_fully_reloads_for_new_options(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        self.create_node_with_static_ip()
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_reload.return_value = True
+        Config.objects.set_config("upstream_dns", factory.make_ipv4_address())
+        dns_update_all_zones()
+        self.assertThat(bind_reload, MockCalledOnceWith(timeout=2))
+
+    def test_dns_update_all_zones_fully_reloads_if_updates_fail(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        node, static = self.create_node_with_static_ip()
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_reload.return_value = True
+        bind_update_zones = self.patch_autospec(
+            dns_config_module, "bind_update_zones"
+        )
+        bind_update_zones.return_value = False
+        self.create_node_with_static_ip(subnet=static.subnet)
+        DNSPublication(source="Test").save()
+        serial, reloaded, domains = dns_update_all_zones()
+        self.assertThat(bind_update_zones, MockCalledOnce())
+        self.assertThat(bind_reload, MockCalledOnceWith(timeout=2))
+        self.assertTrue(reloaded)
+
+    def test_dns_update_all_zones_fully_reloads_if_freezing_fails(self):
+        self.patch(settings, "DNS_CONNECT", True)
+        domain = factory.make_Domain()
+        self.create_node_with_static_ip(domain=domain)
+        dns_update_all_zones()
+        bind_reload = self.patch_autospec(dns_config_module, "bind_reload")
+        bind_reload.return_value = True
+        bind_freeze_zones = self.patch_autospec(
+            dns_config_module, "bind_freeze_zones"
+        )
+        bind_freeze_zones.return_value = False
+        bind_write_zones = self.patch_autospec(
+            dns_config_module, "bind_write_zones"
+        )
+        domain.ttl = random.randint(100, 199)
+        domain.save()
+        DNSPublication(source="Test").save()
+        serial, reloaded, domains = dns_update_all_zones()
+        self.assertThat(
+            bind_freeze_zones,
+            MockCallsMatch(call([domain.name]), call()),
+        )
+        # Only the full rewrite writes out the zones.
+        self.assertThat(bind_write_zones, MockCalledOnce())
+        self.assertThat(bind_reload, MockCalledOnceWith(timeout=2))
+        self.assertTrue(reloaded)
+
     def test_dns_update_all_zones_passes_reload_retry_parameter(self):
         self.patch(settings, "DNS_CONNECT", True)
         bind_reload_with_retries = self.patch_autospec(
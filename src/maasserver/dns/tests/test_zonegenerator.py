@@ -29,7 +29,10 @@ from maasserver.dns.zonegenerator import (
     get_dns_server_address,
     get_dns_server_addresses,
     get_hostname_dnsdata_mapping,
+    get_hostname_dnsdata_mappings,
     get_hostname_ip_mapping,
+    get_hostname_ip_mappings,
+    get_network_mappings,
     InternalDomain,
     InternalDomainResourse,
     InternalDomainResourseRecord,
@@ -299,6 +302,79 @@ class TestGetHostnameMapping(MAASServerTestCase):
         actual = get_hostname_dnsdata_mapping(node.domain)
         self.assertItemsEqual(expected_mapping.items(), actual.items())
 
+    def test_get_hostname_ip_mappings_matches_mapping_per_domain(self):
+        subnet = factory.make_Subnet()
+        domains = [factory.make_Domain() for _ in range(3)]
+        for domain in domains:
+            node = factory.make_Node(interface=True, domain=domain)
+            factory.make_StaticIPAddress(
+                alloc_type=IPADDRESS_TYPE.STICKY,
+                ip=factory.pick_ip_in_Subnet(subnet),
+                subnet=subnet,
+                interface=node.get_boot_interface(),
+            )
+            factory.make_DNSResource(domain=domain)
+        self.assertEqual(
+            {domain: get_hostname_ip_mapping(domain) for domain in domains},
+            get_hostname_ip_mappings(domains),
+        )
+
+    def test_get_hostname_dnsdata_mappings_matches_mapping_per_domain(self):
+        domains = [factory.make_Domain() for _ in range(3)]
+        for domain in domains:
+            node = factory.make_Node(interface=True, domain=domain)
+            factory.make_DNSData(
+                name=node.hostname, domain=domain, rrtype="MX"
+            )
+            factory.make_DNSData(domain=domain)
+        self.assertEqual(
+            {
+                domain: get_hostname_dnsdata_mapping(domain)
+                for domain in domains
+            },
+            get_hostname_dnsdata_mappings(domains),
+        )
+
+
+class TestGetNetworkMappings(TestCase):
+    """Tests for `get_network_mappings`."""
+
+    def test_splits_addresses_between_networks(self):
+        mapping = {
+            "a.maas": HostnameIPMapping(
+                "abc", 30, {"10.0.0.5", "10.1.0.5", "2001:db8::1"}
+            ),
+            "b.maas": HostnameIPMapping("def", None, {"192.168.1.1"}),
+        }
+        networks = [
+            IPNetwork("10.0.0.0/24"),
+            IPNetwork("10.0.0.0/16"),
+            IPNetwork("2001:db8::/64"),
+            IPNetwork("172.16.0.0/12"),
+        ]
+        self.assertEqual(
+            {
+                IPNetwork("10.0.0.0/24"): {
+                    "a.maas": HostnameIPMapping("abc", 30, {"10.0.0.5"})
+                },
+                IPNetwork("10.0.0.0/16"): {
+                    "a.maas": HostnameIPMapping("abc", 30, {"10.0.0.5"})
+                },
+                IPNetwork("2001:db8::/64"): {
+                    "a.maas": HostnameIPMapping("abc", 30, {"2001:db8::1"})
+                },
+                IPNetwork("172.16.0.0/12"): {},
+            },
+            get_network_mappings(mapping, networks),
+        )
+
+    def test_leaves_mapping_unchanged(self):
+        mapping = {"a.maas": HostnameIPMapping("abc", 30, {"10.0.0.5"})}
+        get_network_mappings(mapping, [IPNetwork("10.0.0.0/8")])
+        self.assertEqual(
+            {"a.maas": HostnameIPMapping("abc", 30, {"10.0.0.5"})}, mapping
+        )
+
 
 def forward_zone(domain):
     """Create a matcher for a :class:`DNSForwardZoneConfig`.
@@ -338,6 +414,22 @@ class TestZoneGenerator(MAASServerTestCase):
             ZoneGenerator((), (), serial=random.randint(0, 65535)).as_list(),
         )
 
+    def test_fetches_mappings_for_all_domains_at_once(self):
+        domains = [factory.make_Domain() for _ in range(3)]
+        get_mappings = self.patch(
+            zonegenerator,
+            "get_hostname_ip_mappings",
+            Mock(wraps=get_hostname_ip_mappings),
+        )
+        get_rrset_mappings = self.patch(
+            zonegenerator,
+            "get_hostname_dnsdata_mappings",
+            Mock(wraps=get_hostname_dnsdata_mappings),
+        )
+        ZoneGenerator(domains, (), serial=random.randint(0, 65535)).as_list()
+        self.assertThat(get_mappings, MockCalledOnceWith(domains))
+        self.assertThat(get_rrset_mappings, MockCalledOnceWith(domains))
+
     def test_defaults_ttl(self):
         zonegen = ZoneGenerator((), (), serial=random.randint(0, 65535))
         self.assertEqual(
@@ -8,6 +8,7 @@ __all__ = ["ZoneGenerator"]
 
 from collections import defaultdict
 from collections.abc import Iterable, Sequence
+from copy import copy
 from itertools import chain
 import socket
 
@@ -21,6 +22,7 @@ from maasserver.models.config import Config
 from maasserver.models.dnsdata import DNSData, HostnameRRsetMapping
 from maasserver.models.dnsresource import separate_fqdn
 from maasserver.models.domain import Domain
+from maasserver.models.iprange import IPRange
 from maasserver.models.staticipaddress import StaticIPAddress
 from maasserver.models.subnet import Subnet
 from maasserver.server_address import get_maas_facing_server_addresses
@@ -78,6 +80,59 @@ def get_hostname_dnsdata_mapping(domain):
     return DNSData.objects.get_hostname_dnsdata_mapping(domain, with_ids=False)
 
 
+def get_hostname_ip_mappings(domains):
+    """Return a mapping {domain -> {hostnames -> info}} for the allocated
+    nodes in each of `domains`, using the same few queries for all of them.
+    """
+    mappings = StaticIPAddress.objects.get_hostname_ip_mappings(domains)
+    return {domain: mappings[domain.id] for domain in domains}
+
+
+def get_hostname_dnsdata_mappings(domains):
+    """Return a mapping {domain -> {hostnames -> info}} for the DNS data in
+    each of `domains`, using a single query for all of them.
+    """
+    mappings = DNSData.objects.get_hostname_dnsdata_mappings(
+        domains, with_ids=False
+    )
+    return {domain: mappings[domain.id] for domain in domains}
+
+
+def get_network_mappings(mapping, networks):
+    """Split the hostname mapping `mapping` between `networks`.
+
+    Each IP address is looked up in an index of the networks by prefix, so
+    this takes time proportional to the number of addresses times the number
+    of distinct prefix lengths, rather than times the number of networks.
+
+    :param mapping: A dict mapping hostnames to info, with ttl and ips.
+    :param networks: A sequence of `IPNetwork`.
+    :return: A dict mapping each network to a dict like `mapping`, but with
+        only the IP addresses in that network.
+    """
+    network_mappings = {network: {} for network in networks}
+    # Index the networks by netmask, and then by their first address.
+    index = defaultdict(dict)
+    for network in network_mappings:
+        netmask = int(network.netmask)
+        index[network.version, netmask][network.first] = network
+    for hostname, info in mapping.items():
+        for ip in info.ips:
+            address = IPAddress(ip)
+            for (version, netmask), networks in index.items():
+                if address.version != version:
+                    continue
+                network = networks.get(address.value & netmask)
+                if network is None:
+                    continue
+                network_mapping = network_mappings[network]
+                if hostname not in network_mapping:
+                    network_mapping[hostname] = copy(info)
+                    network_mapping[hostname].ips = set()
+                network_mapping[hostname].ips.add(ip)
+    return network_mappings
+
+
 WARNING_MESSAGE = (
     "The DNS server will use the address '%s',  which is inside the "
     "loopback network.  This may not be a problem if you're not using "
@@ -220,14 +275,18 @@ class ZoneGenerator:
             self.internal_domains = []
 
     @staticmethod
-    def _get_mappings():
-        """Return a lazily evaluated mapping dict."""
-        return lazydict(get_hostname_ip_mapping)
+    def _get_mappings(domains):
+        """Return a lazily evaluated mapping dict, prefilled for `domains`."""
+        mappings = lazydict(get_hostname_ip_mapping)
+        mappings.update(get_hostname_ip_mappings(domains))
+        return mappings
 
     @staticmethod
-    def _get_rrset_mappings():
-        """Return a lazily evaluated mapping dict."""
-        return lazydict(get_hostname_dnsdata_mapping)
+    def _get_rrset_mappings(domains):
+        """Return a lazily evaluated mapping dict, prefilled for `domains`."""
+        mappings = lazydict(get_hostname_dnsdata_mapping)
+        mappings.update(get_hostname_dnsdata_mappings(domains))
+        return mappings
 
     @staticmethod
     def _gen_forward_zones(
@@ -364,6 +423,23 @@ class ZoneGenerator:
         # just do it once and be happy.  LP#1600259
         if len(subnets):
             mappings["reverse"] = mappings[Subnet.objects.first()]
+            # Then split it up between the subnets, so that each reverse zone
+            # only has to look at its own addresses.
+            network_mappings = get_network_mappings(
+                mappings["reverse"],
+                [
+                    IPNetwork(subnet.cidr)
+                    for subnet in subnets
+                    if subnet.rdns_mode != RDNS_MODE.DISABLED
+                ],
+            )
+            subnet_dynamic_ranges = defaultdict(list)
+            for ip_range in IPRange.objects.filter(
+                subnet__in=subnets, type=IPRANGE_TYPE.DYNAMIC
+            ).order_by("id"):
+                subnet_dynamic_ranges[ip_range.subnet_id].append(
+                    ip_range.netaddr_iprange
+                )
 
         # For each of the zones that we are generating (one or more per
         # subnet), compile the zone from:
@@ -389,17 +465,14 @@ class ZoneGenerator:
                 continue
 
             # 1. Figure out the dynamic ranges.
-            dynamic_ranges = [
-                ip_range.netaddr_iprange
-                for ip_range in subnet.get_dynamic_ranges()
-            ]
-
-            # 2. Start with the map of all of the nodes, including all
-            # DNSResource-associated addresses.  We will prune this to just
-            # entries for the subnet when we actually generate the zonefile.
-            # If we get here, then we have subnets, so we noticed that above
-            # and created mappings['reverse'].  LP#1600259
-            mapping = mappings["reverse"]
+            dynamic_ranges = subnet_dynamic_ranges[subnet.id]
+
+            # 2. Start with the map of all of the nodes in the subnet,
+            # including all DNSResource-associated addresses.  We will prune
+            # this to just entries for each zone when we actually generate the
+            # zonefile.  If we get here, then we have subnets, so we noticed
+            # that above and created mappings['reverse'].  LP#1600259
+            mapping = network_mappings[network]
 
             # Use the default_domain as the name for the NS host in the reverse
             # zones.  If this network is actually a parent rfc2317 glue
@@ -451,9 +524,9 @@ class ZoneGenerator:
         # we get to this point, we really need one.
         assert not (self.serial is None), "No serial number specified."
 
-        mappings = self._get_mappings()
+        mappings = self._get_mappings(self.domains)
         ns_host_name = self.default_domain.name
-        rrset_mappings = self._get_rrset_mappings()
+        rrset_mappings = self._get_rrset_mappings(self.domains)
         serial = self.serial
         default_ttl = self.default_ttl
         return chain(
@@ -16,6 +16,8 @@ __all__ = [
     "INTERFACE_TYPE_CHOICES",
     "INTERFACE_TYPE_CHOICES_DICT",
     "IPADDRESS_TYPE",
+    "LARGEFILE_STORAGE",
+    "LARGEFILE_STORAGE_CHOICES",
     "NODE_STATUS",
     "NODE_STATUS_CHOICES",
     "NODE_STATUS_CHOICES_DICT",
@@ -478,6 +480,24 @@ BOOT_RESOURCE_FILE_TYPE_CHOICES = (
 )
 
 
+class LARGEFILE_STORAGE:
+    """The vocabulary of places the content of a `LargeFile` is stored in."""
+
+    #: PostgreSQL large object storage.
+    DATABASE = "database"
+
+    #: Directory on the filesystem of the region controllers, by SHA256.
+    FILESYSTEM = "filesystem"
+
+
+# Django choices for LARGEFILE_STORAGE: sequence of tuples (key, UI
+# representation).
+LARGEFILE_STORAGE_CHOICES = (
+    (LARGEFILE_STORAGE.DATABASE, "Database"),
+    (LARGEFILE_STORAGE.FILESYSTEM, "Filesystem"),
+)
+
+
 class PARTITION_TABLE_TYPE:
     """The vocabulary of possible partition types for `PartitionTable`."""
 
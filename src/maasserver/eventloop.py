@@ -166,6 +166,28 @@ def make_ReverseDNSService(postgresListener):
     return ReverseDNSService(postgresListener)
 
 
+def make_BootConfigCacheService(postgresListener):
+    from maasserver.regiondservices.boot_config_cache import (
+        BootConfigCacheService,
+    )
+
+    return BootConfigCacheService(postgresListener)
+
+
+def make_FreeIPCacheService(postgresListener):
+    from maasserver.regiondservices.free_ip_cache import FreeIPCacheService
+
+    return FreeIPCacheService(postgresListener)
+
+
+def make_SubnetStatsCacheService(postgresListener):
+    from maasserver.regiondservices.subnet_stats_cache import (
+        SubnetStatsCacheService,
+    )
+
+    return SubnetStatsCacheService(postgresListener)
+
+
 def make_NetworkTimeProtocolService():
     from maasserver.regiondservices import ntp
 
@@ -362,6 +384,21 @@ class RegionEventLoop:
             "factory": make_RackControllerService,
             "requires": ["ipc-worker", "postgres-listener-worker"],
         },
+        "boot-config-cache": {
+            "only_on_master": False,
+            "factory": make_BootConfigCacheService,
+            "requires": ["postgres-listener-worker"],
+        },
+        "free-ip-cache": {
+            "only_on_master": False,
+            "factory": make_FreeIPCacheService,
+            "requires": ["postgres-listener-worker"],
+        },
+        "subnet-stats-cache": {
+            "only_on_master": False,
+            "factory": make_SubnetStatsCacheService,
+            "requires": ["postgres-listener-worker"],
+        },
         "ntp": {
             "only_on_master": True,
             "factory": make_NetworkTimeProtocolService,
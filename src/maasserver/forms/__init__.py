@@ -104,11 +104,7 @@ from maasserver.enum import (
     NODE_STATUS,
     NODE_TYPE,
 )
-from maasserver.fields import (
-    LargeObjectFile,
-    MACAddressFormField,
-    UnstrippedCharField,
-)
+from maasserver.fields import MACAddressFormField, UnstrippedCharField
 from maasserver.forms.settings import (
     CONFIG_ITEMS_KEYS,
     get_config_field,
@@ -2549,13 +2545,7 @@ class BootResourceNoContentForm(BootResourceForm):
                     "different size."
                 )
         else:
-            # Create an empty large object. It must be opened and closed
-            # for the object to be created in the database.
-            largeobject = LargeObjectFile()
-            largeobject.open().close()
-            largefile = LargeFile.objects.create(
-                sha256=sha256, total_size=total_size, content=largeobject
-            )
+            largefile = LargeFile.objects.create_empty_file(sha256, total_size)
         return BootResourceFile.objects.create(
             resource_set=resource_set,
             largefile=largefile,
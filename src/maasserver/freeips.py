@@ -0,0 +1,287 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Cache of the free IP addresses of subnets.
+
+Finding the next IP address to allocate from a subnet means working out all
+the addresses that are in use, which is slow for big subnets; see
+`Subnet.get_next_ip_for_allocation`. The free addresses of each subnet are
+instead cached in memory and kept up to date from the `sys_free_ips`
+notifications sent by the database; see `FreeIPCacheService`.
+"""
+
+__all__ = ["free_ip_cache", "FreeIPCache", "IPSpace"]
+
+from bisect import bisect_right, insort
+import threading
+
+from netaddr import IPAddress
+from twisted.internet import reactor
+
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
+
+# How long the free addresses of a subnet are cached before they are worked
+# out again. Notifications that were missed, such as those for transactions
+# that took an address from the cache but rolled back, are picked up then.
+FREE_IP_CACHE_TTL = 60
+
+
+class IPSpace:
+    """A set of addresses, held as disjoint ranges of integers.
+
+    The ranges are kept sorted by their first address, to find the range
+    holding an address, and by their size, to find the smallest range. Both
+    are binary searches.
+    """
+
+    def __init__(self, ranges=()):
+        # The first address of every range, sorted.
+        self._firsts = []
+        # Maps the first address of every range to its last address.
+        self._lasts = {}
+        # (size, first) of every range, sorted.
+        self._sizes = []
+        self.size = 0
+        for first, last in ranges:
+            self._add_range(first, last)
+
+    @classmethod
+    def from_maasipset(cls, ipset):
+        """Return the addresses in the `MAASIPSet` `ipset`."""
+        return cls((iprange.first, iprange.last) for iprange in ipset.ranges)
+
+    def copy(self):
+        space = IPSpace()
+        space._firsts = self._firsts.copy()
+        space._lasts = self._lasts.copy()
+        space._sizes = self._sizes.copy()
+        space.size = self.size
+        return space
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, address):
+        return self._find(address) is not None
+
+    def _find(self, address):
+        """Return the first address of the range holding `address`."""
+        index = bisect_right(self._firsts, address) - 1
+        if index >= 0:
+            first = self._firsts[index]
+            if address <= self._lasts[first]:
+                return first
+        return None
+
+    def _add_range(self, first, last):
+        insort(self._firsts, first)
+        self._lasts[first] = last
+        insort(self._sizes, (last - first + 1, first))
+        self.size += last - first + 1
+
+    def _remove_range(self, first):
+        last = self._lasts.pop(first)
+        del self._firsts[bisect_right(self._firsts, first) - 1]
+        size = last - first + 1
+        del self._sizes[bisect_right(self._sizes, (size, first)) - 1]
+        self.size -= size
+        return last
+
+    def add(self, address):
+        """Add `address`, merging it with the ranges next to it."""
+        if address in self:
+            return
+        first = last = address
+        before = self._find(address - 1)
+        if before is not None:
+            first = before
+            self._remove_range(before)
+        if address + 1 in self._lasts:
+            last = self._remove_range(address + 1)
+        self._add_range(first, last)
+
+    def discard(self, address):
+        """Remove `address`, splitting the range holding it."""
+        first = self._find(address)
+        if first is None:
+            return
+        last = self._remove_range(first)
+        if first < address:
+            self._add_range(first, address - 1)
+        if address < last:
+            self._add_range(address + 1, last)
+
+    def take(self, count=1):
+        """Remove and return `count` addresses.
+
+        Addresses are taken from the start of the smallest range, and from
+        the lowest of equally small ranges, so that big ranges are kept for
+        whoever needs them; this is the same choice as
+        `Subnet.get_next_ip_for_allocation`.
+
+        :return: A list of addresses, or `None` if there are not enough.
+        """
+        if count > self.size:
+            return None
+        addresses = []
+        for _ in range(count):
+            _, first = self._sizes[0]
+            self.discard(first)
+            addresses.append(first)
+        return addresses
+
+
+class FreeIPCache:
+    """Cache of the free IP addresses of managed subnets.
+
+    The cache is only used while `FreeIPCacheService` keeps it up to date,
+    and it is only a hint: addresses handed out by it may have been taken in
+    the meantime, which the database's unique constraint on addresses
+    catches.
+
+    The cache is shared by the threads of a region process, so it is
+    guarded by a lock.
+    """
+
+    def __init__(self, clock=reactor, ttl=FREE_IP_CACHE_TTL):
+        super().__init__()
+        self.clock = clock
+        self.ttl = ttl
+        self.enabled = False
+        # Maps subnet ids to (expires, network, free, fixed), where `free`
+        # are the free addresses and `fixed` are the addresses that are in
+        # use whether or not they are allocated, such as reserved ranges.
+        self.entries = {}
+        # Bumped on every invalidation, so that free addresses worked out
+        # before it are not cached.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def enable(self):
+        """Start using the cache."""
+        with self.lock:
+            self.enabled = True
+            self._clear()
+
+    def disable(self):
+        """Stop using the cache, as it is no longer kept up to date."""
+        with self.lock:
+            self.enabled = False
+            self._clear()
+
+    def take(self, subnet, count=1, exclude_addresses=None):
+        """Take `count` free addresses from `subnet`.
+
+        The addresses are no longer free as far as the cache is concerned,
+        whether or not they are then allocated.
+
+        :param subnet: A `Subnet`.
+        :param exclude_addresses: Addresses which must not be taken.
+        :return: A list of `IPAddress`, or `None` if the cache can't tell,
+            in which case the caller should work out the free addresses
+            itself.
+        """
+        if not self.enabled or not subnet.managed:
+            return None
+        entry = self._get_entry(subnet)
+        if entry is None:
+            return None
+        _, network, space, _ = entry
+        excluded = [
+            address.value
+            for address in map(IPAddress, exclude_addresses or ())
+            if address in network
+        ]
+        with self.lock:
+            taken_from = space
+            if any(address in space for address in excluded):
+                # Leave the excluded addresses out of the choice, without
+                # dropping them from the cache.
+                taken_from = space.copy()
+                for address in excluded:
+                    taken_from.discard(address)
+            addresses = taken_from.take(count)
+            if addresses is None:
+                return None
+            if taken_from is not space:
+                for address in addresses:
+                    space.discard(address)
+        return [IPAddress(address, network.version) for address in addresses]
+
+    def _get_entry(self, subnet):
+        network = subnet.get_ipnetwork()
+        now = self.clock.seconds()
+        with self.lock:
+            entry = self.entries.get(subnet.id)
+            generation = self.generation
+        if entry is not None and entry[0] > now and entry[1] == network:
+            self._record_lookup("hit")
+            return entry
+        self._record_lookup("miss")
+        free = subnet.get_ipranges_not_in_use(with_neighbours=True)
+        fixed = subnet.get_ipranges_in_use(ignore_allocated_ips=True)
+        entry = (
+            now + self.ttl,
+            network,
+            IPSpace.from_maasipset(free),
+            IPSpace.from_maasipset(fixed),
+        )
+        with self.lock:
+            if not self.enabled:
+                return None
+            if generation == self.generation:
+                self.entries[subnet.id] = entry
+        return entry
+
+    def mark_used(self, subnet_id, address):
+        """Record that `address` in the subnet is no longer free."""
+        with self.lock:
+            entry = self.entries.get(subnet_id)
+            if entry is not None:
+                entry[2].discard(IPAddress(address).value)
+
+    def mark_free(self, subnet_id, address):
+        """Record that `address` in the subnet was released.
+
+        Addresses in reserved or dynamic ranges, gateways and the like are
+        still not free once released.
+        """
+        address = IPAddress(address)
+        with self.lock:
+            entry = self.entries.get(subnet_id)
+            if entry is not None:
+                _, network, space, fixed = entry
+                if address in network and address.value not in fixed:
+                    space.add(address.value)
+
+    def mark_neighbour(self, address):
+        """Record that a neighbour was observed using `address`."""
+        address = IPAddress(address)
+        with self.lock:
+            for _, network, space, _ in self.entries.values():
+                if address in network:
+                    space.discard(address.value)
+
+    def invalidate(self, subnet_id=None):
+        """Forget the free addresses of the subnet, or of all subnets."""
+        with self.lock:
+            if subnet_id is None:
+                self._clear()
+            else:
+                self.generation += 1
+                self.entries.pop(subnet_id, None)
+
+    def _clear(self):
+        self.generation += 1
+        self.entries.clear()
+
+    def _record_lookup(self, result):
+        PROMETHEUS_METRICS.update(
+            "maas_region_free_ip_cache_lookups",
+            "inc",
+            labels={"result": result},
+        )
+
+
+# The free IP address cache for this region process.
+free_ip_cache = FreeIPCache()
@@ -0,0 +1,115 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Storage of the content of large files on the filesystem.
+
+The content of a `LargeFile` is stored in PostgreSQL large objects, unless
+the region is configured with a `boot_resources_storage` directory. New
+content is then stored in that directory instead, named by its SHA256, and
+the database only holds its metadata.
+"""
+
+__all__ = ["FileContentStorage", "get_file_content_storage"]
+
+import os
+
+from maasserver.config import RegionConfiguration
+
+# Suffix of the files content is written to before it is complete.
+PARTIAL_SUFFIX = ".partial"
+
+
+class FileContentStorage:
+    """Content-addressed storage of files in a directory.
+
+    Content is stored in `<path>/<sha256[:2]>/<sha256>`. It is written to a
+    partial file next to that, and only moved in place once it is complete,
+    so a file at its final path is always complete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_path(self, sha256):
+        """Return the path of the complete content for `sha256`."""
+        return os.path.join(self.path, sha256[:2], sha256)
+
+    def get_partial_path(self, sha256):
+        """Return the path of the content for `sha256` being written."""
+        return self.get_path(sha256) + PARTIAL_SUFFIX
+
+    def exists(self, sha256):
+        """True if the complete content for `sha256` is stored."""
+        return os.path.exists(self.get_path(sha256))
+
+    def get_size(self, sha256):
+        """Return the size of the content stored for `sha256` so far."""
+        for path in (self.get_path(sha256), self.get_partial_path(sha256)):
+            try:
+                return os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return 0
+
+    def reset(self, sha256):
+        """Start writing the content for `sha256` from scratch."""
+        self.delete(sha256)
+        os.makedirs(os.path.dirname(self.get_path(sha256)), exist_ok=True)
+        open(self.get_partial_path(sha256), "wb").close()
+
+    def append(self, sha256, data):
+        """Append `data` to the content being written for `sha256`.
+
+        :return: The size of the content written so far.
+        """
+        with open(self.get_partial_path(sha256), "ab") as stream:
+            stream.write(data)
+            return stream.tell()
+
+    def commit(self, sha256):
+        """Move the content written for `sha256` in place."""
+        partial_path = self.get_partial_path(sha256)
+        with open(partial_path, "rb") as stream:
+            os.fsync(stream.fileno())
+        os.rename(partial_path, self.get_path(sha256))
+
+    def open(self, sha256):
+        """Open the content for `sha256` for reading.
+
+        Partially written content is read if it is not yet complete.
+        """
+        try:
+            return open(self.get_path(sha256), "rb")
+        except FileNotFoundError:
+            return open(self.get_partial_path(sha256), "rb")
+
+    def delete(self, sha256):
+        """Delete the content for `sha256`, complete or not."""
+        for path in (self.get_path(sha256), self.get_partial_path(sha256)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def list(self):
+        """Yield the SHA256 of all content in the storage, complete or not."""
+        if not os.path.isdir(self.path):
+            return
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.endswith(PARTIAL_SUFFIX):
+                    filename = filename[: -len(PARTIAL_SUFFIX)]
+                yield filename
+
+
+def get_file_content_storage():
+    """Return the `FileContentStorage` configured for the region.
+
+    :return: A `FileContentStorage`, or `None` if content is stored in the
+        database.
+    """
+    with RegionConfiguration.open() as config:
+        path = config.boot_resources_storage
+    if path:
+        return FileContentStorage(path)
+    return None
@@ -8,6 +8,7 @@ __all__ = ["PostgresListenerNotifyError", "PostgresListenerService"]
 from collections import defaultdict
 from errno import ENOENT
 import threading
+import time
 
 from django.db import connections
 from django.db.utils import load_backend
@@ -16,6 +17,7 @@ from twisted.internet import defer, error, interfaces, reactor, task
 from twisted.internet.defer import (
     CancelledError,
     Deferred,
+    DeferredSemaphore,
     ensureDeferred,
     succeed,
 )
@@ -25,6 +27,7 @@ from twisted.logger import Logger
 from twisted.python.failure import Failure
 from zope.interface import implementer
 
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.enum import map_enum
 from provisioningserver.utils.events import EventGroup
 from provisioningserver.utils.twisted import callOut, suppress, synchronous
@@ -76,13 +79,27 @@ class PostgresListenerService(Service, object):
     HANDLE_NOTIFY_DELAY = 0.5
     CHANNEL_REGISTRAR_DELAY = 0.5
 
+    # Maximum number of handlers that can be running at the same time for
+    # notifications on a single channel. Channels not in CHANNEL_CONCURRENCY
+    # use DEFAULT_CHANNEL_CONCURRENCY. System channels are not subject to
+    # this, as their notifications are passed to the handler immediately.
+    DEFAULT_CHANNEL_CONCURRENCY = 4
+    CHANNEL_CONCURRENCY = {}
+
     def __init__(self, alias="default"):
         self.alias = alias
         self.listeners = defaultdict(list)
         self.autoReconnect = False
         self.connection = None
         self.connectionFileno = None
-        self.notifications = set()
+        # Pending (channel, payload) notifications, in the order they were
+        # received, mapped to the time they were first received.
+        self.notifications = {}
+        self.channelLimiters = {}
+        # Notifications for channels with all their handlers running, parked
+        # per channel until one of those handlers finishes.
+        self.channelPending = defaultdict(dict)
+        self.channelDispatching = set()
         self.notifier = task.LoopingCall(self.handleNotifies)
         self.notifierDone = None
         self.connecting = None
@@ -426,20 +443,89 @@ class PostgresListenerService(Service, object):
         else:
             return succeed(None)
 
+    def getChannelLimiter(self, channel):
+        """Return the `DeferredSemaphore` limiting handlers for `channel`."""
+        limiter = self.channelLimiters.get(channel)
+        if limiter is None:
+            limiter = DeferredSemaphore(
+                self.CHANNEL_CONCURRENCY.get(
+                    channel, self.DEFAULT_CHANNEL_CONCURRENCY
+                )
+            )
+            self.channelLimiters[channel] = limiter
+        return limiter
+
     def handleNotifies(self, clock=reactor):
-        """Process all notify message in the notifications set."""
+        """Process all notify message in the notifications queue.
+
+        Notifications are dispatched oldest first. When all the handlers
+        allowed for a channel are already running, its notifications are
+        parked until one of them finishes, and the other channels' keep
+        being dispatched.
+        """
+        defers = []
 
         def gen_notifications(notifications):
             while len(notifications) != 0:
-                yield notifications.pop()
+                PROMETHEUS_METRICS.update(
+                    "maas_listener_notify_queue_depth",
+                    "set",
+                    value=len(notifications),
+                )
+                notification = next(iter(notifications))
+                received = notifications.pop(notification)
+                # The registered channel, as `convertChannel` finds it.
+                channel = notification[0].split("_", 1)[0]
+                if self.getChannelLimiter(channel).tokens == 0:
+                    self.channelPending[channel].setdefault(
+                        notification, received
+                    )
+                else:
+                    defers.append(
+                        self.dispatchNotify(
+                            channel, notification, received, clock
+                        )
+                    )
+                yield
+            PROMETHEUS_METRICS.update(
+                "maas_listener_notify_queue_depth", "set", value=0
+            )
 
-        return task.coiterate(
-            self.handleNotify(notification, clock=clock)
-            for notification in gen_notifications(self.notifications)
+        d = task.coiterate(gen_notifications(self.notifications))
+        d.addCallback(lambda _: defer.DeferredList(defers))
+        return d
+
+    def dispatchNotify(self, channel, notification, received, clock=reactor):
+        """Handle `notification`, recording how long it waited."""
+        PROMETHEUS_METRICS.update(
+            "maas_listener_notify_wait_time",
+            "observe",
+            value=clock.seconds() - received,
+            labels={"channel": channel},
         )
+        return self.handleNotify(notification, clock=clock)
+
+    def dispatchPendingNotifies(self, channel, clock=reactor):
+        """Handle the notifications parked for `channel`, oldest first, for
+        as long as it has handlers to spare."""
+        if channel in self.channelDispatching:
+            # Handlers that finish straight away end up here again.
+            return
+        self.channelDispatching.add(channel)
+        try:
+            limiter = self.getChannelLimiter(channel)
+            pending = self.channelPending.get(channel, {})
+            while len(pending) != 0 and limiter.tokens != 0:
+                notification = next(iter(pending))
+                received = pending.pop(notification)
+                self.dispatchNotify(channel, notification, received, clock)
+            if len(pending) == 0:
+                self.channelPending.pop(channel, None)
+        finally:
+            self.channelDispatching.discard(channel)
 
     def handleNotify(self, notification, clock=reactor):
-        """Process a notify message in the notifications set."""
+        """Process a notify message from the notifications queue."""
         channel, payload = notification
         try:
             channel, action = self.convertChannel(channel)
@@ -452,10 +538,11 @@ class PostgresListenerService(Service, object):
         else:
             defers = []
             handlers = self.listeners[channel]
-            # XXX: There could be an arbitrary number of listeners. Should we
-            # limit concurrency here? Perhaps even do one at a time.
+            limiter = self.getChannelLimiter(channel)
             for handler in handlers:
-                d = defer.maybeDeferred(handler, action, payload)
+                d = limiter.run(
+                    self._runHandler, handler, channel, action, payload
+                )
                 d.addErrback(
                     lambda failure: self.log.failure(
                         "Failure while handling notification to {channel!r}: "
@@ -465,9 +552,28 @@ class PostgresListenerService(Service, object):
                         payload=payload,
                     )
                 )
+                # A handler has been released; use it for what's parked.
+                d.addCallback(
+                    lambda _: self.dispatchPendingNotifies(channel, clock)
+                )
                 defers.append(d)
             return defer.DeferredList(defers)
 
+    def _runHandler(self, handler, channel, action, payload):
+        """Call `handler`, recording its latency for `channel`."""
+
+        def record_latency(result, started):
+            PROMETHEUS_METRICS.update(
+                "maas_listener_notify_handler_latency",
+                "observe",
+                value=time.time() - started,
+                labels={"channel": channel},
+            )
+            return result
+
+        d = defer.maybeDeferred(handler, action, payload)
+        return d.addBoth(record_latency, time.time())
+
     def _process_notifies(self):
         """Add each notify to to the notifications set.
 
@@ -499,7 +605,9 @@ class PostgresListenerService(Service, object):
             else:
                 # Place non-system messages into the queue to be
                 # processed.
-                self.notifications.add((notify.channel, notify.payload))
+                self.notifications.setdefault(
+                    (notify.channel, notify.payload), reactor.seconds()
+                )
         # Delete the contents of the connection's notifies list so
         # that we don't process them a second time.
         del notifies[:]
@@ -0,0 +1,106 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Django command: move_boot_resources (moves the content of boot resources
+from the database to the boot resources storage directory)."""
+
+__all__ = ["Command"]
+
+import hashlib
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from maasserver.enum import LARGEFILE_STORAGE
+from maasserver.largefilestorage import get_file_content_storage
+from maasserver.models import LargeFile
+
+
+def move_large_file(largefile_id, storage):
+    """Move the content of a `LargeFile` from the large object storage to
+    `storage`.
+
+    :return: True if the content was moved, False if it is not complete, or
+        it is not valid.
+    """
+    with transaction.atomic():
+        largefile = LargeFile.objects.select_for_update().get(id=largefile_id)
+        if (
+            largefile.storage != LARGEFILE_STORAGE.DATABASE
+            or not largefile.complete
+        ):
+            return False
+        sha256 = hashlib.sha256()
+        storage.reset(largefile.sha256)
+        with largefile.content.open("rb") as stream:
+            for data in stream:
+                sha256.update(data)
+                storage.append(largefile.sha256, data)
+        if sha256.hexdigest() != largefile.sha256:
+            storage.delete(largefile.sha256)
+            return False
+        storage.commit(largefile.sha256)
+        largefile.content.unlink()
+        largefile.content = None
+        largefile.storage = LARGEFILE_STORAGE.FILESYSTEM
+        largefile.save()
+    return True
+
+
+def remove_unreferenced_files(storage):
+    """Remove the content in `storage` that no `LargeFile` refers to.
+
+    :return: The SHA256 of the removed content.
+    """
+    stored = set(storage.list())
+    referenced = set(
+        LargeFile.objects.filter(
+            storage=LARGEFILE_STORAGE.FILESYSTEM, sha256__in=stored
+        ).values_list("sha256", flat=True)
+    )
+    removed = sorted(stored - referenced)
+    for sha256 in removed:
+        storage.delete(sha256)
+    return removed
+
+
+class Command(BaseCommand):
+    """Moves the content of boot resources out of the database."""
+
+    help = dedent(
+        "Moves the content of boot resources from the database to the "
+        "directory configured with boot_resources_storage, and removes "
+        "files from that directory that are no longer used. Run this while "
+        "no boot resources are being imported or uploaded; content that is "
+        "not completely written is left in the database."
+    )
+
+    def handle(self, **options):
+        storage = get_file_content_storage()
+        if storage is None:
+            raise CommandError(
+                "boot_resources_storage is not configured; set it with "
+                "local_config_set first."
+            )
+        largefile_ids = list(
+            LargeFile.objects.filter(
+                storage=LARGEFILE_STORAGE.DATABASE
+            ).values_list("id", flat=True)
+        )
+        skipped = []
+        for largefile_id in largefile_ids:
+            if not move_large_file(largefile_id, storage):
+                skipped.append(largefile_id)
+        moved = len(largefile_ids) - len(skipped)
+        self.stdout.write("Moved %d boot resource file(s)." % moved)
+        if skipped:
+            self.stdout.write(
+                "Left %d incomplete or invalid boot resource file(s) in the "
+                "database." % len(skipped)
+            )
+        removed = remove_unreferenced_files(storage)
+        if removed:
+            self.stdout.write(
+                "Removed %d unused boot resource file(s)." % len(removed)
+            )
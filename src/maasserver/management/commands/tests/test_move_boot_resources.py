@@ -0,0 +1,67 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Test the `move_boot_resources` management command."""
+
+__all__ = []
+
+import hashlib
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from maasserver.enum import LARGEFILE_STORAGE
+from maasserver.largefilestorage import FileContentStorage
+from maasserver.testing.config import RegionConfigurationFixture
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+from maasserver.utils.orm import reload_object
+
+
+class TestMoveBootResources(MAASServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = FileContentStorage(self.make_dir())
+        self.useFixture(
+            RegionConfigurationFixture(
+                boot_resources_storage=self.storage.path
+            )
+        )
+
+    def call_command(self):
+        stdout = StringIO()
+        call_command("move_boot_resources", stdout=stdout)
+        return stdout.getvalue()
+
+    def test_requires_storage(self):
+        self.useFixture(RegionConfigurationFixture())
+        self.assertRaises(CommandError, self.call_command)
+
+    def test_moves_content_to_storage(self):
+        content = factory.make_bytes(size=1024)
+        largefile = factory.make_LargeFile(content, size=len(content))
+        output = self.call_command()
+        largefile = reload_object(largefile)
+        self.assertEqual(LARGEFILE_STORAGE.FILESYSTEM, largefile.storage)
+        self.assertIsNone(largefile.content)
+        self.assertTrue(self.storage.exists(largefile.sha256))
+        with largefile.open_content() as stream:
+            self.assertEqual(content, stream.read())
+        self.assertIn("Moved 1 boot resource file(s).", output)
+
+    def test_leaves_incomplete_content_in_database(self):
+        largefile = factory.make_LargeFile(factory.make_bytes(), size=1024)
+        output = self.call_command()
+        largefile = reload_object(largefile)
+        self.assertEqual(LARGEFILE_STORAGE.DATABASE, largefile.storage)
+        self.assertEqual([], list(self.storage.list()))
+        self.assertIn("Left 1 incomplete or invalid", output)
+
+    def test_removes_unused_files(self):
+        sha256 = hashlib.sha256(factory.make_bytes()).hexdigest()
+        self.storage.reset(sha256)
+        self.storage.commit(sha256)
+        output = self.call_command()
+        self.assertFalse(self.storage.exists(sha256))
+        self.assertIn("Removed 1 unused boot resource file(s).", output)
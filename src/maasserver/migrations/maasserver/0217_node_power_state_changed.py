@@ -0,0 +1,20 @@
+# Generated by Django 2.2.12 on 2020-09-22 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("maasserver", "0216_remove_skip_bmc_config_column"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="node",
+            name="power_state_changed",
+            field=models.DateTimeField(
+                default=None, editable=False, null=True
+            ),
+        ),
+    ]
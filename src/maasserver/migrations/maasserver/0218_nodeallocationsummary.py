@@ -0,0 +1,151 @@
+# Generated by Django 2.2.12 on 2020-10-02 09:41
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("maasserver", "0217_node_power_state_changed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NodeAllocationSummary",
+            fields=[
+                (
+                    "node",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        editable=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="allocation_summary",
+                        serialize=False,
+                        to="maasserver.Node",
+                    ),
+                ),
+                (
+                    "root_device_size",
+                    models.BigIntegerField(
+                        default=None, editable=False, null=True
+                    ),
+                ),
+                (
+                    "root_device_tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "root_partition_size",
+                    models.BigIntegerField(
+                        default=None, editable=False, null=True
+                    ),
+                ),
+                (
+                    "root_partition_tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "unused_device_count",
+                    models.IntegerField(default=0, editable=False),
+                ),
+                (
+                    "unused_device_size",
+                    models.BigIntegerField(
+                        default=None, editable=False, null=True
+                    ),
+                ),
+                (
+                    "unused_device_tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "unused_partition_count",
+                    models.IntegerField(default=0, editable=False),
+                ),
+                (
+                    "unused_partition_size",
+                    models.BigIntegerField(
+                        default=None, editable=False, null=True
+                    ),
+                ),
+                (
+                    "unused_partition_tags",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.TextField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "fabric_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "vlan_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "subnet_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.IntegerField(),
+                        default=list,
+                        editable=False,
+                        size=None,
+                    ),
+                ),
+                (
+                    "max_link_speed",
+                    models.IntegerField(default=0, editable=False),
+                ),
+            ],
+            options={"verbose_name": "Node allocation summary"},
+        ),
+        migrations.AddIndex(
+            model_name="nodeallocationsummary",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["fabric_ids"], name="nodeallocsummary_fabric_ids"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="nodeallocationsummary",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["vlan_ids"], name="nodeallocsummary_vlan_ids"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="nodeallocationsummary",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["subnet_ids"], name="nodeallocsummary_subnet_ids"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.12 on 2020-10-09 11:02
+
+from django.db import migrations, models
+
+import maasserver.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("maasserver", "0218_nodeallocationsummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="largefile",
+            name="storage",
+            field=models.CharField(
+                choices=[
+                    ("database", "Database"),
+                    ("filesystem", "Filesystem"),
+                ],
+                default="database",
+                editable=False,
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="largefile",
+            name="content",
+            field=maasserver.fields.LargeObjectField(blank=True, null=True),
+        ),
+    ]
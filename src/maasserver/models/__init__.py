@@ -46,6 +46,7 @@ __all__ = [
     "MDNS",
     "Neighbour",
     "Node",
+    "NodeAllocationSummary",
     "NodeMetadata",
     "NodeGroupToRackController",
     "Notification",
@@ -162,6 +163,7 @@ from maasserver.models.node import (
     RackController,
     RegionController,
 )
+from maasserver.models.nodeallocationsummary import NodeAllocationSummary
 from maasserver.models.nodemetadata import NodeMetadata
 from maasserver.models.notification import Notification
 from maasserver.models.numa import NUMANode, NUMANodeHugepages
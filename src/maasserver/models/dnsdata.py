@@ -147,6 +147,24 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
         self, domain, raw_ttl=False, with_ids=True
     ):
         """Return hostname to RRset mapping for this domain."""
+        mappings = self.get_hostname_dnsdata_mappings(
+            [domain], raw_ttl=raw_ttl, with_ids=with_ids
+        )
+        return mappings[domain.id]
+
+    def get_hostname_dnsdata_mappings(
+        self, domains, raw_ttl=False, with_ids=True
+    ):
+        """Return hostname to RRset mappings for each of these domains.
+
+        This gives the same mappings as calling `get_hostname_dnsdata_mapping`
+        for each domain, but with a single query.
+
+        :return: a dict of {domain id: mapping}.
+        """
+        domains = {domain.id: domain for domain in domains}
+        if len(domains) == 0:
+            return {}
         cursor = connection.cursor()
         default_ttl = "%d" % Config.objects.get_config("default_dns_ttl")
         if raw_ttl:
@@ -165,6 +183,7 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
             SELECT
                 dnsresource.id,
                 dnsresource.name,
+                dnsresource.domain_id,
                 domain.name,
                 node.system_id,
                 node.node_type,
@@ -226,7 +245,7 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
                  * wins, and we drop the CNAME until the node no longer has the
                  * same name.
                  */
-                (dnsresource.domain_id = %s OR node.fqdn IS NOT NULL) AND
+                (dnsresource.domain_id = ANY(%s) OR node.fqdn IS NOT NULL) AND
                 (dnsdata.rrtype != 'CNAME' OR node.fqdn IS NULL)
             ORDER BY
                 dnsresource.name,
@@ -237,11 +256,15 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
         # N.B.: The "node.hostname IS NULL" above is actually checking that
         # no node exists with the same name, in order to make sure that we do
         # not spill CNAME and other data.
-        mapping = defaultdict(HostnameRRsetMapping)
-        cursor.execute(sql_query, (domain.id,))
+        mappings = {
+            domain_id: defaultdict(HostnameRRsetMapping)
+            for domain_id in domains
+        }
+        cursor.execute(sql_query, (list(domains),))
         for (
             dnsresource_id,
             name,
+            d_id,
             d_name,
             system_id,
             node_type,
@@ -251,27 +274,34 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
             rrtype,
             rrdata,
         ) in cursor.fetchall():
-            if name == "@" and d_name != domain.name:
-                name, d_name = d_name.split(".", 1)
-                # Since we don't allow more than one label in dnsresource
-                # names, we should never ever be wrong in this assertion.
-                assert (
-                    d_name == domain.name
-                ), "Invalid domain; expected '%s' == '%s'" % (
-                    d_name,
-                    domain.name,
-                )
-            entry = mapping[name]
-            entry.node_type = node_type
-            entry.system_id = system_id
-            entry.user_id = user_id
-            if with_ids:
-                entry.dnsresource_id = dnsresource_id
-                rrtuple = (ttl, rrtype, rrdata, dnsdata_id)
+            if system_id is None:
+                # Without a node, the entry is only in its own domain.
+                result_domains = [domains[d_id]]
             else:
-                rrtuple = (ttl, rrtype, rrdata)
-            entry.rrset.add(rrtuple)
-        return mapping
+                result_domains = domains.values()
+            for domain in result_domains:
+                entry_name = name
+                if name == "@" and d_name != domain.name:
+                    entry_name, parent_name = d_name.split(".", 1)
+                    # Since we don't allow more than one label in dnsresource
+                    # names, we should never ever be wrong in this assertion.
+                    assert (
+                        parent_name == domain.name
+                    ), "Invalid domain; expected '%s' == '%s'" % (
+                        parent_name,
+                        domain.name,
+                    )
+                entry = mappings[domain.id][entry_name]
+                entry.node_type = node_type
+                entry.system_id = system_id
+                entry.user_id = user_id
+                if with_ids:
+                    entry.dnsresource_id = dnsresource_id
+                    rrtuple = (ttl, rrtype, rrdata, dnsdata_id)
+                else:
+                    rrtuple = (ttl, rrtype, rrdata)
+                entry.rrset.add(rrtuple)
+        return mappings
 
 
 class DNSData(CleanSave, TimestampedModel):
@@ -1542,9 +1542,15 @@ class Interface(CleanSave, TimestampedModel):
         neighbour = Neighbour.objects.get_current_binding(
             ip, mac, interface=self, vid=vid
         )
+        count = neighbour_json.get("count", 1)
         if neighbour is None:
             neighbour = Neighbour.objects.create(
-                interface=self, ip=ip, vid=vid, mac_address=mac, time=time
+                interface=self,
+                ip=ip,
+                vid=vid,
+                mac_address=mac,
+                time=time,
+                count=count,
             )
             # If we deleted a previous neighbour, then we have already
             # generated a log statement about this neighbour.
@@ -1560,7 +1566,7 @@ class Interface(CleanSave, TimestampedModel):
                 )
         else:
             neighbour.time = time
-            neighbour.count += 1
+            neighbour.count += count
             neighbour.save(update_fields=["time", "count", "updated"])
         return neighbour
 
@@ -1580,9 +1586,10 @@ class Interface(CleanSave, TimestampedModel):
             hostname, ip, interface=self
         )
         binding = MDNS.objects.get_current_entry(hostname, ip, interface=self)
+        count = avahi_json.get("count", 1)
         if binding is None:
             binding = MDNS.objects.create(
-                interface=self, ip=ip, hostname=hostname
+                interface=self, ip=ip, hostname=hostname, count=count
             )
             # If we deleted a previous mDNS entry, then we have already
             # generated a log statement about this mDNS entry.
@@ -1592,7 +1599,7 @@ class Interface(CleanSave, TimestampedModel):
                     % (self.get_log_string(), hostname, ip)
                 )
         else:
-            binding.count += 1
+            binding.count += count
             binding.save(update_fields=["count", "updated"])
         return binding
 
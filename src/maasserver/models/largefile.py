@@ -6,12 +6,15 @@
 __all__ = ["LargeFile"]
 
 import hashlib
+import os
 
 from django.db.models import BigIntegerField, CharField, Manager
 from twisted.internet import reactor
 
 from maasserver import DefaultMeta
+from maasserver.enum import LARGEFILE_STORAGE, LARGEFILE_STORAGE_CHOICES
 from maasserver.fields import LargeObjectField, LargeObjectFile
+from maasserver.largefilestorage import get_file_content_storage
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.timestampedmodel import TimestampedModel
 from maasserver.utils.orm import get_one, transactional
@@ -44,30 +47,55 @@ class FileStorageManager(Manager):
         :return: `LargeFile`.
         """
         sha256 = hashlib.sha256()
+        length = 0
         for data in content:
             sha256.update(data)
+            length += len(data)
         hexdigest = sha256.hexdigest()
         largefile = self.get_file(hexdigest)
         if largefile is not None:
             return largefile
 
-        length = 0
+        largefile = self.create_empty_file(hexdigest, length)
         content.seek(0)
-        objfile = LargeObjectFile()
-        with objfile.open("wb") as objstream:
-            for data in content:
-                objstream.write(data)
-                length += len(data)
+        for data in content:
+            largefile.size = largefile.append_content(data)
+        largefile.save()
+        return largefile
+
+    def create_empty_file(self, sha256, total_size):
+        """Create a file whose content is yet to be written.
+
+        The content is stored on the filesystem if the region is configured
+        with a `boot_resources_storage` directory, and in the large object
+        storage otherwise.
+
+        :return: `LargeFile`.
+        """
+        storage = get_file_content_storage()
+        if storage is not None:
+            storage.reset(sha256)
+            return self.create(
+                sha256=sha256,
+                total_size=total_size,
+                storage=LARGEFILE_STORAGE.FILESYSTEM,
+                content=None,
+            )
+        # Create an empty large object. It must be opened and closed for the
+        # object to be created in the database.
+        largeobject = LargeObjectFile()
+        largeobject.open().close()
         return self.create(
-            sha256=hexdigest, size=length, total_size=length, content=objfile
+            sha256=sha256, total_size=total_size, content=largeobject
         )
 
 
 class LargeFile(CleanSave, TimestampedModel):
-    """Files that are stored in the large object storage.
+    """Files that are stored in the large object storage, or on the
+    filesystem of the region controllers.
 
-    Only unique files are stored in the database, as only one sha256 value
-    can exist per file. This provides data deduplication on the file level.
+    Only unique files are stored, as only one sha256 value can exist per
+    file. This provides data deduplication on the file level.
 
     Currently only used by `BootResourceFile`. This speeds up the import
     process by only saving unique files.
@@ -77,7 +105,8 @@ class LargeFile(CleanSave, TimestampedModel):
     :ivar total_size: Final size of `content`. The data might currently
         be saving, so total_size could be larger than `size`. `size` should
         never be larger than `total_size`.
-    :ivar content: File data.
+    :ivar storage: Where `content` is stored. See `LARGEFILE_STORAGE`.
+    :ivar content: File data, when stored in the large object storage.
     """
 
     class Meta(DefaultMeta):
@@ -91,9 +120,17 @@ class LargeFile(CleanSave, TimestampedModel):
 
     total_size = BigIntegerField(editable=False)
 
+    storage = CharField(
+        max_length=10,
+        choices=LARGEFILE_STORAGE_CHOICES,
+        default=LARGEFILE_STORAGE.DATABASE,
+        editable=False,
+    )
+
     # content is stored directly in the database, in the large object storage.
-    # Max file storage size is 4TB.
-    content = LargeObjectField()
+    # Max file storage size is 4TB. It is None when the content is stored on
+    # the filesystem instead.
+    content = LargeObjectField(null=True, blank=True)
 
     def __str__(self):
         return "<LargeFile size=%d sha256=%s>" % (self.total_size, self.sha256)
@@ -121,12 +158,66 @@ class LargeFile(CleanSave, TimestampedModel):
         if not self.complete:
             return False
         sha256 = hashlib.sha256()
-        with self.content.open("rb") as stream:
-            for data in stream:
+        with self.open_content() as stream:
+            for data in iter(lambda: stream.read(1 << 16), b""):
                 sha256.update(data)
         hexdigest = sha256.hexdigest()
         return hexdigest == self.sha256
 
+    def _get_file_content_storage(self):
+        storage = get_file_content_storage()
+        if storage is None:
+            raise FileNotFoundError(
+                "Content of %s is stored on the filesystem, but "
+                "boot_resources_storage is not configured." % self
+            )
+        return storage
+
+    def open_content(self):
+        """Open `content` for reading.
+
+        Content in the large object storage can only be read within a
+        transaction.
+        """
+        if self.storage == LARGEFILE_STORAGE.FILESYSTEM:
+            return self._get_file_content_storage().open(self.sha256)
+        return self.content.open("rb")
+
+    def get_content_size(self):
+        """Return the size of the content written so far."""
+        if self.storage == LARGEFILE_STORAGE.FILESYSTEM:
+            return self._get_file_content_storage().get_size(self.sha256)
+        with self.content.open("rb") as stream:
+            stream.seek(0, os.SEEK_END)
+            return stream.tell()
+
+    def reset_content(self):
+        """Discard the content written so far."""
+        if self.storage == LARGEFILE_STORAGE.FILESYSTEM:
+            self._get_file_content_storage().reset(self.sha256)
+        else:
+            with self.content.open("wb") as stream:
+                stream.truncate()
+
+    def append_content(self, data):
+        """Append `data` to `content`.
+
+        Content on the filesystem is only moved in place once `total_size`
+        has been written.
+
+        :return: The size of the content written so far.
+        """
+        if self.storage == LARGEFILE_STORAGE.FILESYSTEM:
+            storage = self._get_file_content_storage()
+            size = storage.append(self.sha256, data)
+            if size == self.total_size:
+                storage.commit(self.sha256)
+            return size
+        with self.content.open("wb") as stream:
+            stream.seek(0, os.SEEK_END)
+            stream.write(data)
+            return stream.tell()
+
     def delete(self, *args, **kwargs):
         """Delete this object.
 
@@ -166,3 +257,15 @@ def delete_large_object_content_later(content):
         return d
 
     return reactor.callLater(0, unlink, content)
+
+
+def delete_file_content(sha256):
+    """Delete the content stored on the filesystem for `sha256`."""
+    storage = get_file_content_storage()
+    if storage is None:
+        log.msg(
+            "Failure deleting content (sha256=%s): boot_resources_storage "
+            "is not configured." % sha256
+        )
+    else:
+        storage.delete(sha256)
@@ -5,6 +5,8 @@
 
 __all__ = ["Neighbour"]
 
+from collections import OrderedDict
+
 from django.db.models import (
     CASCADE,
     ForeignKey,
@@ -13,12 +15,13 @@ from django.db.models import (
     Manager,
 )
 from django.db.models.query import QuerySet
+from netaddr import EUI, IPAddress
 
 from maasserver import DefaultMeta
 from maasserver.fields import MACAddressField
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.interface import Interface
-from maasserver.models.timestampedmodel import TimestampedModel
+from maasserver.models.timestampedmodel import now, TimestampedModel
 from maasserver.utils.orm import get_one, MAASQueriesMixin, UniqueViolation
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils.network import get_mac_organization
@@ -135,6 +138,118 @@ class NeighbourManager(Manager, NeighbourQueriesMixin):
         # a UniqueViolation so this operation can be retried.
         return get_one(query, exception_class=UniqueViolation)
 
+    def update_neighbours(self, observations):
+        """Update the neighbour table with many observations at once.
+
+        This has the same effect as calling `Interface.update_neighbour` for
+        each observation in turn, but with a fixed number of queries: the
+        existing neighbours are fetched together, bindings that moved to
+        another MAC are deleted together, and the rest are created or updated
+        in bulk.
+
+        :param observations: A sequence of ``(interface, neighbour_json)``
+            tuples, where the neighbour JSON is as reported by a controller.
+            It can have a ``count`` of how many times the binding was seen.
+        :return: A list of the created or updated neighbours.
+        """
+        # Only the last MAC observed for each (interface, IP, VID) matters;
+        # any earlier binding is obsolete by the end of the batch.
+        latest = OrderedDict()
+        for interface, neighbour_json in observations:
+            if interface.neighbour_discovery_state is False:
+                continue
+            vid = neighbour_json.get("vid", None)
+            key = interface.id, IPAddress(neighbour_json["ip"]), vid
+            observed = {
+                "interface": interface,
+                "ip": neighbour_json["ip"],
+                "mac": neighbour_json["mac"],
+                "vid": vid,
+                "time": neighbour_json["time"],
+                "count": neighbour_json.get("count", 1),
+            }
+            previous = latest.pop(key, None)
+            if previous is not None and (
+                EUI(previous["mac"]) == EUI(observed["mac"])
+            ):
+                observed["count"] += previous["count"]
+                observed["time"] = max(observed["time"], previous["time"])
+            latest[key] = observed
+        if len(latest) == 0:
+            return []
+
+        existing = self.filter(
+            interface_id__in={key[0] for key in latest},
+            ip__in={observed["ip"] for observed in latest.values()},
+        )
+        current, obsolete, moved = {}, [], set()
+        for neighbour in existing:
+            key = (
+                neighbour.interface_id,
+                IPAddress(neighbour.ip),
+                neighbour.vid,
+            )
+            observed = latest.get(key)
+            if observed is None:
+                continue
+            elif neighbour.mac_address is not None and (
+                EUI(str(neighbour.mac_address)) == EUI(observed["mac"])
+            ):
+                current[key] = neighbour
+            else:
+                maaslog.info(
+                    "%s: IP address %s%s moved from %s to %s"
+                    % (
+                        observed["interface"].get_log_string(),
+                        observed["ip"],
+                        self.get_vid_log_snippet(observed["vid"]),
+                        neighbour.mac_address,
+                        observed["mac"],
+                    )
+                )
+                obsolete.append(neighbour.id)
+                moved.add(key)
+        if len(obsolete) > 0:
+            self.filter(id__in=obsolete).delete()
+
+        timestamp = now()
+        neighbours, created, updated = [], [], []
+        for key, observed in latest.items():
+            neighbour = current.get(key)
+            if neighbour is None:
+                neighbour = self.model(
+                    interface=observed["interface"],
+                    ip=observed["ip"],
+                    vid=observed["vid"],
+                    mac_address=observed["mac"],
+                    time=observed["time"],
+                    count=observed["count"],
+                    created=timestamp,
+                    updated=timestamp,
+                )
+                created.append(neighbour)
+                # If a previous binding was deleted, its move has already
+                # been logged.
+                if key not in moved:
+                    maaslog.info(
+                        "%s: New MAC, IP binding observed%s: %s, %s"
+                        % (
+                            observed["interface"].get_log_string(),
+                            self.get_vid_log_snippet(observed["vid"]),
+                            observed["mac"],
+                            observed["ip"],
+                        )
+                    )
+            else:
+                neighbour.time = observed["time"]
+                neighbour.count += observed["count"]
+                neighbour.updated = timestamp
+                updated.append(neighbour)
+            neighbours.append(neighbour)
+        self.bulk_create(created)
+        self.bulk_update(updated, ["time", "count", "updated"])
+        return neighbours
+
     def get_by_updated_with_related_nodes(self):
         """Returns a `QuerySet` of neighbours, while also selecting related
         interfaces and nodes.
@@ -41,6 +41,7 @@ from django.db import connection
 from django.db.models import (
     BigIntegerField,
     BooleanField,
+    Case,
     CASCADE,
     CharField,
     DateTimeField,
@@ -57,6 +58,8 @@ from django.db.models import (
     SET_DEFAULT,
     SET_NULL,
     TextField,
+    Value,
+    When,
 )
 from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
@@ -614,6 +617,62 @@ class MachineManager(BaseNodeManager):
         available_machines = self.get_nodes(for_user, NodePermission.edit)
         return available_machines.filter(status=NODE_STATUS.READY)
 
+    def claim_available_machines(self, candidates, count=1, batch_size=20):
+        """Lock up to `count` of the `candidates` so they can be acquired.
+
+        Candidates are tried in order. Machines that are locked by another
+        transaction, most likely because they are being acquired, are skipped
+        instead of waited for, so concurrent allocations claim different
+        machines rather than queueing behind a single lock. The locks are
+        held until the end of the transaction.
+
+        :param candidates: A `QuerySet` of available machines, in order of
+            preference.
+        :param count: The number of machines to claim.
+        :param batch_size: The number of candidates to consider at once.
+        :return: A list of the claimed machines, in order of preference.
+        """
+        claimed = []
+        offset = 0
+        while len(claimed) < count:
+            batch = list(candidates[offset : offset + batch_size])
+            if len(batch) == 0:
+                break
+            offset += len(batch)
+            preference = Case(
+                *(
+                    When(id=machine.id, then=Value(index))
+                    for index, machine in enumerate(batch)
+                ),
+                output_field=IntegerField(),
+            )
+            locked = (
+                self.filter(
+                    id__in=[machine.id for machine in batch],
+                    status=NODE_STATUS.READY,
+                )
+                .select_for_update(skip_locked=True)
+                .order_by(preference)
+                .values_list("id", flat=True)
+            )
+            locked_ids = set(locked[: count - len(claimed)])
+            claimed.extend(
+                machine for machine in batch if machine.id in locked_ids
+            )
+        return claimed
+
+    def lock_for_acquisition(self, machine):
+        """Lock `machine` until the end of the transaction.
+
+        Used when acquiring a given machine so that a concurrent allocation
+        cannot claim it, without holding up the acquisition of other machines.
+        """
+        list(
+            self.filter(id=machine.id)
+            .select_for_update()
+            .values_list("id", flat=True)
+        )
+
 
 class DeviceManager(BaseNodeManager):
     """Devices are all the non-deployable nodes."""
@@ -1088,6 +1147,13 @@ class Node(CleanSave, TimestampedModel):
         null=True, blank=False, default=None, editable=False
     )
 
+    # Set when a rack controller reports a power state different from the
+    # last one. Used to query the power state of recently changed nodes
+    # more often than stable ones.
+    power_state_changed = DateTimeField(
+        null=True, blank=False, default=None, editable=False
+    )
+
     # Updated each time a rack controller finishes syncing boot images.
     last_image_sync = DateTimeField(
         null=True, blank=False, default=None, editable=False
@@ -3847,6 +3913,8 @@ class Node(CleanSave, TimestampedModel):
         # Avoid circular imports.
         from maasserver.models.event import Event
 
+        if self.power_state != power_state or self.power_state_changed is None:
+            self.power_state_changed = now()
         self.power_state = power_state
         self.power_state_updated = now()
         mark_ready = (
@@ -6766,18 +6834,26 @@ class Controller(Node):
             Neighbour data is gathered directly from the ARP monitoring process
             running on each rack interface.
         """
+        # Circular imports.
+        from maasserver.models.neighbour import Neighbour
+
         # Determine which interfaces' neighbours need updating.
         interface_set = {neighbour["interface"] for neighbour in neighbours}
         interfaces = Interface.objects.get_interface_dict_for_node(
             self, names=interface_set, fetch_fabric_vlan=True
         )
+        observations = []
+        vids = OrderedDict()
         for neighbour in neighbours:
             interface = interfaces.get(neighbour["interface"], None)
             if interface is not None:
-                interface.update_neighbour(neighbour)
+                observations.append((interface, neighbour))
                 vid = neighbour.get("vid", None)
                 if vid is not None:
-                    interface.report_vid(vid)
+                    vids[interface.id, vid] = interface
+        Neighbour.objects.update_neighbours(observations)
+        for (_, vid), interface in vids.items():
+            interface.report_vid(vid)
 
     def report_mdns_entries(self, entries):
         """Update the mDNS entries on this controller.
@@ -0,0 +1,99 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Node allocation summary objects."""
+
+__all__ = ["NodeAllocationSummary"]
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import (
+    BigIntegerField,
+    DO_NOTHING,
+    IntegerField,
+    Model,
+    OneToOneField,
+    TextField,
+)
+
+from maasserver import DefaultMeta
+
+
+class NodeAllocationSummary(Model):
+    """Denormalized summary of the storage and networking of a node.
+
+    The storage and interface constraints used when allocating a machine
+    otherwise need several joins over the block devices, partitions,
+    filesystems and interfaces of every node. This table holds one row per
+    node that answers the question "could this node match?" with simple
+    predicates, so the exact matching only has to look at the candidates.
+
+    The rows are maintained by triggers within the database (see
+    `maasserver.triggers.system`); nothing in MAAS writes to this table.
+
+    Sizes are the largest of the matching devices and tags are the union of
+    the tags of the matching devices, so the storage columns are necessary
+    conditions only. The network columns are exact.
+    """
+
+    class Meta(DefaultMeta):
+        verbose_name = "Node allocation summary"
+        indexes = [
+            GinIndex(
+                fields=["fabric_ids"], name="nodeallocsummary_fabric_ids"
+            ),
+            GinIndex(fields=["vlan_ids"], name="nodeallocsummary_vlan_ids"),
+            GinIndex(
+                fields=["subnet_ids"], name="nodeallocsummary_subnet_ids"
+            ),
+        ]
+
+    # The row is deleted by a trigger when the node is deleted; using a
+    # database constraint would fail when the storage triggers refresh the
+    # row while Django is cascading the deletion of a node.
+    node = OneToOneField(
+        "Node",
+        primary_key=True,
+        editable=False,
+        db_constraint=False,
+        on_delete=DO_NOTHING,
+        related_name="allocation_summary",
+    )
+
+    # Block devices holding an unacquired root filesystem, directly or on
+    # one of their partitions.
+    root_device_size = BigIntegerField(editable=False, null=True, default=None)
+    root_device_tags = ArrayField(TextField(), editable=False, default=list)
+
+    # Partitions holding an unacquired root filesystem.
+    root_partition_size = BigIntegerField(
+        editable=False, null=True, default=None
+    )
+    root_partition_tags = ArrayField(TextField(), editable=False, default=list)
+
+    # Block devices without a filesystem or a partition table.
+    unused_device_count = IntegerField(editable=False, default=0)
+    unused_device_size = BigIntegerField(
+        editable=False, null=True, default=None
+    )
+    unused_device_tags = ArrayField(TextField(), editable=False, default=list)
+
+    # Partitions without a filesystem.
+    unused_partition_count = IntegerField(editable=False, default=0)
+    unused_partition_size = BigIntegerField(
+        editable=False, null=True, default=None
+    )
+    unused_partition_tags = ArrayField(
+        TextField(), editable=False, default=list
+    )
+
+    # The fabrics, VLANs and subnets the interfaces of the node are on.
+    fabric_ids = ArrayField(IntegerField(), editable=False, default=list)
+    vlan_ids = ArrayField(IntegerField(), editable=False, default=list)
+    subnet_ids = ArrayField(IntegerField(), editable=False, default=list)
+
+    # Fastest link speed of the interfaces of the node, in Mbit/s.
+    max_link_speed = IntegerField(editable=False, default=0)
+
+    def __str__(self):
+        return "NodeAllocationSummary(node_id=%s)" % self.node_id
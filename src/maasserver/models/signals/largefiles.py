@@ -7,7 +7,9 @@ __all__ = ["signals"]
 
 from django.db.models.signals import post_delete
 
+from maasserver.enum import LARGEFILE_STORAGE
 from maasserver.models.largefile import (
+    delete_file_content,
     delete_large_object_content_later,
     LargeFile,
 )
@@ -18,12 +20,14 @@ signals = SignalsManager()
 
 
 def delete_large_object(sender, instance, **kwargs):
-    """Delete the large object when the `LargeFile` is deleted.
+    """Delete the content when the `LargeFile` is deleted.
 
     This is done using the `post_delete` signal instead of overriding delete
     on `LargeFile`, so it works correctly for both the model and `QuerySet`.
     """
-    if instance.content is not None:
+    if instance.storage == LARGEFILE_STORAGE.FILESYSTEM:
+        post_commit_do(delete_file_content, instance.sha256)
+    elif instance.content is not None:
         post_commit_do(delete_large_object_content_later, instance.content)
 
 
@@ -28,7 +28,7 @@ from django.db.models import (
 )
 from netaddr import IPAddress
 
-from maasserver import DefaultMeta, locks
+from maasserver import DefaultMeta, freeips, locks
 from maasserver.enum import (
     INTERFACE_LINK_TYPE,
     INTERFACE_TYPE,
@@ -58,15 +58,29 @@ _mapping_base_fields = (
     "ip",
 )
 
-_special_mapping_result = _mapping_base_fields + ("dnsresource_id",)
+_special_mapping_result = _mapping_base_fields + (
+    "dnsresource_id",
+    "domain_ids",
+)
 
 _mapping_query_result = _mapping_base_fields + (
     "is_boot",
     "preference",
     "family",
+    "domain_id",
+    "domain2_id",
+)
+
+_interface_mapping_result = _mapping_base_fields + (
+    "iface_name",
+    "assigned",
+    "domain_id",
+    "domain2_id",
 )
 
-_interface_mapping_result = _mapping_base_fields + ("iface_name", "assigned")
+# How many addresses from the free IP address cache are tried before the free
+# addresses of a subnet are worked out from the database.
+FREE_IP_CACHE_ATTEMPTS = 10
 
 SpecialMappingQueryResult = namedtuple(
     "SpecialMappingQueryResult", _special_mapping_result
@@ -79,6 +93,24 @@ InterfaceMappingResult = namedtuple(
 )
 
 
+def _group_results_by_domain(results, domain_ids):
+    """Group node mapping query results by the domains they belong in.
+
+    A result belongs in the domain of its node, and in any domain whose name
+    is its FQDN.  If `domain_ids` is `[None]`, all results are grouped under
+    None.  The results keep their order within each group.
+    """
+    grouped = {domain_id: [] for domain_id in domain_ids}
+    for result in results:
+        if None in grouped:
+            grouped[None].append(result)
+        else:
+            for domain_id in {result.domain_id, result.domain2_id}:
+                if domain_id in grouped:
+                    grouped[domain_id].append(result)
+    return grouped
+
+
 class HostnameIPMapping:
     """This is used to return address information for a host in a way that
     keeps life simple for the callers."""
@@ -199,6 +231,37 @@ class StaticIPAddressManager(Manager):
             ipaddress.save()
             return ipaddress
 
+    def _attempt_allocation_of_cached_free_address(
+        self, subnet, alloc_type, user=None, exclude_addresses=None
+    ):
+        """Attempt to allocate an address the free IP address cache has.
+
+        Working out the free addresses of a subnet from the database is slow
+        for big subnets, so the cache is tried first. It can be out of date,
+        so addresses that turn out to be taken are skipped; each is taken
+        out of the cache, so it is not handed out again.
+
+        :param subnet: The subnet from which to allocate the address.
+        :param alloc_type: Allocation type.
+        :param user: Optional user.
+        :param exclude_addresses: A list of addresses which MUST NOT be used.
+        :return: `StaticIPAddress` if successful, or `None` if the cache
+            could not provide a free address.
+        """
+        for _ in range(FREE_IP_CACHE_ATTEMPTS):
+            addresses = freeips.free_ip_cache.take(
+                subnet, exclude_addresses=exclude_addresses
+            )
+            if addresses is None:
+                return None
+            try:
+                return self._attempt_allocation(
+                    addresses[0], alloc_type, user=user, subnet=subnet
+                )
+            except StaticIPAddressUnavailable:
+                continue
+        return None
+
     def _attempt_allocation_of_free_address(
         self, requested_address, alloc_type, user=None, subnet=None
     ):
@@ -288,6 +351,14 @@ class StaticIPAddressManager(Manager):
                 )
 
         if requested_address is None:
+            ipaddress = self._attempt_allocation_of_cached_free_address(
+                subnet,
+                alloc_type,
+                user=user,
+                exclude_addresses=exclude_addresses,
+            )
+            if ipaddress is not None:
+                return ipaddress
             requested_address = subnet.get_next_ip_for_allocation(
                 exclude_addresses=exclude_addresses
             )
@@ -314,8 +385,51 @@ class StaticIPAddressManager(Manager):
                 requested_address, alloc_type, user=user, subnet=subnet
             )
 
-    def _get_special_mappings(self, domain, raw_ttl=False):
-        """Get the special mappings, possibly limited to a single Domain.
+    def allocate_new_many(
+        self,
+        subnet,
+        count,
+        alloc_type=IPADDRESS_TYPE.AUTO,
+        user=None,
+        exclude_addresses=None,
+    ):
+        """Return `count` new StaticIPAddresses from `subnet`.
+
+        The addresses are taken from the free IP address cache in one go when
+        it can provide them; any that turn out to be taken are allocated one
+        by one with `allocate_new`.
+
+        See `allocate_new` for the parameters.
+        """
+        self._verify_alloc_type(alloc_type, user)
+        exclude_addresses = list(exclude_addresses or ())
+        ipaddresses = []
+        addresses = freeips.free_ip_cache.take(
+            subnet, count, exclude_addresses=exclude_addresses
+        )
+        for address in addresses or ():
+            try:
+                ipaddresses.append(
+                    self._attempt_allocation(
+                        address, alloc_type, user=user, subnet=subnet
+                    )
+                )
+            except StaticIPAddressUnavailable:
+                pass
+        exclude_addresses.extend(ipaddress.ip for ipaddress in ipaddresses)
+        while len(ipaddresses) < count:
+            ipaddress = self.allocate_new(
+                subnet,
+                alloc_type,
+                user=user,
+                exclude_addresses=exclude_addresses,
+            )
+            ipaddresses.append(ipaddress)
+            exclude_addresses.append(ipaddress.ip)
+        return ipaddresses
+
+    def _get_special_mappings(self, domains, raw_ttl=False):
+        """Get the special mappings, possibly limited to some Domains.
 
         This function is responsible for creating these mappings:
         - any USER_RESERVED IP that has no name (dnsrr or node),
@@ -334,13 +448,14 @@ class StaticIPAddressManager(Manager):
         to fetch ALL of the entries for subnets, but forward mappings are
         domain-specific.
 
-        :param domain: limit return to just the given Domain.  If anything
-            other than a Domain is passed in (e.g., a Subnet or None), we
-            return all of the reverse mappings.
+        :param domains: limit return to just the given Domains.  If None is
+            passed in, we return all of the reverse mappings.
         :param raw_ttl: Boolean, if True then just return the address_ttl,
             otherwise, coalesce the address_ttl to be the correct answer for
             zone generation.
-        :return: a (default) dict of hostname: HostnameIPMapping entries.
+        :return: a dict of {domain id: mapping}, where each mapping is a
+            (default) dict of hostname: HostnameIPMapping entries.  With no
+            domains, the only key is None.
         """
         default_ttl = "%d" % Config.objects.get_config("default_dns_ttl")
         # raw_ttl says that we don't coalesce, but we need to pick one, so we
@@ -373,7 +488,13 @@ class StaticIPAddressManager(Manager):
             + ttl_clause
             + """ AS ttl,
                 staticip.ip,
-                dnsrr.id AS dnsresource_id
+                dnsrr.id AS dnsresource_id,
+                ARRAY[
+                    dnsrr.dom2_id,
+                    node.dom2_id,
+                    dnsrr.domain_id,
+                    node.domain_id
+                ] AS domain_ids
             FROM
                 maasserver_staticipaddress AS staticip
             LEFT JOIN (
@@ -434,49 +555,42 @@ class StaticIPAddressManager(Manager):
                 """
         )
 
+        default_domain = Domain.objects.get_default_domain()
         query_parms = []
-        if isinstance(domain, Domain):
-            if domain.is_default():
+        if domains is not None:
+            domain_ids = [domain.id for domain in domains]
+            # For domains, we only need answers for the domains we were
+            # given.  These can can possibly come from either the child or
+            # the parent for glue.  Anything with a node associated will be
+            # found inside of get_hostname_ip_mapping() - we need any
+            # entries that are:
+            # - in these domains and have a dnsrr associated.
+            sql_query += """ ((
+                    dnsrr.fqdn IS NOT NULL AND
+                    (
+                        dnsrr.dom2_id = ANY(%s) OR
+                        node.dom2_id = ANY(%s) OR
+                        dnsrr.domain_id = ANY(%s) OR
+                        node.domain_id = ANY(%s)))"""
+            query_parms += [domain_ids, domain_ids, domain_ids, domain_ids]
+            if default_domain.id in domain_ids:
                 # The default domain is extra special, since it needs to have
                 # A/AAAA RRs for any USER_RESERVED addresses that have no name
                 # otherwise attached to them.
-                # We need to get all of the entries that are:
-                # - in this domain and have a dnsrr associated, OR
-                # - are USER_RESERVED and have NO fqdn associated at all.
-                sql_query += """ ((
+                sql_query += """ OR (
                         staticip.alloc_type = %s AND
                         dnsrr.fqdn IS NULL AND
                         node.fqdn IS NULL
-                    ) OR (
-                        dnsrr.fqdn IS NOT NULL AND
-                        (
-                            dnsrr.dom2_id = %s OR
-                            node.dom2_id = %s OR
-                            dnsrr.domain_id = %s OR
-                            node.domain_id = %s)))"""
+                    )"""
                 query_parms += [IPADDRESS_TYPE.USER_RESERVED]
-            else:
-                # For domains, we only need answers for the domain we were
-                # given.  These can can possibly come from either the child or
-                # the parent for glue.  Anything with a node associated will be
-                # found inside of get_hostname_ip_mapping() - we need any
-                # entries that are:
-                # - in this domain and have a dnsrr associated.
-                sql_query += """ (
-                    dnsrr.fqdn IS NOT NULL AND
-                    (
-                        dnsrr.dom2_id = %s OR
-                        node.dom2_id = %s OR
-                        dnsrr.domain_id = %s OR
-                        node.domain_id = %s))"""
-            query_parms += [domain.id, domain.id, domain.id, domain.id]
+            sql_query += """)"""
         else:
             # In the subnet map, addresses attached to nodes only map back to
             # the node, since some things don't like multiple PTR RRs in
             # answers from the DNS.
             # Since that is handled in get_hostname_ip_mapping, we exclude
             # anything where the node also has a link to the address.
-            domain = None
+            domain_ids = [None]
             sql_query += """ ((
                     node.fqdn IS NULL AND dnsrr.fqdn IS NOT NULL
                 ) OR (
@@ -485,8 +599,10 @@ class StaticIPAddressManager(Manager):
                     node.fqdn IS NULL))"""
             query_parms += [IPADDRESS_TYPE.USER_RESERVED]
 
-        default_domain = Domain.objects.get_default_domain()
-        mapping = defaultdict(HostnameIPMapping)
+        mappings = {
+            domain_id: defaultdict(HostnameIPMapping)
+            for domain_id in domain_ids
+        }
         cursor = connection.cursor()
         cursor.execute(sql_query, query_parms)
         for result in cursor.fetchall():
@@ -496,24 +612,34 @@ class StaticIPAddressManager(Manager):
                     get_ip_based_hostname(result.ip),
                     default_domain.name,
                 )
+                # Unnamed addresses only belong in the default domain.
+                result_domain_ids = {default_domain.id}
             else:
                 fqdn = result.fqdn
-            # It is possible that there are both Node and DNSResource entries
-            # for this fqdn.  If we have any system_id, preserve it.  Ditto for
-            # TTL.  It is left as an exercise for the admin to make sure that
-            # the any non-default TTL applied to the Node and DNSResource are
-            # equal.
-            entry = mapping[fqdn]
-            if result.system_id is not None:
-                entry.node_type = result.node_type
-                entry.system_id = result.system_id
-            if result.ttl is not None:
-                entry.ttl = result.ttl
-            if result.user_id is not None:
-                entry.user_id = result.user_id
-            entry.ips.add(result.ip)
-            entry.dnsresource_id = result.dnsresource_id
-        return mapping
+                result_domain_ids = set(result.domain_ids)
+            if domains is None:
+                result_domain_ids = {None}
+            for domain_id in result_domain_ids.intersection(mappings):
+                self._add_special_mapping(mappings[domain_id], fqdn, result)
+        return mappings
+
+    def _add_special_mapping(self, mapping, fqdn, result):
+        """Add a row from the special mappings query to `mapping`."""
+        # It is possible that there are both Node and DNSResource entries
+        # for this fqdn.  If we have any system_id, preserve it.  Ditto for
+        # TTL.  It is left as an exercise for the admin to make sure that
+        # the any non-default TTL applied to the Node and DNSResource are
+        # equal.
+        entry = mapping[fqdn]
+        if result.system_id is not None:
+            entry.node_type = result.node_type
+            entry.system_id = result.system_id
+        if result.ttl is not None:
+            entry.ttl = result.ttl
+        if result.user_id is not None:
+            entry.user_id = result.user_id
+        entry.ips.add(result.ip)
+        entry.dnsresource_id = result.dnsresource_id
 
     def get_hostname_ip_mapping(self, domain_or_subnet, raw_ttl=False):
         """Return hostname mappings for `StaticIPAddress` entries.
@@ -527,6 +653,36 @@ class StaticIPAddressManager(Manager):
 
         The returned name is an FQDN (no trailing dot.)
         """
+        if isinstance(domain_or_subnet, Domain):
+            mappings = self.get_hostname_ip_mappings(
+                [domain_or_subnet], raw_ttl
+            )
+            return mappings[domain_or_subnet.id]
+        else:
+            return self._get_hostname_ip_mappings(None, raw_ttl)[None]
+
+    def get_hostname_ip_mappings(self, domains, raw_ttl=False):
+        """Return hostname mappings for `StaticIPAddress` entries in `domains`.
+
+        This gives the same mappings as calling `get_hostname_ip_mapping` for
+        each domain, but with the same few queries however many domains there
+        are.
+
+        :return: a dict of {domain id: mapping}.
+        """
+        domains = list(domains)
+        if len(domains) == 0:
+            return {}
+        return self._get_hostname_ip_mappings(domains, raw_ttl)
+
+    def _get_hostname_ip_mappings(self, domains, raw_ttl=False):
+        """Return hostname mappings for the given domains, or all of them.
+
+        :param domains: a list of Domains, or None for the mapping of all the
+            names in MAAS, as needed for the reverse zones.
+        :return: a dict of {domain id: mapping}.  With no domains, the only
+            key is None.
+        """
         cursor = connection.cursor()
 
         # DISTINCT ON returns the first matching row for any given
@@ -580,7 +736,9 @@ class StaticIPAddressManager(Manager):
                     WHEN interface.type = 'unknown' THEN 9
                     ELSE 10
                 END AS preference,
-                family(staticip.ip) AS family
+                family(staticip.ip) AS family,
+                node.domain_id,
+                domain2.id AS domain2_id
             FROM
                 maasserver_interface AS interface
             LEFT OUTER JOIN maasserver_interfacerelationship AS rel ON
@@ -599,28 +757,30 @@ class StaticIPAddressManager(Manager):
                 link.interface_id = interface.id
             JOIN maasserver_staticipaddress AS staticip ON
                 staticip.id = link.staticipaddress_id
+            LEFT JOIN maasserver_domain AS domain2 ON
+                /* Pick up another copy of domain looking for instances of
+                 * nodes a the top of a domain.
+                 */ domain2.name = CONCAT(node.hostname, '.', domain.name)
             """
         )
-        if isinstance(domain_or_subnet, Domain):
+        if domains is not None:
             # The model has nodes in the parent domain, but they actually live
             # in the child domain.  And the parent needs the glue.  So we
             # return such nodes addresses in _BOTH_ the parent and the child
             # domains. domain2.name will be non-null if this host's fqdn is the
             # name of a domain in MAAS.
+            domain_ids = [domain.id for domain in domains]
             sql_query += """
-            LEFT JOIN maasserver_domain AS domain2 ON
-                /* Pick up another copy of domain looking for instances of
-                 * nodes a the top of a domain.
-                 */ domain2.name = CONCAT(node.hostname, '.', domain.name)
             WHERE
-                (domain2.id = %s OR node.domain_id = %s) AND
+                (domain2.id = ANY(%s) OR node.domain_id = ANY(%s)) AND
             """
-            query_parms = [domain_or_subnet.id, domain_or_subnet.id]
+            query_parms = [domain_ids, domain_ids]
         else:
             # For subnets, we need ALL the names, so that we can correctly
             # identify which ones should have the FQDN.  dns/zonegenerator.py
             # optimizes based on this, and only calls once with a subnet,
             # expecting to get all the subnets back in one table.
+            domain_ids = [None]
             sql_query += """
             WHERE
             """
@@ -666,7 +826,9 @@ class StaticIPAddressManager(Manager):
             + """ AS ttl,
                 staticip.ip,
                 interface.name,
-                alloc_type != 6 /* DISCOVERED */ AS assigned
+                alloc_type != 6 /* DISCOVERED */ AS assigned,
+                node.domain_id,
+                domain2.id AS domain2_id
             FROM
                 maasserver_interface AS interface
             JOIN maasserver_node AS node ON
@@ -677,19 +839,19 @@ class StaticIPAddressManager(Manager):
                 link.interface_id = interface.id
             JOIN maasserver_staticipaddress AS staticip ON
                 staticip.id = link.staticipaddress_id
-            """
-        )
-        if isinstance(domain_or_subnet, Domain):
-            # This logic is similar to the logic in sql_query above.
-            iface_sql_query += """
             LEFT JOIN maasserver_domain AS domain2 ON
                 /* Pick up another copy of domain looking for instances of
                  * the name as the top of a domain.
                  */
                 domain2.name = CONCAT(
                     interface.name, '.', node.hostname, '.', domain.name)
+            """
+        )
+        if domains is not None:
+            # This logic is similar to the logic in sql_query above.
+            iface_sql_query += """
             WHERE
-                (domain2.id = %s OR node.domain_id = %s) AND
+                (domain2.id = ANY(%s) OR node.domain_id = ANY(%s)) AND
             """
         else:
             # For subnets, we need ALL the names, so that we can correctly
@@ -710,22 +872,36 @@ class StaticIPAddressManager(Manager):
             """
         # We get user reserved et al mappings first, so that we can overwrite
         # TTL as we process the return from the SQL horror above.
-        mapping = self._get_special_mappings(domain_or_subnet, raw_ttl)
+        mappings = self._get_special_mappings(domains, raw_ttl)
+        cursor.execute(sql_query, query_parms)
+        results = _group_results_by_domain(
+            map(MappingQueryResult._make, cursor.fetchall()), domain_ids
+        )
+        cursor.execute(iface_sql_query, query_parms)
+        iface_results = _group_results_by_domain(
+            map(InterfaceMappingResult._make, cursor.fetchall()), domain_ids
+        )
+        for domain_id, mapping in mappings.items():
+            self._add_node_mappings(
+                mapping, results[domain_id], iface_results[domain_id]
+            )
+        return mappings
+
+    def _add_node_mappings(self, mapping, results, iface_results):
+        """Add the rows from the node mapping queries to `mapping`."""
         # All of the mappings that we got mean that we will only want to add
         # addresses for the boot interface (is_boot == True).
         iface_is_boot = defaultdict(
             bool, {hostname: True for hostname in mapping.keys()}
         )
         assigned_ips = defaultdict(bool)
-        cursor.execute(sql_query, query_parms)
         # The records from the query provide, for each hostname (after
         # stripping domain), the boot and non-boot interface ip address in ipv4
         # and ipv6.  Our task: if there are boot interace IPs, they win.  If
         # there are none, then whatever we got wins.  The ORDER BY means that
         # we will see all of the boot interfaces before we see any non-boot
         # interface IPs.  See Bug#1584850
-        for result in cursor.fetchall():
-            result = MappingQueryResult(*result)
+        for result in results:
             entry = mapping[result.fqdn]
             entry.node_type = result.node_type
             entry.system_id = result.system_id
@@ -740,9 +916,7 @@ class StaticIPAddressManager(Manager):
         # Next, get all the addresses, on all the interfaces, and add the ones
         # that are not already present on the FQDN as $IFACE.$FQDN.  Exclude
         # any discovered addresses once there are any non-discovered addresses.
-        cursor.execute(iface_sql_query, query_parms)
-        for result in cursor.fetchall():
-            result = InterfaceMappingResult(*result)
+        for result in iface_results:
             if result.assigned:
                 assigned_ips[result.fqdn] = True
             # If this is an assigned IP, or there are NO assigned IPs on the
@@ -756,7 +930,6 @@ class StaticIPAddressManager(Manager):
                         entry.user_id = result.user_id
                     entry.ttl = result.ttl
                     entry.ips.add(result.ip)
-        return mapping
 
     def filter_by_ip_family(self, family):
         possible_families = map_enum_reverse(IPADDRESS_FAMILY)
@@ -150,6 +150,42 @@ class SubnetQueriesMixin(MAASQueriesMixin):
         else:
             return None
 
+    # As `find_best_subnet_for_ip_query`, but for many IP addresses at once.
+    # DISTINCT ON keeps the first (best) subnet for each address.
+    find_best_subnets_for_ips_query = """
+        SELECT DISTINCT ON (address.ip)
+            subnet.*,
+            host(address.ip) "for_ip"
+        FROM unnest(%s::inet[]) AS address(ip)
+        INNER JOIN maasserver_subnet AS subnet
+            ON address.ip << subnet.cidr
+        INNER JOIN maasserver_vlan AS vlan
+            ON subnet.vlan_id = vlan.id
+        ORDER BY
+            address.ip,
+            vlan.dhcp_on DESC,
+            masklen(subnet.cidr) DESC
+        """
+
+    def get_best_subnets_for_ips(self, ips):
+        """Find the most-specific managed Subnet for each of `ips`.
+
+        This makes the same choice as `get_best_subnet_for_ip` but uses a
+        single query for all the addresses.
+
+        :return: A dict mapping each `IPAddress` for which a subnet was found
+            to that `Subnet`. IPv4-mapped IPv6 addresses are mapped to IPv4.
+        """
+        ips = {IPAddress(ip) for ip in ips}
+        ips = {ip.ipv4() if ip.is_ipv4_mapped() else ip for ip in ips}
+        if len(ips) == 0:
+            return {}
+        subnets = self.raw(
+            self.find_best_subnets_for_ips_query,
+            params=[[str(ip) for ip in ips]],
+        )
+        return {IPAddress(subnet.for_ip): subnet for subnet in subnets}
+
     def validate_filter_specifiers(self, specifiers):
         """Validate the given filter string."""
         try:
@@ -513,12 +549,14 @@ class Subnet(CleanSave, TimestampedModel):
         ignore_discovered_ips: bool = False,
         exclude_ip_ranges: list = None,
         cached_staticroutes: list = None,
+        ignore_allocated_ips: bool = False,
     ) -> MAASIPSet:
         """Returns a `MAASIPSet` of `MAASIPRange` objects which are currently
         in use on this `Subnet`.
 
         :param exclude_addresses: Additional addresses to consider "in use".
         :param ignore_discovered_ips: DISCOVERED addresses are not "in use".
+        :param ignore_allocated_ips: Allocated addresses are not "in use".
         :param ranges_only: if True, filters out gateway IPs, static routes,
             DNS servers, and `exclude_addresses`.
         :param with_neighbours: If True, includes addresses learned from
@@ -576,9 +614,10 @@ class Subnet(CleanSave, TimestampedModel):
                 ranges |= {
                     make_iprange(static_route.gateway_ip, purpose="gateway-ip")
                 }
-            ranges |= self._get_ranges_for_allocated_ips(
-                network, ignore_discovered_ips
-            )
+            if not ignore_allocated_ips:
+                ranges |= self._get_ranges_for_allocated_ips(
+                    network, ignore_discovered_ips
+                )
             ranges |= set(
                 make_iprange(address, purpose="excluded")
                 for address in exclude_addresses
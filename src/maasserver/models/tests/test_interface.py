@@ -1421,6 +1421,16 @@ class InterfaceUpdateNeighbourTest(MAASServerTestCase):
         # Make sure the "last seen" time is correct.
         self.assertThat(neighbour.updated, Not(Equals(yesterday)))
 
+    def test_adds_reported_count(self):
+        iface = factory.make_Interface(INTERFACE_TYPE.PHYSICAL)
+        iface.neighbour_discovery_state = True
+        json = self.make_neighbour_json()
+        json["count"] = 3
+        neighbour = iface.update_neighbour(json)
+        self.assertThat(reload_object(neighbour).count, Equals(3))
+        iface.update_neighbour(json)
+        self.assertThat(reload_object(neighbour).count, Equals(6))
+
     def test_replaces_obsolete_neighbour(self):
         iface = factory.make_Interface(INTERFACE_TYPE.PHYSICAL)
         iface.neighbour_discovery_state = True
@@ -1511,6 +1521,16 @@ class InterfaceUpdateMDNSEntryTest(MAASServerTestCase):
         self.assertThat(mdns_entry.count, Equals(2))
         self.assertThat(mdns_entry.updated, Not(Equals(yesterday)))
 
+    def test_adds_reported_count(self):
+        iface = factory.make_Interface(INTERFACE_TYPE.PHYSICAL)
+        iface.mdns_discovery_state = True
+        json = self.make_mdns_entry_json()
+        json["count"] = 3
+        mdns_entry = iface.update_mdns_entry(json)
+        self.assertThat(reload_object(mdns_entry).count, Equals(3))
+        iface.update_mdns_entry(json)
+        self.assertThat(reload_object(mdns_entry).count, Equals(6))
+
     def test_replaces_obsolete_entry(self):
         iface = factory.make_Interface(INTERFACE_TYPE.PHYSICAL)
         iface.mdns_discovery_state = True
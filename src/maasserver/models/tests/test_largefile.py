@@ -5,6 +5,7 @@
 
 __all__ = []
 
+import hashlib
 from io import BytesIO
 from random import randint
 from unittest.mock import ANY, call
@@ -21,16 +22,19 @@ from testtools.matchers import (
 )
 from twisted.internet.task import Clock
 
+from maasserver.enum import LARGEFILE_STORAGE
 from maasserver.fields import LargeObjectFile
+from maasserver.largefilestorage import FileContentStorage
 from maasserver.models import largefile as largefile_module
 from maasserver.models import signals
 from maasserver.models.largefile import LargeFile
+from maasserver.testing.config import RegionConfigurationFixture
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import (
     MAASServerTestCase,
     MAASTransactionServerTestCase,
 )
-from maasserver.utils.orm import post_commit_hooks
+from maasserver.utils.orm import post_commit_hooks, reload_object
 from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
 
 
@@ -63,6 +67,16 @@ class TestLargeFileManager(MAASServerTestCase):
         self.assertEqual(content, written_content)
         self.assertEqual(len(content), largefile.size)
 
+    def test_create_empty_file_stores_in_database_by_default(self):
+        self.useFixture(RegionConfigurationFixture())
+        sha256 = factory.make_string(64)
+        largefile = LargeFile.objects.create_empty_file(sha256, 1024)
+        self.assertEqual(
+            (LARGEFILE_STORAGE.DATABASE, 0, 1024),
+            (largefile.storage, largefile.size, largefile.total_size),
+        )
+        self.assertEqual(0, largefile.get_content_size())
+
 
 class TestLargeFile(MAASServerTestCase):
     def test_content(self):
@@ -122,6 +136,17 @@ class TestLargeFile(MAASServerTestCase):
         largefile = factory.make_LargeFile()
         self.assertTrue(largefile.valid)
 
+    def test_append_content(self):
+        largefile = factory.make_LargeFile(b"foo", size=6)
+        self.assertEqual(6, largefile.append_content(b"bar"))
+        with largefile.open_content() as stream:
+            self.assertEqual(b"foobar", stream.read())
+
+    def test_reset_content(self):
+        largefile = factory.make_LargeFile()
+        largefile.reset_content()
+        self.assertEqual(0, largefile.get_content_size())
+
     def test_delete_does_nothing_if_linked(self):
         largefile = factory.make_LargeFile()
         resource = factory.make_BootResource()
@@ -154,6 +179,80 @@ class TestLargeFile(MAASServerTestCase):
         )
 
 
+class TestLargeFileOnFilesystem(MAASServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.storage = FileContentStorage(self.make_dir())
+        self.useFixture(
+            RegionConfigurationFixture(
+                boot_resources_storage=self.storage.path
+            )
+        )
+
+    def make_LargeFile(self, content):
+        sha256 = hashlib.sha256(content).hexdigest()
+        return LargeFile.objects.create_empty_file(sha256, len(content))
+
+    def test_create_empty_file_stores_on_filesystem(self):
+        largefile = self.make_LargeFile(factory.make_bytes())
+        self.assertEqual(LARGEFILE_STORAGE.FILESYSTEM, largefile.storage)
+        self.assertIsNone(reload_object(largefile).content)
+        self.assertEqual(0, largefile.get_content_size())
+        self.assertFalse(self.storage.exists(largefile.sha256))
+
+    def test_append_content_moves_content_in_place_once_complete(self):
+        largefile = self.make_LargeFile(b"foobar")
+        self.assertEqual(3, largefile.append_content(b"foo"))
+        self.assertFalse(self.storage.exists(largefile.sha256))
+        self.assertEqual(6, largefile.append_content(b"bar"))
+        self.assertTrue(self.storage.exists(largefile.sha256))
+        with largefile.open_content() as stream:
+            self.assertEqual(b"foobar", stream.read())
+
+    def test_valid(self):
+        content = factory.make_bytes()
+        largefile = self.make_LargeFile(content)
+        largefile.size = largefile.append_content(content)
+        self.assertTrue(largefile.valid)
+
+    def test_valid_returns_False_when_content_doesnt_have_equal_sha256(self):
+        content = factory.make_bytes()
+        largefile = self.make_LargeFile(content)
+        largefile.size = largefile.append_content(
+            factory.make_bytes(len(content))
+        )
+        self.assertFalse(largefile.valid)
+
+    def test_reset_content(self):
+        content = factory.make_bytes()
+        largefile = self.make_LargeFile(content)
+        largefile.append_content(content)
+        largefile.reset_content()
+        self.assertEqual(0, largefile.get_content_size())
+        self.assertFalse(self.storage.exists(largefile.sha256))
+
+    def test_get_or_create_file_from_content(self):
+        content = factory.make_bytes(1024)
+        largefile = LargeFile.objects.get_or_create_file_from_content(
+            BytesIO(content)
+        )
+        self.assertEqual(LARGEFILE_STORAGE.FILESYSTEM, largefile.storage)
+        self.assertTrue(largefile.valid)
+
+    def test_deletes_content(self):
+        content = factory.make_bytes()
+        largefile = self.make_LargeFile(content)
+        largefile.append_content(content)
+        with post_commit_hooks:
+            largefile.delete()
+        self.assertEqual([], list(self.storage.list()))
+
+    def test_open_content_fails_when_storage_is_not_configured(self):
+        largefile = self.make_LargeFile(factory.make_bytes())
+        self.useFixture(RegionConfigurationFixture())
+        self.assertRaises(FileNotFoundError, largefile.open_content)
+
+
 class TestDeleteLargeObjectContentLater(MAASTransactionServerTestCase):
     def test_schedules_unlink(self):
         # We're going to capture the delayed call that
@@ -5,12 +5,163 @@
 
 __all__ = []
 
+import datetime
+
+from fixtures import FakeLogger
+from testtools.matchers import Equals, MatchesStructure, Not
+
+from maasserver.enum import INTERFACE_TYPE
+from maasserver.models import Neighbour
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
-from maastesting.matchers import IsNonEmptyString
+from maasserver.utils.orm import reload_object
+from maastesting.djangotestcase import count_queries
+from maastesting.matchers import DocTestMatches, IsNonEmptyString
 
 
 class TestNeighbourModel(MAASServerTestCase):
     def test_mac_organization(self):
         neighbour = factory.make_Neighbour(mac_address="48:51:b7:00:00:00")
         self.assertThat(neighbour.mac_organization, IsNonEmptyString)
+
+
+class TestUpdateNeighbours(MAASServerTestCase):
+    """Tests for `NeighbourManager.update_neighbours`."""
+
+    def make_interface(self, neighbour_discovery_state=True):
+        interface = factory.make_Interface(INTERFACE_TYPE.PHYSICAL)
+        interface.neighbour_discovery_state = neighbour_discovery_state
+        return interface
+
+    def make_neighbour_json(self, ip=None, mac=None, time=1, **kwargs):
+        if ip is None:
+            ip = factory.make_ip_address(ipv6=False)
+        if mac is None:
+            mac = factory.make_mac_address()
+        neighbour = {"ip": ip, "mac": mac, "time": time, "vid": None}
+        neighbour.update(kwargs)
+        return neighbour
+
+    def test_ignores_interfaces_without_neighbour_discovery(self):
+        interface = self.make_interface(neighbour_discovery_state=False)
+        updated = Neighbour.objects.update_neighbours(
+            [(interface, self.make_neighbour_json())]
+        )
+        self.assertThat(updated, Equals([]))
+        self.assertThat(Neighbour.objects.count(), Equals(0))
+
+    def test_creates_new_neighbours(self):
+        interface = self.make_interface()
+        json = self.make_neighbour_json(vid=42, count=3)
+        with FakeLogger("maas.neighbour") as maaslog:
+            [neighbour] = Neighbour.objects.update_neighbours(
+                [(interface, json)]
+            )
+        neighbour = reload_object(neighbour)
+        self.assertThat(
+            neighbour,
+            MatchesStructure.byEquality(
+                interface=interface,
+                ip=json["ip"],
+                mac_address=json["mac"],
+                vid=42,
+                time=1,
+                count=3,
+            ),
+        )
+        self.assertThat(
+            maaslog.output,
+            DocTestMatches("...: New MAC, IP binding observed on VLAN 42..."),
+        )
+
+    def test_updates_existing_neighbours(self):
+        interface = self.make_interface()
+        json = self.make_neighbour_json()
+        [neighbour] = Neighbour.objects.update_neighbours([(interface, json)])
+        yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+        neighbour.save(_updated=yesterday, update_fields=["updated"])
+        json.update(time=2, count=4)
+        Neighbour.objects.update_neighbours([(interface, json)])
+        neighbour = reload_object(neighbour)
+        self.assertThat(Neighbour.objects.count(), Equals(1))
+        self.assertThat(neighbour.time, Equals(2))
+        self.assertThat(neighbour.count, Equals(5))
+        self.assertThat(neighbour.updated, Not(Equals(yesterday)))
+
+    def test_replaces_obsolete_neighbours(self):
+        interface = self.make_interface()
+        json = self.make_neighbour_json()
+        Neighbour.objects.update_neighbours([(interface, json)])
+        moved = dict(json, mac=factory.make_mac_address(), time=2)
+        with FakeLogger("maas.neighbour") as maaslog:
+            Neighbour.objects.update_neighbours([(interface, moved)])
+        [neighbour] = Neighbour.objects.all()
+        self.assertThat(neighbour.mac_address, Equals(moved["mac"]))
+        self.assertThat(neighbour.count, Equals(1))
+        self.assertThat(
+            maaslog.output,
+            DocTestMatches("...: IP address...moved from...to..."),
+        )
+        self.assertNotIn("New MAC, IP binding observed", maaslog.output)
+
+    def test_keeps_last_binding_observed_in_batch(self):
+        interface = self.make_interface()
+        first = self.make_neighbour_json()
+        moved = dict(first, mac=factory.make_mac_address(), time=2)
+        back = dict(first, time=3)
+        Neighbour.objects.update_neighbours(
+            [(interface, first), (interface, moved), (interface, back)]
+        )
+        [neighbour] = Neighbour.objects.all()
+        self.assertThat(neighbour.mac_address, Equals(first["mac"]))
+        self.assertThat(neighbour.time, Equals(3))
+        self.assertThat(neighbour.count, Equals(1))
+
+    def test_sums_counts_observed_in_batch(self):
+        interface = self.make_interface()
+        json = self.make_neighbour_json(count=2)
+        Neighbour.objects.update_neighbours(
+            [(interface, json), (interface, dict(json, time=5))]
+        )
+        [neighbour] = Neighbour.objects.all()
+        self.assertThat(neighbour.time, Equals(5))
+        self.assertThat(neighbour.count, Equals(4))
+
+    def test_keeps_bindings_per_interface_and_vid(self):
+        interface = self.make_interface()
+        other = self.make_interface()
+        json = self.make_neighbour_json()
+        Neighbour.objects.update_neighbours(
+            [
+                (interface, json),
+                (interface, dict(json, vid=42)),
+                (other, json),
+            ]
+        )
+        self.assertThat(Neighbour.objects.count(), Equals(3))
+
+    def test_uses_constant_number_of_queries(self):
+        interface = self.make_interface()
+        existing = [self.make_neighbour_json() for _ in range(5)]
+        Neighbour.objects.update_neighbours(
+            [(interface, json) for json in existing]
+        )
+
+        def update(count):
+            # Refresh some, move some and add some.
+            observations = [
+                (interface, dict(json, time=2)) for json in existing[:count]
+            ] + [
+                (interface, dict(json, mac=factory.make_mac_address()))
+                for json in existing[count : count * 2]
+            ]
+            observations += [
+                (interface, self.make_neighbour_json()) for _ in range(count)
+            ]
+            return count_queries(
+                Neighbour.objects.update_neighbours, observations
+            )
+
+        count_one, _ = update(1)
+        count_two, _ = update(2)
+        self.assertThat(count_two, Equals(count_one))
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 import email
 import json
 import logging
+from operator import attrgetter
 import os
 import random
 import re
@@ -19,9 +20,10 @@ from unittest.mock import ANY, call, MagicMock, Mock, sentinel
 import crochet
 from crochet import TimeoutError, wait_for
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models.deletion import Collector
 from django.db.models.query import QuerySet
+from django.test.utils import CaptureQueriesContext
 from fixtures import LoggerFixture
 from netaddr import IPAddress, IPNetwork
 from testscenarios import multiply_scenarios
@@ -114,6 +116,7 @@ from maasserver.models.bmc import BMC, BMCRoutableRackControllerRelationship
 from maasserver.models.config import NetworkDiscoveryConfig
 from maasserver.models.event import Event
 import maasserver.models.interface as interface_module
+from maasserver.models.neighbour import Neighbour
 from maasserver.models.node import (
     DefaultGateways,
     GatewayDefinition,
@@ -546,6 +549,51 @@ class TestMachineManager(MAASServerTestCase):
             list(Machine.objects.get_available_machines_for_acquisition(user)),
         )
 
+    def test_claim_available_machines_claims_in_order(self):
+        machines = [self.make_machine() for _ in range(3)]
+        candidates = Machine.objects.filter(
+            id__in=[machine.id for machine in machines]
+        ).order_by("-id")
+        self.assertEqual(
+            sorted(machines, key=attrgetter("id"), reverse=True)[:2],
+            Machine.objects.claim_available_machines(candidates, count=2),
+        )
+
+    def test_claim_available_machines_claims_across_batches(self):
+        machines = [self.make_machine() for _ in range(3)]
+        candidates = Machine.objects.all().order_by("id")
+        self.assertEqual(
+            machines,
+            Machine.objects.claim_available_machines(
+                candidates, count=3, batch_size=1
+            ),
+        )
+
+    def test_claim_available_machines_skips_unavailable_machines(self):
+        self.make_machine(user=factory.make_User())
+        machine = self.make_machine()
+        candidates = Machine.objects.all().order_by("id")
+        self.assertEqual(
+            [machine],
+            Machine.objects.claim_available_machines(candidates, count=2),
+        )
+
+    def test_claim_available_machines_does_not_wait_for_locks(self):
+        self.make_machine()
+        with CaptureQueriesContext(connection) as queries:
+            Machine.objects.claim_available_machines(Machine.objects.all())
+        self.assertIn(
+            "FOR UPDATE SKIP LOCKED",
+            " ".join(query["sql"] for query in queries),
+        )
+
+    def test_lock_for_acquisition_locks_machine(self):
+        machine = self.make_machine()
+        with CaptureQueriesContext(connection) as queries:
+            Machine.objects.lock_for_acquisition(machine)
+        [query] = queries.captured_queries
+        self.assertIn("FOR UPDATE", query["sql"])
+
 
 class TestControllerManager(MAASServerTestCase):
     def test_controller_lists_node_type_rack_and_region(self):
@@ -4432,6 +4480,28 @@ class TestNode(MAASServerTestCase):
             previous_updated, reload_object(node).power_state_updated
         )
 
+    def test_update_power_state_sets_changed_field_on_change(self):
+        node = factory.make_Node(power_state=POWER_STATE.OFF)
+        previous_changed = node.power_state_changed = now() - timedelta(
+            hours=1
+        )
+        node.save()
+        node.update_power_state(POWER_STATE.ON)
+        self.assertGreater(
+            reload_object(node).power_state_changed, previous_changed
+        )
+
+    def test_update_power_state_keeps_changed_field_if_unchanged(self):
+        node = factory.make_Node(power_state=POWER_STATE.OFF)
+        previous_changed = node.power_state_changed = now() - timedelta(
+            hours=1
+        )
+        node.save()
+        node.update_power_state(POWER_STATE.OFF)
+        self.assertEqual(
+            previous_changed, reload_object(node).power_state_changed
+        )
+
     def test_update_power_state_readies_node_if_releasing(self):
         node = factory.make_Node(
             power_state=POWER_STATE.ON,
@@ -9790,33 +9860,56 @@ class TestControllerUpdateDiscoveryState(MAASServerTestCase):
 class TestReportNeighbours(MAASServerTestCase):
     """Tests for `Controller.report_neighbours()."""
 
-    def test_calls_update_neighbour_for_each_neighbour(self):
+    def test_updates_neighbours_together(self):
         rack = factory.make_RackController()
-        factory.make_Interface(name="eth0", node=rack)
-        factory.make_Interface(name="eth1", node=rack)
-        update_neighbour = self.patch(
-            interface_module.Interface, "update_neighbour"
-        )
+        eth0 = factory.make_Interface(name="eth0", node=rack)
+        eth1 = factory.make_Interface(name="eth1", node=rack)
+        update_neighbours = self.patch(Neighbour.objects, "update_neighbours")
         neighbours = [
             {"interface": "eth0", "mac": factory.make_mac_address()},
             {"interface": "eth1", "mac": factory.make_mac_address()},
+            {"interface": "eth2", "mac": factory.make_mac_address()},
         ]
         rack.report_neighbours(neighbours)
+        self.assertThat(update_neighbours, MockCalledOnceWith(ANY))
+        [observations] = update_neighbours.call_args[0]
         self.assertThat(
-            update_neighbour,
-            MockCallsMatch(*[call(neighbour) for neighbour in neighbours]),
+            [
+                (interface.id, neighbour)
+                for interface, neighbour in observations
+            ],
+            Equals([(eth0.id, neighbours[0]), (eth1.id, neighbours[1])]),
         )
 
+    def test_updates_neighbours(self):
+        rack = factory.make_RackController()
+        interface = factory.make_Interface(name="eth0", node=rack)
+        interface.neighbour_discovery_state = True
+        interface.save()
+        neighbour = {
+            "interface": "eth0",
+            "ip": factory.make_ip_address(ipv6=False),
+            "mac": factory.make_mac_address(),
+            "time": 1,
+            "vid": None,
+            "count": 2,
+        }
+        rack.report_neighbours([neighbour])
+        [observed] = Neighbour.objects.filter(interface=interface)
+        self.assertThat(observed.ip, Equals(neighbour["ip"]))
+        self.assertThat(observed.count, Equals(2))
+
     def test_calls_report_vid_for_each_vid(self):
         rack = factory.make_RackController()
         factory.make_Interface(name="eth0", node=rack)
         factory.make_Interface(name="eth1", node=rack)
         # Just make this a no-op for simplicity.
-        self.patch(interface_module.Interface, "update_neighbour")
+        self.patch(Neighbour.objects, "update_neighbours")
         report_vid = self.patch(interface_module.Interface, "report_vid")
         neighbours = [
             {"interface": "eth0", "mac": factory.make_mac_address(), "vid": 3},
             {"interface": "eth1", "mac": factory.make_mac_address(), "vid": 7},
+            {"interface": "eth0", "mac": factory.make_mac_address(), "vid": 3},
         ]
         rack.report_neighbours(neighbours)
         self.assertThat(report_vid, MockCallsMatch(call(3), call(7)))
@@ -0,0 +1,149 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the trigger-maintained `NodeAllocationSummary` model."""
+
+__all__ = []
+
+from maasserver.models import NodeAllocationSummary
+from maasserver.testing.factory import factory
+from maasserver.testing.testcase import MAASServerTestCase
+
+
+class TestNodeAllocationSummary(MAASServerTestCase):
+    def get_summary(self, node):
+        return NodeAllocationSummary.objects.get(node=node)
+
+    def test_created_with_node(self):
+        node = factory.make_Node(with_boot_disk=False)
+        summary = self.get_summary(node)
+        self.assertEqual(
+            (None, 0, 0, [], []),
+            (
+                summary.root_device_size,
+                summary.unused_device_count,
+                summary.unused_partition_count,
+                summary.vlan_ids,
+                summary.subnet_ids,
+            ),
+        )
+
+    def test_deleted_with_node(self):
+        node = factory.make_Node()
+        factory.make_Interface(node=node)
+        node.delete()
+        self.assertFalse(
+            NodeAllocationSummary.objects.filter(node_id=node.id).exists()
+        )
+
+    def test_tracks_root_device(self):
+        node = factory.make_Node(with_boot_disk=False)
+        small = factory.make_PhysicalBlockDevice(
+            node=node, size=2 * (1000 ** 3), tags=["ssd"]
+        )
+        large = factory.make_PhysicalBlockDevice(
+            node=node, size=4 * (1000 ** 3), tags=["rotary"]
+        )
+        factory.make_Filesystem(mount_point="/", block_device=small)
+        summary = self.get_summary(node)
+        self.assertEqual(
+            (small.size, ["ssd"], 1, large.size, ["rotary"]),
+            (
+                summary.root_device_size,
+                summary.root_device_tags,
+                summary.unused_device_count,
+                summary.unused_device_size,
+                summary.unused_device_tags,
+            ),
+        )
+
+    def test_tracks_root_partition(self):
+        node = factory.make_Node(with_boot_disk=False)
+        block_device = factory.make_PhysicalBlockDevice(
+            node=node, tags=["ssd"]
+        )
+        partition_table = factory.make_PartitionTable(
+            block_device=block_device
+        )
+        root = factory.make_Partition(
+            partition_table=partition_table, tags=["root"]
+        )
+        unused = factory.make_Partition(
+            partition_table=partition_table, tags=["data"]
+        )
+        factory.make_Filesystem(mount_point="/", partition=root)
+        summary = self.get_summary(node)
+        self.assertEqual(
+            (
+                block_device.size,
+                ["ssd"],
+                root.size,
+                ["root"],
+                0,
+                1,
+                unused.size,
+                ["data"],
+            ),
+            (
+                summary.root_device_size,
+                summary.root_device_tags,
+                summary.root_partition_size,
+                summary.root_partition_tags,
+                summary.unused_device_count,
+                summary.unused_partition_count,
+                summary.unused_partition_size,
+                summary.unused_partition_tags,
+            ),
+        )
+
+    def test_ignores_acquired_root_filesystem(self):
+        node = factory.make_Node(with_boot_disk=False)
+        block_device = factory.make_PhysicalBlockDevice(node=node)
+        filesystem = factory.make_Filesystem(
+            mount_point="/", block_device=block_device
+        )
+        filesystem.acquired = True
+        filesystem.save()
+        self.assertIsNone(self.get_summary(node).root_device_size)
+
+    def test_tracks_block_device_changes(self):
+        node = factory.make_Node(with_boot_disk=False)
+        block_device = factory.make_PhysicalBlockDevice(node=node, tags=[])
+        block_device.tags = ["ssd"]
+        block_device.save()
+        self.assertEqual(["ssd"], self.get_summary(node).unused_device_tags)
+        block_device.delete()
+        self.assertEqual(0, self.get_summary(node).unused_device_count)
+
+    def test_tracks_interfaces(self):
+        node = factory.make_Node()
+        subnet = factory.make_Subnet()
+        interface = factory.make_Interface(
+            node=node, subnet=subnet, link_speed=1000, interface_speed=1000
+        )
+        factory.make_StaticIPAddress(interface=interface, subnet=subnet)
+        summary = self.get_summary(node)
+        self.assertEqual(
+            ([subnet.vlan.fabric_id], [subnet.vlan_id], [subnet.id], 1000),
+            (
+                summary.fabric_ids,
+                summary.vlan_ids,
+                summary.subnet_ids,
+                summary.max_link_speed,
+            ),
+        )
+
+    def test_tracks_vlan_fabric(self):
+        node = factory.make_Node()
+        vlan = factory.make_VLAN()
+        factory.make_Interface(node=node, vlan=vlan)
+        fabric = factory.make_Fabric()
+        vlan.fabric = fabric
+        vlan.save()
+        self.assertEqual([fabric.id], self.get_summary(node).fabric_ids)
+
+    def test_tracks_removed_interfaces(self):
+        node = factory.make_Node()
+        interface = factory.make_Interface(node=node)
+        interface.delete()
+        self.assertEqual([], self.get_summary(node).vlan_ids)
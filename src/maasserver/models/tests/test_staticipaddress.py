@@ -27,7 +27,7 @@ from testtools.matchers import (
 )
 from twisted.python.failure import Failure
 
-from maasserver import locks
+from maasserver import freeips, locks
 from maasserver.enum import (
     INTERFACE_LINK_TYPE,
     INTERFACE_TYPE,
@@ -346,6 +346,62 @@ class TestStaticIPAddressManager(MAASServerTestCase):
             # There is no pending retry context.
             self.assertThat(orm.retry_context.stack._cm_pending, HasLength(0))
 
+    def enable_free_ip_cache(self):
+        cache = freeips.FreeIPCache()
+        cache.enable()
+        self.patch(freeips, "free_ip_cache", cache)
+        return cache
+
+    def make_subnet_with_free_ips(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24", gateway_ip="10.0.0.1")
+        factory.make_IPRange(subnet, "10.0.0.101", "10.0.0.254")
+        factory.make_IPRange(subnet, "10.0.0.2", "10.0.0.97")
+        factory.make_StaticIPAddress("10.0.0.99", subnet=subnet)
+        return reload_object(subnet)
+
+    def test_allocate_new_uses_free_ip_cache(self):
+        cache = self.enable_free_ip_cache()
+        subnet = self.make_subnet_with_free_ips()
+        ipaddress = StaticIPAddress.objects.allocate_new(subnet)
+        self.assertEqual("10.0.0.98", ipaddress.ip)
+        self.assertIn(subnet.id, cache.entries)
+
+    def test_allocate_new_skips_taken_cached_addresses(self):
+        cache = self.enable_free_ip_cache()
+        subnet = self.make_subnet_with_free_ips()
+        cache.take(subnet, count=0)
+        # The cache isn't told about this address.
+        factory.make_StaticIPAddress("10.0.0.98", subnet=subnet)
+        ipaddress = StaticIPAddress.objects.allocate_new(subnet)
+        self.assertEqual("10.0.0.100", ipaddress.ip)
+
+    def test_allocate_new_many_returns_addresses(self):
+        self.enable_free_ip_cache()
+        subnet = self.make_subnet_with_free_ips()
+        ipaddresses = StaticIPAddress.objects.allocate_new_many(subnet, 2)
+        self.assertItemsEqual(
+            ["10.0.0.98", "10.0.0.100"],
+            [ipaddress.ip for ipaddress in ipaddresses],
+        )
+
+    def test_allocate_new_many_without_free_ip_cache(self):
+        subnet = self.make_subnet_with_free_ips()
+        ipaddresses = StaticIPAddress.objects.allocate_new_many(subnet, 2)
+        self.assertItemsEqual(
+            ["10.0.0.98", "10.0.0.100"],
+            [ipaddress.ip for ipaddress in ipaddresses],
+        )
+
+    def test_allocate_new_many_raises_when_addresses_exhausted(self):
+        self.enable_free_ip_cache()
+        subnet = self.make_subnet_with_free_ips()
+        self.assertRaises(
+            StaticIPAddressExhaustion,
+            StaticIPAddress.objects.allocate_new_many,
+            subnet,
+            3,
+        )
+
 
 class TestStaticIPAddressManagerTransactional(MAASTransactionServerTestCase):
     """Transactional tests for `StaticIPAddressManager."""
@@ -827,6 +827,49 @@ class TestGetBestSubnetForIP(MAASServerTestCase):
         self.expectThat(subnet, Is(None))
 
 
+class TestGetBestSubnetsForIPs(MAASServerTestCase):
+    def test_returns_most_specific_subnet_for_each_ip(self):
+        factory.make_Subnet(cidr="10.0.0.0/8")
+        subnet_v4 = factory.make_Subnet(cidr="10.1.1.0/24")
+        factory.make_Subnet(cidr="10.1.0.0/16")
+        factory.make_Subnet(cidr="2001::/16")
+        subnet_v6 = factory.make_Subnet(cidr="2001:db8:1:2::/64")
+        subnets = Subnet.objects.get_best_subnets_for_ips(
+            ["10.1.1.1", "10.1.1.2", "2001:db8:1:2::1"]
+        )
+        self.assertEqual(
+            {
+                IPAddress("10.1.1.1"): subnet_v4,
+                IPAddress("10.1.1.2"): subnet_v4,
+                IPAddress("2001:db8:1:2::1"): subnet_v6,
+            },
+            subnets,
+        )
+
+    def test_prefers_subnet_on_managed_vlan(self):
+        vlan = factory.make_VLAN(dhcp_on=True)
+        expected_subnet = factory.make_Subnet(cidr="10.0.0.0/8", vlan=vlan)
+        factory.make_Subnet(cidr="10.1.1.0/24")
+        self.assertEqual(
+            {IPAddress("10.1.1.1"): expected_subnet},
+            Subnet.objects.get_best_subnets_for_ips(["10.1.1.1"]),
+        )
+
+    def test_maps_ipv4_mapped_ipv6_addr_to_ipv4(self):
+        expected_subnet = factory.make_Subnet(cidr="10.1.1.0/24")
+        self.assertEqual(
+            {IPAddress("10.1.1.1"): expected_subnet},
+            Subnet.objects.get_best_subnets_for_ips(["::ffff:10.1.1.1"]),
+        )
+
+    def test_omits_ips_without_subnet(self):
+        factory.make_Subnet(cidr="10.1.1.0/24")
+        self.assertEqual({}, Subnet.objects.get_best_subnets_for_ips(["::"]))
+
+    def test_returns_empty_for_no_ips(self):
+        self.assertEqual({}, Subnet.objects.get_best_subnets_for_ips([]))
+
+
 class SubnetLabelTest(MAASServerTestCase):
     def test_returns_cidr_for_null_name(self):
         network = factory.make_ip4_or_6_network()
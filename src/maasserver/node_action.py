@@ -21,7 +21,6 @@ from crochet import TimeoutError
 from django.core.exceptions import ValidationError
 from django.http.request import HttpRequest
 
-from maasserver import locks
 from maasserver.audit import create_audit_event
 from maasserver.clusterrpc.boot_images import RackControllersImporter
 from maasserver.enum import (
@@ -35,7 +34,7 @@ from maasserver.enum import (
     POWER_STATE,
 )
 from maasserver.exceptions import NodeActionError, StaticIPAddressExhaustion
-from maasserver.models import Config, ResourcePool, Tag, Zone
+from maasserver.models import Config, Machine, ResourcePool, Tag, Zone
 from maasserver.node_status import is_failed_status, NON_MONITORED_STATUSES
 from maasserver.permissions import NodePermission
 from maasserver.preseed import get_curtin_config
@@ -446,11 +445,11 @@ class Acquire(NodeAction):
 
     def _execute(self):
         """See `NodeAction.execute`."""
-        with locks.node_acquire:
-            try:
-                self.node.acquire(self.user)
-            except ValidationError as e:
-                raise NodeActionError(e)
+        Machine.objects.lock_for_acquisition(self.node)
+        try:
+            self.node.acquire(self.user)
+        except ValidationError as e:
+            raise NodeActionError(e)
 
 
 class Deploy(NodeAction):
@@ -485,11 +484,11 @@ class Deploy(NodeAction):
                     "as a MAAS-managed KVM Pod."
                 )
         if self.node.owner is None:
-            with locks.node_acquire:
-                try:
-                    self.node.acquire(self.user)
-                except ValidationError as e:
-                    raise NodeActionError(e)
+            Machine.objects.lock_for_acquisition(self.node)
+            try:
+                self.node.acquire(self.user)
+            except ValidationError as e:
+                raise NodeActionError(e)
         if install_kvm:
             try:
                 # KVM Pod installation should default to ubuntu/bionic, since
@@ -26,6 +26,7 @@ from maasserver.forms import (
 )
 from maasserver.models import (
     BlockDevice,
+    Fabric,
     Filesystem,
     Interface,
     Partition,
@@ -125,6 +126,7 @@ IGNORED_FIELDS = {
     "bridge_type",
     "bridge_stp",
     "bridge_fd",
+    "count",
     "dry_run",
     "verbose",
     "op",
@@ -513,6 +515,53 @@ def nodes_by_storage(storage, node_ids=None):
     return nodes
 
 
+def storage_summary_query(storage):
+    """Return a `Q` matching the nodes that could satisfy the storage
+    constraint string `storage`, according to their allocation summary.
+
+    The summary only knows the largest size and the union of the tags for
+    each kind of device, so this is a necessary condition only. It is used
+    to narrow down the nodes before `nodes_by_storage` matches the devices.
+    """
+    constraints = get_storage_constraints_from_string(storage)
+    if constraints is None:
+        return None
+    (_, size, tags), others = constraints[0], constraints[1:]
+    if tags is not None and "partition" in tags:
+        query = Q(allocation_summary__root_partition_size__gte=size)
+        part_tags = [tag for tag in tags if tag != "partition"]
+        if part_tags:
+            query &= Q(
+                allocation_summary__root_partition_tags__contains=part_tags
+            )
+    else:
+        query = Q(allocation_summary__root_device_size__gte=size)
+        if tags:
+            query &= Q(allocation_summary__root_device_tags__contains=tags)
+    partitions = devices = 0
+    for _, size, tags in others:
+        if tags is not None and "partition" in tags:
+            partitions += 1
+            query &= Q(allocation_summary__unused_partition_size__gte=size)
+            part_tags = [tag for tag in tags if tag != "partition"]
+            if part_tags:
+                query &= Q(
+                    allocation_summary__unused_partition_tags__contains=part_tags
+                )
+        else:
+            devices += 1
+            query &= Q(allocation_summary__unused_device_size__gte=size)
+            if tags is not None:
+                query &= Q(
+                    allocation_summary__unused_device_tags__contains=tags
+                )
+    if partitions > 0:
+        query &= Q(allocation_summary__unused_partition_count__gte=partitions)
+    if devices > 0:
+        query &= Q(allocation_summary__unused_device_count__gte=devices)
+    return query
+
+
 def nodes_by_interface(
     interfaces_label_map, include_filter=None, preconfigured=True
 ):
@@ -999,7 +1048,14 @@ class FilterNodeForm(RenamableFieldsForm):
             self.get_field_name("interfaces")
         )
         if interfaces_label_map is not None:
-            result = nodes_by_interface(interfaces_label_map)
+            # Only match the interfaces of the nodes that are still
+            # candidates, rather than those of every node.
+            result = nodes_by_interface(
+                interfaces_label_map,
+                include_filter={
+                    "node_id__in": filtered_nodes.order_by().values("id")
+                },
+            )
             if result.node_ids is not None:
                 filtered_nodes = filtered_nodes.filter(id__in=result.node_ids)
                 compatible_interfaces = result.label_map
@@ -1009,7 +1065,14 @@ class FilterNodeForm(RenamableFieldsForm):
         compatible_nodes = {}  # Maps node/storage to named storage constraints
         storage = self.cleaned_data.get(self.get_field_name("storage"))
         if storage:
-            compatible_nodes = nodes_by_storage(storage)
+            # Discard the nodes that can't match using their allocation
+            # summary, so that the devices are only matched for the rest.
+            filtered_nodes = filtered_nodes.filter(
+                storage_summary_query(storage)
+            )
+            compatible_nodes = nodes_by_storage(
+                storage, node_ids=filtered_nodes.order_by().values("id")
+            )
             node_ids = list(compatible_nodes)
             if node_ids is not None:
                 filtered_nodes = filtered_nodes.filter(id__in=node_ids)
@@ -1020,15 +1083,21 @@ class FilterNodeForm(RenamableFieldsForm):
             self.get_field_name("fabric_classes")
         )
         if fabric_classes is not None and len(fabric_classes) > 0:
+            fabric_ids = Fabric.objects.filter(
+                class_type__in=fabric_classes
+            ).values_list("id", flat=True)
             filtered_nodes = filtered_nodes.filter(
-                interface__vlan__fabric__class_type__in=fabric_classes
+                allocation_summary__fabric_ids__overlap=list(fabric_ids)
             )
         not_fabric_classes = self.cleaned_data.get(
             self.get_field_name("not_fabric_classes")
         )
         if not_fabric_classes is not None and len(not_fabric_classes) > 0:
+            fabric_ids = Fabric.objects.filter(
+                class_type__in=not_fabric_classes
+            ).values_list("id", flat=True)
             filtered_nodes = filtered_nodes.exclude(
-                interface__vlan__fabric__class_type__in=not_fabric_classes
+                allocation_summary__fabric_ids__overlap=list(fabric_ids)
             )
         return filtered_nodes
 
@@ -1037,51 +1106,63 @@ class FilterNodeForm(RenamableFieldsForm):
         if fabrics is not None and len(fabrics) > 0:
             # XXX mpontillo 2015-10-30 need to also handle fabrics whose name
             # is null (fabric-<id>).
+            fabric_ids = Fabric.objects.filter(name__in=fabrics).values_list(
+                "id", flat=True
+            )
             filtered_nodes = filtered_nodes.filter(
-                interface__vlan__fabric__name__in=fabrics
+                allocation_summary__fabric_ids__overlap=list(fabric_ids)
             )
         not_fabrics = self.cleaned_data.get(self.get_field_name("not_fabrics"))
         if not_fabrics is not None and len(not_fabrics) > 0:
             # XXX mpontillo 2015-10-30 need to also handle fabrics whose name
             # is null (fabric-<id>).
+            fabric_ids = Fabric.objects.filter(
+                name__in=not_fabrics
+            ).values_list("id", flat=True)
             filtered_nodes = filtered_nodes.exclude(
-                interface__vlan__fabric__name__in=not_fabrics
+                allocation_summary__fabric_ids__overlap=list(fabric_ids)
             )
         return filtered_nodes
 
     def filter_by_vlans(self, filtered_nodes):
         vlans = self.cleaned_data.get(self.get_field_name("vlans"))
         if vlans is not None and len(vlans) > 0:
-            for vlan in set(vlans):
-                filtered_nodes = filtered_nodes.filter(interface__vlan=vlan)
+            filtered_nodes = filtered_nodes.filter(
+                allocation_summary__vlan_ids__contains=sorted(
+                    vlan.id for vlan in vlans
+                )
+            )
         not_vlans = self.cleaned_data.get(self.get_field_name("not_vlans"))
         if not_vlans is not None and len(not_vlans) > 0:
-            for not_vlan in set(not_vlans):
-                filtered_nodes = filtered_nodes.exclude(
-                    interface__vlan=not_vlan
+            filtered_nodes = filtered_nodes.exclude(
+                allocation_summary__vlan_ids__overlap=sorted(
+                    vlan.id for vlan in not_vlans
                 )
+            )
         return filtered_nodes
 
     def filter_by_subnets(self, filtered_nodes):
         subnets = self.cleaned_data.get(self.get_field_name("subnets"))
         if subnets is not None and len(subnets) > 0:
-            for subnet in set(subnets):
-                filtered_nodes = filtered_nodes.filter(
-                    interface__ip_addresses__subnet=subnet
+            filtered_nodes = filtered_nodes.filter(
+                allocation_summary__subnet_ids__contains=sorted(
+                    subnet.id for subnet in subnets
                 )
+            )
         not_subnets = self.cleaned_data.get(self.get_field_name("not_subnets"))
         if not_subnets is not None and len(not_subnets) > 0:
-            for not_subnet in set(not_subnets):
-                filtered_nodes = filtered_nodes.exclude(
-                    interface__ip_addresses__subnet=not_subnet
+            filtered_nodes = filtered_nodes.exclude(
+                allocation_summary__subnet_ids__overlap=sorted(
+                    subnet.id for subnet in not_subnets
                 )
+            )
         return filtered_nodes
 
     def filter_by_link_speed(self, filtered_nodes):
         link_speed = self.cleaned_data.get(self.get_field_name("link_speed"))
         if link_speed:
             filtered_nodes = filtered_nodes.filter(
-                interface__link_speed__gte=link_speed
+                allocation_summary__max_link_speed__gte=link_speed
             )
         return filtered_nodes
 
@@ -34,6 +34,7 @@ from maasserver.utils.orm import in_transaction, transactional
 from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.rpc.cluster import EvaluateTag
 from provisioningserver.tags import (
+    classify_node_details,
     DEFAULT_BATCH_SIZE,
     gen_batches,
     merge_details,
@@ -211,8 +212,10 @@ def populate_tags_for_single_node(tags, node):
     evaluator = partial(try_match_xpath, doc=evaluator, logger=logger)
     tags_defined = ((tag, tag.definition) for tag in tags if tag.is_defined)
     tags_matching, tags_nonmatching = classify(evaluator, tags_defined)
-    node.tags.remove(*tags_nonmatching)
-    node.tags.add(*tags_matching)
+    # Only change the tags that the node gains or loses.
+    tag_ids = set(node.tags.values_list("id", flat=True))
+    node.tags.remove(*(tag for tag in tags_nonmatching if tag.id in tag_ids))
+    node.tags.add(*(tag for tag in tags_matching if tag.id not in tag_ids))
 
 
 @synchronous
@@ -224,18 +227,25 @@ def populate_tag_for_multiple_nodes(tag, nodes, batch_size=DEFAULT_BATCH_SIZE):
     to which to farm-out work. Use this only when many nodes need reevaluating
     locally, i.e. when there are no rack controllers connected.
     """
-    # Same expression, multuple documents: compile expression with XPath.
-    xpath = etree.XPath(tag.definition, namespaces=tag_nsmap)
+    # Compile the expression first, so an invalid one fails early.
+    etree.XPath(tag.definition, namespaces=tag_nsmap)
     # The XML details documents can be large so work in batches.
     for batch in gen_batches(nodes, batch_size):
         probed_details = get_probed_details(batch)
-        probed_details_docs_by_node = {
-            node: merge_details(probed_details[node.system_id])
-            for node in batch
-        }
-        nodes_matching, nodes_nonmatching = classify(
-            partial(try_match_xpath, xpath, logger=maaslog),
-            probed_details_docs_by_node.items(),
+        nodes_matching, nodes_nonmatching = classify_node_details(
+            tag.definition,
+            tag_nsmap,
+            ((node, probed_details[node.system_id]) for node in batch),
+        )
+        # Only change the nodes that gain or lose the tag.
+        node_ids = set(
+            tag.node_set.filter(
+                id__in=[node.id for node in batch]
+            ).values_list("id", flat=True)
+        )
+        tag.node_set.remove(
+            *(node for node in nodes_nonmatching if node.id in node_ids)
+        )
+        tag.node_set.add(
+            *(node for node in nodes_matching if node.id not in node_ids)
         )
-        tag.node_set.remove(*nodes_nonmatching)
-        tag.node_set.add(*nodes_matching)
@@ -30,6 +30,11 @@ DHCP:
     for messages on 'sys_dhcp_{id}' channel and set that rack controller as
     needing an update. Any time a message is received on this queue that rack
     controller is marked as needing an update.
+
+    A message with a VLAN ID as its payload means only the hosts on that
+    VLAN have changed. While every pending message for a rack controller is
+    of that kind only the hosts on those VLANs are pushed; otherwise the
+    whole DHCP configuration is.
 """
 
 __all__ = ["RackControllerService"]
@@ -77,6 +82,7 @@ class RackControllerService(Service):
         self.processingDone = None
         self.watching = set()
         self.needsDHCPUpdate = set()
+        self.dhcpHostUpdates = {}
         self.ipcWorker = ipcWorker
         self.postgresListener = postgresListener
 
@@ -159,6 +165,7 @@ class RackControllerService(Service):
 
             self.watching = set()
             self.needsDHCPUpdate = set()
+            self.dhcpHostUpdates = {}
             self.starting = None
             if self.processing.running:
                 self.processing.stop()
@@ -196,6 +203,7 @@ class RackControllerService(Service):
                     rack_id=rack_id,
                 )
             self.needsDHCPUpdate.discard(rack_id)
+            self.dhcpHostUpdates.pop(rack_id, None)
             self.watching.discard(rack_id)
         elif action == "watch":
             if rack_id not in self.watching:
@@ -211,6 +219,7 @@ class RackControllerService(Service):
                 )
             self.watching.add(rack_id)
             self.needsDHCPUpdate.add(rack_id)
+            self.dhcpHostUpdates.pop(rack_id, None)
             self.startProcessing()
         else:
             raise ValueError("Unknown action: %s." % action)
@@ -235,6 +244,13 @@ class RackControllerService(Service):
         _, rack_id = channel.split("sys_dhcp_")
         rack_id = int(rack_id)
         if rack_id in self.watching:
+            if not message:
+                # Everything needs to be pushed.
+                self.dhcpHostUpdates.pop(rack_id, None)
+            elif rack_id not in self.needsDHCPUpdate:
+                self.dhcpHostUpdates[rack_id] = {int(message)}
+            elif rack_id in self.dhcpHostUpdates:
+                self.dhcpHostUpdates[rack_id].add(int(message))
             self.needsDHCPUpdate.add(rack_id)
             self.startProcessing()
 
@@ -291,8 +307,12 @@ class RackControllerService(Service):
             rack_id=rack_id,
         )
 
+        vlan_ids = self.dhcpHostUpdates.pop(rack_id, None)
         d = deferToDatabase(
             transactional(RackController.objects.get), id=rack_id
         )
-        d.addCallback(dhcp.configure_dhcp)
+        if vlan_ids is None:
+            d.addCallback(dhcp.configure_dhcp)
+        else:
+            d.addCallback(dhcp.configure_dhcp_hosts, vlan_ids)
         return d
@@ -0,0 +1,52 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Boot configuration cache invalidation service."""
+
+__all__ = ["BootConfigCacheService"]
+
+from twisted.application.service import Service
+
+from maasserver.listener import PostgresListenerService
+from maasserver.rpc import boot
+
+# Channels that notify about a change to a single node, by system_id.
+NODE_CHANNELS = ("machine", "device", "controller")
+
+# Channels that notify about a change that can affect any node.
+GLOBAL_CHANNELS = ("config", "domain", "tag")
+
+
+class BootConfigCacheService(Service):
+    """Service to drop cached boot configurations when they go stale."""
+
+    def __init__(
+        self, postgresListener: PostgresListenerService = None, cache=None
+    ):
+        super().__init__()
+        self.listener = postgresListener
+        self.cache = boot.boot_config_cache if cache is None else cache
+
+    def startService(self):
+        super().startService()
+        if self.listener is not None:
+            for channel in NODE_CHANNELS:
+                self.listener.register(channel, self.consumeNodeEvent)
+            for channel in GLOBAL_CHANNELS:
+                self.listener.register(channel, self.consumeGlobalEvent)
+
+    def stopService(self):
+        if self.listener is not None:
+            for channel in NODE_CHANNELS:
+                self.listener.unregister(channel, self.consumeNodeEvent)
+            for channel in GLOBAL_CHANNELS:
+                self.listener.unregister(channel, self.consumeGlobalEvent)
+        return super().stopService()
+
+    def consumeNodeEvent(self, action: str = None, system_id: str = None):
+        """Forget the boot configurations for the changed node."""
+        self.cache.invalidate(system_id)
+
+    def consumeGlobalEvent(self, action: str = None, obj_id: str = None):
+        """Forget all boot configurations."""
+        self.cache.invalidate()
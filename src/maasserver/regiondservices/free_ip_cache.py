@@ -0,0 +1,76 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Free IP address cache maintenance service."""
+
+__all__ = ["FreeIPCacheService"]
+
+from twisted.application.service import Service
+
+from maasserver import freeips
+from maasserver.listener import PostgresListenerService
+from provisioningserver.logger import LegacyLogger
+
+log = LegacyLogger()
+
+
+class FreeIPCacheService(Service):
+    """Service to keep the free IP address cache up to date.
+
+    The cache is only used while the listener is connected, as changes made
+    while it is not connected are missed.
+    """
+
+    def __init__(
+        self, postgresListener: PostgresListenerService = None, cache=None
+    ):
+        super().__init__()
+        self.listener = postgresListener
+        self.cache = freeips.free_ip_cache if cache is None else cache
+
+    def startService(self):
+        super().startService()
+        if self.listener is not None:
+            self.listener.register("sys_free_ips", self.consumeFreeIPsEvent)
+            self.listener.events.connected.registerHandler(self.cache.enable)
+            self.listener.events.disconnected.registerHandler(
+                self.consumeDisconnected
+            )
+            if self.listener.connected():
+                self.cache.enable()
+
+    def stopService(self):
+        if self.listener is not None:
+            self.listener.events.disconnected.unregisterHandler(
+                self.consumeDisconnected
+            )
+            self.listener.events.connected.unregisterHandler(self.cache.enable)
+            self.listener.unregister("sys_free_ips", self.consumeFreeIPsEvent)
+        self.cache.disable()
+        return super().stopService()
+
+    def consumeDisconnected(self, reason=None):
+        """Stop using the cache, as changes are no longer seen."""
+        self.cache.disable()
+
+    def consumeFreeIPsEvent(self, channel: str, message: str):
+        """Apply a change to the free IP addresses to the cache.
+
+        The message is one of:
+
+        - "used <subnet_id> <ip> <id>": the address was taken;
+        - "free <subnet_id> <ip> <id>": the address was released;
+        - "subnet <subnet_id>": the free addresses of the subnet changed;
+        - "neighbour <ip>": a neighbour was observed using the address.
+        """
+        kind, *args = message.split()
+        if kind == "used":
+            self.cache.mark_used(int(args[0]), args[1])
+        elif kind == "free":
+            self.cache.mark_free(int(args[0]), args[1])
+        elif kind == "subnet":
+            self.cache.invalidate(int(args[0]))
+        elif kind == "neighbour":
+            self.cache.mark_neighbour(args[0])
+        else:
+            log.msg("Unknown free IP address message: %s" % message)
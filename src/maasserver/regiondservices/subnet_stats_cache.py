@@ -0,0 +1,64 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Subnet utilisation statistics cache invalidation service."""
+
+__all__ = ["SubnetStatsCacheService"]
+
+from twisted.application.service import Service
+
+from maasserver import stats
+from maasserver.listener import PostgresListenerService
+
+# Channels that notify about a change to the utilisation of a subnet. Changes
+# to the IP addresses of a subnet are notified on the subnet channel.
+CHANNELS = ("subnet", "iprange", "staticroute")
+
+
+class SubnetStatsCacheService(Service):
+    """Service to drop the cached subnet utilisation statistics when they go
+    stale.
+
+    The statistics are only cached while the listener is connected, as
+    changes made while it is not connected are missed.
+    """
+
+    def __init__(
+        self, postgresListener: PostgresListenerService = None, cache=None
+    ):
+        super().__init__()
+        self.listener = postgresListener
+        self.cache = (
+            stats.subnets_utilisation_stats_cache if cache is None else cache
+        )
+
+    def startService(self):
+        super().startService()
+        if self.listener is not None:
+            for channel in CHANNELS:
+                self.listener.register(channel, self.consumeEvent)
+            self.listener.events.connected.registerHandler(self.cache.enable)
+            self.listener.events.disconnected.registerHandler(
+                self.consumeDisconnected
+            )
+            if self.listener.connected():
+                self.cache.enable()
+
+    def stopService(self):
+        if self.listener is not None:
+            self.listener.events.disconnected.unregisterHandler(
+                self.consumeDisconnected
+            )
+            self.listener.events.connected.unregisterHandler(self.cache.enable)
+            for channel in CHANNELS:
+                self.listener.unregister(channel, self.consumeEvent)
+        self.cache.disable()
+        return super().stopService()
+
+    def consumeDisconnected(self, reason=None):
+        """Stop using the cache, as changes are no longer seen."""
+        self.cache.disable()
+
+    def consumeEvent(self, action: str = None, obj_id: str = None):
+        """Forget the cached statistics."""
+        self.cache.invalidate()
@@ -0,0 +1,57 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the boot configuration cache invalidation service."""
+
+__all__ = []
+
+from unittest.mock import call, Mock
+
+from maasserver.regiondservices.boot_config_cache import (
+    BootConfigCacheService,
+    GLOBAL_CHANNELS,
+    NODE_CHANNELS,
+)
+from maasserver.rpc import boot
+from maastesting.factory import factory
+from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.testcase import MAASTestCase
+
+
+class TestBootConfigCacheService(MAASTestCase):
+    def test_uses_region_cache_by_default(self):
+        service = BootConfigCacheService()
+        self.assertIs(boot.boot_config_cache, service.cache)
+
+    def test_registers_and_unregisters_channels(self):
+        listener = Mock()
+        service = BootConfigCacheService(listener, Mock())
+        service.startService()
+        service.stopService()
+        expected_handlers = [
+            (channel, service.consumeNodeEvent) for channel in NODE_CHANNELS
+        ] + [
+            (channel, service.consumeGlobalEvent)
+            for channel in GLOBAL_CHANNELS
+        ]
+        self.assertThat(
+            listener.register,
+            MockCallsMatch(*(call(*args) for args in expected_handlers)),
+        )
+        self.assertThat(
+            listener.unregister,
+            MockCallsMatch(*(call(*args) for args in expected_handlers)),
+        )
+
+    def test_node_event_invalidates_node(self):
+        cache = Mock()
+        service = BootConfigCacheService(cache=cache)
+        system_id = factory.make_name("system_id")
+        service.consumeNodeEvent("update", system_id)
+        self.assertThat(cache.invalidate, MockCalledOnceWith(system_id))
+
+    def test_global_event_invalidates_everything(self):
+        cache = Mock()
+        service = BootConfigCacheService(cache=cache)
+        service.consumeGlobalEvent("update", factory.make_name("name"))
+        self.assertThat(cache.invalidate, MockCalledOnceWith())
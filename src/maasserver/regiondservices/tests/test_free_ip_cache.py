@@ -0,0 +1,93 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the free IP address cache maintenance service."""
+
+__all__ = []
+
+from unittest.mock import Mock
+
+from maasserver import freeips
+from maasserver.regiondservices.free_ip_cache import FreeIPCacheService
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockNotCalled,
+)
+from maastesting.testcase import MAASTestCase
+
+
+class TestFreeIPCacheService(MAASTestCase):
+    def test_uses_region_cache_by_default(self):
+        service = FreeIPCacheService()
+        self.assertIs(freeips.free_ip_cache, service.cache)
+
+    def test_registers_and_unregisters_channel(self):
+        listener = Mock()
+        service = FreeIPCacheService(listener, Mock())
+        service.startService()
+        service.stopService()
+        self.assertThat(
+            listener.register,
+            MockCalledOnceWith("sys_free_ips", service.consumeFreeIPsEvent),
+        )
+        self.assertThat(
+            listener.unregister,
+            MockCalledOnceWith("sys_free_ips", service.consumeFreeIPsEvent),
+        )
+
+    def test_enables_cache_when_connected(self):
+        listener = Mock()
+        listener.connected.return_value = True
+        cache = Mock()
+        service = FreeIPCacheService(listener, cache)
+        service.startService()
+        self.assertThat(cache.enable, MockCalledOnceWith())
+        self.assertThat(
+            listener.events.connected.registerHandler,
+            MockCalledOnceWith(cache.enable),
+        )
+
+    def test_does_not_enable_cache_when_not_connected(self):
+        listener = Mock()
+        listener.connected.return_value = False
+        cache = Mock()
+        service = FreeIPCacheService(listener, cache)
+        service.startService()
+        self.assertThat(cache.enable, MockNotCalled())
+
+    def test_disables_cache_when_disconnected(self):
+        cache = Mock()
+        service = FreeIPCacheService(cache=cache)
+        service.consumeDisconnected(Mock())
+        self.assertThat(cache.disable, MockCalledOnceWith())
+
+    def test_disables_cache_when_stopped(self):
+        cache = Mock()
+        service = FreeIPCacheService(Mock(), cache)
+        service.startService()
+        service.stopService()
+        self.assertThat(cache.disable, MockCalledOnceWith())
+
+    def test_used_message_marks_address_used(self):
+        cache = Mock()
+        service = FreeIPCacheService(cache=cache)
+        service.consumeFreeIPsEvent("sys_free_ips", "used 4 10.0.0.5 12")
+        self.assertThat(cache.mark_used, MockCalledOnceWith(4, "10.0.0.5"))
+
+    def test_free_message_marks_address_free(self):
+        cache = Mock()
+        service = FreeIPCacheService(cache=cache)
+        service.consumeFreeIPsEvent("sys_free_ips", "free 4 10.0.0.5 12")
+        self.assertThat(cache.mark_free, MockCalledOnceWith(4, "10.0.0.5"))
+
+    def test_subnet_message_invalidates_subnet(self):
+        cache = Mock()
+        service = FreeIPCacheService(cache=cache)
+        service.consumeFreeIPsEvent("sys_free_ips", "subnet 4")
+        self.assertThat(cache.invalidate, MockCalledOnceWith(4))
+
+    def test_neighbour_message_marks_neighbour(self):
+        cache = Mock()
+        service = FreeIPCacheService(cache=cache)
+        service.consumeFreeIPsEvent("sys_free_ips", "neighbour 10.0.0.5")
+        self.assertThat(cache.mark_neighbour, MockCalledOnceWith("10.0.0.5"))
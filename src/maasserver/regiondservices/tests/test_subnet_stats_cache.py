@@ -0,0 +1,68 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the subnet utilisation statistics cache invalidation service."""
+
+__all__ = []
+
+from unittest.mock import call, Mock
+
+from maasserver import stats
+from maasserver.regiondservices.subnet_stats_cache import (
+    CHANNELS,
+    SubnetStatsCacheService,
+)
+from maastesting.factory import factory
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
+from maastesting.testcase import MAASTestCase
+
+
+class TestSubnetStatsCacheService(MAASTestCase):
+    def test_uses_region_cache_by_default(self):
+        service = SubnetStatsCacheService()
+        self.assertIs(stats.subnets_utilisation_stats_cache, service.cache)
+
+    def test_registers_and_unregisters_channels(self):
+        listener = Mock()
+        service = SubnetStatsCacheService(listener, Mock())
+        service.startService()
+        service.stopService()
+        expected_handlers = [
+            call(channel, service.consumeEvent) for channel in CHANNELS
+        ]
+        self.assertThat(listener.register, MockCallsMatch(*expected_handlers))
+        self.assertThat(
+            listener.unregister, MockCallsMatch(*expected_handlers)
+        )
+
+    def test_enables_cache_when_connected(self):
+        listener = Mock()
+        listener.connected.return_value = True
+        cache = Mock()
+        service = SubnetStatsCacheService(listener, cache)
+        service.startService()
+        self.assertThat(cache.enable, MockCalledOnceWith())
+
+    def test_does_not_enable_cache_when_not_connected(self):
+        listener = Mock()
+        listener.connected.return_value = False
+        cache = Mock()
+        service = SubnetStatsCacheService(listener, cache)
+        service.startService()
+        self.assertThat(cache.enable, MockNotCalled())
+
+    def test_disables_cache_when_disconnected(self):
+        cache = Mock()
+        service = SubnetStatsCacheService(cache=cache)
+        service.consumeDisconnected(Mock())
+        self.assertThat(cache.disable, MockCalledOnceWith())
+
+    def test_event_invalidates_cache(self):
+        cache = Mock()
+        service = SubnetStatsCacheService(cache=cache)
+        service.consumeEvent("update", factory.make_name("id"))
+        self.assertThat(cache.invalidate, MockCalledOnceWith())
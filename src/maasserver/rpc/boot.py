@@ -3,13 +3,15 @@
 
 """RPC helpers for getting the configuration for a booting machine."""
 
-__all__ = ["get_config"]
+__all__ = ["boot_config_cache", "BootConfigCache", "get_config"]
 
 import re
 import shlex
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db.models import Q
+from twisted.internet import reactor
+from twisted.internet.defer import fail, succeed
 
 from maasserver.compose_preseed import RSYSLOG_PORT
 from maasserver.dns.config import get_resource_name_for_subnet
@@ -31,18 +33,32 @@ from maasserver.preseed import (
 from maasserver.third_party_drivers import get_third_party_driver
 from maasserver.utils.orm import transactional
 from maasserver.utils.osystems import validate_hwe_kernel
+from maasserver.utils.threads import deferToDatabase
 from provisioningserver.events import EVENT_TYPES
-from provisioningserver.logger import get_maas_logger
+from provisioningserver.logger import get_maas_logger, LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc.exceptions import BootConfigNoResponse
 from provisioningserver.utils.network import get_source_address
-from provisioningserver.utils.twisted import synchronous, undefined
+from provisioningserver.utils.twisted import (
+    asynchronous,
+    synchronous,
+    undefined,
+)
 from provisioningserver.utils.url import splithost
 
+log = LegacyLogger()
 maaslog = get_maas_logger("rpc.boot")
 
 
 DEFAULT_ARCH = "i386"
 
+# Seconds a cached boot configuration is handed out for before it's computed
+# again, even when no change to it has been notified.
+BOOT_CONFIG_CACHE_TTL = 60
+
+# Number of cached boot configurations above which expired ones are pruned.
+BOOT_CONFIG_CACHE_SIZE = 10000
+
 
 def get_node_from_mac_or_hardware_uuid(mac=None, hardware_uuid=None):
     """Get a Node object from a MAC address or hardware UUID string.
@@ -314,6 +330,30 @@ def get_final_boot_purpose(machine, arch, purpose):
         return purpose
 
 
+def reset_status_expires(machine):
+    """Reset the status_expires of `machine`, if it's in a monitored status.
+
+    Only that column is updated. It's not one whose changes are notified,
+    so this doesn't invalidate the cached boot configurations of the
+    machine; see `BootConfigCache`.
+    """
+    machine.reset_status_expires()
+    if machine.status_expires is not None:
+        Node.objects.filter(id=machine.id).update(
+            status_expires=machine.status_expires
+        )
+
+
+@synchronous
+@transactional
+def reset_machine_status_expires(system_id):
+    """Reset the status_expires of the machine with `system_id`, if it
+    exists and is in a monitored status."""
+    machine = Node.objects.filter(system_id=system_id).first()
+    if machine is not None:
+        reset_status_expires(machine)
+
+
 @synchronous
 @transactional
 def get_config(
@@ -430,13 +470,13 @@ def get_config(
                     machine.boot_interface.vlan = rack_interface.vlan
                     machine.boot_interface.save()
 
+        # Does nothing if the machine hasn't changed.
+        machine.save()
+
         # Reset the machine's status_expires whenever the boot_config is called
         # on a known machine. This allows a machine to take up to the maximum
         # timeout status to POST.
-        machine.reset_status_expires()
-
-        # Does nothing if the machine hasn't changed.
-        machine.save()
+        reset_status_expires(machine)
 
         arch, subarch = machine.split_arch()
         if configs["use_rack_proxy"]:
@@ -634,3 +674,132 @@ def get_config(
     if machine is not None:
         params["system_id"] = machine.system_id
     return params
+
+
+class BootConfigCache:
+    """Cache of the boot configurations computed by `get_config`.
+
+    During a PXE storm the same machines ask for the same configuration over
+    and over; answering the repeats from memory keeps them off the database.
+
+    Entries for a node are dropped when that node changes, and all entries
+    are dropped when the global configuration changes; see
+    `BootConfigCacheService`. Anything else, like a newly imported boot
+    resource, is picked up once the entry expires after `ttl` seconds.
+
+    The side effects of `get_config`, such as logging the PXE request for a
+    machine, only happen when the configuration is computed, except for
+    resetting the machine's status_expires, which happens on every request.
+    """
+
+    def __init__(self, clock=reactor, ttl=BOOT_CONFIG_CACHE_TTL):
+        super().__init__()
+        self.clock = clock
+        self.ttl = ttl
+        # Maps the `get_config` arguments to (expires, system_id, params),
+        # where params is None if the request got no response.
+        self.entries = {}
+        # Bumped on every invalidation, so that configurations computed
+        # before it are not cached.
+        self.generation = 0
+
+    @asynchronous
+    def get_config(
+        self,
+        system_id,
+        local_ip,
+        remote_ip,
+        arch=None,
+        subarch=None,
+        mac=None,
+        hardware_uuid=None,
+        bios_boot_method=None,
+    ):
+        """Get the boot configuration for a machine, using the cache.
+
+        Takes the same arguments as `get_config`.
+        """
+        key = (
+            system_id,
+            local_ip,
+            remote_ip,
+            arch,
+            subarch,
+            mac,
+            hardware_uuid,
+            bios_boot_method,
+        )
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > self.clock.seconds():
+            self._record_lookup("hit")
+            if entry[1] is not None:
+                self._reset_status_expires(entry[1])
+            params = entry[2]
+            if params is None:
+                return fail(BootConfigNoResponse())
+            else:
+                return succeed(params.copy())
+
+        self._record_lookup("miss")
+        generation = self.generation
+
+        def store(params):
+            if generation == self.generation:
+                self._store(key, params.get("system_id"), params.copy())
+            return params
+
+        def store_no_response(failure):
+            failure.trap(BootConfigNoResponse)
+            if generation == self.generation:
+                self._store(key, None, None)
+            return failure
+
+        d = deferToDatabase(get_config, *key)
+        d.addCallbacks(store, store_no_response)
+        return d
+
+    def invalidate(self, system_id=None):
+        """Forget cached boot configurations.
+
+        :param system_id: Only forget the configurations for this node, and
+            those for unknown nodes, as the change may have made a MAC address
+            or hardware UUID known. Forget everything when `None`.
+        """
+        self.generation += 1
+        if system_id is None:
+            self.entries.clear()
+        else:
+            self.entries = {
+                other_key: entry
+                for other_key, entry in self.entries.items()
+                if entry[1] is not None and entry[1] != system_id
+            }
+
+    def _store(self, key, system_id, params):
+        now = self.clock.seconds()
+        if len(self.entries) >= BOOT_CONFIG_CACHE_SIZE:
+            self.entries = {
+                other_key: entry
+                for other_key, entry in self.entries.items()
+                if entry[0] > now
+            }
+        self.entries[key] = (now + self.ttl, system_id, params)
+
+    def _reset_status_expires(self, system_id):
+        """Reset the status_expires of the machine, without waiting."""
+        d = deferToDatabase(reset_machine_status_expires, system_id)
+        d.addErrback(
+            log.err, "Failed to reset status_expires for %s." % system_id
+        )
+        return d
+
+    def _record_lookup(self, result):
+        PROMETHEUS_METRICS.update(
+            "maas_region_boot_config_cache_lookups",
+            "inc",
+            labels={"result": result},
+        )
+
+
+# The boot configuration cache for this region process.
+boot_config_cache = BootConfigCache()
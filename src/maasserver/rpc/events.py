@@ -3,10 +3,25 @@
 
 """RPC helpers relating to events."""
 
-__all__ = ["register_event_type", "send_event", "send_event_mac_address"]
+__all__ = [
+    "register_event_type",
+    "send_event",
+    "send_event_mac_address",
+    "send_ip_address_events",
+]
+
+from datetime import datetime
+
+from netaddr import AddrFormatError, IPAddress
 
 from maasserver.enum import INTERFACE_TYPE
-from maasserver.models import Event, EventType, Interface, Node
+from maasserver.models import (
+    Event,
+    EventType,
+    Interface,
+    Node,
+    StaticIPAddress,
+)
 from maasserver.utils.orm import transactional
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.rpc.exceptions import NoSuchEventType
@@ -129,3 +144,81 @@ def send_event_ip_address(ip_address, type_name, description, timestamp):
             description=description,
             created=timestamp,
         )
+
+
+def _normalise_ip(ip_address):
+    """Return `ip_address` as the database formats it, or None."""
+    try:
+        ip_address = IPAddress(ip_address)
+    except (AddrFormatError, TypeError, ValueError):
+        return None
+    return str(
+        ip_address.ipv4() if ip_address.is_ipv4_mapped() else ip_address
+    )
+
+
+@synchronous
+@transactional
+def send_ip_address_events(events):
+    """Send many events using IP addresses.
+
+    The event types and the nodes for all the events are each fetched with
+    a single query, and the events are inserted together.
+
+    for :py:class:`~provisioningserver.rpc.region.SendIPAddressEvents`.
+    """
+    event_types = {
+        event_type.name: event_type
+        for event_type in EventType.objects.filter(
+            name__in={event["type_name"] for event in events}
+        )
+    }
+    # Like `send_event_ip_address`, pick the first node when more than one
+    # has the address.
+    ip_addresses = {_normalise_ip(event["ip_address"]) for event in events}
+    ip_addresses.discard(None)
+    node_ids = {}
+    addresses = (
+        StaticIPAddress.objects.filter(
+            ip__in=ip_addresses,
+            interface__node__isnull=False,
+        )
+        .order_by("interface__node_id")
+        .values_list("ip", "interface__node_id")
+    )
+    for ip, node_id in addresses:
+        node_ids.setdefault(ip, node_id)
+
+    new_events = []
+    for event in events:
+        event_type = event_types.get(event["type_name"])
+        node_id = node_ids.get(_normalise_ip(event["ip_address"]))
+        if event_type is None:
+            log.debug(
+                "Event '{type}: {description}' sent with non-existent "
+                "event type.",
+                type=event["type_name"],
+                description=event["description"],
+            )
+        elif node_id is None:
+            # As for `send_event_ip_address`, the node might not be known
+            # yet, for example while it's enlisting.
+            log.debug(
+                "Event '{type}: {description}' sent for non-existent "
+                "node with IP address '{ip_address}'.",
+                type=event["type_name"],
+                description=event["description"],
+                ip_address=event["ip_address"],
+            )
+        else:
+            created = datetime.fromtimestamp(event["timestamp"])
+            new_events.append(
+                Event(
+                    node_id=node_id,
+                    type=event_type,
+                    description=event["description"],
+                    created=created,
+                    updated=created,
+                )
+            )
+    Event.objects.bulk_create(new_events)
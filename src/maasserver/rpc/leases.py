@@ -3,22 +3,28 @@
 
 """RPC helpers relating to DHCP leases."""
 
-__all__ = ["update_lease"]
+__all__ = ["update_lease", "update_leases"]
 
+from collections import defaultdict
 from datetime import datetime
 
-from netaddr import IPAddress
+from netaddr import AddrFormatError, EUI, IPAddress, mac_unix_expanded
 
-from maasserver.enum import IPADDRESS_FAMILY, IPADDRESS_TYPE
+from maasserver.enum import IPADDRESS_FAMILY, IPADDRESS_TYPE, IPRANGE_TYPE
 from maasserver.models import (
     DNSResource,
     Interface,
+    IPRange,
     Node,
     StaticIPAddress,
     Subnet,
     UnknownInterface,
 )
-from maasserver.utils.orm import transactional
+from maasserver.utils.orm import (
+    is_retryable_failure,
+    savepoint,
+    transactional,
+)
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.utils.network import coerce_to_valid_hostname
 from provisioningserver.utils.twisted import synchronous
@@ -39,6 +45,109 @@ def _is_valid_hostname(hostname):
     )
 
 
+def _normalise_mac(mac):
+    """Return `mac` as PostgreSQL formats MAC addresses, or None."""
+    try:
+        return str(EUI(str(mac), dialect=mac_unix_expanded))
+    except (AddrFormatError, TypeError, ValueError):
+        return None
+
+
+def _normalise_ip(ip):
+    """Return `ip` as an `IPAddress`, mapped to IPv4 if needed, or None."""
+    try:
+        ip = IPAddress(ip)
+    except (AddrFormatError, TypeError, ValueError):
+        return None
+    return ip.ipv4() if ip.is_ipv4_mapped() else ip
+
+
+class _LeaseLookup:
+    """The rows needed to process a set of lease updates.
+
+    Subnets, dynamic ranges, interfaces and DISCOVERED addresses for all of
+    the updates are each fetched with a single query. Changes made while
+    processing the updates are recorded here too, so that each update sees
+    the effects of those before it, as if they were processed one by one.
+    """
+
+    def __init__(self, updates):
+        ips = {_normalise_ip(update["ip"]) for update in updates}
+        ips.discard(None)
+        self.subnets = Subnet.objects.get_best_subnets_for_ips(ips)
+        self.dynamic_ranges = defaultdict(list)
+        dynamic_ranges = IPRange.objects.filter(
+            type=IPRANGE_TYPE.DYNAMIC,
+            subnet_id__in={subnet.id for subnet in self.subnets.values()},
+        )
+        for iprange in dynamic_ranges:
+            self.dynamic_ranges[iprange.subnet_id].append(iprange)
+
+        macs = {_normalise_mac(update["mac"]) for update in updates}
+        macs.discard(None)
+        self.interfaces = defaultdict(list)
+        for interface in Interface.objects.filter(mac_address__in=macs):
+            self.add_interface(interface)
+
+        # DISCOVERED addresses by ID, so that every interface sharing an
+        # address sees the same instance, and the IDs linked to each
+        # interface.
+        self.addresses = {}
+        self.links = defaultdict(set)
+        links = Interface.ip_addresses.through.objects.filter(
+            interface_id__in={
+                interface.id
+                for interfaces in self.interfaces.values()
+                for interface in interfaces
+            },
+            staticipaddress__alloc_type=IPADDRESS_TYPE.DISCOVERED,
+        ).select_related("staticipaddress")
+        for link in links:
+            address = link.staticipaddress
+            self.addresses.setdefault(address.id, address)
+            self.links[link.interface_id].add(address.id)
+
+    def get_subnet(self, ip):
+        """Return the best `Subnet` for `ip`, or None."""
+        return self.subnets.get(_normalise_ip(ip))
+
+    def get_dynamic_range(self, subnet, ip):
+        """Return the dynamic `IPRange` in `subnet` holding `ip`, or None."""
+        ip = IPAddress(ip)
+        for iprange in self.dynamic_ranges[subnet.id]:
+            if ip in iprange.netaddr_iprange:
+                return iprange
+        return None
+
+    def get_interfaces(self, mac):
+        """Return the interfaces with `mac`."""
+        return list(self.interfaces[_normalise_mac(mac)])
+
+    def add_interface(self, interface):
+        """Record a newly created `interface`."""
+        mac = _normalise_mac(interface.mac_address)
+        self.interfaces[mac].append(interface)
+
+    def get_addresses(self, interfaces):
+        """Return the DISCOVERED addresses linked to any of `interfaces`."""
+        ids = set().union(*(self.links[iface.id] for iface in interfaces))
+        return [self.addresses[address_id] for address_id in sorted(ids)]
+
+    def link_address(self, address, interfaces):
+        """Link the DISCOVERED `address` to `interfaces`."""
+        self.addresses[address.id] = address
+        for interface in interfaces:
+            interface.ip_addresses.add(address)
+            self.links[interface.id].add(address.id)
+
+    def delete_address(self, address):
+        """Delete the DISCOVERED `address`."""
+        del self.addresses[address.id]
+        for ids in self.links.values():
+            ids.discard(address.id)
+        address.delete()
+
+
 @synchronous
 @transactional
 def update_lease(
@@ -74,13 +183,64 @@ def update_lease(
     :raises NoSuchCluster: If the cluster identified by `cluster_uuid` does not
         exist.
     """
+    lookup = _LeaseLookup([{"mac": mac, "ip": ip}])
+    return _update_lease(
+        lookup, action, mac, ip_family, ip, timestamp, lease_time, hostname
+    )
+
+
+@synchronous
+@transactional
+def update_leases(updates):
+    """Update many DHCP leases from a cluster, in a single transaction.
+
+    :param updates: A list of dicts, each holding the arguments for
+        `update_lease`, as found in
+        :py:class`~provisioningserver.rpc.region.UpdateLeases`. They are
+        processed in order.
+
+    Each update is processed in its own savepoint. An update that cannot be
+    processed is logged and skipped, and whatever it changed is rolled back.
+    Failures that retrying the transaction could fix are not skipped.
+    """
+    lookup = _LeaseLookup(updates)
+    for index, update in enumerate(updates):
+        try:
+            with savepoint():
+                _update_lease(lookup, **update)
+        except LeaseUpdateError as error:
+            log.msg("Lease update skipped: %s" % error)
+        except Exception as error:
+            if is_retryable_failure(error):
+                raise
+            log.err(None, "Lease update skipped: %r" % (update,))
+            # The lookup may hold changes that were just rolled back, so
+            # fetch the rows for the remaining updates again.
+            lookup = _LeaseLookup(updates[index + 1 :])
+    return {}
+
+
+def _update_lease(
+    lookup,
+    action,
+    mac,
+    ip_family,
+    ip,
+    timestamp,
+    lease_time=None,
+    hostname=None,
+):
+    """Update one DHCP lease using rows from `lookup`.
+
+    See `update_lease` for the arguments.
+    """
     # Check for a valid action.
     if action not in ["commit", "expiry", "release"]:
         raise LeaseUpdateError("Unknown lease action: %s" % action)
 
     # Get the subnet for this IP address. If no subnet exists then something
     # is wrong as we should not be recieving message about unknown subnets.
-    subnet = Subnet.objects.get_best_subnet_for_ip(ip)
+    subnet = lookup.get_subnet(ip)
     if subnet is None:
         raise LeaseUpdateError("No subnet exists for: %s" % ip)
 
@@ -114,12 +274,12 @@ def update_lease(
 
     # We will recieve actions on all addresses in the subnet. We only want
     # to update the addresses in the dynamic range.
-    dynamic_range = subnet.get_dynamic_range_for_ip(IPAddress(ip))
+    dynamic_range = lookup.get_dynamic_range(subnet, ip)
     if dynamic_range is None:
         # Do nothing.
         return {}
 
-    interfaces = list(Interface.objects.filter(mac_address=mac))
+    interfaces = lookup.get_interfaces(mac)
     if len(interfaces) == 0 and action == "commit":
         # A MAC address that is unknown to MAAS was given an IP address. Create
         # an unknown interface for this lease.
@@ -127,6 +287,7 @@ def update_lease(
             name="eth0", mac_address=mac, vlan_id=subnet.vlan_id
         )
         unknown_interface.save()
+        lookup.add_interface(unknown_interface)
         interfaces = [unknown_interface]
     elif len(interfaces) == 0:
         # No interfaces and not commit action so nothing needs to be done.
@@ -135,18 +296,18 @@ def update_lease(
     sip = None
     # Delete all discovered IP addresses attached to all interfaces of the same
     # IP address family.
-    old_family_addresses = StaticIPAddress.objects.filter_by_ip_family(
-        subnet_family
-    )
-    old_family_addresses = old_family_addresses.filter(
-        alloc_type=IPADDRESS_TYPE.DISCOVERED, interface__in=interfaces
-    )
+    addresses = lookup.get_addresses(interfaces)
+    old_family_addresses = [
+        address
+        for address in addresses
+        if address.ip is not None
+        and IPAddress(address.ip).version == subnet_family
+    ]
     for address in old_family_addresses:
         # Release old DHCP hostnames, but only for obsolete dynamic addresses.
         if address.ip != ip:
-            if address.ip is not None:
-                DNSResource.objects.release_dynamic_hostname(address)
-            address.delete()
+            DNSResource.objects.release_dynamic_hostname(address)
+            lookup.delete_address(address)
         else:
             # Avoid recreating a new StaticIPAddress later.
             sip = address
@@ -175,8 +336,7 @@ def update_lease(
             alloc_type=IPADDRESS_TYPE.DISCOVERED,
             ip=ip,
         )
-        for interface in interfaces:
-            interface.ip_addresses.add(sip)
+        lookup.link_address(sip, interfaces)
         if sip_hostname is not None:
             # MAAS automatically manages DNS for node hostnames, so we cannot
             # allow a DHCP client to override that.
@@ -195,12 +355,14 @@ def update_lease(
         if sip is None:
             # XXX: There shouldn't be more than one StaticIPAddress
             #      record here, but it can happen be due to bug 1817305.
-            sip = StaticIPAddress.objects.filter(
-                alloc_type=IPADDRESS_TYPE.DISCOVERED,
-                ip=None,
-                subnet=subnet,
-                interface__in=interfaces,
-            ).first()
+            sip = next(
+                (
+                    address
+                    for address in addresses
+                    if address.ip is None and address.subnet_id == subnet.id
+                ),
+                None,
+            )
             if sip is None:
                 sip = StaticIPAddress.objects.create(
                     alloc_type=IPADDRESS_TYPE.DISCOVERED,
@@ -210,6 +372,5 @@ def update_lease(
         else:
             sip.ip = None
             sip.save()
-        for interface in interfaces:
-            interface.ip_addresses.add(sip)
+        lookup.link_address(sip, interfaces)
     return {}
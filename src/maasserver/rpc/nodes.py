@@ -6,6 +6,7 @@
 __all__ = [
     "mark_node_failed",
     "update_node_power_state",
+    "update_node_power_states",
     "commission_node",
     "create_node",
 ]
@@ -19,7 +20,7 @@ from django.db.models import F, Q
 
 from maasserver import exceptions, ntp
 from maasserver.api.utils import get_overridden_query_dict
-from maasserver.enum import NODE_STATUS
+from maasserver.enum import NODE_STATUS, POWER_STATE
 from maasserver.forms import AdminMachineWithMACAddressesForm
 from maasserver.models import Node, PhysicalInterface, RackController
 from maasserver.models.timestampedmodel import now
@@ -35,6 +36,30 @@ from provisioningserver.rpc.exceptions import (
 from provisioningserver.utils.twisted import synchronous
 
 
+# Statuses in which a node is likely to be powered on or off soon.
+UNSTABLE_POWER_STATUSES = frozenset(
+    {
+        NODE_STATUS.COMMISSIONING,
+        NODE_STATUS.DEPLOYING,
+        NODE_STATUS.RELEASING,
+        NODE_STATUS.DISK_ERASING,
+        NODE_STATUS.ENTERING_RESCUE_MODE,
+        NODE_STATUS.EXITING_RESCUE_MODE,
+        NODE_STATUS.TESTING,
+    }
+)
+
+# How long to wait between power queries of a node. Nodes in one of the
+# statuses above, with an unknown power state, or whose power state changed
+# recently are queried more often; nodes whose power state has not changed
+# for a long while are queried less often.
+POWER_QUERY_INTERVAL = timedelta(minutes=5)
+POWER_QUERY_INTERVAL_UNSTABLE = timedelta(minutes=1)
+POWER_QUERY_INTERVAL_STABLE = timedelta(minutes=15)
+POWER_STATE_RECENTLY_CHANGED = timedelta(minutes=10)
+POWER_STATE_STABLE = timedelta(hours=1)
+
+
 @synchronous
 @transactional
 def mark_node_failed(system_id, error_description):
@@ -60,7 +85,6 @@ def _gen_cluster_nodes_power_parameters(nodes, limit):
 
     :return: A generator yielding `dict`s.
     """
-    five_minutes_ago = now() - timedelta(minutes=5)
     queryable_power_types = [
         driver.name for _, driver in PowerDriverRegistry if driver.queryable
     ]
@@ -68,14 +92,21 @@ def _gen_cluster_nodes_power_parameters(nodes, limit):
     qs = (
         nodes.exclude(status=NODE_STATUS.BROKEN)
         .filter(bmc__power_type__in=queryable_power_types)
-        .filter(
-            Q(power_state_queried=None)
-            | Q(power_state_queried__lte=five_minutes_ago)
-        )
+        .filter(_power_query_due())
         .order_by(F("power_state_queried").asc(nulls_first=True), "system_id")
         .distinct()
     )
-    for node in qs[:limit]:
+    nodes = list(qs[:limit])
+    # Nodes behind the same chassis share a BMC. Query those that are due
+    # together, so the rack can log in to the chassis only once. At most
+    # `limit` nodes are added, so a page is never more than twice as big;
+    # the rest of a large chassis is left for the next pages.
+    node_ids = {node.id for node in nodes}
+    bmc_ids = {node.bmc_id for node in nodes}
+    nodes.extend(
+        qs.filter(bmc_id__in=bmc_ids).exclude(id__in=node_ids)[:limit]
+    )
+    for node in nodes:
         power_info = node.get_effective_power_info()
         if power_info.power_type is not None:
             yield {
@@ -87,6 +118,46 @@ def _gen_cluster_nodes_power_parameters(nodes, limit):
             }
 
 
+def _power_query_due():
+    """Return a `Q` matching nodes whose power state should be queried."""
+    current_time = now()
+    unstable = (
+        Q(status__in=UNSTABLE_POWER_STATUSES)
+        | Q(power_state__in=[POWER_STATE.ERROR, POWER_STATE.UNKNOWN])
+        | Q(
+            power_state_changed__gte=(
+                current_time - POWER_STATE_RECENTLY_CHANGED
+            )
+        )
+    )
+    stable = Q(power_state_changed__lte=current_time - POWER_STATE_STABLE)
+    return (
+        Q(power_state_queried=None)
+        | (
+            unstable
+            & Q(
+                power_state_queried__lte=(
+                    current_time - POWER_QUERY_INTERVAL_UNSTABLE
+                )
+            )
+        )
+        | (
+            ~unstable
+            & stable
+            & Q(
+                power_state_queried__lte=(
+                    current_time - POWER_QUERY_INTERVAL_STABLE
+                )
+            )
+        )
+        | (
+            ~unstable
+            & ~stable
+            & Q(power_state_queried__lte=current_time - POWER_QUERY_INTERVAL)
+        )
+    )
+
+
 def _gen_up_to_json_limit(things, limit):
     """Yield until the combined JSON dump of those things would exceed `limit`.
 
@@ -120,25 +191,31 @@ def _gen_up_to_json_limit(things, limit):
 
 @synchronous
 @transactional
-def list_cluster_nodes_power_parameters(system_id, limit=10):
+def list_cluster_nodes_power_parameters(system_id, limit=10, streaming=False):
     """Return power parameters that a rack controller should power check,
     in priority order.
 
     For :py:class:`~provisioningserver.rpc.region.ListNodePowerParameters`.
 
     :param limit: Limit the number of nodes for which to return power
-        parameters. Pass `None` to remove this numerical limit; there is still
-        a limit on the quantity of power information that will be returned.
+        parameters. Pass `None` to remove this numerical limit.
+    :param streaming: Whether the rack controller can fetch values that
+        are streamed because they don't fit into a single AMP value. If
+        not, there is also a limit on the quantity of power information
+        that will be returned.
     """
     try:
         rack = RackController.objects.get(system_id=system_id)
     except RackController.DoesNotExist:
         raise NoSuchCluster.from_uuid(system_id)
 
-    # Generate all the the power queries that will fit into the response.
+    # Generate all the the power queries. The response streams them if they
+    # don't fit into a single AMP value, but only to rack controllers that
+    # can fetch them; the rest get what fits into the response.
     nodes = rack.get_bmc_accessible_nodes()
     details = _gen_cluster_nodes_power_parameters(nodes, limit)
-    details = _gen_up_to_json_limit(details, 60 * (2 ** 10))  # 60kiB
+    if not streaming:
+        details = _gen_up_to_json_limit(details, 60 * (2 ** 10))  # 60kiB
     details = list(details)
 
     # Update the queried time on all of the nodes at once. So another
@@ -166,6 +243,24 @@ def update_node_power_state(system_id, power_state):
     node.update_power_state(power_state)
 
 
+@synchronous
+@transactional
+def update_node_power_states(power_states):
+    """Update many nodes' power states.
+
+    for :py:class:`~provisioningserver.rpc.region.UpdateNodePowerStates`.
+
+    :param power_states: A list of dicts with "system_id" and "power_state"
+        keys. Nodes that do not exist are ignored.
+    """
+    power_states = {
+        power_state["system_id"]: power_state["power_state"]
+        for power_state in power_states
+    }
+    for node in Node.objects.filter(system_id__in=power_states):
+        node.update_power_state(power_states[node.system_id])
+
+
 @synchronous
 @transactional
 def create_node(
@@ -4,6 +4,7 @@
 """RPC helpers relating to rack controllers."""
 
 __all__ = [
+    "get_boot_image_peers",
     "handle_upgrade",
     "register",
     "update_interfaces",
@@ -26,6 +27,10 @@ from maasserver.models import (
     StaticIPAddress,
 )
 from maasserver.models.timestampedmodel import now
+from maasserver.routablepairs import (
+    get_routable_address_map,
+    reduce_routable_address_map,
+)
 from maasserver.utils import synchronised
 from maasserver.utils.orm import transactional, with_connection
 from metadataserver.models import ScriptSet
@@ -290,3 +295,30 @@ def update_last_image_sync(system_id):
     RackController.objects.filter(system_id=system_id).update(
         last_image_sync=now()
     )
+
+
+@synchronous
+@transactional
+def get_boot_image_peers(system_id):
+    """Get the addresses of the other rack controllers that the given rack
+    controller can download boot images from.
+
+    Only rack controllers that have synced boot images at least once are
+    included, and one routable address is returned for each of them.
+
+    for :py:class:`~provisioningserver.rpc.region.GetBootImagePeers`.
+    """
+    try:
+        rack_controller = RackController.objects.get(system_id=system_id)
+    except RackController.DoesNotExist:
+        raise NoSuchNode.from_system_id(system_id)
+    peers = RackController.objects.exclude(id=rack_controller.id).filter(
+        last_image_sync__isnull=False
+    )
+    routable_addrs_map = get_routable_address_map(peers, rack_controller)
+    return {
+        "peers": sorted(
+            str(address)
+            for address in reduce_routable_address_map(routable_addrs_map)
+        )
+    }
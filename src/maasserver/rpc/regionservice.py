@@ -46,6 +46,7 @@ from maasserver.rpc import (
     packagerepository,
     rackcontrollers,
 )
+from maasserver.rpc.events import send_ip_address_events
 from maasserver.rpc.nodes import (
     commission_node,
     create_node,
@@ -70,6 +71,7 @@ from provisioningserver.utils.network import resolves_to_loopback_address
 from provisioningserver.utils.twisted import (
     asynchronous,
     callOut,
+    DeferredValue,
     deferWithTimeout,
     FOREVER,
 )
@@ -161,6 +163,31 @@ class Region(RPCProtocol):
         # region recieves the message.
         return d
 
+    @region.UpdateLeases.responder
+    def update_leases(self, cluster_uuid, updates):
+        """update_leases(cluster_uuid, updates)
+
+        Implementation of
+        :py:class`~provisioningserver.rpc.region.UpdateLeases`.
+        """
+        dbtasks = eventloop.services.getServiceNamed("database-tasks")
+        d = dbtasks.deferTask(leases.update_leases, updates)
+
+        # Catch all errors except the NoSuchCluster failure. We want that to
+        # be sent back to the cluster.
+        def err_NoSuchCluster_passThrough(failure):
+            if failure.check(NoSuchCluster):
+                return failure
+            else:
+                log.err(failure, "Unhandled failure in updating leases.")
+                return {}
+
+        d.addErrback(err_NoSuchCluster_passThrough)
+
+        # Wait for the batch to be handled, so that batches from a cluster
+        # are processed in order no matter which region recieves them.
+        return d
+
     @amp.StartTLS.responder
     def get_tls_parameters(self):
         """get_tls_parameters()
@@ -194,8 +221,7 @@ class Region(RPCProtocol):
         Implementation of
         :py:class:`~provisioningserver.rpc.region.GetBootConfig`.
         """
-        return deferToDatabase(
-            boot.get_config,
+        return boot.boot_config_cache.get_config(
             system_id,
             local_ip,
             remote_ip,
@@ -230,6 +256,15 @@ class Region(RPCProtocol):
         d.addCallback(lambda source: {"sources": [source]})
         return d
 
+    @region.GetBootImagePeers.responder
+    def get_boot_image_peers(self, system_id):
+        """get_boot_image_peers()
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.region.GetBootImagePeers`.
+        """
+        return deferToDatabase(rackcontrollers.get_boot_image_peers, system_id)
+
     @region.GetArchiveMirrors.responder
     def get_archive_mirrors(self):
         """get_archive_mirrors()
@@ -264,13 +299,17 @@ class Region(RPCProtocol):
         return d
 
     @region.ListNodePowerParameters.responder
-    def list_node_power_parameters(self, uuid):
+    def list_node_power_parameters(self, uuid, streaming=False):
         """list_node_power_parameters()
 
         Implementation of
         :py:class:`~provisioningserver.rpc.region.ListNodePowerParameters`.
         """
-        d = deferToDatabase(nodes.list_cluster_nodes_power_parameters, uuid)
+        d = deferToDatabase(
+            nodes.list_cluster_nodes_power_parameters,
+            uuid,
+            streaming=bool(streaming),
+        )
         d.addCallback(lambda nodes: {"nodes": nodes})
         return d
 
@@ -298,6 +337,17 @@ class Region(RPCProtocol):
         d.addCallback(lambda args: {})
         return d
 
+    @region.UpdateNodePowerStates.responder
+    def update_node_power_states(self, power_states):
+        """update_node_power_states()
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.region.UpdateNodePowerStates`.
+        """
+        d = deferToDatabase(nodes.update_node_power_states, power_states)
+        d.addCallback(lambda args: {})
+        return d
+
     @region.RegisterEventType.responder
     def register_event_type(self, name, description, level):
         """register_event_type()
@@ -364,6 +414,18 @@ class Region(RPCProtocol):
         # Don't wait for the record to be written.
         return succeed({})
 
+    @region.SendIPAddressEvents.responder
+    def send_ip_address_events(self, events):
+        """send_ip_address_events()
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.region.SendIPAddressEvents`.
+        """
+        dbtasks = eventloop.services.getServiceNamed("database-tasks")
+        dbtasks.addTask(send_ip_address_events, events)
+        # Don't wait for the records to be written.
+        return succeed({})
+
     @region.ReportForeignDHCPServer.responder
     def report_foreign_dhcp_server(
         self, system_id, interface_name, dhcp_ip=None
@@ -628,6 +690,12 @@ class RegionServer(Region):
         service that created it.
 
     :ivar ident: The identity (e.g. UUID) of the remote cluster.
+
+    :ivar authenticated: A py:class:`DeferredValue` that will be set when the
+        cluster has been authenticated. If the cluster has been authenticated,
+        this will be ``True``, otherwise it will be ``False``. If there was an
+        error, it will return a :py:class:`twisted.python.failure.Failure` via
+        errback.
     """
 
     factory = None
@@ -636,6 +704,10 @@ class RegionServer(Region):
     host = None
     hostIsRemote = False
 
+    def __init__(self):
+        super().__init__()
+        self.authenticated = DeferredValue()
+
     @asynchronous
     def initResponder(self, rack_controller):
         """Set up local connection identifiers for this RPC connection.
@@ -770,9 +842,19 @@ class RegionServer(Region):
                 "uuid": GLOBAL_LABELS["maas_uuid"],
             }
 
+    def remoteAuthenticated(self):
+        """Return a `Deferred` that fires with whether the cluster has been
+        authenticated.
+
+        Overrides `RPCProtocol.remoteAuthenticated`.
+        """
+        return self.authenticated.get()
+
     @inlineCallbacks
     def performHandshake(self):
-        authenticated = yield self.authenticateCluster()
+        d_authenticate = self.authenticateCluster()
+        self.authenticated.observe(d_authenticate)
+        authenticated = yield d_authenticate
         peer = self.transport.getPeer()
         if isinstance(peer, (IPv4Address, IPv6Address)):
             client = "%s:%s" % (peer.host, peer.port)
@@ -813,6 +895,7 @@ class RegionServer(Region):
             return self.performHandshake().addErrback(self.handshakeFailed)
         else:
             self.transport.loseConnection()
+            self.authenticated.set(None)
 
     def connectionLost(self, reason):
         if self.hostIsRemote:
@@ -7,10 +7,13 @@ __all__ = []
 
 from datetime import timedelta
 import random
-from unittest.mock import ANY
+from unittest.mock import ANY, Mock
 
 from netaddr import IPNetwork
+from testtools import ExpectedException
 from testtools.matchers import ContainsAll, StartsWith
+from twisted.internet.defer import Deferred, fail, inlineCallbacks, succeed
+from twisted.internet.task import Clock
 
 from maasserver import server_address
 from maasserver.dns.config import get_resource_name_for_subnet
@@ -26,20 +29,42 @@ from maasserver.models.timestampedmodel import now
 from maasserver.node_status import get_node_timeout, MONITORED_STATUSES
 from maasserver.preseed import compose_enlistment_preseed_url
 from maasserver.rpc import boot as boot_module
-from maasserver.rpc.boot import event_log_pxe_request, get_boot_filenames
+from maasserver.rpc.boot import (
+    BootConfigCache,
+    event_log_pxe_request,
+    get_boot_filenames,
+)
 from maasserver.rpc.boot import get_config as orig_get_config
 from maasserver.rpc.boot import merge_kparams_with_extra
 from maasserver.testing.architecture import make_usable_architecture
 from maasserver.testing.config import RegionConfigurationFixture
 from maasserver.testing.factory import factory
-from maasserver.testing.testcase import MAASServerTestCase
-from maasserver.utils.orm import post_commit_hooks, reload_object
+from maasserver.testing.testcase import (
+    MAASServerTestCase,
+    MAASTransactionServerTestCase,
+)
+from maasserver.regiondservices.boot_config_cache import (
+    BootConfigCacheService,
+)
+from maasserver.triggers.testing import (
+    TransactionalHelpersMixin,
+    wait_for_reactor,
+)
+from maasserver.triggers.websocket import register_websocket_triggers
+from maasserver.utils.orm import (
+    post_commit_hooks,
+    reload_object,
+    transactional,
+)
+from maasserver.utils.threads import deferToDatabase
 from maasserver.utils.osystems import get_release_from_distro_info
 from maastesting.djangotestcase import count_queries
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import MockCalledOnceWith, MockNotCalled
+from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
 from provisioningserver.events import EVENT_DETAILS, EVENT_TYPES
 from provisioningserver.rpc.exceptions import BootConfigNoResponse
 from provisioningserver.utils.network import get_source_address
+from provisioningserver.utils.twisted import DeferredValue
 
 
 def get_config(*args, **kwargs):
@@ -1500,3 +1525,236 @@ class TestGetBootFilenames(MAASServerTestCase):
             initrd,
         )
         self.assertIsNone(boot_dbt)
+
+
+class TestBootConfigCache(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def make_cache(self, *results):
+        self.get_config = self.patch(boot_module, "get_config")
+        self.get_config.side_effect = results
+        self.patch(
+            boot_module, "deferToDatabase", lambda func, *args: func(*args)
+        )
+        self.reset_machine_status_expires = self.patch(
+            boot_module, "reset_machine_status_expires"
+        )
+        self.reset_machine_status_expires.return_value = succeed(None)
+        return BootConfigCache(clock=Clock())
+
+    def make_args(self):
+        return (
+            factory.make_name("system_id"),
+            factory.make_ip_address(),
+            factory.make_ip_address(),
+        )
+
+    @inlineCallbacks
+    def test_caches_config(self):
+        params = {"system_id": factory.make_name("system_id")}
+        cache = self.make_cache(succeed(params.copy()))
+        args = self.make_args()
+        mac = factory.make_mac_address()
+        first = yield cache.get_config(*args, mac=mac)
+        # Changes made by the caller don't leak into the cache.
+        first["label"] = factory.make_name("label")
+        second = yield cache.get_config(*args, mac=mac)
+        self.assertEqual(params, second)
+        self.assertThat(
+            self.get_config,
+            MockCalledOnceWith(*args, None, None, mac, None, None),
+        )
+
+    @inlineCallbacks
+    def test_resets_status_expires_of_machine_on_hits(self):
+        params = {"system_id": factory.make_name("system_id")}
+        cache = self.make_cache(succeed(params.copy()))
+        args = self.make_args()
+        yield cache.get_config(*args)
+        # The status_expires is reset by get_config on a miss.
+        self.assertThat(self.reset_machine_status_expires, MockNotCalled())
+        yield cache.get_config(*args)
+        self.assertThat(
+            self.reset_machine_status_expires,
+            MockCalledOnceWith(params["system_id"]),
+        )
+
+    @inlineCallbacks
+    def test_does_not_reset_status_expires_without_machine(self):
+        cache = self.make_cache(succeed({}))
+        args = self.make_args()
+        yield cache.get_config(*args)
+        yield cache.get_config(*args)
+        self.assertThat(self.reset_machine_status_expires, MockNotCalled())
+
+    @inlineCallbacks
+    def test_caches_no_response(self):
+        cache = self.make_cache(fail(BootConfigNoResponse()))
+        args = self.make_args()
+        for _ in range(2):
+            with ExpectedException(BootConfigNoResponse):
+                yield cache.get_config(*args)
+        self.assertEqual(1, self.get_config.call_count)
+
+    @inlineCallbacks
+    def test_does_not_cache_errors(self):
+        exception = factory.make_exception()
+        cache = self.make_cache(fail(exception), succeed({}))
+        args = self.make_args()
+        with ExpectedException(type(exception)):
+            yield cache.get_config(*args)
+        yield cache.get_config(*args)
+        self.assertEqual(2, self.get_config.call_count)
+
+    @inlineCallbacks
+    def test_computes_config_again_once_expired(self):
+        cache = self.make_cache(succeed({}), succeed({}))
+        args = self.make_args()
+        yield cache.get_config(*args)
+        cache.clock.advance(cache.ttl)
+        yield cache.get_config(*args)
+        self.assertEqual(2, self.get_config.call_count)
+
+    @inlineCallbacks
+    def test_invalidate_node_drops_node_and_unknown_entries(self):
+        system_id = factory.make_name("system_id")
+        other_system_id = factory.make_name("system_id")
+        cache = self.make_cache(
+            succeed({"system_id": system_id}),
+            succeed({"system_id": other_system_id}),
+            succeed({}),
+        )
+        node_args = self.make_args()
+        other_node_args = self.make_args()
+        unknown_args = self.make_args()
+        yield cache.get_config(*node_args)
+        yield cache.get_config(*other_node_args)
+        yield cache.get_config(*unknown_args)
+        cache.invalidate(system_id)
+        self.assertEqual(
+            [other_system_id],
+            [system_id for _, system_id, _ in cache.entries.values()],
+        )
+
+    @inlineCallbacks
+    def test_invalidate_drops_all_entries(self):
+        cache = self.make_cache(
+            succeed({"system_id": factory.make_name("system_id")}),
+            succeed({}),
+        )
+        yield cache.get_config(*self.make_args())
+        yield cache.get_config(*self.make_args())
+        cache.invalidate()
+        self.assertEqual({}, cache.entries)
+
+    @inlineCallbacks
+    def test_does_not_cache_config_computed_before_invalidation(self):
+        d = Deferred()
+        cache = self.make_cache(d)
+        result = cache.get_config(*self.make_args())
+        cache.invalidate()
+        d.callback({})
+        yield result
+        self.assertEqual({}, cache.entries)
+
+    @inlineCallbacks
+    def test_records_hits_and_misses(self):
+        update = self.patch(boot_module.PROMETHEUS_METRICS, "update")
+        update.return_value = None
+        cache = self.make_cache(succeed({}))
+        args = self.make_args()
+        yield cache.get_config(*args)
+        yield cache.get_config(*args)
+        self.assertEqual(
+            ["miss", "hit"],
+            [
+                call[1]["labels"]["result"]
+                for call in update.call_args_list
+                if call[0][0] == "maas_region_boot_config_cache_lookups"
+            ],
+        )
+
+
+class TestBootConfigCacheInvalidation(
+    MAASTransactionServerTestCase, TransactionalHelpersMixin
+):
+    """End-to-end test of the cache with the invalidation service."""
+
+    @transactional
+    def make_machines(self):
+        rack_controller = factory.make_RackController()
+        architecture = make_usable_architecture(self)
+        machine = factory.make_Node_with_Interface_on_Subnet(
+            architecture="%s/generic" % architecture.split("/")[0],
+            status=NODE_STATUS.COMMISSIONING,
+            status_expires=factory.make_date(),
+        )
+        other_machine = factory.make_Machine()
+        return (
+            rack_controller.system_id,
+            machine,
+            machine.get_boot_interface().mac_address,
+            other_machine,
+        )
+
+    @transactional
+    def get_status_expires(self, machine):
+        return reload_object(machine).status_expires
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_second_request_from_commissioning_machine_is_a_hit(self):
+        yield deferToDatabase(register_websocket_triggers)
+        rack_id, machine, mac, other_machine = yield deferToDatabase(
+            self.make_machines
+        )
+        listener = self.make_listener_without_delay()
+        cache = BootConfigCache()
+        service = BootConfigCacheService(listener, cache)
+        service.startService()
+        # Notifications are handled in order, so once the one for the other
+        # machine has been handled, so have those from the first request.
+        handled = DeferredValue()
+        listener.register(
+            "machine",
+            lambda action, system_id: (
+                handled.set(system_id)
+                if system_id == other_machine.system_id
+                else None
+            ),
+        )
+        yield listener.startService()
+        try:
+            args = (
+                rack_id,
+                factory.make_ip_address(),
+                factory.make_ip_address(),
+            )
+            yield cache.get_config(*args, mac=mac)
+            status_expires = yield deferToDatabase(
+                self.get_status_expires, machine
+            )
+            yield deferToDatabase(
+                self.update_node,
+                other_machine.system_id,
+                {"hostname": factory.make_name("hostname")},
+            )
+            yield handled.get(timeout=2)
+            get_config = self.patch(boot_module, "get_config")
+            reset_status_expires = self.patch(
+                cache,
+                "_reset_status_expires",
+                Mock(wraps=cache._reset_status_expires),
+            )
+            yield cache.get_config(*args, mac=mac)
+            self.assertThat(get_config, MockNotCalled())
+            # A hit still resets the machine's status_expires.
+            yield reset_status_expires.return_value
+            self.assertGreater(
+                (yield deferToDatabase(self.get_status_expires, machine)),
+                status_expires,
+            )
+        finally:
+            service.stopService()
+            yield listener.stopService()
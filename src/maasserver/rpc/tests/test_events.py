@@ -8,6 +8,7 @@ __all__ = []
 
 import datetime
 import logging
+import time
 
 from maasserver.enum import INTERFACE_TYPE
 from maasserver.models.event import Event
@@ -15,6 +16,7 @@ from maasserver.models.eventtype import EventType
 from maasserver.rpc import events
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
+from maastesting.djangotestcase import count_queries
 from provisioningserver.rpc.exceptions import NoSuchEventType
 
 
@@ -180,3 +182,93 @@ class TestSendEventIPAddress(MAASServerTestCase):
             description=description,
             created=timestamp,
         )
+
+
+class TestSendIPAddressEvents(MAASServerTestCase):
+    def make_event(self, ip_address, type_name, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        return {
+            "ip_address": ip_address,
+            "type_name": type_name,
+            "description": factory.make_name("description"),
+            "timestamp": timestamp,
+        }
+
+    def test_creates_events_for_nodes(self):
+        event_type = factory.make_EventType()
+        nodes = [factory.make_Node(interface=True) for _ in range(3)]
+        ips = [
+            factory.make_StaticIPAddress(
+                interface=node.interface_set.first()
+            ).ip
+            for node in nodes
+        ]
+        sent = [self.make_event(ip, event_type.name) for ip in ips]
+        events.send_ip_address_events(sent)
+        for node, event in zip(nodes, sent):
+            # Doesn't raise a DoesNotExist error.
+            Event.objects.get(
+                node=node,
+                type=event_type,
+                description=event["description"],
+                created=datetime.datetime.fromtimestamp(event["timestamp"]),
+            )
+
+    def test_creates_events_with_constant_queries(self):
+        event_type = factory.make_EventType()
+        node = factory.make_Node(interface=True)
+        ip = factory.make_StaticIPAddress(
+            interface=node.interface_set.first()
+        ).ip
+        count_one, _ = count_queries(
+            events.send_ip_address_events,
+            [self.make_event(ip, event_type.name)],
+        )
+        count_many, _ = count_queries(
+            events.send_ip_address_events,
+            [self.make_event(ip, event_type.name) for _ in range(10)],
+        )
+        self.assertEqual(count_one, count_many)
+        self.assertEqual(11, Event.objects.filter(node=node).count())
+
+    def test_creates_event_for_node_with_bridge_interface(self):
+        event_type = factory.make_EventType()
+        node = factory.make_Node(interface=True)
+        eth0 = node.get_boot_interface()
+        # Create a bridge with the same MAC as the boot interface.
+        factory.make_Interface(
+            INTERFACE_TYPE.BRIDGE,
+            node=node,
+            mac_address=eth0.mac_address,
+            parents=[node.get_boot_interface()],
+        )
+        ip = factory.make_StaticIPAddress()
+        for interface in node.interface_set.all():
+            ip.interface_set.add(interface)
+        event = self.make_event(ip.ip, event_type.name)
+        events.send_ip_address_events([event])
+        self.assertEqual(
+            [event["description"]],
+            [e.description for e in Event.objects.filter(node=node)],
+        )
+
+    def test_skips_unknown_types_nodes_and_addresses(self):
+        event_type = factory.make_EventType()
+        node = factory.make_Node(interface=True)
+        ip = factory.make_StaticIPAddress(
+            interface=node.interface_set.first()
+        ).ip
+        event = self.make_event(ip, event_type.name)
+        events.send_ip_address_events(
+            [
+                self.make_event(ip, factory.make_name("type")),
+                self.make_event(factory.make_ip_address(), event_type.name),
+                self.make_event("not-an-ip", event_type.name),
+                event,
+            ]
+        )
+        self.assertEqual(
+            [event["description"]],
+            [e.description for e in Event.objects.filter(type=event_type)],
+        )
@@ -9,6 +9,7 @@ from datetime import datetime
 import random
 import time
 
+from django.db.utils import OperationalError
 from django.utils import timezone
 from netaddr import IPAddress
 from testtools.matchers import Contains, Equals, MatchesStructure, Not
@@ -17,10 +18,20 @@ from maasserver.enum import INTERFACE_TYPE, IPADDRESS_FAMILY, IPADDRESS_TYPE
 from maasserver.models import DNSResource
 from maasserver.models.interface import UnknownInterface
 from maasserver.models.staticipaddress import StaticIPAddress
-from maasserver.rpc.leases import LeaseUpdateError, update_lease
+from maasserver.rpc import leases as leases_module
+from maasserver.rpc.leases import (
+    LeaseUpdateError,
+    update_lease,
+    update_leases,
+)
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
-from maasserver.utils.orm import get_one, reload_object
+from maasserver.utils.orm import (
+    get_one,
+    make_serialization_failure,
+    reload_object,
+)
+from maastesting.djangotestcase import count_queries
 
 
 class TestUpdateLease(MAASServerTestCase):
@@ -508,3 +519,188 @@ class TestUpdateLease(MAASServerTestCase):
         self.assertEqual(1, ip_address2.interface_set.count())
         self.assertEqual(1, boot_interface1.ip_addresses.count())
         self.assertEqual(1, boot_interface2.ip_addresses.count())
+
+
+class TestUpdateLeases(MAASServerTestCase):
+    def make_subnet(self):
+        return factory.make_ipv4_Subnet_with_IPRanges(
+            with_static_range=False, dhcp_on=True
+        )
+
+    def make_update(self, subnet, action="commit", mac=None, ip=None):
+        if mac is None:
+            mac = factory.make_mac_address()
+        if ip is None:
+            ip = factory.pick_ip_in_IPRange(subnet.get_dynamic_ranges()[0])
+        update = {
+            "action": action,
+            "mac": mac,
+            "ip_family": "ipv4",
+            "ip": ip,
+            "timestamp": int(time.time()),
+        }
+        if action == "commit":
+            update["lease_time"] = random.randint(30, 1000)
+            update["hostname"] = factory.make_name("host")
+        return update
+
+    def get_leased_ips(self, interface):
+        return [
+            address.ip
+            for address in interface.ip_addresses.filter(
+                alloc_type=IPADDRESS_TYPE.DISCOVERED, ip__isnull=False
+            )
+        ]
+
+    def test_creates_leases_for_all_updates(self):
+        subnet = self.make_subnet()
+        interfaces = [
+            factory.make_Node_with_Interface_on_Subnet(
+                subnet=subnet
+            ).get_boot_interface()
+            for _ in range(3)
+        ]
+        updates = [
+            self.make_update(subnet, mac=interface.mac_address)
+            for interface in interfaces
+        ]
+        update_leases(updates)
+        for interface, update in zip(interfaces, updates):
+            self.assertEqual([update["ip"]], self.get_leased_ips(interface))
+
+    def test_creates_unknown_interfaces(self):
+        subnet = self.make_subnet()
+        updates = [self.make_update(subnet) for _ in range(2)]
+        update_leases(updates)
+        for update in updates:
+            interface = UnknownInterface.objects.get(mac_address=update["mac"])
+            self.assertEqual([update["ip"]], self.get_leased_ips(interface))
+
+    def test_processes_updates_in_order(self):
+        subnet = self.make_subnet()
+        interface = factory.make_Node_with_Interface_on_Subnet(
+            subnet=subnet
+        ).get_boot_interface()
+        dynamic_range = subnet.get_dynamic_ranges()[0]
+        first = self.make_update(subnet, mac=interface.mac_address)
+        second = self.make_update(
+            subnet,
+            mac=interface.mac_address,
+            ip=factory.pick_ip_in_IPRange(
+                dynamic_range, but_not=[first["ip"]]
+            ),
+        )
+        release = self.make_update(
+            subnet,
+            action="release",
+            mac=interface.mac_address,
+            ip=second["ip"],
+        )
+        update_leases([first, second, release])
+        self.assertEqual([], self.get_leased_ips(interface))
+        self.assertFalse(
+            StaticIPAddress.objects.filter(
+                ip__in=[first["ip"], second["ip"]]
+            ).exists()
+        )
+
+    def test_address_released_by_one_mac_and_leased_by_another(self):
+        subnet = self.make_subnet()
+        node1 = factory.make_Node_with_Interface_on_Subnet(subnet=subnet)
+        interface1 = node1.get_boot_interface()
+        node2 = factory.make_Node_with_Interface_on_Subnet(subnet=subnet)
+        interface2 = node2.get_boot_interface()
+        commit = self.make_update(subnet, mac=interface1.mac_address)
+        update_lease(**commit)
+        update_leases(
+            [
+                self.make_update(
+                    subnet,
+                    action="release",
+                    mac=interface1.mac_address,
+                    ip=commit["ip"],
+                ),
+                self.make_update(
+                    subnet, mac=interface2.mac_address, ip=commit["ip"]
+                ),
+            ]
+        )
+        self.assertEqual([], self.get_leased_ips(interface1))
+        self.assertEqual([commit["ip"]], self.get_leased_ips(interface2))
+
+    def test_skips_updates_that_cannot_be_processed(self):
+        subnet = self.make_subnet()
+        bad_action = self.make_update(subnet)
+        bad_action["action"] = factory.make_name("action")
+        no_subnet = self.make_update(subnet, ip=factory.make_ipv6_address())
+        no_subnet["ip_family"] = "ipv6"
+        good = self.make_update(subnet)
+        update_leases([bad_action, no_subnet, good])
+        self.assertFalse(
+            UnknownInterface.objects.filter(
+                mac_address__in=[bad_action["mac"], no_subnet["mac"]]
+            ).exists()
+        )
+        interface = UnknownInterface.objects.get(mac_address=good["mac"])
+        self.assertEqual([good["ip"]], self.get_leased_ips(interface))
+
+    def test_rolls_back_and_skips_updates_that_fail(self):
+        subnet = self.make_subnet()
+        failing = self.make_update(subnet)
+        good = self.make_update(subnet)
+        original_update_lease = leases_module._update_lease
+
+        def _update_lease(lookup, **update):
+            original_update_lease(lookup, **update)
+            if update["mac"] == failing["mac"]:
+                raise factory.make_exception()
+
+        self.patch(leases_module, "_update_lease").side_effect = _update_lease
+        update_leases([failing, good])
+        self.assertFalse(
+            UnknownInterface.objects.filter(
+                mac_address=failing["mac"]
+            ).exists()
+        )
+        interface = UnknownInterface.objects.get(mac_address=good["mac"])
+        self.assertEqual([good["ip"]], self.get_leased_ips(interface))
+
+    def test_does_not_skip_retryable_failures(self):
+        subnet = self.make_subnet()
+        self.patch(
+            leases_module, "_update_lease"
+        ).side_effect = make_serialization_failure()
+        self.assertRaises(
+            OperationalError, update_leases, [self.make_update(subnet)]
+        )
+
+    def test_matches_mac_addresses_without_leading_zeros(self):
+        subnet = self.make_subnet()
+        interface = factory.make_Node_with_Interface_on_Subnet(
+            subnet=subnet
+        ).get_boot_interface()
+        # The DHCP server reports MAC addresses without leading zeros.
+        interface.mac_address = "00:16:3e:0a:0b:0c"
+        interface.save()
+        update = self.make_update(subnet, mac="0:16:3e:a:b:c")
+        update_leases([update])
+        self.assertEqual([update["ip"]], self.get_leased_ips(interface))
+        self.assertFalse(UnknownInterface.objects.exists())
+
+    def test_uses_fewer_queries_than_one_by_one(self):
+        subnet = self.make_subnet()
+        interfaces = [
+            factory.make_Node_with_Interface_on_Subnet(
+                subnet=subnet
+            ).get_boot_interface()
+            for _ in range(5)
+        ]
+        updates = [
+            self.make_update(
+                subnet, action="release", mac=interface.mac_address
+            )
+            for interface in interfaces
+        ]
+        batch_queries, _ = count_queries(update_leases, updates)
+        single_queries, _ = count_queries(update_lease, **updates[0])
+        self.assertLess(batch_queries, single_queries * len(updates))
@@ -36,6 +36,7 @@ from maasserver.rpc.nodes import (
     mark_node_failed,
     request_node_info_by_mac_address,
     update_node_power_state,
+    update_node_power_states,
 )
 from maasserver.rpc.testing.fixtures import MockLiveRegionToClusterRPCFixture
 from maasserver.testing.architecture import make_usable_architecture
@@ -476,6 +477,62 @@ class TestListClusterNodesPowerParameters(MAASServerTestCase):
             [node.system_id for node in nodes_in_order], system_ids
         )
 
+    def test_returns_due_nodes_sharing_a_bmc_together(self):
+        rack = factory.make_RackController(power_type="")
+        node = self.make_Node(
+            bmc_connected_to=rack,
+            power_state_queried=now() - timedelta(minutes=30),
+        )
+        self.make_Node(
+            bmc_connected_to=rack,
+            power_state_queried=now() - timedelta(minutes=20),
+        )
+        node_in_chassis = self.make_Node(
+            bmc_connected_to=rack,
+            power_state_queried=now() - timedelta(minutes=10),
+        )
+        node_in_chassis.bmc = node.bmc
+        node_in_chassis.save()
+
+        power_parameters = list_cluster_nodes_power_parameters(
+            rack.system_id, limit=1
+        )
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        self.assertEqual(
+            [node.system_id, node_in_chassis.system_id], system_ids
+        )
+
+    def test_limits_due_nodes_added_for_a_shared_bmc(self):
+        rack = factory.make_RackController(power_type="")
+        node = self.make_Node(
+            bmc_connected_to=rack,
+            power_state_queried=now() - timedelta(minutes=30),
+        )
+        nodes_in_chassis = []
+        for minutes in range(20, 10, -2):
+            node_in_chassis = self.make_Node(
+                bmc_connected_to=rack,
+                power_state_queried=now() - timedelta(minutes=minutes),
+            )
+            node_in_chassis.bmc = node.bmc
+            node_in_chassis.save()
+            nodes_in_chassis.append(node_in_chassis)
+
+        power_parameters = list_cluster_nodes_power_parameters(
+            rack.system_id, limit=2
+        )
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        # The two nodes due first, then at most two more behind the chassis.
+        self.assertEqual(
+            [node.system_id]
+            + [
+                chassis_node.system_id for chassis_node in nodes_in_chassis[:3]
+            ],
+            system_ids,
+        )
+
     def test_returns_at_most_60kiB_of_JSON(self):
         # Configure the rack controller subnet to be very large so it
         # can hold that many BMC connected to the interface for the rack
@@ -514,6 +571,42 @@ class TestListClusterNodesPowerParameters(MAASServerTestCase):
         expected_minimum = 50 * (2 ** 10)  # 50kiB
         self.expectThat(nodes_json_length, GreaterThan(expected_minimum - 1))
 
+    def test_returns_more_than_64kiB_of_JSON_when_streaming(self):
+        # Configure the rack controller subnet to be very large so it
+        # can hold that many BMC connected to the interface for the rack
+        # controller.
+        rack = factory.make_RackController(power_type="")
+        rack_interface = rack.get_boot_interface()
+        subnet = factory.make_Subnet(
+            cidr=str(factory.make_ipv6_network(slash=8))
+        )
+        factory.make_StaticIPAddress(
+            ip=factory.pick_ip_in_Subnet(subnet),
+            subnet=subnet,
+            interface=rack_interface,
+        )
+
+        # Ensure that there are at least 64kiB of power parameters (when
+        # converted to JSON) in the database.
+        example_parameters = {"key%d" % i: "value%d" % i for i in range(250)}
+        remaining = 2 ** 16
+        while remaining > 0:
+            node = self.make_Node(
+                bmc_connected_to=rack, power_parameters=example_parameters
+            )
+            remaining -= len(json.dumps(node.get_effective_power_parameters()))
+
+        nodes = list_cluster_nodes_power_parameters(
+            rack.system_id, limit=None, streaming=True
+        )  # Remove numeric limit.
+
+        # All of the power parameters are returned, even though they're
+        # more than fits into a single AMP value; they're streamed instead.
+        nodes_json = map(json.dumps, nodes)
+        nodes_json_lengths = map(len, nodes_json)
+        nodes_json_length = sum(nodes_json_lengths)
+        self.assertThat(nodes_json_length, GreaterThan(2 ** 16))
+
     def test_limited_to_10_nodes_at_a_time_by_default(self):
         # Configure the rack controller subnet to be large enough.
         rack = factory.make_RackController(power_type="")
@@ -536,6 +629,96 @@ class TestListClusterNodesPowerParameters(MAASServerTestCase):
             list_cluster_nodes_power_parameters(rack.system_id), HasLength(10)
         )
 
+    def make_queried_Node(self, rack, queried, changed=None, **kwargs):
+        node = self.make_Node(
+            bmc_connected_to=rack,
+            power_state=POWER_STATE.ON,
+            power_state_queried=now() - queried,
+            **kwargs
+        )
+        if changed is not None:
+            node.power_state_changed = now() - changed
+            node.save()
+        return node
+
+    def test_includes_nodes_in_unstable_status_checked_a_minute_ago(self):
+        rack = factory.make_RackController(power_type="")
+        node = self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=2),
+            changed=timedelta(hours=2),
+            status=NODE_STATUS.COMMISSIONING,
+        )
+        self.make_queried_Node(
+            rack, queried=timedelta(minutes=2), status=NODE_STATUS.READY
+        )
+
+        power_parameters = list_cluster_nodes_power_parameters(rack.system_id)
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        self.assertItemsEqual([node.system_id], system_ids)
+
+    def test_includes_recently_changed_nodes_checked_a_minute_ago(self):
+        rack = factory.make_RackController(power_type="")
+        node = self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=2),
+            changed=timedelta(minutes=5),
+            status=NODE_STATUS.READY,
+        )
+
+        power_parameters = list_cluster_nodes_power_parameters(rack.system_id)
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        self.assertItemsEqual([node.system_id], system_ids)
+
+    def test_includes_nodes_in_unknown_power_state_checked_a_minute_ago(self):
+        rack = factory.make_RackController(power_type="")
+        node = self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=2),
+            changed=timedelta(hours=2),
+            status=NODE_STATUS.READY,
+        )
+        node.power_state = POWER_STATE.UNKNOWN
+        node.save()
+
+        power_parameters = list_cluster_nodes_power_parameters(rack.system_id)
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        self.assertItemsEqual([node.system_id], system_ids)
+
+    def test_checks_stable_nodes_less_often(self):
+        rack = factory.make_RackController(power_type="")
+        # Unchanged for two hours, so only checked every 15 minutes.
+        self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=10),
+            changed=timedelta(hours=2),
+            status=NODE_STATUS.READY,
+        )
+        node_stable_due = self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=20),
+            changed=timedelta(hours=2),
+            status=NODE_STATUS.READY,
+        )
+        # Changed half an hour ago, so checked every 5 minutes.
+        node_default_due = self.make_queried_Node(
+            rack,
+            queried=timedelta(minutes=10),
+            changed=timedelta(minutes=30),
+            status=NODE_STATUS.READY,
+        )
+
+        power_parameters = list_cluster_nodes_power_parameters(rack.system_id)
+        system_ids = [params["system_id"] for params in power_parameters]
+
+        self.assertItemsEqual(
+            [node_stable_due.system_id, node_default_due.system_id],
+            system_ids,
+        )
+
 
 class TestUpdateNodePowerState(MAASServerTestCase):
     def test_raises_NoSuchNode_if_node_doesnt_exist(self):
@@ -552,6 +735,36 @@ class TestUpdateNodePowerState(MAASServerTestCase):
         self.assertEqual(reload_object(node).power_state, POWER_STATE.ON)
 
 
+class TestUpdateNodePowerStates(MAASServerTestCase):
+    def test_updates_nodes_power_states(self):
+        nodes = [
+            factory.make_Node(power_state=POWER_STATE.OFF) for _ in range(3)
+        ]
+        update_node_power_states(
+            [
+                {"system_id": node.system_id, "power_state": POWER_STATE.ON}
+                for node in nodes
+            ]
+        )
+        self.assertEqual(
+            [POWER_STATE.ON] * len(nodes),
+            [reload_object(node).power_state for node in nodes],
+        )
+
+    def test_ignores_nodes_that_do_not_exist(self):
+        node = factory.make_Node(power_state=POWER_STATE.OFF)
+        update_node_power_states(
+            [
+                {
+                    "system_id": factory.make_name("system_id"),
+                    "power_state": POWER_STATE.ON,
+                },
+                {"system_id": node.system_id, "power_state": POWER_STATE.ON},
+            ]
+        )
+        self.assertEqual(reload_object(node).power_state, POWER_STATE.ON)
+
+
 class TestGetControllerType(MAASServerTestCase):
     """Tests for `get_controller_type`."""
 
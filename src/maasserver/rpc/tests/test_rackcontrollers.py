@@ -29,6 +29,7 @@ from maasserver.models.interface import PhysicalInterface
 from maasserver.models.timestampedmodel import now
 from maasserver.rpc import rackcontrollers
 from maasserver.rpc.rackcontrollers import (
+    get_boot_image_peers,
     handle_upgrade,
     register,
     report_neighbours,
@@ -41,6 +42,7 @@ from maasserver.testing.testcase import MAASServerTestCase
 from maasserver.utils.orm import reload_object
 from maastesting.matchers import DocTestMatches, MockCalledOnceWith
 from metadataserver.builtin_scripts import load_builtin_scripts
+from provisioningserver.rpc.exceptions import NoSuchNode
 
 
 class TestHandleUpgrade(MAASServerTestCase):
@@ -544,3 +546,37 @@ class TestUpdateLastImageSync(MAASServerTestCase):
         update_last_image_sync(rack.system_id)
 
         self.assertNotEqual(previous_sync, reload_object(rack).last_image_sync)
+
+
+class TestGetBootImagePeers(MAASServerTestCase):
+    def make_rack_with_address(self, subnet=None, last_image_sync=None):
+        rack = factory.make_RackController()
+        rack.last_image_sync = last_image_sync
+        rack.save()
+        address = factory.make_StaticIPAddress(
+            interface=factory.make_Interface(node=rack), subnet=subnet
+        )
+        return rack, address
+
+    def test_returns_addresses_of_synced_racks(self):
+        rack, address = self.make_rack_with_address()
+        _, peer1_address = self.make_rack_with_address(
+            subnet=address.subnet, last_image_sync=now()
+        )
+        _, peer2_address = self.make_rack_with_address(
+            subnet=address.subnet, last_image_sync=now()
+        )
+        self.assertEqual(
+            {"peers": sorted([peer1_address.ip, peer2_address.ip])},
+            get_boot_image_peers(rack.system_id),
+        )
+
+    def test_excludes_racks_that_never_synced(self):
+        rack, address = self.make_rack_with_address(last_image_sync=now())
+        self.make_rack_with_address(subnet=address.subnet)
+        self.assertEqual({"peers": []}, get_boot_image_peers(rack.system_id))
+
+    def test_raises_NoSuchNode_for_unknown_rack(self):
+        self.assertRaises(
+            NoSuchNode, get_boot_image_peers, factory.make_name("system_id")
+        )
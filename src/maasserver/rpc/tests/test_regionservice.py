@@ -61,7 +61,12 @@ from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASTransactionServerTestCase
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch, Provides
+from maastesting.matchers import (
+    IsUnfiredDeferred,
+    MockCalledOnceWith,
+    MockCallsMatch,
+    Provides,
+)
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import (
     always_fail_with,
@@ -218,6 +223,13 @@ class TestRegionServer(MAASTransactionServerTestCase):
         # Nothing was logged.
         self.assertEqual("", logger.output)
 
+    def test_remoteAuthenticated_waits_for_authentication(self):
+        server = RegionServer()
+        wait_for_authenticated = server.remoteAuthenticated()
+        self.assertThat(wait_for_authenticated, IsUnfiredDeferred())
+        server.authenticated.set(True)
+        self.assertIs(True, extract_result(wait_for_authenticated))
+
     def make_handshaking_server(self):
         service = RegionService(sentinel.ipcWorker)
         service.running = True  # Pretend it's running.
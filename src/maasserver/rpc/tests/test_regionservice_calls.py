@@ -15,6 +15,7 @@ import random
 from random import randint
 import time
 from unittest import skip
+from unittest.mock import call
 from urllib.parse import urlparse
 
 from crochet import wait_for
@@ -36,6 +37,7 @@ from maasserver.rpc import events as events_module
 from maasserver.rpc import leases as leases_module
 from maasserver.rpc import regionservice
 from maasserver.rpc.nodes import get_controller_type, get_time_configuration
+from maasserver.rpc.rackcontrollers import get_boot_image_peers
 from maasserver.rpc.regionservice import Region
 from maasserver.rpc.services import update_services
 from maasserver.security import get_shared_secret
@@ -50,6 +52,7 @@ from maastesting.matchers import (
     MockCalledOnce,
     MockCalledOnceWith,
     MockCalledWith,
+    MockCallsMatch,
 )
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import TwistedLoggerFixture
@@ -60,6 +63,7 @@ from provisioningserver.rpc.region import (
     CreateNode,
     GetArchiveMirrors,
     GetBootConfig,
+    GetBootImagePeers,
     GetBootSources,
     GetBootSourcesV2,
     GetControllerType,
@@ -79,9 +83,12 @@ from provisioningserver.rpc.region import (
     RequestRackRefresh,
     SendEvent,
     SendEventMACAddress,
+    SendIPAddressEvents,
     UpdateInterfaces,
     UpdateLease,
+    UpdateLeases,
     UpdateNodePowerState,
+    UpdateNodePowerStates,
     UpdateServices,
 )
 from provisioningserver.rpc.testing import (
@@ -278,6 +285,76 @@ class TestRegionProtocol_UpdateLease(MAASTransactionServerTestCase):
         # works as expected.
 
 
+class TestRegionProtocol_UpdateLeases(MAASTransactionServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.useFixture(RegionEventLoopFixture("database-tasks"))
+
+    def test_update_leases_is_registered(self):
+        protocol = Region()
+        responder = protocol.locateResponder(UpdateLeases.commandName)
+        self.assertIsNotNone(responder)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_passes_updates_to_update_leases(self):
+        update_leases = self.patch(leases_module, "update_leases")
+        update_leases.return_value = {}
+        updates = [
+            {
+                "action": "commit",
+                "mac": factory.make_mac_address(),
+                "ip_family": "ipv4",
+                "ip": factory.make_ipv4_address(),
+                "timestamp": int(time.time()),
+                "lease_time": 30,
+                "hostname": factory.make_name("host"),
+            },
+            {
+                "action": "expiry",
+                "mac": factory.make_mac_address(),
+                "ip_family": "ipv4",
+                "ip": factory.make_ipv4_address(),
+                "timestamp": int(time.time()),
+            },
+        ]
+
+        yield eventloop.start()
+        try:
+            yield call_responder(
+                Region(),
+                UpdateLeases,
+                {
+                    "cluster_uuid": factory.make_name("uuid"),
+                    "updates": updates,
+                },
+            )
+        finally:
+            yield eventloop.reset()
+
+        self.assertThat(update_leases, MockCalledOnceWith(updates))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_doesnt_raises_other_errors(self):
+        self.patch(
+            leases_module, "update_leases"
+        ).side_effect = factory.make_exception()
+
+        yield eventloop.start()
+        try:
+            yield call_responder(
+                Region(),
+                UpdateLeases,
+                {"cluster_uuid": factory.make_name("uuid"), "updates": []},
+            )
+        finally:
+            yield eventloop.reset()
+
+        # Test is that no exceptions are raised. If this test passes then all
+        # works as expected.
+
+
 class TestRegionProtocol_GetBootConfig(MAASTransactionServerTestCase):
     def test_get_boot_config_is_registered(self):
         protocol = Region()
@@ -593,6 +670,29 @@ class TestRegionProtocol_ListNodePowerParameters(
         self.maxDiff = None
         self.assertItemsEqual(nodes, response["nodes"])
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_passes_on_whether_the_rack_can_fetch_streams(self):
+        list_cluster_nodes_power_parameters = self.patch(
+            regionservice.nodes, "list_cluster_nodes_power_parameters"
+        )
+        list_cluster_nodes_power_parameters.return_value = []
+        uuid = factory.make_UUID()
+
+        yield call_responder(Region(), ListNodePowerParameters, {"uuid": uuid})
+        yield call_responder(
+            Region(),
+            ListNodePowerParameters,
+            {"uuid": uuid, "streaming": True},
+        )
+
+        self.assertThat(
+            list_cluster_nodes_power_parameters,
+            MockCallsMatch(
+                call(uuid, streaming=False), call(uuid, streaming=True)
+            ),
+        )
+
     @wait_for_reactor
     def test_raises_exception_if_nodegroup_doesnt_exist(self):
         uuid = factory.make_UUID()
@@ -656,6 +756,68 @@ class TestRegionProtocol_UpdateNodePowerState(MAASTransactionServerTestCase):
         return d.addErrback(check)
 
 
+class TestRegionProtocol_UpdateNodePowerStates(MAASTransactionServerTestCase):
+    @transactional
+    def create_node(self, power_state):
+        node = factory.make_Node(power_state=power_state)
+        return node
+
+    @transactional
+    def get_node_power_state(self, system_id):
+        node = Node.objects.get(system_id=system_id)
+        return node.power_state
+
+    def test_is_registered(self):
+        protocol = Region()
+        responder = protocol.locateResponder(UpdateNodePowerStates.commandName)
+        self.assertIsNotNone(responder)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_changes_power_states(self):
+        power_state = factory.pick_enum(POWER_STATE)
+        nodes = []
+        for _ in range(3):
+            node = yield deferToDatabase(self.create_node, power_state)
+            nodes.append(node)
+
+        new_state = factory.pick_enum(POWER_STATE, but_not=power_state)
+        yield call_responder(
+            Region(),
+            UpdateNodePowerStates,
+            {
+                "power_states": [
+                    {"system_id": node.system_id, "power_state": new_state}
+                    for node in nodes
+                ]
+            },
+        )
+
+        for node in nodes:
+            db_state = yield deferToDatabase(
+                self.get_node_power_state, node.system_id
+            )
+            self.assertEqual(new_state, db_state)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_ignores_nodes_that_cannot_be_found(self):
+        power_state = factory.pick_enum(POWER_STATE)
+        response = yield call_responder(
+            Region(),
+            UpdateNodePowerStates,
+            {
+                "power_states": [
+                    {
+                        "system_id": factory.make_name("unknown-system-id"),
+                        "power_state": power_state,
+                    }
+                ]
+            },
+        )
+        self.assertEqual({}, response)
+
+
 class TestRegionProtocol_RegisterEventType(MAASTransactionServerTestCase):
     def test_register_event_type_is_registered(self):
         protocol = Region()
@@ -1048,6 +1210,44 @@ class TestRegionProtocol_SendEventMACAddress(MAASTransactionServerTestCase):
         )
 
 
+class TestRegionProtocol_SendIPAddressEvents(MAASTransactionServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.useFixture(RegionEventLoopFixture("database-tasks"))
+
+    def test_send_ip_address_events_is_registered(self):
+        protocol = Region()
+        responder = protocol.locateResponder(SendIPAddressEvents.commandName)
+        self.assertIsNotNone(responder)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_passes_events_to_send_ip_address_events(self):
+        send_ip_address_events = self.patch(
+            regionservice, "send_ip_address_events"
+        )
+        events = [
+            {
+                "ip_address": factory.make_ip_address(),
+                "type_name": factory.make_name("type_name"),
+                "description": factory.make_name("description"),
+                "timestamp": time.time(),
+            }
+            for _ in range(3)
+        ]
+
+        yield eventloop.start()
+        try:
+            response = yield call_responder(
+                Region(), SendIPAddressEvents, {"events": events}
+            )
+        finally:
+            yield eventloop.reset()
+
+        self.assertEqual({}, response)
+        self.assertThat(send_ip_address_events, MockCalledOnceWith(events))
+
+
 class TestRegionProtocol_UpdateServices(MAASTransactionServerTestCase):
     def setUp(self):
         super().setUp()
@@ -1405,6 +1605,37 @@ class TestRegionProtocol_GetTimeConfiguration(MAASTransactionServerTestCase):
         return assert_fails_with(d, NoSuchNode)
 
 
+class TestRegionProtocol_GetBootImagePeers(MAASTransactionServerTestCase):
+    def test_get_boot_image_peers_is_registered(self):
+        protocol = Region()
+        responder = protocol.locateResponder(GetBootImagePeers.commandName)
+        self.assertIsNotNone(responder)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_calls_get_boot_image_peers(self):
+        example_response = {
+            "peers": [factory.make_ipv4_address(), factory.make_ipv6_address()]
+        }
+        deferToDatabase = self.patch(regionservice, "deferToDatabase")
+        deferToDatabase.return_value = succeed(example_response)
+        system_id = factory.make_name("id")
+        response = yield call_responder(
+            Region(), GetBootImagePeers, {"system_id": system_id}
+        )
+        self.assertThat(response, Equals(example_response))
+        self.assertThat(
+            deferToDatabase,
+            MockCalledOnceWith(get_boot_image_peers, system_id),
+        )
+
+    @wait_for_reactor
+    def test_raises_NoSuchNode_when_node_does_not_exist(self):
+        arguments = {"system_id": factory.make_name("id")}
+        d = call_responder(Region(), GetBootImagePeers, arguments)
+        return assert_fails_with(d, NoSuchNode)
+
+
 class TestRegionProtocol_GetDNSConfiguration(MAASTransactionServerTestCase):
     def test_get_dns_configuration_is_registered(self):
         protocol = Region()
@@ -7,17 +7,23 @@ __all__ = [
     "get_subnets_utilisation_stats",
     "StatsService",
     "STATS_SERVICE_PERIOD",
+    "SubnetsUtilisationStatsCache",
 ]
 
 import base64
-from collections import Counter, defaultdict
+from bisect import bisect_right
+from collections import Counter, defaultdict, namedtuple
+from contextlib import closing
 from datetime import timedelta
 import json
 
+from django.db import connection
 from django.db.models import Count, Sum, Value
 from django.db.models.functions import Coalesce
+from netaddr import IPAddress, IPNetwork
 import requests
 from twisted.application.internet import TimerService
+from twisted.internet import reactor
 
 from maasserver.enum import (
     BMC_TYPE,
@@ -30,11 +36,13 @@ from maasserver.models import (
     BMC,
     Config,
     Fabric,
+    IPRange,
     Machine,
     Node,
     Pod,
     Space,
     StaticIPAddress,
+    StaticRoute,
     Subnet,
     VLAN,
 )
@@ -42,7 +50,6 @@ from maasserver.utils import get_maas_user_agent
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from provisioningserver.logger import LegacyLogger
-from provisioningserver.utils.network import IPRangeStatistics
 
 log = LegacyLogger()
 
@@ -145,48 +152,271 @@ def get_subnets_stats():
     }
 
 
+# Runs of consecutive allocated addresses within their subnet, by subnet.
+# Numbering the distinct addresses of a subnet in order and subtracting the
+# number from the address gives the same value for every address in a run.
+SUBNETS_ALLOCATED_RUNS_QUERY = """
+SELECT subnet_id, host(min(ip)), host(max(ip))
+FROM (
+    SELECT
+        subnet_id,
+        ip,
+        ip - (
+            row_number() OVER (PARTITION BY subnet_id ORDER BY ip) - 1
+        ) AS run
+    FROM (
+        SELECT DISTINCT staticip.subnet_id, staticip.ip
+        FROM maasserver_staticipaddress AS staticip
+        JOIN maasserver_subnet AS subnet
+          ON subnet.id = staticip.subnet_id
+        WHERE staticip.ip IS NOT NULL AND staticip.ip <<= subnet.cidr
+    ) AS addresses
+) AS runs
+GROUP BY subnet_id, run
+ORDER BY subnet_id, min(ip)
+"""
+
+# How long the subnet utilisation statistics are cached.
+SUBNETS_UTILISATION_STATS_CACHE_TTL = 300
+
+
+class SubnetsUtilisationStatsCache:
+    """Cache of the subnet utilisation statistics.
+
+    The statistics are only cached while `SubnetStatsCacheService` drops
+    them whenever a subnet, IP range, static route or IP address changes.
+    Anything missed is picked up once they expire after `ttl` seconds.
+    """
+
+    def __init__(self, clock=reactor, ttl=SUBNETS_UTILISATION_STATS_CACHE_TTL):
+        super().__init__()
+        self.clock = clock
+        self.ttl = ttl
+        self.enabled = False
+        # (expires, stats), or None.
+        self.entry = None
+        # Bumped on every invalidation, so that statistics computed before
+        # it are not cached.
+        self.generation = 0
+
+    def enable(self):
+        """Start using the cache."""
+        self.enabled = True
+        self.invalidate()
+
+    def disable(self):
+        """Stop using the cache, as it is no longer kept up to date."""
+        self.enabled = False
+        self.invalidate()
+
+    def get(self, compute):
+        """Return the cached statistics, or those returned by `compute`."""
+        if not self.enabled:
+            return compute()
+        now = self.clock.seconds()
+        entry = self.entry
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        generation = self.generation
+        stats = compute()
+        if self.enabled and generation == self.generation:
+            self.entry = (now + self.ttl, stats)
+        return stats
+
+    def invalidate(self):
+        """Forget the cached statistics."""
+        self.generation += 1
+        self.entry = None
+
+
+subnets_utilisation_stats_cache = SubnetsUtilisationStatsCache()
+
+
 def get_subnets_utilisation_stats():
     """Return a dict mapping subnet CIDRs to their utilisation details."""
+    return subnets_utilisation_stats_cache.get(_get_subnets_utilisation_stats)
+
+
+def _get_subnets_utilisation_stats():
+    """Work out the utilisation of all subnets.
+
+    This gives the same results as working out the usage of every subnet
+    with `Subnet.get_iprange_usage`, but with a few queries for all subnets
+    rather than several for each one, and with plain integer ranges rather
+    than a `MAASIPRange` for every allocated address.
+    """
     ips_count = _get_subnets_ipaddress_count()
+    ipranges = defaultdict(list)
+    for (
+        subnet_id,
+        start_ip,
+        end_ip,
+        iprange_type,
+    ) in IPRange.objects.values_list(
+        "subnet_id", "start_ip", "end_ip", "type"
+    ):
+        ipranges[subnet_id].append(
+            (
+                IPAddress(start_ip).value,
+                IPAddress(end_ip).value,
+                iprange_type,
+            )
+        )
+    route_gateways = defaultdict(list)
+    for source_id, gateway_ip in StaticRoute.objects.values_list(
+        "source_id", "gateway_ip"
+    ):
+        route_gateways[source_id].append(gateway_ip)
+    allocated_runs = defaultdict(list)
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(SUBNETS_ALLOCATED_RUNS_QUERY)
+        for subnet_id, first_ip, last_ip in cursor.fetchall():
+            allocated_runs[subnet_id].append(
+                (IPAddress(first_ip).value, IPAddress(last_ip).value)
+            )
 
     stats = {}
-    for subnet in Subnet.objects.all():
-        full_range = subnet.get_iprange_usage()
-        range_stats = IPRangeStatistics(subnet.get_iprange_usage())
-        static = 0
-        reserved_available = 0
-        reserved_used = 0
-        dynamic_available = 0
-        dynamic_used = 0
-        for rng in full_range.ranges:
-            if IPRANGE_TYPE.DYNAMIC in rng.purpose:
-                dynamic_available += rng.num_addresses
-            elif IPRANGE_TYPE.RESERVED in rng.purpose:
-                reserved_available += rng.num_addresses
-            elif "assigned-ip" in rng.purpose:
-                static += rng.num_addresses
-        # allocated IPs
-        subnet_ips = ips_count[subnet.id]
-        reserved_used += subnet_ips[IPADDRESS_TYPE.USER_RESERVED]
-        reserved_available -= reserved_used
-        dynamic_used += (
+    subnets = Subnet.objects.values_list(
+        "id", "cidr", "gateway_ip", "dns_servers"
+    )
+    for subnet_id, cidr, gateway_ip, dns_servers in subnets:
+        network = IPNetwork(cidr)
+        addresses = list(route_gateways[subnet_id])
+        if gateway_ip and gateway_ip in network:
+            addresses.append(gateway_ip)
+        if dns_servers is not None:
+            addresses.extend(
+                server for server in dns_servers if server in network
+            )
+        usage = _get_subnet_usage(
+            network,
+            ipranges[subnet_id],
+            allocated_runs[subnet_id],
+            {IPAddress(address).value for address in addresses},
+        )
+        subnet_ips = ips_count[subnet_id]
+        reserved_used = subnet_ips[IPADDRESS_TYPE.USER_RESERVED]
+        dynamic_used = (
             subnet_ips[IPADDRESS_TYPE.AUTO]
             + subnet_ips[IPADDRESS_TYPE.DHCP]
             + subnet_ips[IPADDRESS_TYPE.DISCOVERED]
         )
-        dynamic_available -= dynamic_used
-        stats[subnet.cidr] = {
-            "available": range_stats.num_available,
-            "unavailable": range_stats.num_unavailable,
-            "dynamic_available": dynamic_available,
+        stats[cidr] = {
+            "available": usage.available,
+            "unavailable": usage.unavailable,
+            "dynamic_available": usage.dynamic - dynamic_used,
             "dynamic_used": dynamic_used,
-            "static": static,
-            "reserved_available": reserved_available,
+            "static": usage.static,
+            "reserved_available": usage.reserved - reserved_used,
             "reserved_used": reserved_used,
         }
     return stats
 
 
+SubnetUsage = namedtuple(
+    "SubnetUsage",
+    ("available", "unavailable", "dynamic", "reserved", "static"),
+)
+
+
+def _get_subnet_usage(network, ipranges, allocated_runs, addresses):
+    """Work out how the addresses of `network` are used.
+
+    This follows `MAASIPSet.get_full_range`, where ranges that overlap are
+    combined and take all of their purposes, and `IPRangeStatistics`.
+
+    :param network: The `IPNetwork` of the subnet.
+    :param ipranges: (first, last, type) of the IP ranges of the subnet.
+    :param allocated_runs: Sorted (first, last) of runs of consecutive
+        allocated addresses within the subnet.
+    :param addresses: Other addresses in use, such as gateways.
+    :return: A `SubnetUsage`, where `dynamic` and `reserved` are the sizes
+        of the dynamic and reserved ranges, and `static` the number of
+        allocated addresses outside of those.
+    """
+    ranges = list(ipranges)
+    if network.version == 6:
+        # See `Subnet.get_ipranges_in_use`.
+        if network.prefixlen == 64:
+            ranges.append(
+                (
+                    network.first + 1,
+                    network.first + 0xFFFFFFFF,
+                    IPRANGE_TYPE.RESERVED,
+                )
+            )
+        if network.prefixlen < 127:
+            addresses = addresses | {network.first}
+    # Combine the overlapping ranges.
+    combined = []
+    for first, last, iprange_type in sorted(ranges):
+        if combined and first <= combined[-1][1]:
+            previous_first, previous_last, types = combined[-1]
+            combined[-1] = (
+                previous_first,
+                max(last, previous_last),
+                types | {iprange_type},
+            )
+        else:
+            combined.append((first, last, {iprange_type}))
+    firsts = [first for first, _, _ in combined]
+
+    def find(address, ranges, firsts):
+        index = bisect_right(firsts, address) - 1
+        return index >= 0 and address <= ranges[index][1]
+
+    dynamic = reserved = 0
+    for first, last, types in combined:
+        if IPRANGE_TYPE.DYNAMIC in types:
+            dynamic += last - first + 1
+        else:
+            reserved += last - first + 1
+    # Addresses outside of the ranges. An allocated address that is also,
+    # say, a gateway only counts as the latter, as in `MAASIPSet` addresses
+    # are compared by their first and last address only.
+    outside = {
+        address for address in addresses if not find(address, combined, firsts)
+    }
+    run_firsts = [first for first, _ in allocated_runs]
+    static = -sum(
+        1 for address in outside if find(address, allocated_runs, run_firsts)
+    )
+    for first, last in allocated_runs:
+        static += last - first + 1
+        index = max(bisect_right(firsts, first) - 1, 0)
+        for range_first, range_last, _ in combined[index:]:
+            if range_first > last:
+                break
+            overlap = min(last, range_last) - max(first, range_first) + 1
+            if overlap > 0:
+                static -= overlap
+    unavailable = dynamic + reserved + static + len(outside)
+
+    def is_used(address):
+        return (
+            address in addresses
+            or find(address, combined, firsts)
+            or find(address, allocated_runs, run_firsts)
+        )
+
+    # The network address, and the broadcast address of IPv4 networks,
+    # are only available when the network is too small for them; see
+    # `MAASIPSet.get_unused_ranges`.
+    first, last = network.first, network.last
+    small = network.prefixlen >= (31 if network.version == 4 else 127)
+    used_in_range = unavailable
+    if not small:
+        if is_used(first):
+            used_in_range -= 1
+        first += 1
+        if network.version == 4:
+            if is_used(last):
+                used_in_range -= 1
+            last -= 1
+    available = last - first + 1 - used_in_range
+    return SubnetUsage(available, unavailable, dynamic, reserved, static)
+
+
 def _get_subnets_ipaddress_count():
     counts = defaultdict(lambda: defaultdict(int))
     rows = (
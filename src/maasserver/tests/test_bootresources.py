@@ -7,6 +7,7 @@ __all__ = []
 
 from datetime import datetime
 from email.utils import format_datetime
+import hashlib
 import http.client
 from io import BytesIO
 import json
@@ -24,6 +25,7 @@ from crochet import wait_for
 from django.conf import settings
 from django.db import connections, transaction
 from django.http import StreamingHttpResponse
+from django.test.client import RequestFactory
 from django.urls import reverse
 from fixtures import FakeLogger, Fixture
 from testtools.matchers import Contains, ContainsAll, Equals, HasLength, Not
@@ -37,7 +39,9 @@ from maasserver.bootresources import (
     BootResourceStore,
     download_all_boot_resources,
     download_boot_resources,
+    get_requested_range,
     get_simplestream_endpoint,
+    RangeNotSatisfiable,
     set_global_default_releases,
     SimpleStreamsHandler,
 )
@@ -488,6 +492,119 @@ class TestSimpleStreamsHandler(MAASServerTestCase):
         self.assertIsInstance(response, StreamingHttpResponse)
 
 
+class TestGetRequestedRange(MAASTestCase):
+    """Tests for `get_requested_range`."""
+
+    scenarios = (
+        ("no-range", {"header": None, "expected": None}),
+        ("range", {"header": "bytes=2-5", "expected": (2, 5)}),
+        ("open-range", {"header": "bytes=2-", "expected": (2, 9)}),
+        ("suffix-range", {"header": "bytes=-3", "expected": (7, 9)}),
+        ("past-end", {"header": "bytes=5-20", "expected": (5, 9)}),
+        ("long-suffix", {"header": "bytes=-20", "expected": (0, 9)}),
+        ("several-ranges", {"header": "bytes=0-1,4-5", "expected": None}),
+        ("other-unit", {"header": "items=0-1", "expected": None}),
+        ("invalid", {"header": "bytes=a-b", "expected": None}),
+        ("reversed", {"header": "bytes=5-2", "expected": None}),
+    )
+
+    def test_get_requested_range(self):
+        if self.header is None:
+            request = RequestFactory().get("/")
+        else:
+            request = RequestFactory().get("/", HTTP_RANGE=self.header)
+        self.assertEqual(self.expected, get_requested_range(request, 10))
+
+
+class TestGetRequestedRangeNotSatisfiable(MAASTestCase):
+    """Tests for `get_requested_range` with ranges outside the content."""
+
+    scenarios = (
+        ("past-end", {"header": "bytes=10-"}),
+        ("empty-suffix", {"header": "bytes=-0"}),
+    )
+
+    def test_raises_RangeNotSatisfiable(self):
+        request = RequestFactory().get("/", HTTP_RANGE=self.header)
+        self.assertRaises(
+            RangeNotSatisfiable, get_requested_range, request, 10
+        )
+
+
+class TestSimpleStreamsHandlerFilesystemStorage(MAASServerTestCase):
+    """Tests for `SimpleStreamsHandler` serving content stored on the
+    filesystem."""
+
+    def setUp(self):
+        super().setUp()
+        self.useFixture(
+            RegionConfigurationFixture(boot_resources_storage=self.make_dir())
+        )
+
+    def make_file(self, content):
+        os = factory.make_name("os")
+        series = factory.make_name("series")
+        arch = factory.make_name("arch")
+        subarch = factory.make_name("subarch")
+        version = factory.make_name("version")
+        filetype = factory.pick_enum(BOOT_RESOURCE_FILE_TYPE)
+        resource = factory.make_BootResource(
+            rtype=BOOT_RESOURCE_TYPE.SYNCED,
+            name="%s/%s" % (os, series),
+            architecture="%s/%s" % (arch, subarch),
+        )
+        resource_set = factory.make_BootResourceSet(resource, version=version)
+        largefile = LargeFile.objects.create_empty_file(
+            hashlib.sha256(content).hexdigest(), len(content)
+        )
+        largefile.size = largefile.append_content(content)
+        largefile.save()
+        factory.make_BootResourceFile(
+            resource_set, largefile, filename=filetype, filetype=filetype
+        )
+        return reverse(
+            "simplestreams_file_handler",
+            kwargs={
+                "os": os,
+                "arch": arch,
+                "subarch": subarch,
+                "series": series,
+                "version": version,
+                "filename": filetype,
+            },
+        )
+
+    def test_download_returns_content(self):
+        content = factory.make_bytes(size=randint(1024, 2048))
+        response = self.client.get(self.make_file(content))
+        self.assertEqual(http.client.OK, response.status_code)
+        self.assertEqual(str(len(content)), response["Content-Length"])
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertEqual(content, b"".join(response.streaming_content))
+
+    def test_download_returns_requested_range(self):
+        content = factory.make_bytes(size=1024)
+        response = self.client.get(
+            self.make_file(content), HTTP_RANGE="bytes=100-199"
+        )
+        self.assertEqual(http.client.PARTIAL_CONTENT, response.status_code)
+        self.assertEqual("100", response["Content-Length"])
+        self.assertEqual("bytes 100-199/1024", response["Content-Range"])
+        self.assertEqual(
+            content[100:200], b"".join(response.streaming_content)
+        )
+
+    def test_download_returns_416_for_range_past_end(self):
+        content = factory.make_bytes(size=1024)
+        response = self.client.get(
+            self.make_file(content), HTTP_RANGE="bytes=2048-"
+        )
+        self.assertEqual(
+            http.client.REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code
+        )
+        self.assertEqual("bytes */1024", response["Content-Range"])
+
+
 class TestConnectionWrapper(MAASTransactionServerTestCase):
     """Tests the use of StreamingHttpResponse(ConnectionWrapper(stream)).
 
@@ -610,6 +727,17 @@ class TestConnectionWrapper(MAASTransactionServerTestCase):
             AssertConnectionWrapper.connection.connection,
         )
 
+    def test_download_returns_requested_range(self):
+        content, url = self.make_file_for_client()
+        client = MAASSensibleClient()
+        response = client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(http.client.PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(
+            "bytes 10-%d/%d" % (len(content) - 1, len(content)),
+            response["Content-Range"],
+        )
+        self.assertEqual(content[10:], self.read_response(response))
+
 
 def make_product(ftype=None, kflavor=None, subarch=None):
     """Make product dictionary that is just like the one provided
@@ -998,6 +1126,24 @@ class TestBootResourceStore(MAASServerTestCase):
         rfile.largefile = reload_object(rfile.largefile)
         self.assertEqual(rfile.largefile.size, 0)
 
+    def test_write_content_thread_saves_data_on_filesystem(self):
+        self.useFixture(
+            RegionConfigurationFixture(boot_resources_storage=self.make_dir())
+        )
+        store = BootResourceStore()
+        size = int(2.5 * store.read_size)
+        content = factory.make_bytes(size=size)
+        resource = factory.make_BootResource(rtype=BOOT_RESOURCE_TYPE.SYNCED)
+        resource_set = factory.make_BootResourceSet(resource)
+        largefile = LargeFile.objects.create_empty_file(
+            hashlib.sha256(content).hexdigest(), size
+        )
+        rfile = factory.make_BootResourceFile(resource_set, largefile)
+        store.write_content_thread(rfile.id, BytesIO(content))
+        largefile = reload_object(largefile)
+        self.assertEqual(size, largefile.size)
+        self.assertTrue(largefile.valid)
+
     @skip(
         "XXX blake_r: Skipped because it causes the test that runs after this "
         "to fail. Because this test is not isolated and places a task in the "
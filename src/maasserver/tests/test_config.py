@@ -114,6 +114,21 @@ class TestRegionConfigurationDatabaseOptions(MAASTestCase):
         self.assertEqual({self.option: expected_value}, config.store)
 
 
+class TestRegionConfigurationBootResourceOptions(MAASTestCase):
+    """Tests for the boot resource options in `RegionConfiguration`."""
+
+    def test_default(self):
+        config = RegionConfiguration({})
+        self.assertEqual("", config.boot_resources_storage)
+
+    def test_set_and_get(self):
+        config = RegionConfiguration({})
+        path = factory.make_name("/storage")
+        config.boot_resources_storage = path
+        self.assertEqual(path, config.boot_resources_storage)
+        self.assertEqual({"boot_resources_storage": path}, config.store)
+
+
 class TestRegionConfigurationWorkerOptions(MAASTestCase):
     """Tests for the worker options in `RegionConfiguration`."""
 
@@ -54,12 +54,15 @@ from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from maastesting.djangotestcase import count_queries
 from maastesting.matchers import MockCalledOnceWith, MockNotCalled
+from maastesting.testcase import MAASTestCase
 from maastesting.twisted import always_fail_with, always_succeed_with
 from provisioningserver.rpc.cluster import (
     ConfigureDHCPv4,
     ConfigureDHCPv4_V2,
     ConfigureDHCPv6,
     ConfigureDHCPv6_V2,
+    UpdateDHCPv4Hosts,
+    UpdateDHCPv6Hosts,
     ValidateDHCPv4Config,
     ValidateDHCPv4Config_V2,
     ValidateDHCPv6Config,
@@ -2764,6 +2767,171 @@ class TestConfigureDHCP(MAASTransactionServerTestCase):
         yield deferToDatabase(service_status_updated)
 
 
+class TestGetHostsDelta(MAASTestCase):
+    """Tests for `get_hosts_delta`."""
+
+    def make_host(self):
+        return {
+            "host": factory.make_name("host"),
+            "mac": factory.make_mac_address(),
+            "ip": factory.make_ip_address(),
+            "dhcp_snippets": [],
+        }
+
+    def test_returns_changed_hosts_and_removed_macs(self):
+        unchanged, modified, removed = [self.make_host() for _ in range(3)]
+        added = self.make_host()
+        new_modified = dict(modified, ip=factory.make_ip_address())
+        self.assertEqual(
+            ([new_modified, added], [removed["mac"]]),
+            dhcp.get_hosts_delta(
+                [unchanged, modified, removed],
+                [unchanged, new_modified, added],
+            ),
+        )
+
+    def test_returns_nothing_when_unchanged(self):
+        hosts = [self.make_host() for _ in range(3)]
+        self.assertEqual(([], []), dhcp.get_hosts_delta(hosts, hosts))
+
+
+class TestGetDHCPHostsForVLANs(MAASServerTestCase):
+    """Tests for `get_dhcp_hosts_for_vlans`."""
+
+    def make_RackController_ready_for_DHCP(self):
+        rack = factory.make_RackController()
+        vlan = factory.make_VLAN(dhcp_on=True, primary_rack=rack)
+        subnet4 = factory.make_Subnet(vlan=vlan, cidr="10.20.30.0/24")
+        subnet6 = factory.make_Subnet(
+            vlan=vlan, cidr="fd38:c341:27da:c831::/64"
+        )
+        interface = factory.make_Interface(
+            INTERFACE_TYPE.PHYSICAL, node=rack, vlan=vlan
+        )
+        for subnet in (subnet4, subnet6):
+            factory.make_StaticIPAddress(
+                alloc_type=IPADDRESS_TYPE.STICKY,
+                subnet=subnet,
+                interface=interface,
+            )
+        return rack, vlan
+
+    def test_returns_same_hosts_as_get_dhcp_configuration(self):
+        rack, vlan = self.make_RackController_ready_for_DHCP()
+        config = dhcp.get_dhcp_configuration(rack)
+        self.assertEqual(
+            (config.omapi_key, config.hosts_by_vlan),
+            dhcp.get_dhcp_hosts_for_vlans(rack, [vlan.id], [vlan.id]),
+        )
+
+    def test_returns_None_when_managed_vlans_changed(self):
+        rack, vlan = self.make_RackController_ready_for_DHCP()
+        other_vlan = factory.make_VLAN()
+        self.assertIsNone(
+            dhcp.get_dhcp_hosts_for_vlans(
+                rack, [vlan.id], [vlan.id, other_vlan.id]
+            )
+        )
+
+
+class TestConfigureDHCPHosts(MAASTransactionServerTestCase):
+    """Tests for `configure_dhcp_hosts`."""
+
+    def setUp(self):
+        super().setUp()
+        self.patch(dhcp.settings, "DHCP_CONNECT", True)
+        self.addCleanup(dhcp._current_hosts.clear)
+
+    @synchronous
+    def prepare_rpc(self, rack_controller):
+        """"Set up test case for speaking RPC to `rack_controller`."""
+        self.useFixture(RegionEventLoopFixture("rpc"))
+        self.useFixture(RunningEventLoopFixture())
+        fixture = self.useFixture(MockLiveRegionToClusterRPCFixture())
+        cluster = fixture.makeCluster(
+            rack_controller, UpdateDHCPv4Hosts, UpdateDHCPv6Hosts
+        )
+        return cluster.UpdateDHCPv4Hosts, cluster.UpdateDHCPv6Hosts
+
+    @transactional
+    def create_rack_controller(self):
+        rack = factory.make_RackController(interface=False)
+        vlan = factory.make_VLAN(dhcp_on=True, primary_rack=rack)
+        interface = factory.make_Interface(
+            INTERFACE_TYPE.PHYSICAL, node=rack, vlan=vlan
+        )
+        subnet = factory.make_ipv4_Subnet_with_IPRanges(vlan=vlan)
+        for _ in range(2):
+            factory.make_StaticIPAddress(
+                alloc_type=IPADDRESS_TYPE.AUTO,
+                subnet=subnet,
+                interface=factory.make_Interface(vlan=vlan),
+            )
+        factory.make_StaticIPAddress(
+            alloc_type=IPADDRESS_TYPE.AUTO, subnet=subnet, interface=interface
+        )
+        return rack, vlan, dhcp.get_dhcp_configuration(rack)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_configures_dhcp_when_not_configured_before(self):
+        rack, vlan, _ = yield deferToDatabase(self.create_rack_controller)
+        configure_dhcp = self.patch(dhcp, "configure_dhcp")
+        configure_dhcp.return_value = defer.succeed(None)
+        yield dhcp.configure_dhcp_hosts(rack, {vlan.id})
+        self.assertThat(configure_dhcp, MockCalledOnceWith(rack))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_only_changed_hosts(self):
+        rack, vlan, config = yield deferToDatabase(self.create_rack_controller)
+        ipv4_stub, ipv6_stub = yield deferToThread(self.prepare_rpc, rack)
+        ipv4_stub.side_effect = always_succeed_with({})
+        ipv6_stub.side_effect = always_succeed_with({})
+        hosts_v4, hosts_v6 = config.hosts_by_vlan[vlan.id]
+        added_host = hosts_v4[-1]
+        removed_host = dict(added_host, mac=factory.make_mac_address())
+        dhcp._current_hosts[rack.system_id] = {
+            vlan.id: (hosts_v4[:-1] + [removed_host], hosts_v6)
+        }
+
+        yield dhcp.configure_dhcp_hosts(rack, {vlan.id})
+
+        self.assertThat(
+            ipv4_stub,
+            MockCalledOnceWith(
+                ANY,
+                omapi_key=config.omapi_key,
+                hosts=[added_host],
+                removed_macs=[removed_host["mac"]],
+            ),
+        )
+        self.assertThat(ipv6_stub, MockNotCalled())
+        self.assertEqual(
+            config.hosts_by_vlan, dhcp._current_hosts[rack.system_id]
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_configures_dhcp_when_update_fails(self):
+        rack, vlan, config = yield deferToDatabase(self.create_rack_controller)
+        ipv4_stub, ipv6_stub = yield deferToThread(self.prepare_rpc, rack)
+        ipv4_stub.side_effect = always_fail_with(
+            CannotConfigureDHCP("not configured")
+        )
+        hosts_v4, hosts_v6 = config.hosts_by_vlan[vlan.id]
+        dhcp._current_hosts[rack.system_id] = {
+            vlan.id: (hosts_v4[:-1], hosts_v6)
+        }
+        configure_dhcp = self.patch(dhcp, "configure_dhcp")
+        configure_dhcp.return_value = defer.succeed(None)
+
+        yield dhcp.configure_dhcp_hosts(rack, {vlan.id})
+
+        self.assertThat(configure_dhcp, MockCalledOnceWith(rack))
+        self.assertNotIn(rack.system_id, dhcp._current_hosts)
+
+
 class TestValidateDHCPConfig(MAASTransactionServerTestCase):
     """Tests for `validate_dhcp_config`."""
 
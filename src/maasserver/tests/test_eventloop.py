@@ -29,7 +29,14 @@ from maasserver import (
 )
 from maasserver.eventloop import DEFAULT_PORT, MAASServices
 from maasserver.prometheus.stats import PrometheusService
-from maasserver.regiondservices import ntp, service_monitor_service, syslog
+from maasserver.regiondservices import (
+    boot_config_cache,
+    free_ip_cache,
+    ntp,
+    service_monitor_service,
+    subnet_stats_cache,
+    syslog,
+)
 from maasserver.rpc import regionservice
 from maasserver.testing.eventloop import RegionEventLoopFixture
 from maasserver.testing.listener import FakePostgresListenerService
@@ -520,6 +527,67 @@ class TestFactories(MAASServerTestCase):
             eventloop.loop.factories["status-worker"]["only_on_master"]
         )
 
+    def test_make_BootConfigCacheService(self):
+        listener = FakePostgresListenerService()
+        service = eventloop.make_BootConfigCacheService(listener)
+        self.assertThat(
+            service, IsInstance(boot_config_cache.BootConfigCacheService)
+        )
+        self.assertIs(listener, service.listener)
+        # It is registered as a factory in RegionEventLoop.
+        self.assertIs(
+            eventloop.make_BootConfigCacheService,
+            eventloop.loop.factories["boot-config-cache"]["factory"],
+        )
+        # Has a dependency of postgres-listener.
+        self.assertEquals(
+            ["postgres-listener-worker"],
+            eventloop.loop.factories["boot-config-cache"]["requires"],
+        )
+        self.assertFalse(
+            eventloop.loop.factories["boot-config-cache"]["only_on_master"]
+        )
+
+    def test_make_FreeIPCacheService(self):
+        listener = FakePostgresListenerService()
+        service = eventloop.make_FreeIPCacheService(listener)
+        self.assertThat(service, IsInstance(free_ip_cache.FreeIPCacheService))
+        self.assertIs(listener, service.listener)
+        # It is registered as a factory in RegionEventLoop.
+        self.assertIs(
+            eventloop.make_FreeIPCacheService,
+            eventloop.loop.factories["free-ip-cache"]["factory"],
+        )
+        # Has a dependency of postgres-listener.
+        self.assertEquals(
+            ["postgres-listener-worker"],
+            eventloop.loop.factories["free-ip-cache"]["requires"],
+        )
+        self.assertFalse(
+            eventloop.loop.factories["free-ip-cache"]["only_on_master"]
+        )
+
+    def test_make_SubnetStatsCacheService(self):
+        listener = FakePostgresListenerService()
+        service = eventloop.make_SubnetStatsCacheService(listener)
+        self.assertThat(
+            service, IsInstance(subnet_stats_cache.SubnetStatsCacheService)
+        )
+        self.assertIs(listener, service.listener)
+        # It is registered as a factory in RegionEventLoop.
+        self.assertIs(
+            eventloop.make_SubnetStatsCacheService,
+            eventloop.loop.factories["subnet-stats-cache"]["factory"],
+        )
+        # Has a dependency of postgres-listener.
+        self.assertEquals(
+            ["postgres-listener-worker"],
+            eventloop.loop.factories["subnet-stats-cache"]["requires"],
+        )
+        self.assertFalse(
+            eventloop.loop.factories["subnet-stats-cache"]["only_on_master"]
+        )
+
     def test_make_NetworkTimeProtocolService(self):
         service = eventloop.make_NetworkTimeProtocolService()
         self.assertThat(
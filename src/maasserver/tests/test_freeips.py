@@ -0,0 +1,179 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the free IP address cache."""
+
+__all__ = []
+
+from unittest.mock import Mock
+
+from netaddr import IPAddress, IPNetwork
+from twisted.internet.task import Clock
+
+from maasserver.freeips import FreeIPCache, IPSpace
+from maastesting.testcase import MAASTestCase
+from provisioningserver.utils.network import MAASIPRange, MAASIPSet
+
+
+class TestIPSpace(MAASTestCase):
+    def test_contains(self):
+        space = IPSpace([(10, 20), (30, 30)])
+        self.assertEqual(
+            [False, True, True, False, True, False],
+            [address in space for address in (9, 10, 20, 21, 30, 31)],
+        )
+        self.assertEqual(12, len(space))
+
+    def test_from_maasipset(self):
+        ipset = MAASIPSet([MAASIPRange("10.0.0.2", "10.0.0.5")])
+        space = IPSpace.from_maasipset(ipset)
+        self.assertEqual(4, len(space))
+        self.assertIn(IPAddress("10.0.0.2").value, space)
+
+    def test_take_uses_smallest_range(self):
+        space = IPSpace([(1, 10), (20, 22), (30, 32)])
+        self.assertEqual([20, 21], space.take(2))
+        self.assertEqual(14, len(space))
+
+    def test_take_spans_ranges(self):
+        space = IPSpace([(1, 10), (20, 21)])
+        self.assertEqual([20, 21, 1], space.take(3))
+        self.assertEqual(9, len(space))
+
+    def test_take_returns_none_when_not_enough(self):
+        space = IPSpace([(1, 2)])
+        self.assertIsNone(space.take(3))
+        self.assertEqual(2, len(space))
+
+    def test_discard_splits_range(self):
+        space = IPSpace([(1, 10)])
+        space.discard(5)
+        self.assertEqual(9, len(space))
+        self.assertNotIn(5, space)
+        self.assertEqual([1, 2, 3, 4, 6], space.take(5))
+
+    def test_discard_ignores_missing_address(self):
+        space = IPSpace([(1, 10)])
+        space.discard(11)
+        self.assertEqual(10, len(space))
+
+    def test_add_merges_ranges(self):
+        space = IPSpace([(1, 4), (6, 10)])
+        space.add(5)
+        self.assertEqual(10, len(space))
+        self.assertEqual([1], space.take(1))
+        self.assertEqual([(9, 2)], space._sizes)
+
+    def test_add_ignores_present_address(self):
+        space = IPSpace([(1, 4)])
+        space.add(2)
+        self.assertEqual(4, len(space))
+
+    def test_copy_is_independent(self):
+        space = IPSpace([(1, 4)])
+        copy = space.copy()
+        copy.discard(2)
+        self.assertEqual((4, 3), (len(space), len(copy)))
+
+
+class TestFreeIPCache(MAASTestCase):
+    def make_subnet(self, free, fixed=(), managed=True):
+        subnet = Mock(id=1, managed=managed)
+        subnet.get_ipnetwork.return_value = IPNetwork("10.0.0.0/24")
+        subnet.get_ipranges_not_in_use.return_value = MAASIPSet(
+            [MAASIPRange(*iprange) for iprange in free]
+        )
+        subnet.get_ipranges_in_use.return_value = MAASIPSet(
+            [MAASIPRange(*iprange) for iprange in fixed]
+        )
+        return subnet
+
+    def make_cache(self):
+        cache = FreeIPCache(clock=Clock())
+        cache.enable()
+        return cache
+
+    def test_take(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        self.assertEqual([IPAddress("10.0.0.2")], cache.take(subnet))
+        self.assertEqual([IPAddress("10.0.0.3")], cache.take(subnet))
+        self.assertIsNone(cache.take(subnet))
+        subnet.get_ipranges_not_in_use.assert_called_once_with(
+            with_neighbours=True
+        )
+
+    def test_take_returns_none_when_disabled(self):
+        cache = FreeIPCache(clock=Clock())
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        self.assertIsNone(cache.take(subnet))
+
+    def test_take_returns_none_for_unmanaged_subnet(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")], managed=False)
+        self.assertIsNone(cache.take(subnet))
+
+    def test_take_leaves_out_excluded_addresses(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.4")])
+        self.assertEqual(
+            [IPAddress("10.0.0.3")],
+            cache.take(subnet, exclude_addresses=["10.0.0.2"]),
+        )
+        # The excluded address is still free.
+        self.assertEqual(
+            [IPAddress("10.0.0.2"), IPAddress("10.0.0.4")],
+            cache.take(subnet, count=2),
+        )
+
+    def test_expires(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.9")])
+        cache.take(subnet)
+        cache.clock.advance(cache.ttl)
+        self.assertEqual([IPAddress("10.0.0.2")], cache.take(subnet))
+
+    def test_mark_used(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        cache.take(subnet, count=0)
+        cache.mark_used(subnet.id, "10.0.0.2")
+        self.assertEqual([IPAddress("10.0.0.3")], cache.take(subnet))
+
+    def test_mark_free(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        cache.take(subnet, count=2)
+        cache.mark_free(subnet.id, "10.0.0.3")
+        self.assertEqual([IPAddress("10.0.0.3")], cache.take(subnet))
+
+    def test_mark_free_ignores_fixed_addresses(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet(
+            [("10.0.0.2", "10.0.0.3")], fixed=[("10.0.0.10", "10.0.0.20")]
+        )
+        cache.take(subnet, count=2)
+        cache.mark_free(subnet.id, "10.0.0.10")
+        self.assertIsNone(cache.take(subnet))
+
+    def test_mark_neighbour(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        cache.take(subnet, count=0)
+        cache.mark_neighbour("10.0.0.2")
+        self.assertEqual([IPAddress("10.0.0.3")], cache.take(subnet))
+
+    def test_invalidate(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        cache.take(subnet)
+        cache.invalidate(subnet.id)
+        self.assertEqual([IPAddress("10.0.0.2")], cache.take(subnet))
+
+    def test_disable_forgets_everything(self):
+        cache = self.make_cache()
+        subnet = self.make_subnet([("10.0.0.2", "10.0.0.3")])
+        cache.take(subnet)
+        cache.disable()
+        self.assertEqual({}, cache.entries)
+        self.assertIsNone(cache.take(subnet))
@@ -0,0 +1,102 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.largefilestorage`."""
+
+__all__ = []
+
+import hashlib
+import os
+
+from maasserver.largefilestorage import (
+    FileContentStorage,
+    get_file_content_storage,
+)
+from maasserver.testing.config import RegionConfigurationFixture
+from maasserver.testing.factory import factory
+from maastesting.testcase import MAASTestCase
+
+
+class TestFileContentStorage(MAASTestCase):
+    def make_storage(self):
+        return FileContentStorage(self.make_dir())
+
+    def make_sha256(self):
+        return hashlib.sha256(factory.make_bytes()).hexdigest()
+
+    def test_get_path(self):
+        storage = self.make_storage()
+        sha256 = self.make_sha256()
+        self.assertEqual(
+            os.path.join(storage.path, sha256[:2], sha256),
+            storage.get_path(sha256),
+        )
+
+    def test_append_writes_partial_file(self):
+        storage = self.make_storage()
+        sha256 = self.make_sha256()
+        storage.reset(sha256)
+        self.assertEqual(3, storage.append(sha256, b"foo"))
+        self.assertEqual(6, storage.append(sha256, b"bar"))
+        self.assertFalse(storage.exists(sha256))
+        self.assertEqual(6, storage.get_size(sha256))
+        with storage.open(sha256) as stream:
+            self.assertEqual(b"foobar", stream.read())
+
+    def test_commit_moves_content_in_place(self):
+        storage = self.make_storage()
+        sha256 = self.make_sha256()
+        storage.reset(sha256)
+        storage.append(sha256, b"foo")
+        storage.commit(sha256)
+        self.assertTrue(storage.exists(sha256))
+        self.assertFalse(os.path.exists(storage.get_partial_path(sha256)))
+        with storage.open(sha256) as stream:
+            self.assertEqual(b"foo", stream.read())
+
+    def test_reset_discards_content(self):
+        storage = self.make_storage()
+        sha256 = self.make_sha256()
+        storage.reset(sha256)
+        storage.append(sha256, b"foo")
+        storage.commit(sha256)
+        storage.reset(sha256)
+        self.assertFalse(storage.exists(sha256))
+        self.assertEqual(0, storage.get_size(sha256))
+
+    def test_delete(self):
+        storage = self.make_storage()
+        sha256 = self.make_sha256()
+        storage.reset(sha256)
+        storage.delete(sha256)
+        storage.delete(sha256)
+        self.assertEqual([], list(storage.list()))
+
+    def test_list(self):
+        storage = self.make_storage()
+        complete, partial = self.make_sha256(), self.make_sha256()
+        storage.reset(complete)
+        storage.commit(complete)
+        storage.reset(partial)
+        self.assertItemsEqual([complete, partial], storage.list())
+
+    def test_list_without_directory(self):
+        storage = FileContentStorage(
+            os.path.join(self.make_dir(), factory.make_name("missing"))
+        )
+        self.assertEqual([], list(storage.list()))
+
+
+class TestGetFileContentStorage(MAASTestCase):
+    def test_returns_None_when_not_configured(self):
+        self.useFixture(RegionConfigurationFixture())
+        self.assertIsNone(get_file_content_storage())
+
+    def test_returns_configured_storage(self):
+        path = self.make_dir()
+        self.useFixture(
+            RegionConfigurationFixture(boot_resources_storage=path)
+        )
+        storage = get_file_content_storage()
+        self.assertIsInstance(storage, FileContentStorage)
+        self.assertEqual(path, storage.path)
@@ -469,6 +469,72 @@ class TestPostgresListenerService(MAASServerTestCase):
             "node_unknown",
         )
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_handleNotifies_handles_oldest_first(self):
+        listener = PostgresListenerService()
+        handled = []
+        listener.register("machine", lambda *args: handled.append(args))
+        listener.notifications[("machine_update", "b")] = 1
+        listener.notifications[("machine_create", "a")] = 2
+        yield listener.handleNotifies()
+        self.assertEqual([("update", "b"), ("create", "a")], handled)
+        self.assertEqual({}, listener.notifications)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_handleNotifies_parks_notifications_for_busy_channels(self):
+        listener = PostgresListenerService()
+        listener.CHANNEL_CONCURRENCY = {"machine": 1}
+        handled, running = [], []
+
+        def machine_handler(action, payload):
+            handled.append(payload)
+            running.append(Deferred())
+            return running[-1]
+
+        def device_handler(action, payload):
+            handled.append(payload)
+            # The parked machine notification goes once this finishes.
+            running[0].callback(None)
+
+        listener.register("machine", machine_handler)
+        listener.register("device", device_handler)
+        listener.notifications[("machine_update", "a")] = 1
+        listener.notifications[("machine_update", "b")] = 2
+        listener.notifications[("device_update", "c")] = 3
+        yield listener.handleNotifies()
+        # The device notification didn't wait behind the machine ones.
+        self.assertEqual(["a", "c", "b"], handled)
+        self.assertEqual({}, listener.channelPending)
+        running[1].callback(None)
+
+    def test_handleNotify_limits_handlers_per_channel(self):
+        listener = PostgresListenerService()
+        listener.CHANNEL_CONCURRENCY = {"machine": 1}
+        running = []
+
+        def handler(action, payload):
+            d = Deferred()
+            running.append(d)
+            return d
+
+        listener.register("machine", handler)
+        listener.register("device", handler)
+        listener.handleNotify(("machine_update", "a"))
+        listener.handleNotify(("machine_update", "b"))
+        listener.handleNotify(("device_update", "c"))
+        # The second machine notification waits for the first.
+        self.assertThat(running, HasLength(2))
+        running[0].callback(None)
+        self.assertThat(running, HasLength(3))
+
+    def test_getChannelLimiter_uses_default_concurrency(self):
+        listener = PostgresListenerService()
+        limiter = listener.getChannelLimiter("machine")
+        self.assertEqual(listener.DEFAULT_CHANNEL_CONCURRENCY, limiter.limit)
+        self.assertIs(limiter, listener.getChannelLimiter("machine"))
+
     @wait_for_reactor
     @inlineCallbacks
     def test_doRead_removes_self_from_reactor_on_error(self):
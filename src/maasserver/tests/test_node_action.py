@@ -12,7 +12,6 @@ from django.db import transaction
 from netaddr import IPNetwork
 from testtools.matchers import Equals
 
-from maasserver import locks
 from maasserver.clusterrpc.boot_images import RackControllersImporter
 from maasserver.clusterrpc.utils import get_error_message_for_exception
 from maasserver.enum import (
@@ -606,7 +605,7 @@ class TestAcquireNodeAction(MAASServerTestCase):
             audit_event.description, "Acquired '%s'." % node.hostname
         )
 
-    def test_Acquire_uses_node_acquire_lock(self):
+    def test_Acquire_locks_machine(self):
         node = factory.make_Node(
             interface=True,
             status=NODE_STATUS.READY,
@@ -616,12 +615,11 @@ class TestAcquireNodeAction(MAASServerTestCase):
         user = factory.make_User()
         request = factory.make_fake_request("/")
         request.user = user
-        node_acquire = self.patch(locks, "node_acquire")
-        Acquire(node, user, request).execute()
-        self.assertThat(node_acquire.__enter__, MockCalledOnceWith())
-        self.assertThat(
-            node_acquire.__exit__, MockCalledOnceWith(None, None, None)
+        lock_for_acquisition = self.patch(
+            node_action_module.Machine.objects, "lock_for_acquisition"
         )
+        Acquire(node, user, request).execute()
+        self.assertThat(lock_for_acquisition, MockCalledOnceWith(node))
 
 
 class TestDeployAction(MAASServerTestCase):
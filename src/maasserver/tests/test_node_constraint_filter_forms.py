@@ -40,6 +40,7 @@ from maasserver.node_constraint_filter_forms import (
     parse_legacy_tags,
     ReadNodesForm,
     RenamableFieldsForm,
+    storage_summary_query,
 )
 from maasserver.testing.architecture import patch_usable_architectures
 from maasserver.testing.factory import factory, RANDOM
@@ -178,6 +179,53 @@ class TestUtils(MAASServerTestCase):
     def test_nodes_by_storage_returns_None_when_storage_string_is_empty(self):
         self.assertEqual(None, nodes_by_storage(""))
 
+    def test_storage_summary_query_returns_None_when_storage_is_empty(self):
+        self.assertIsNone(storage_summary_query(""))
+
+    def test_storage_summary_query_requires_enough_unused_devices(self):
+        node1 = factory.make_Node(with_boot_disk=False)
+        factory.make_PhysicalBlockDevice(node=node1, formatted_root=True)
+        factory.make_PhysicalBlockDevice(node=node1)
+        node2 = factory.make_Node(with_boot_disk=False)
+        factory.make_PhysicalBlockDevice(node=node2, formatted_root=True)
+        factory.make_PhysicalBlockDevice(node=node2)
+        factory.make_PhysicalBlockDevice(node=node2)
+        self.assertItemsEqual(
+            [node2],
+            Machine.objects.filter(storage_summary_query("0,0,0")),
+        )
+
+    def test_storage_summary_query_matches_unused_device_tags(self):
+        node1 = factory.make_Node(with_boot_disk=False)
+        factory.make_PhysicalBlockDevice(node=node1, formatted_root=True)
+        factory.make_PhysicalBlockDevice(node=node1, tags=["ssd"])
+        node2 = factory.make_Node(with_boot_disk=False)
+        factory.make_PhysicalBlockDevice(node=node2, formatted_root=True)
+        factory.make_PhysicalBlockDevice(node=node2, tags=["rotary"])
+        self.assertItemsEqual(
+            [node1],
+            Machine.objects.filter(storage_summary_query("0,0(ssd)")),
+        )
+
+    def test_storage_summary_query_matches_root_partition(self):
+        node1 = factory.make_Node(with_boot_disk=False)
+        block_device = factory.make_PhysicalBlockDevice(node=node1)
+        partition_table = factory.make_PartitionTable(
+            block_device=block_device
+        )
+        partition = factory.make_Partition(
+            partition_table=partition_table, tags=["fast"]
+        )
+        factory.make_Filesystem(mount_point="/", partition=partition)
+        node2 = factory.make_Node(with_boot_disk=False)
+        factory.make_PhysicalBlockDevice(
+            node=node2, tags=["fast"], formatted_root=True
+        )
+        self.assertItemsEqual(
+            [node1],
+            Machine.objects.filter(storage_summary_query("0(partition,fast)")),
+        )
+
 
 class TestRenamableForm(RenamableFieldsForm):
     field1 = forms.CharField(label="A field which is forced to contain 'foo'.")
@@ -122,6 +122,9 @@ class TestRegionWorkerServiceMaker(TestServiceMaker):
             "database-tasks",
             "postgres-listener-worker",
             "rack-controller",
+            "boot-config-cache",
+            "free-ip-cache",
+            "subnet-stats-cache",
             "rpc",
             "status-worker",
             "web",
@@ -159,6 +162,9 @@ class TestRegionWorkerServiceMaker(TestServiceMaker):
             "database-tasks",
             "postgres-listener-worker",
             "rack-controller",
+            "boot-config-cache",
+            "free-ip-cache",
+            "subnet-stats-cache",
             "rpc",
             "status-worker",
             "web",
@@ -360,6 +366,9 @@ class TestRegionAllInOneServiceMaker(TestServiceMaker):
             "database-tasks",
             "postgres-listener-worker",
             "rack-controller",
+            "boot-config-cache",
+            "free-ip-cache",
+            "subnet-stats-cache",
             "rpc",
             "service-monitor",
             "status-worker",
@@ -5,7 +5,7 @@
 
 __all__ = []
 
-from unittest.mock import ANY, call, create_autospec
+from unittest.mock import ANY, call, create_autospec, Mock
 
 from django.db import transaction
 from fixtures import FakeLogger
@@ -48,13 +48,18 @@ from maasserver.testing.testcase import (
 )
 from maasserver.utils.orm import post_commit_hooks
 from maasserver.utils.threads import deferToDatabase
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    MockCalledOnce,
+    MockCalledOnceWith,
+    MockCallsMatch,
+)
 from maastesting.twisted import (
     always_fail_with,
     always_succeed_with,
     extract_result,
 )
 from metadataserver.enum import RESULT_TYPE, SCRIPT_STATUS
+from provisioningserver import tags as provisioningserver_tags
 from provisioningserver.refresh.node_info_scripts import (
     LLDP_OUTPUT_NAME,
     LSHW_OUTPUT_NAME,
@@ -411,3 +416,33 @@ class TestPopulateTagForMultipleNodes(MAASServerTestCase):
             [node.hostname for node in nodes[0:2]],
             [node.hostname for node in Node.objects.filter(tags__name="bar")],
         )
+
+    def test_removes_tag_from_nodes_that_no_longer_match(self):
+        nodes = [factory.make_Node() for _ in range(3)]
+        make_lldp_result(nodes[0], b"<bar/>")
+        tag = factory.make_Tag("bar", "//lldp:bar", populate=False)
+        for node in nodes[:2]:
+            node.tags.add(tag)
+        populate_tag_for_multiple_nodes(tag, nodes)
+        self.assertItemsEqual(
+            [nodes[0].hostname],
+            [node.hostname for node in Node.objects.filter(tags__name="bar")],
+        )
+
+    def test_evaluates_nodes_with_same_details_once(self):
+        nodes = [factory.make_Node() for _ in range(4)]
+        for node in nodes:
+            make_lldp_result(node, b"<bar/>")
+        tag = factory.make_Tag("bar", "//lldp:bar", populate=False)
+        provisioningserver_tags.merged_details_cache.clear()
+        merge_details = self.patch(
+            provisioningserver_tags,
+            "merge_details",
+            Mock(side_effect=provisioningserver_tags.merge_details),
+        )
+        populate_tag_for_multiple_nodes(tag, nodes)
+        self.assertThat(merge_details, MockCalledOnce())
+        self.assertItemsEqual(
+            [node.hostname for node in nodes],
+            [node.hostname for node in Node.objects.filter(tags__name="bar")],
+        )
@@ -42,6 +42,7 @@ class TestRackControllerService(MAASTransactionServerTestCase):
                 starting=None,
                 watching=set(),
                 needsDHCPUpdate=set(),
+                dhcpHostUpdates={},
                 ipcWorker=sentinel.ipcWorker,
                 postgresListener=sentinel.listener,
             ),
@@ -251,6 +252,29 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         self.assertEquals(set(), service.needsDHCPUpdate)
         self.assertThat(mock_startProcessing, MockNotCalled())
 
+    def test_dhcpHandler_records_vlans_with_host_changes(self):
+        rack_id = random.randint(0, 100)
+        listener = PostgresListenerService()
+        service = RackControllerService(sentinel.ipcWorker, listener)
+        service.watching = set([rack_id])
+        self.patch(service, "startProcessing")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "1")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "2")
+        self.assertEquals(set([rack_id]), service.needsDHCPUpdate)
+        self.assertEquals({rack_id: {1, 2}}, service.dhcpHostUpdates)
+
+    def test_dhcpHandler_full_update_overrides_host_changes(self):
+        rack_id = random.randint(0, 100)
+        listener = PostgresListenerService()
+        service = RackControllerService(sentinel.ipcWorker, listener)
+        service.watching = set([rack_id])
+        self.patch(service, "startProcessing")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "1")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "2")
+        self.assertEquals(set([rack_id]), service.needsDHCPUpdate)
+        self.assertEquals({}, service.dhcpHostUpdates)
+
     def test_startProcessing_doesnt_call_start_when_looping_call_running(self):
         service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
         mock_start = self.patch(service.processing, "start")
@@ -351,3 +375,25 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         mock_configure_dhcp.return_value = succeed(None)
         yield service.processDHCP(rack.id)
         self.assertThat(mock_configure_dhcp, MockCalledOnceWith(rack))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_processDHCP_calls_configure_dhcp_hosts(self):
+        rack = yield deferToDatabase(
+            transactional(factory.make_RackController)
+        )
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        service.dhcpHostUpdates = {rack.id: {1, 2}}
+        mock_configure_dhcp = self.patch(
+            rack_controller.dhcp, "configure_dhcp"
+        )
+        mock_configure_dhcp_hosts = self.patch(
+            rack_controller.dhcp, "configure_dhcp_hosts"
+        )
+        mock_configure_dhcp_hosts.return_value = succeed(None)
+        yield service.processDHCP(rack.id)
+        self.assertThat(mock_configure_dhcp, MockNotCalled())
+        self.assertThat(
+            mock_configure_dhcp_hosts, MockCalledOnceWith(rack, {1, 2})
+        )
+        self.assertEquals({}, service.dhcpHostUpdates)
@@ -12,6 +12,7 @@ from django.db import transaction
 import requests as requests_module
 from twisted.application.internet import TimerService
 from twisted.internet.defer import fail
+from twisted.internet.task import Clock
 
 from maasserver import stats
 from maasserver.enum import IPADDRESS_TYPE, IPRANGE_TYPE, NODE_STATUS
@@ -23,6 +24,7 @@ from maasserver.stats import (
     get_machines_by_architecture,
     get_request_params,
     make_maas_user_agent_request,
+    SubnetsUtilisationStatsCache,
 )
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import (
@@ -32,6 +34,7 @@ from maasserver.testing.testcase import (
 from maastesting.matchers import MockCalledOnce, MockNotCalled
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import extract_result
+from provisioningserver.utils.network import IPRangeStatistics
 from provisioningserver.utils.twisted import asynchronous
 
 
@@ -398,6 +401,126 @@ class TestGetSubnetsUtilisationStats(MAASServerTestCase):
             },
         )
 
+    def test_stats_allocated_run_across_range(self):
+        subnet = factory.make_Subnet(cidr="1.2.0.0/16", gateway_ip="1.2.0.254")
+        factory.make_IPRange(
+            subnet=subnet,
+            start_ip="1.2.0.11",
+            end_ip="1.2.0.20",
+            alloc_type=IPRANGE_TYPE.DYNAMIC,
+        )
+        for n in (9, 10, 11):
+            factory.make_StaticIPAddress(
+                ip="1.2.0.{}".format(n),
+                alloc_type=IPADDRESS_TYPE.STICKY,
+                subnet=subnet,
+            )
+        self.assertEqual(
+            stats.get_subnets_utilisation_stats(),
+            {
+                "1.2.0.0/16": {
+                    "available": 2 ** 16 - 15,
+                    "dynamic_available": 10,
+                    "dynamic_used": 0,
+                    "reserved_available": 0,
+                    "reserved_used": 0,
+                    "static": 2,
+                    "unavailable": 13,
+                }
+            },
+        )
+
+    def test_stats_allocated_gateway_is_not_static(self):
+        subnet = factory.make_Subnet(cidr="1.2.0.0/16", gateway_ip="1.2.0.254")
+        factory.make_StaticIPAddress(
+            ip="1.2.0.254", alloc_type=IPADDRESS_TYPE.STICKY, subnet=subnet
+        )
+        self.assertEqual(
+            stats.get_subnets_utilisation_stats()["1.2.0.0/16"]["static"], 0
+        )
+
+    def test_stats_match_iprange_usage(self):
+        subnet = factory.make_Subnet(cidr="2001:db8::/64", gateway_ip="")
+        factory.make_IPRange(
+            subnet=subnet,
+            start_ip="2001:db8::1:0:10",
+            end_ip="2001:db8::1:0:20",
+            alloc_type=IPRANGE_TYPE.DYNAMIC,
+        )
+        factory.make_StaticIPAddress(
+            ip="2001:db8::1:0:1",
+            alloc_type=IPADDRESS_TYPE.STICKY,
+            subnet=subnet,
+        )
+        full_range = subnet.get_iprange_usage()
+        range_stats = IPRangeStatistics(full_range)
+        subnet_stats = stats.get_subnets_utilisation_stats()["2001:db8::/64"]
+        self.assertEqual(
+            (range_stats.num_available, range_stats.num_unavailable, 1),
+            (
+                subnet_stats["available"],
+                subnet_stats["unavailable"],
+                subnet_stats["static"],
+            ),
+        )
+
+    def test_stats_cached(self):
+        cache = SubnetsUtilisationStatsCache()
+        cache.enable()
+        self.patch(stats, "subnets_utilisation_stats_cache", cache)
+        factory.make_Subnet(cidr="1.2.0.0/16")
+        cached = stats.get_subnets_utilisation_stats()
+        factory.make_Subnet(cidr="1.3.0.0/16")
+        self.assertIs(cached, stats.get_subnets_utilisation_stats())
+        cache.invalidate()
+        self.assertIn("1.3.0.0/16", stats.get_subnets_utilisation_stats())
+
+
+class TestSubnetsUtilisationStatsCache(MAASTestCase):
+    def test_computes_when_disabled(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        self.assertEqual(1, cache.get(lambda: 1))
+        self.assertEqual(2, cache.get(lambda: 2))
+
+    def test_caches_when_enabled(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        cache.enable()
+        self.assertEqual(1, cache.get(lambda: 1))
+        self.assertEqual(1, cache.get(lambda: 2))
+
+    def test_expires(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        cache.enable()
+        cache.get(lambda: 1)
+        cache.clock.advance(cache.ttl)
+        self.assertEqual(2, cache.get(lambda: 2))
+
+    def test_invalidate(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        cache.enable()
+        cache.get(lambda: 1)
+        cache.invalidate()
+        self.assertEqual(2, cache.get(lambda: 2))
+
+    def test_does_not_cache_stats_computed_before_invalidation(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        cache.enable()
+
+        def compute():
+            cache.invalidate()
+            return 1
+
+        cache.get(compute)
+        self.assertIsNone(cache.entry)
+
+    def test_disable_forgets_stats(self):
+        cache = SubnetsUtilisationStatsCache(clock=Clock())
+        cache.enable()
+        cache.get(lambda: 1)
+        cache.disable()
+        self.assertIsNone(cache.entry)
+        self.assertEqual(2, cache.get(lambda: 2))
+
 
 class TestStatsService(MAASTestCase):
     """Tests for `ImportStatsService`."""
@@ -10,7 +10,13 @@ its previous trigger. All triggers will be added into the database via the
 `start_up` method for regiond.
 """
 
-__all__ = ["register_all_triggers", "register_procedure", "register_trigger"]
+__all__ = [
+    "register_all_triggers",
+    "register_procedure",
+    "register_statement_trigger",
+    "register_trigger",
+    "supports_transition_tables",
+]
 
 from contextlib import closing
 from textwrap import dedent
@@ -165,6 +171,52 @@ def register_trigger(
         cursor.execute(trigger_sql)
 
 
+# The transition tables that statement-level triggers can see, by event.
+TRANSITION_TABLES = {
+    "insert": "NEW TABLE AS new_table",
+    "update": "OLD TABLE AS old_table NEW TABLE AS new_table",
+    "delete": "OLD TABLE AS old_table",
+}
+
+
+def supports_transition_tables():
+    """Whether the database supports statement-level triggers that can see
+    the changed rows, which needs PostgreSQL 10 or later."""
+    return connection.pg_version >= 100000
+
+
+def register_statement_trigger(table, procedure, event):
+    """Register statement-level `trigger` on `table` if it doesn't exist.
+
+    The trigger fires once after each statement, and `procedure` can select
+    the rows the statement changed from `new_table` and/or `old_table`.
+    """
+    # Strip the "maasserver_" off the front of the table name.
+    table_name = table
+    if table.startswith("maasserver_"):
+        table_name = table_name[11:]
+    trigger_name = "%s_%s" % (table_name, procedure)
+    trigger_sql = dedent(
+        """\
+        DROP TRIGGER IF EXISTS {trigger_name} ON {table};
+        CREATE TRIGGER {trigger_name}
+        AFTER {event} ON {table}
+        REFERENCING {transition_tables}
+        FOR EACH STATEMENT
+        EXECUTE PROCEDURE {procedure}();
+        """
+    )
+    trigger_sql = trigger_sql.format(
+        trigger_name=trigger_name,
+        table=table,
+        event=event.upper(),
+        transition_tables=TRANSITION_TABLES[event],
+        procedure=procedure,
+    )
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(trigger_sql)
+
+
 @transactional
 def register_all_triggers():
     """Register all triggers into the database."""
@@ -11,8 +11,11 @@ for.
 
 __all__ = ["register_system_triggers"]
 
+from contextlib import closing
 from textwrap import dedent
 
+from django.db import connection
+
 from maasserver.models.dnspublication import zone_serial
 from maasserver.triggers import register_procedure, register_trigger
 from maasserver.utils.orm import transactional
@@ -430,6 +433,46 @@ DHCP_ALERT = dedent(
     """
 )
 
+# Helper that alerts the primary and secondary rack controller for a VLAN
+# that only the hosts on that VLAN have changed. The VLAN ID is sent as the
+# payload so the hosts on the rack controllers can be updated without
+# rebuilding the whole DHCP configuration.
+DHCP_HOSTS_ALERT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dhcp_hosts_alert(vlan maasserver_vlan)
+    RETURNS void AS $$
+    DECLARE
+      relay_vlan maasserver_vlan;
+    BEGIN
+      IF vlan.dhcp_on THEN
+        PERFORM pg_notify(
+          CONCAT('sys_dhcp_', vlan.primary_rack_id), CAST(vlan.id AS text));
+        IF vlan.secondary_rack_id IS NOT NULL THEN
+          PERFORM pg_notify(
+            CONCAT('sys_dhcp_', vlan.secondary_rack_id),
+            CAST(vlan.id AS text));
+        END IF;
+      END IF;
+      IF vlan.relay_vlan_id IS NOT NULL THEN
+        SELECT maasserver_vlan.* INTO relay_vlan
+        FROM maasserver_vlan
+        WHERE maasserver_vlan.id = vlan.relay_vlan_id;
+        IF relay_vlan.dhcp_on THEN
+          PERFORM pg_notify(CONCAT(
+            'sys_dhcp_', relay_vlan.primary_rack_id), CAST(vlan.id AS text));
+          IF relay_vlan.secondary_rack_id IS NOT NULL THEN
+            PERFORM pg_notify(CONCAT(
+              'sys_dhcp_', relay_vlan.secondary_rack_id),
+              CAST(vlan.id AS text));
+          END IF;
+        END IF;
+      END IF;
+      RETURN;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
 # Triggered when a subnet's VLAN, CIDR, gateway IP, or DNS servers change.
 # If the VLAN was changed it alerts both the rack controllers of the old VLAN
 # and then the rack controllers of the new VLAN. Any other field that is
@@ -574,7 +617,7 @@ DHCP_STATICIPADDRESS_INSERT = dedent(
         FROM maasserver_vlan, maasserver_subnet
         WHERE maasserver_subnet.id = NEW.subnet_id AND
           maasserver_subnet.vlan_id = maasserver_vlan.id;
-        PERFORM sys_dhcp_alert(vlan);
+        PERFORM sys_dhcp_hosts_alert(vlan);
       END IF;
       RETURN NEW;
     END;
@@ -607,11 +650,11 @@ DHCP_STATICIPADDRESS_UPDATE = dedent(
             maasserver_subnet.vlan_id = maasserver_vlan.id;
           IF old_vlan.id != new_vlan.id THEN
             -- Different VLAN's; update each if DHCP enabled.
-            PERFORM sys_dhcp_alert(old_vlan);
-            PERFORM sys_dhcp_alert(new_vlan);
+            PERFORM sys_dhcp_hosts_alert(old_vlan);
+            PERFORM sys_dhcp_hosts_alert(new_vlan);
           ELSE
             -- Same VLAN so only need to update once.
-            PERFORM sys_dhcp_alert(new_vlan);
+            PERFORM sys_dhcp_hosts_alert(new_vlan);
           END IF;
         ELSIF (OLD.ip IS NULL AND NEW.ip IS NOT NULL) OR
           (OLD.ip IS NOT NULL and NEW.ip IS NULL) OR
@@ -623,7 +666,7 @@ DHCP_STATICIPADDRESS_UPDATE = dedent(
           FROM maasserver_vlan, maasserver_subnet
           WHERE maasserver_subnet.id = NEW.subnet_id AND
             maasserver_subnet.vlan_id = maasserver_vlan.id;
-          PERFORM sys_dhcp_alert(new_vlan);
+          PERFORM sys_dhcp_hosts_alert(new_vlan);
         END IF;
       END IF;
       RETURN NEW;
@@ -647,7 +690,7 @@ DHCP_STATICIPADDRESS_DELETE = dedent(
         FROM maasserver_vlan, maasserver_subnet
         WHERE maasserver_subnet.id = OLD.subnet_id AND
           maasserver_subnet.vlan_id = maasserver_vlan.id;
-        PERFORM sys_dhcp_alert(vlan);
+        PERFORM sys_dhcp_hosts_alert(vlan);
       END IF;
       RETURN NEW;
     END;
@@ -685,7 +728,7 @@ DHCP_INTERFACE_UPDATE = dedent(
           AND host(maasserver_staticipaddress.ip) != ''
           AND maasserver_vlan.id = maasserver_subnet.vlan_id)
         LOOP
-          PERFORM sys_dhcp_alert(vlan);
+          PERFORM sys_dhcp_hosts_alert(vlan);
         END LOOP;
       END IF;
       RETURN NEW;
@@ -725,7 +768,7 @@ DHCP_NODE_UPDATE = dedent(
           AND host(maasserver_staticipaddress.ip) != ''
           AND maasserver_vlan.id = maasserver_subnet.vlan_id)
         LOOP
-          PERFORM sys_dhcp_alert(vlan);
+          PERFORM sys_dhcp_hosts_alert(vlan);
         END LOOP;
       END IF;
       RETURN NEW;
@@ -1920,6 +1963,302 @@ RBAC_CONFIG_UPDATE = dedent(
 )
 
 
+# Procedure to recompute the allocation summary of a node. The summary is
+# removed when the node no longer exists.
+ALLOCATION_SUMMARY_REFRESH = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_allocation_summary_refresh(nid integer)
+    RETURNS void AS $$
+    DECLARE
+      summary maasserver_nodeallocationsummary;
+    BEGIN
+      PERFORM 1 FROM maasserver_node WHERE id = nid;
+      IF NOT FOUND THEN
+        DELETE FROM maasserver_nodeallocationsummary WHERE node_id = nid;
+        RETURN;
+      END IF;
+      -- Block devices holding an unacquired root filesystem, directly or
+      -- on one of their partitions.
+      SELECT
+        max(bd.size),
+        COALESCE(array_remove(array_agg(DISTINCT tag), NULL), '{}')
+      INTO summary.root_device_size, summary.root_device_tags
+      FROM maasserver_filesystem AS fs
+      LEFT JOIN maasserver_partition AS part ON part.id = fs.partition_id
+      LEFT JOIN maasserver_partitiontable AS pt
+        ON pt.id = part.partition_table_id
+      JOIN maasserver_blockdevice AS bd
+        ON bd.id = COALESCE(fs.block_device_id, pt.block_device_id)
+      LEFT JOIN LATERAL unnest(bd.tags) AS tag ON TRUE
+      WHERE bd.node_id = nid AND fs.mount_point = '/' AND NOT fs.acquired;
+      -- Partitions holding an unacquired root filesystem.
+      SELECT
+        max(part.size),
+        COALESCE(array_remove(array_agg(DISTINCT tag), NULL), '{}')
+      INTO summary.root_partition_size, summary.root_partition_tags
+      FROM maasserver_filesystem AS fs
+      JOIN maasserver_partition AS part ON part.id = fs.partition_id
+      JOIN maasserver_partitiontable AS pt ON pt.id = part.partition_table_id
+      JOIN maasserver_blockdevice AS bd ON bd.id = pt.block_device_id
+      LEFT JOIN LATERAL unnest(part.tags) AS tag ON TRUE
+      WHERE bd.node_id = nid AND fs.mount_point = '/' AND NOT fs.acquired;
+      -- Block devices without a filesystem or a partition table.
+      SELECT
+        count(DISTINCT bd.id),
+        max(bd.size),
+        COALESCE(array_remove(array_agg(DISTINCT tag), NULL), '{}')
+      INTO
+        summary.unused_device_count,
+        summary.unused_device_size,
+        summary.unused_device_tags
+      FROM maasserver_blockdevice AS bd
+      LEFT JOIN LATERAL unnest(bd.tags) AS tag ON TRUE
+      WHERE bd.node_id = nid AND NOT EXISTS (
+        SELECT 1 FROM maasserver_filesystem AS fs
+        WHERE fs.block_device_id = bd.id) AND NOT EXISTS (
+        SELECT 1 FROM maasserver_partitiontable AS pt
+        WHERE pt.block_device_id = bd.id);
+      -- Partitions without a filesystem.
+      SELECT
+        count(DISTINCT part.id),
+        max(part.size),
+        COALESCE(array_remove(array_agg(DISTINCT tag), NULL), '{}')
+      INTO
+        summary.unused_partition_count,
+        summary.unused_partition_size,
+        summary.unused_partition_tags
+      FROM maasserver_partition AS part
+      JOIN maasserver_partitiontable AS pt ON pt.id = part.partition_table_id
+      JOIN maasserver_blockdevice AS bd ON bd.id = pt.block_device_id
+      LEFT JOIN LATERAL unnest(part.tags) AS tag ON TRUE
+      WHERE bd.node_id = nid AND NOT EXISTS (
+        SELECT 1 FROM maasserver_filesystem AS fs
+        WHERE fs.partition_id = part.id);
+      -- The fabrics and VLANs of the interfaces.
+      SELECT
+        COALESCE(array_agg(DISTINCT vlan.fabric_id)
+          FILTER (WHERE vlan.fabric_id IS NOT NULL), '{}'),
+        COALESCE(array_agg(DISTINCT nic.vlan_id)
+          FILTER (WHERE nic.vlan_id IS NOT NULL), '{}'),
+        COALESCE(max(nic.link_speed), 0)
+      INTO summary.fabric_ids, summary.vlan_ids, summary.max_link_speed
+      FROM maasserver_interface AS nic
+      LEFT JOIN maasserver_vlan AS vlan ON vlan.id = nic.vlan_id
+      WHERE nic.node_id = nid;
+      -- The subnets of the IP addresses linked to the interfaces.
+      SELECT COALESCE(array_agg(DISTINCT ip.subnet_id), '{}')
+      INTO summary.subnet_ids
+      FROM maasserver_interface AS nic
+      JOIN maasserver_interface_ip_addresses AS link
+        ON link.interface_id = nic.id
+      JOIN maasserver_staticipaddress AS ip
+        ON ip.id = link.staticipaddress_id
+      WHERE nic.node_id = nid AND ip.subnet_id IS NOT NULL;
+      INSERT INTO maasserver_nodeallocationsummary (
+        node_id,
+        root_device_size, root_device_tags,
+        root_partition_size, root_partition_tags,
+        unused_device_count, unused_device_size, unused_device_tags,
+        unused_partition_count, unused_partition_size,
+        unused_partition_tags,
+        fabric_ids, vlan_ids, subnet_ids, max_link_speed)
+      VALUES (
+        nid,
+        summary.root_device_size, summary.root_device_tags,
+        summary.root_partition_size, summary.root_partition_tags,
+        summary.unused_device_count, summary.unused_device_size,
+        summary.unused_device_tags,
+        summary.unused_partition_count, summary.unused_partition_size,
+        summary.unused_partition_tags,
+        summary.fabric_ids, summary.vlan_ids, summary.subnet_ids,
+        summary.max_link_speed)
+      ON CONFLICT (node_id) DO UPDATE SET
+        root_device_size = EXCLUDED.root_device_size,
+        root_device_tags = EXCLUDED.root_device_tags,
+        root_partition_size = EXCLUDED.root_partition_size,
+        root_partition_tags = EXCLUDED.root_partition_tags,
+        unused_device_count = EXCLUDED.unused_device_count,
+        unused_device_size = EXCLUDED.unused_device_size,
+        unused_device_tags = EXCLUDED.unused_device_tags,
+        unused_partition_count = EXCLUDED.unused_partition_count,
+        unused_partition_size = EXCLUDED.unused_partition_size,
+        unused_partition_tags = EXCLUDED.unused_partition_tags,
+        fabric_ids = EXCLUDED.fabric_ids,
+        vlan_ids = EXCLUDED.vlan_ids,
+        subnet_ids = EXCLUDED.subnet_ids,
+        max_link_speed = EXCLUDED.max_link_speed;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
+# Recomputes the allocation summary of every node, and removes the summaries
+# of nodes that no longer exist.
+ALLOCATION_SUMMARY_REFRESH_ALL = dedent(
+    """\
+    DELETE FROM maasserver_nodeallocationsummary
+    WHERE node_id NOT IN (SELECT id FROM maasserver_node);
+    SELECT sys_allocation_summary_refresh(id) FROM maasserver_node;
+    """
+)
+
+
+# Triggers that keep the allocation summaries up to date. Each entry holds the
+# table, the name used for the procedures, the events to trigger on, the
+# fields an update must change, and a query for the ids of the nodes whose
+# summary is affected by a change to a row. ROW is replaced with NEW or OLD
+# when rendering the procedure.
+ALLOCATION_SUMMARY_TRIGGERS = [
+    ("maasserver_node", "node", ("insert", "delete"), None, "SELECT ROW.id"),
+    (
+        "maasserver_blockdevice",
+        "blockdevice",
+        ("insert", "update", "delete"),
+        ["size", "tags"],
+        "SELECT ROW.node_id",
+    ),
+    (
+        "maasserver_partitiontable",
+        "partitiontable",
+        ("insert", "delete"),
+        None,
+        dedent(
+            """\
+            SELECT node_id FROM maasserver_blockdevice
+            WHERE id = ROW.block_device_id"""
+        ),
+    ),
+    (
+        "maasserver_partition",
+        "partition",
+        ("insert", "update", "delete"),
+        ["size", "tags"],
+        dedent(
+            """\
+            SELECT bd.node_id FROM maasserver_partitiontable AS pt
+            JOIN maasserver_blockdevice AS bd ON bd.id = pt.block_device_id
+            WHERE pt.id = ROW.partition_table_id"""
+        ),
+    ),
+    (
+        "maasserver_filesystem",
+        "filesystem",
+        ("insert", "update", "delete"),
+        ["mount_point", "acquired", "block_device_id", "partition_id"],
+        dedent(
+            """\
+            SELECT node_id FROM maasserver_blockdevice
+            WHERE id = ROW.block_device_id
+            UNION
+            SELECT bd.node_id FROM maasserver_partition AS part
+            JOIN maasserver_partitiontable AS pt
+              ON pt.id = part.partition_table_id
+            JOIN maasserver_blockdevice AS bd ON bd.id = pt.block_device_id
+            WHERE part.id = ROW.partition_id"""
+        ),
+    ),
+    (
+        "maasserver_interface",
+        "interface",
+        ("insert", "update", "delete"),
+        ["node_id", "vlan_id", "link_speed"],
+        "SELECT ROW.node_id",
+    ),
+    (
+        "maasserver_interface_ip_addresses",
+        "nic_ip",
+        ("insert", "delete"),
+        None,
+        dedent(
+            """\
+            SELECT node_id FROM maasserver_interface
+            WHERE id = ROW.interface_id"""
+        ),
+    ),
+    (
+        "maasserver_staticipaddress",
+        "staticipaddress",
+        ("update",),
+        ["subnet_id"],
+        dedent(
+            """\
+            SELECT nic.node_id FROM maasserver_interface_ip_addresses AS link
+            JOIN maasserver_interface AS nic ON nic.id = link.interface_id
+            WHERE link.staticipaddress_id = ROW.id"""
+        ),
+    ),
+    (
+        "maasserver_vlan",
+        "vlan",
+        ("update",),
+        ["fabric_id"],
+        dedent(
+            """\
+            SELECT DISTINCT node_id FROM maasserver_interface
+            WHERE vlan_id = ROW.id"""
+        ),
+    ),
+]
+
+
+# Triggers that keep the free IP address caches of the region processes up to
+# date; see `maasserver.freeips`. Each entry holds the table, the name used for
+# the procedures, the events to trigger on, the fields an update must change,
+# and the messages to send for the new and the old row, if any. ROW is
+# replaced with NEW or OLD when rendering the procedure; a message that is
+# NULL is not sent.
+#
+# The id of the address is part of the address messages: identical messages
+# sent within one transaction are only delivered once, which would lose the
+# order of an address being released and then taken again.
+FREE_IPS_ADDRESS_MESSAGE = (
+    "ROW.subnet_id || ' ' || host(ROW.ip) || ' ' || ROW.id"
+)
+FREE_IPS_TRIGGERS = [
+    (
+        "maasserver_staticipaddress",
+        "staticipaddress",
+        ("insert", "update", "delete"),
+        ["ip", "subnet_id"],
+        "'used ' || " + FREE_IPS_ADDRESS_MESSAGE,
+        "'free ' || " + FREE_IPS_ADDRESS_MESSAGE,
+    ),
+    (
+        "maasserver_subnet",
+        "subnet",
+        ("update", "delete"),
+        ["cidr", "gateway_ip", "dns_servers", "managed"],
+        "'subnet ' || ROW.id",
+        "'subnet ' || ROW.id",
+    ),
+    (
+        "maasserver_iprange",
+        "iprange",
+        ("insert", "update", "delete"),
+        ["subnet_id", "start_ip", "end_ip", "type"],
+        "'subnet ' || ROW.subnet_id",
+        "'subnet ' || ROW.subnet_id",
+    ),
+    (
+        "maasserver_staticroute",
+        "staticroute",
+        ("insert", "update", "delete"),
+        ["source_id", "gateway_ip"],
+        "'subnet ' || ROW.source_id",
+        "'subnet ' || ROW.source_id",
+    ),
+    (
+        "maasserver_neighbour",
+        "neighbour",
+        ("insert", "update"),
+        ["ip"],
+        "'neighbour ' || host(ROW.ip)",
+        None,
+    ),
+]
+
+
 def render_sys_proxy_procedure(proc_name, on_delete=False):
     """Render a database procedure with name `proc_name` that notifies that a
     proxy update is needed.
@@ -1940,6 +2279,87 @@ def render_sys_proxy_procedure(proc_name, on_delete=False):
     )
 
 
+def render_sys_allocation_summary_procedure(proc_name, query, event):
+    """Render a database procedure with name `proc_name` that refreshes the
+    allocation summaries of the nodes affected by a change to a row.
+
+    :param proc_name: Name of the procedure.
+    :param query: Query for the ids of the affected nodes, referring to the
+        changed row as ROW.
+    :param event: The event the procedure will be used for; on update both
+        the old and the new row are considered.
+    """
+    rows = {"insert": ["NEW"], "update": ["NEW", "OLD"], "delete": ["OLD"]}
+    node_ids = "\nUNION\n".join(
+        query.replace("ROW", row) for row in rows[event]
+    )
+    procedure = dedent(
+        """\
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+          PERFORM sys_allocation_summary_refresh(affected.node_id)
+          FROM (
+        %s
+          ) AS affected(node_id)
+          WHERE affected.node_id IS NOT NULL;
+          RETURN %s;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    return procedure % (
+        proc_name,
+        node_ids,
+        "OLD" if event == "delete" else "NEW",
+    )
+
+
+def render_sys_free_ips_procedure(proc_name, new_message, old_message, event):
+    """Render a database procedure with name `proc_name` that notifies the
+    free IP address caches of a change to a row.
+
+    :param proc_name: Name of the procedure.
+    :param new_message: Message to send for the new row, referring to it as
+        ROW, or None.
+    :param old_message: Message to send for the old row, referring to it as
+        ROW, or None.
+    :param event: The event the procedure will be used for; on update the
+        message for the old row is sent first.
+    """
+    rows = {
+        "insert": [("NEW", new_message)],
+        "update": [("OLD", old_message), ("NEW", new_message)],
+        "delete": [("OLD", old_message)],
+    }
+    notify = (
+        "  message := %s;\n"
+        "  IF message IS NOT NULL THEN\n"
+        "    PERFORM pg_notify('sys_free_ips', message);\n"
+        "  END IF;\n"
+    )
+    notifies = "".join(
+        notify % message.replace("ROW", row)
+        for row, message in rows[event]
+        if message is not None
+    )
+    procedure = dedent(
+        """\
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        DECLARE
+          message text;
+        BEGIN
+        %s  RETURN %s;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    return procedure % (
+        proc_name,
+        notifies,
+        "OLD" if event == "delete" else "NEW",
+    )
+
+
 @transactional
 def register_system_triggers():
     """Register all system triggers into the database."""
@@ -1962,6 +2382,7 @@ def register_system_triggers():
 
     # DHCP
     register_procedure(DHCP_ALERT)
+    register_procedure(DHCP_HOSTS_ALERT)
 
     # - VLAN
     register_procedure(DHCP_VLAN_UPDATE)
@@ -2188,3 +2609,46 @@ def register_system_triggers():
     register_trigger("maasserver_config", "sys_rbac_config_insert", "insert")
     register_procedure(RBAC_CONFIG_UPDATE)
     register_trigger("maasserver_config", "sys_rbac_config_update", "update")
+
+    # Free IP addresses
+    for (
+        table,
+        name,
+        events,
+        fields,
+        new_message,
+        old_message,
+    ) in FREE_IPS_TRIGGERS:
+        for event in events:
+            proc_name = "sys_free_ips_%s_%s" % (name, event)
+            register_procedure(
+                render_sys_free_ips_procedure(
+                    proc_name, new_message, old_message, event
+                )
+            )
+            register_trigger(
+                table,
+                proc_name,
+                event,
+                fields=fields if event == "update" else None,
+            )
+
+    # Allocation summary
+    register_procedure(ALLOCATION_SUMMARY_REFRESH)
+    for table, name, events, fields, query in ALLOCATION_SUMMARY_TRIGGERS:
+        for event in events:
+            proc_name = "sys_alloc_summary_%s_%s" % (name, event)
+            register_procedure(
+                render_sys_allocation_summary_procedure(
+                    proc_name, query, event
+                )
+            )
+            register_trigger(
+                table,
+                proc_name,
+                event,
+                fields=fields if event == "update" else None,
+            )
+    # Summaries of nodes from before the triggers existed.
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(ALLOCATION_SUMMARY_REFRESH_ALL)
@@ -11,10 +11,15 @@ from django.db import connection
 from testtools.matchers import Equals
 
 from maasserver.testing.testcase import MAASServerTestCase
-from maasserver.triggers import register_procedure, register_trigger
+from maasserver.triggers import (
+    register_procedure,
+    register_statement_trigger,
+    register_trigger,
+)
 from maasserver.triggers.system import register_system_triggers
 from maasserver.triggers.websocket import (
     register_websocket_triggers,
+    render_node_related_statement_notification_procedure,
     render_notification_procedure,
 )
 
@@ -55,6 +60,38 @@ class TestTriggers(MAASServerTestCase):
 
         self.assertEqual(1, len(triggers), "Trigger was not created.")
 
+    def get_trigger_type(self, name):
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(
+                "SELECT tgtype FROM pg_trigger WHERE tgname = %s", [name]
+            )
+            [tgtype] = cursor.fetchone()
+        return tgtype
+
+    def test_register_statement_trigger_creates_statement_trigger(self):
+        register_procedure(
+            render_node_related_statement_notification_procedure(
+                "node_create_notify", "SELECT id FROM new_table"
+            )
+        )
+        register_statement_trigger(
+            "maasserver_node", "node_create_notify", "insert"
+        )
+        # Bit 0 of tgtype is set for row-level triggers.
+        tgtype = self.get_trigger_type("node_node_create_notify")
+        self.assertEqual(0, tgtype & 1)
+
+    def test_registers_statement_triggers_for_node_device_deletes(self):
+        register_websocket_triggers()
+        link_tgtype = self.get_trigger_type(
+            "blockdevice_nd_blockdevice_link_notify"
+        )
+        unlink_tgtype = self.get_trigger_type(
+            "blockdevice_nd_blockdevice_unlink_notify"
+        )
+        self.assertEqual(1, link_tgtype & 1)
+        self.assertEqual(0, unlink_tgtype & 1)
+
 
 class TestTriggersUsed(MAASServerTestCase):
     """Tests relating to those triggers the MAAS application uses."""
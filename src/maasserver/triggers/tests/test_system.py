@@ -9,7 +9,9 @@ from contextlib import closing
 
 from django.db import connection
 
+from maasserver.models import NodeAllocationSummary
 from maasserver.models.dnspublication import zone_serial
+from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
 from maasserver.triggers.system import register_system_triggers
 from maasserver.utils.orm import psql_array
@@ -66,6 +68,39 @@ class TestTriggers(MAASServerTestCase):
             "resourcepool_sys_rbac_rpool_delete",
             "config_sys_rbac_config_insert",
             "config_sys_rbac_config_update",
+            "staticipaddress_sys_free_ips_staticipaddress_insert",
+            "staticipaddress_sys_free_ips_staticipaddress_update",
+            "staticipaddress_sys_free_ips_staticipaddress_delete",
+            "subnet_sys_free_ips_subnet_update",
+            "subnet_sys_free_ips_subnet_delete",
+            "iprange_sys_free_ips_iprange_insert",
+            "iprange_sys_free_ips_iprange_update",
+            "iprange_sys_free_ips_iprange_delete",
+            "staticroute_sys_free_ips_staticroute_insert",
+            "staticroute_sys_free_ips_staticroute_update",
+            "staticroute_sys_free_ips_staticroute_delete",
+            "neighbour_sys_free_ips_neighbour_insert",
+            "neighbour_sys_free_ips_neighbour_update",
+            "node_sys_alloc_summary_node_insert",
+            "node_sys_alloc_summary_node_delete",
+            "blockdevice_sys_alloc_summary_blockdevice_insert",
+            "blockdevice_sys_alloc_summary_blockdevice_update",
+            "blockdevice_sys_alloc_summary_blockdevice_delete",
+            "partitiontable_sys_alloc_summary_partitiontable_insert",
+            "partitiontable_sys_alloc_summary_partitiontable_delete",
+            "partition_sys_alloc_summary_partition_insert",
+            "partition_sys_alloc_summary_partition_update",
+            "partition_sys_alloc_summary_partition_delete",
+            "filesystem_sys_alloc_summary_filesystem_insert",
+            "filesystem_sys_alloc_summary_filesystem_update",
+            "filesystem_sys_alloc_summary_filesystem_delete",
+            "interface_sys_alloc_summary_interface_insert",
+            "interface_sys_alloc_summary_interface_update",
+            "interface_sys_alloc_summary_interface_delete",
+            "interface_ip_addresses_sys_alloc_summary_nic_ip_insert",
+            "interface_ip_addresses_sys_alloc_summary_nic_ip_delete",
+            "staticipaddress_sys_alloc_summary_staticipaddress_update",
+            "vlan_sys_alloc_summary_vlan_update",
         ]
         sql, args = psql_array(triggers, sql_type="text")
         with closing(connection.cursor()) as cursor:
@@ -93,3 +128,11 @@ class TestTriggers(MAASServerTestCase):
         mock_create = self.patch(zone_serial, "create_if_not_exists")
         register_system_triggers()
         self.assertThat(mock_create, MockCalledOnceWith())
+
+    def test_register_system_triggers_refreshes_allocation_summaries(self):
+        node = factory.make_Node()
+        NodeAllocationSummary.objects.filter(node=node).delete()
+        register_system_triggers()
+        self.assertTrue(
+            NodeAllocationSummary.objects.filter(node=node).exists()
+        )
@@ -5462,3 +5462,68 @@ class TestRBACConfigListener(
             ),
         )
         self.assertThat(change.action, Equals("full"))
+
+
+class TestFreeIPsListener(
+    MAASTransactionServerTestCase, TransactionalHelpersMixin
+):
+    """End-to-end test for the free IP address triggers code."""
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_staticipaddress_insert(self):
+        yield deferToDatabase(register_system_triggers)
+        subnet = yield deferToDatabase(self.create_subnet)
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_free_ips", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            sip = yield deferToDatabase(
+                self.create_staticipaddress, {"subnet": subnet}
+            )
+            yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(
+            ("sys_free_ips", "used %d %s %d" % (subnet.id, sip.ip, sip.id)),
+            dv.value,
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_staticipaddress_delete(self):
+        yield deferToDatabase(register_system_triggers)
+        subnet = yield deferToDatabase(self.create_subnet)
+        sip = yield deferToDatabase(
+            self.create_staticipaddress, {"subnet": subnet}
+        )
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_free_ips", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.delete_staticipaddress, sip.id)
+            yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(
+            ("sys_free_ips", "free %d %s %d" % (subnet.id, sip.ip, sip.id)),
+            dv.value,
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_iprange_insert(self):
+        yield deferToDatabase(register_system_triggers)
+        subnet = yield deferToDatabase(self.create_subnet)
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_free_ips", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.create_iprange, {"subnet": subnet})
+            yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(("sys_free_ips", "subnet %d" % subnet.id), dv.value)
@@ -33,6 +33,7 @@ from maasserver.listener import PostgresListenerService
 from maasserver.models import ControllerInfo
 from maasserver.models.blockdevice import MIN_BLOCK_DEVICE_SIZE
 from maasserver.models.config import Config
+from maasserver.models.filesystem import Filesystem
 from maasserver.models.node import Node
 from maasserver.models.partition import MIN_PARTITION_SIZE
 from maasserver.models.switch import Switch
@@ -3690,6 +3691,18 @@ class TestMachineFilesystemListener(
             filesystem.save(force_update=True)  # A no-op update is enough.
             self.assertEqual(("update", "%s" % node.system_id), get())
 
+    def test_calls_handler_for_each_node_on_bulk_delete(self):
+        nodes = [factory.make_Node(**self.params) for _ in range(2)]
+        for node in nodes:
+            for _ in range(3):
+                factory.make_Filesystem(node=node)
+        with listenFor(self.channel) as get:
+            Filesystem.objects.filter(node__in=nodes).delete()
+            self.assertItemsEqual(
+                [("update", node.system_id) for node in nodes],
+                [get(), get()],
+            )
+
 
 class TestMachineFilesystemgroupListener(
     MAASTransactionServerTestCase, TransactionalHelpersMixin
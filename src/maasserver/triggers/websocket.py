@@ -22,8 +22,10 @@ from maasserver.triggers import (
     EVENTS_LU,
     EVENTS_LUU,
     register_procedure,
+    register_statement_trigger,
     register_trigger,
     register_triggers,
+    supports_transition_tables,
 )
 from maasserver.utils.orm import transactional
 
@@ -2133,40 +2135,6 @@ def register_websocket_triggers():
     )
     register_trigger("maasserver_event", "event_create_notify", "insert")
 
-    # MAC static ip address table, update to linked node.
-    register_procedure(
-        INTERFACE_IP_ADDRESS_NODE_NOTIFY
-        % (
-            "nd_sipaddress_link_notify",
-            "NEW.interface_id",
-            NODE_TYPE.MACHINE,
-            NODE_TYPE.RACK_CONTROLLER,
-            NODE_TYPE.REGION_CONTROLLER,
-            NODE_TYPE.REGION_AND_RACK_CONTROLLER,
-        )
-    )
-    register_procedure(
-        INTERFACE_IP_ADDRESS_NODE_NOTIFY
-        % (
-            "nd_sipaddress_unlink_notify",
-            "OLD.interface_id",
-            NODE_TYPE.MACHINE,
-            NODE_TYPE.RACK_CONTROLLER,
-            NODE_TYPE.REGION_CONTROLLER,
-            NODE_TYPE.REGION_AND_RACK_CONTROLLER,
-        )
-    )
-    register_trigger(
-        "maasserver_interface_ip_addresses",
-        "nd_sipaddress_link_notify",
-        "insert",
-    )
-    register_trigger(
-        "maasserver_interface_ip_addresses",
-        "nd_sipaddress_unlink_notify",
-        "delete",
-    )
-
     # MAC static ip address table, update to linked domain via node.
     register_procedure(
         INTERFACE_IP_ADDRESS_DOMAIN_NOTIFY
@@ -2287,169 +2255,14 @@ def register_websocket_triggers():
         "maasserver_interface", "nd_interface_update_notify", "update"
     )
 
-    # Block device table, update to linked node.
-    register_procedure(
-        render_node_related_notification_procedure(
-            "nd_blockdevice_link_notify", "NEW.node_id"
-        )
-    )
-    register_procedure(
-        render_node_related_notification_procedure(
-            "nd_blockdevice_update_notify", "NEW.node_id"
-        )
-    )
-    register_procedure(
-        render_node_related_notification_procedure(
-            "nd_blockdevice_unlink_notify", "OLD.node_id"
-        )
-    )
-    register_procedure(
-        PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_NOTIFY
-        % (
-            "nd_physblockdevice_update_notify",
-            "NEW.blockdevice_ptr_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_NOTIFY
-        % (
-            "nd_virtblockdevice_update_notify",
-            "NEW.blockdevice_ptr_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_trigger(
-        "maasserver_blockdevice", "nd_blockdevice_link_notify", "insert"
-    )
-    register_trigger(
-        "maasserver_blockdevice", "nd_blockdevice_update_notify", "update"
-    )
-    register_trigger(
-        "maasserver_blockdevice", "nd_blockdevice_unlink_notify", "delete"
-    )
-    register_trigger(
-        "maasserver_physicalblockdevice",
-        "nd_physblockdevice_update_notify",
-        "update",
-    )
-    register_trigger(
-        "maasserver_virtualblockdevice",
-        "nd_virtblockdevice_update_notify",
-        "update",
-    )
-
-    # Partition table, update to linked user.
-    register_procedure(
-        PARTITIONTABLE_NODE_NOTIFY
-        % (
-            "nd_partitiontable_link_notify",
-            "NEW.block_device_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        PARTITIONTABLE_NODE_NOTIFY
-        % (
-            "nd_partitiontable_update_notify",
-            "NEW.block_device_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        PARTITIONTABLE_NODE_NOTIFY
-        % (
-            "nd_partitiontable_unlink_notify",
-            "OLD.block_device_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_trigger(
-        "maasserver_partitiontable", "nd_partitiontable_link_notify", "insert"
-    )
-    register_trigger(
-        "maasserver_partitiontable",
-        "nd_partitiontable_update_notify",
-        "update",
-    )
-    register_trigger(
-        "maasserver_partitiontable",
-        "nd_partitiontable_unlink_notify",
-        "delete",
-    )
-
-    # Partition, update to linked user.
-    register_procedure(
-        PARTITION_NODE_NOTIFY
-        % (
-            "nd_partition_link_notify",
-            "NEW.partition_table_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        PARTITION_NODE_NOTIFY
-        % (
-            "nd_partition_update_notify",
-            "NEW.partition_table_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        PARTITION_NODE_NOTIFY
-        % (
-            "nd_partition_unlink_notify",
-            "OLD.partition_table_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_trigger(
-        "maasserver_partition", "nd_partition_link_notify", "insert"
-    )
-    register_trigger(
-        "maasserver_partition", "nd_partition_update_notify", "update"
-    )
-    register_trigger(
-        "maasserver_partition", "nd_partition_unlink_notify", "delete"
-    )
-
-    # Filesystem, update to linked user.
-    register_procedure(
-        FILESYSTEM_NODE_NOTIFY.format(
-            "nd_filesystem_link_notify",
-            "NEW.block_device_id",
-            "NEW.partition_id",
-            "NEW.node_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        FILESYSTEM_NODE_NOTIFY.format(
-            "nd_filesystem_update_notify",
-            "NEW.block_device_id",
-            "NEW.partition_id",
-            "NEW.node_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_procedure(
-        FILESYSTEM_NODE_NOTIFY.format(
-            "nd_filesystem_unlink_notify",
-            "OLD.block_device_id",
-            "OLD.partition_id",
-            "OLD.node_id",
-            NODE_TYPE.MACHINE,
-        )
-    )
-    register_trigger(
-        "maasserver_filesystem", "nd_filesystem_link_notify", "insert"
-    )
-    register_trigger(
-        "maasserver_filesystem", "nd_filesystem_update_notify", "update"
-    )
-    register_trigger(
-        "maasserver_filesystem", "nd_filesystem_unlink_notify", "delete"
-    )
+    # Interface address and storage tables, update to linked node.
+    register_node_device_row_triggers()
+    if supports_transition_tables():
+        # Deleting a node or recommissioning it deletes its devices many rows
+        # to a statement, where a trigger per statement is cheaper. Inserts
+        # and updates are mostly one row to a statement, where a trigger per
+        # row is cheaper.
+        register_node_device_statement_triggers(events=["delete"])
 
     # Filesystemgroup, update to linked user.
     register_procedure(
@@ -2725,3 +2538,449 @@ def register_websocket_triggers():
         )
     )
     register_triggers("metadataserver_script", "script")
+
+
+def register_node_device_row_triggers():
+    """Register the row-level triggers that notify a node when its interface
+    addresses or its storage change."""
+    # MAC static ip address table, update to linked node.
+    register_procedure(
+        INTERFACE_IP_ADDRESS_NODE_NOTIFY
+        % (
+            "nd_sipaddress_link_notify",
+            "NEW.interface_id",
+            NODE_TYPE.MACHINE,
+            NODE_TYPE.RACK_CONTROLLER,
+            NODE_TYPE.REGION_CONTROLLER,
+            NODE_TYPE.REGION_AND_RACK_CONTROLLER,
+        )
+    )
+    register_procedure(
+        INTERFACE_IP_ADDRESS_NODE_NOTIFY
+        % (
+            "nd_sipaddress_unlink_notify",
+            "OLD.interface_id",
+            NODE_TYPE.MACHINE,
+            NODE_TYPE.RACK_CONTROLLER,
+            NODE_TYPE.REGION_CONTROLLER,
+            NODE_TYPE.REGION_AND_RACK_CONTROLLER,
+        )
+    )
+    register_trigger(
+        "maasserver_interface_ip_addresses",
+        "nd_sipaddress_link_notify",
+        "insert",
+    )
+    register_trigger(
+        "maasserver_interface_ip_addresses",
+        "nd_sipaddress_unlink_notify",
+        "delete",
+    )
+
+    # Block device table, update to linked node.
+    register_procedure(
+        render_node_related_notification_procedure(
+            "nd_blockdevice_link_notify", "NEW.node_id"
+        )
+    )
+    register_procedure(
+        render_node_related_notification_procedure(
+            "nd_blockdevice_update_notify", "NEW.node_id"
+        )
+    )
+    register_procedure(
+        render_node_related_notification_procedure(
+            "nd_blockdevice_unlink_notify", "OLD.node_id"
+        )
+    )
+    register_procedure(
+        PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_NOTIFY
+        % (
+            "nd_physblockdevice_update_notify",
+            "NEW.blockdevice_ptr_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_NOTIFY
+        % (
+            "nd_virtblockdevice_update_notify",
+            "NEW.blockdevice_ptr_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_trigger(
+        "maasserver_blockdevice", "nd_blockdevice_link_notify", "insert"
+    )
+    register_trigger(
+        "maasserver_blockdevice", "nd_blockdevice_update_notify", "update"
+    )
+    register_trigger(
+        "maasserver_blockdevice", "nd_blockdevice_unlink_notify", "delete"
+    )
+    register_trigger(
+        "maasserver_physicalblockdevice",
+        "nd_physblockdevice_update_notify",
+        "update",
+    )
+    register_trigger(
+        "maasserver_virtualblockdevice",
+        "nd_virtblockdevice_update_notify",
+        "update",
+    )
+
+    # Partition table, update to linked user.
+    register_procedure(
+        PARTITIONTABLE_NODE_NOTIFY
+        % (
+            "nd_partitiontable_link_notify",
+            "NEW.block_device_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        PARTITIONTABLE_NODE_NOTIFY
+        % (
+            "nd_partitiontable_update_notify",
+            "NEW.block_device_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        PARTITIONTABLE_NODE_NOTIFY
+        % (
+            "nd_partitiontable_unlink_notify",
+            "OLD.block_device_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_trigger(
+        "maasserver_partitiontable", "nd_partitiontable_link_notify", "insert"
+    )
+    register_trigger(
+        "maasserver_partitiontable",
+        "nd_partitiontable_update_notify",
+        "update",
+    )
+    register_trigger(
+        "maasserver_partitiontable",
+        "nd_partitiontable_unlink_notify",
+        "delete",
+    )
+
+    # Partition, update to linked user.
+    register_procedure(
+        PARTITION_NODE_NOTIFY
+        % (
+            "nd_partition_link_notify",
+            "NEW.partition_table_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        PARTITION_NODE_NOTIFY
+        % (
+            "nd_partition_update_notify",
+            "NEW.partition_table_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        PARTITION_NODE_NOTIFY
+        % (
+            "nd_partition_unlink_notify",
+            "OLD.partition_table_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_trigger(
+        "maasserver_partition", "nd_partition_link_notify", "insert"
+    )
+    register_trigger(
+        "maasserver_partition", "nd_partition_update_notify", "update"
+    )
+    register_trigger(
+        "maasserver_partition", "nd_partition_unlink_notify", "delete"
+    )
+
+    # Filesystem, update to linked user.
+    register_procedure(
+        FILESYSTEM_NODE_NOTIFY.format(
+            "nd_filesystem_link_notify",
+            "NEW.block_device_id",
+            "NEW.partition_id",
+            "NEW.node_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        FILESYSTEM_NODE_NOTIFY.format(
+            "nd_filesystem_update_notify",
+            "NEW.block_device_id",
+            "NEW.partition_id",
+            "NEW.node_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_procedure(
+        FILESYSTEM_NODE_NOTIFY.format(
+            "nd_filesystem_unlink_notify",
+            "OLD.block_device_id",
+            "OLD.partition_id",
+            "OLD.node_id",
+            NODE_TYPE.MACHINE,
+        )
+    )
+    register_trigger(
+        "maasserver_filesystem", "nd_filesystem_link_notify", "insert"
+    )
+    register_trigger(
+        "maasserver_filesystem", "nd_filesystem_update_notify", "update"
+    )
+    register_trigger(
+        "maasserver_filesystem", "nd_filesystem_unlink_notify", "delete"
+    )
+
+
+# Queries for the ids of the nodes that the rows of a transition table belong
+# to, by table. Each is formatted with the name of the transition table.
+BLOCKDEVICE_NODE_IDS = "SELECT node_id FROM {0}"
+
+INTERFACE_IP_ADDRESS_NODE_IDS = dedent(
+    """\
+    SELECT node_id FROM maasserver_interface
+    WHERE id IN (SELECT interface_id FROM {0})"""
+)
+
+PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_IDS = dedent(
+    """\
+    SELECT node_id FROM maasserver_blockdevice
+    WHERE id IN (SELECT blockdevice_ptr_id FROM {0})"""
+)
+
+PARTITIONTABLE_NODE_IDS = dedent(
+    """\
+    SELECT node_id FROM maasserver_blockdevice
+    WHERE id IN (SELECT block_device_id FROM {0})"""
+)
+
+PARTITION_NODE_IDS = dedent(
+    """\
+    SELECT maasserver_blockdevice.node_id
+    FROM maasserver_blockdevice, maasserver_partitiontable
+    WHERE maasserver_blockdevice.id = maasserver_partitiontable.block_device_id
+    AND maasserver_partitiontable.id IN (
+      SELECT partition_table_id FROM {0})"""
+)
+
+FILESYSTEM_NODE_IDS = dedent(
+    """\
+    SELECT node_id FROM maasserver_blockdevice
+    WHERE id IN (SELECT block_device_id FROM {0})
+    UNION
+    SELECT maasserver_blockdevice.node_id
+    FROM maasserver_blockdevice,
+         maasserver_partition,
+         maasserver_partitiontable
+    WHERE maasserver_blockdevice.id = maasserver_partitiontable.block_device_id
+    AND maasserver_partitiontable.id = maasserver_partition.partition_table_id
+    AND maasserver_partition.id IN (SELECT partition_id FROM {0})
+    UNION
+    SELECT node_id FROM {0}"""
+)
+
+
+def render_node_related_statement_notification_procedure(
+    proc_name, node_ids, machines_only=False
+):
+    """Render a statement-level procedure that notifies each node once.
+
+    :param node_ids: A query for the ids of the nodes to notify.
+    :param machines_only: Only notify machines, not controllers or devices.
+    """
+    controller_types = "%d, %d, %d" % (
+        NODE_TYPE.RACK_CONTROLLER,
+        NODE_TYPE.REGION_CONTROLLER,
+        NODE_TYPE.REGION_AND_RACK_CONTROLLER,
+    )
+    if machines_only:
+        machines_only = "AND node.node_type = %d" % NODE_TYPE.MACHINE
+    else:
+        machines_only = ""
+    return dedent(
+        """\
+        CREATE OR REPLACE FUNCTION {proc_name}() RETURNS trigger AS $$
+        DECLARE
+          notify RECORD;
+        BEGIN
+          FOR notify IN
+            SELECT DISTINCT
+              CASE
+                WHEN node.node_type = {machine} THEN 'machine_update'
+                WHEN node.node_type IN ({controllers})
+                  THEN 'controller_update'
+                WHEN node.parent_id IS NOT NULL THEN 'machine_update'
+                ELSE 'device_update'
+              END AS channel,
+              CASE
+                WHEN node.node_type IN ({machine}, {controllers})
+                  OR node.parent_id IS NULL THEN node.system_id
+                ELSE parent.system_id
+              END AS system_id
+            FROM maasserver_node AS node
+            LEFT OUTER JOIN maasserver_node AS parent
+              ON parent.id = node.parent_id
+            WHERE node.id IN ({node_ids})
+            {machines_only}
+          LOOP
+            PERFORM pg_notify(notify.channel, CAST(notify.system_id AS text));
+          END LOOP;
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    ).format(
+        proc_name=proc_name,
+        machine=NODE_TYPE.MACHINE,
+        controllers=controller_types,
+        node_ids=node_ids,
+        machines_only=machines_only,
+    )
+
+
+def register_node_device_statement_triggers(
+    events=("insert", "update", "delete")
+):
+    """Register the statement-level triggers that notify a node when its
+    interface addresses or its storage change.
+
+    Unlike the row-level triggers, these look up the nodes for all the rows
+    a statement changes at once, and notify each of those nodes once. Only
+    the triggers for `events` are registered, replacing their row-level
+    counterparts.
+    """
+    for table, proc_name, event, node_ids, machines_only in (
+        (
+            "maasserver_interface_ip_addresses",
+            "nd_sipaddress_link_notify",
+            "insert",
+            INTERFACE_IP_ADDRESS_NODE_IDS,
+            False,
+        ),
+        (
+            "maasserver_interface_ip_addresses",
+            "nd_sipaddress_unlink_notify",
+            "delete",
+            INTERFACE_IP_ADDRESS_NODE_IDS,
+            False,
+        ),
+        (
+            "maasserver_blockdevice",
+            "nd_blockdevice_link_notify",
+            "insert",
+            BLOCKDEVICE_NODE_IDS,
+            False,
+        ),
+        (
+            "maasserver_blockdevice",
+            "nd_blockdevice_update_notify",
+            "update",
+            BLOCKDEVICE_NODE_IDS,
+            False,
+        ),
+        (
+            "maasserver_blockdevice",
+            "nd_blockdevice_unlink_notify",
+            "delete",
+            BLOCKDEVICE_NODE_IDS,
+            False,
+        ),
+        (
+            "maasserver_physicalblockdevice",
+            "nd_physblockdevice_update_notify",
+            "update",
+            PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_virtualblockdevice",
+            "nd_virtblockdevice_update_notify",
+            "update",
+            PHYSICAL_OR_VIRTUAL_BLOCK_DEVICE_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partitiontable",
+            "nd_partitiontable_link_notify",
+            "insert",
+            PARTITIONTABLE_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partitiontable",
+            "nd_partitiontable_update_notify",
+            "update",
+            PARTITIONTABLE_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partitiontable",
+            "nd_partitiontable_unlink_notify",
+            "delete",
+            PARTITIONTABLE_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partition",
+            "nd_partition_link_notify",
+            "insert",
+            PARTITION_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partition",
+            "nd_partition_update_notify",
+            "update",
+            PARTITION_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_partition",
+            "nd_partition_unlink_notify",
+            "delete",
+            PARTITION_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_filesystem",
+            "nd_filesystem_link_notify",
+            "insert",
+            FILESYSTEM_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_filesystem",
+            "nd_filesystem_update_notify",
+            "update",
+            FILESYSTEM_NODE_IDS,
+            True,
+        ),
+        (
+            "maasserver_filesystem",
+            "nd_filesystem_unlink_notify",
+            "delete",
+            FILESYSTEM_NODE_IDS,
+            True,
+        ),
+    ):
+        if event not in events:
+            continue
+        # Like the row-level triggers, updates notify the nodes of the
+        # updated rows, not the nodes they were moved from.
+        transition_table = "old_table" if event == "delete" else "new_table"
+        register_procedure(
+            render_node_related_statement_notification_procedure(
+                proc_name, node_ids.format(transition_table), machines_only
+            )
+        )
+        register_statement_trigger(table, proc_name, event)
@@ -172,6 +172,11 @@ class Handler(metaclass=HandlerMetaclass):
         # correct notifications based on what items the client has.
         if "loaded_pks" not in self.cache:
             self.cache["loaded_pks"] = set()
+        # Set by the protocol when processing a batch of notifications. It is
+        # shared between the handlers of all clients of the same user, so
+        # that each changed object is only loaded and dehydrated once for
+        # that user. See `WebSocketFactory.processNotifies`.
+        self.notify_cache = None
 
     def full_dehydrate(self, obj, for_list=False):
         """Convert the given object into a dictionary.
@@ -596,19 +601,25 @@ class Handler(metaclass=HandlerMetaclass):
             else:
                 return None
 
-        self.user.refresh_from_db()
-        try:
-            obj = self.listen(channel, action, pk)
-        except HandlerDoesNotExistError:
-            obj = None
+        if self.notify_cache is None:
+            # When processing a batch the protocol refreshes the user once
+            # for the whole batch instead.
+            self.user.refresh_from_db()
+        obj = self._notify_cached(
+            ("listen", channel, action, pk),
+            self._listen_or_none,
+            channel,
+            action,
+            pk,
+        )
         if action == "create" and obj is not None:
             if pk in self.cache["loaded_pks"]:
                 # The user already knows about this node, so its not a create
                 # to the user but an update.
-                return self.on_listen_for_active_pk("update", pk, obj)
+                return self._on_listen_for_active_pk_cached("update", pk, obj)
             else:
                 self.cache["loaded_pks"].add(pk)
-                return self.on_listen_for_active_pk(action, pk, obj)
+                return self._on_listen_for_active_pk_cached(action, pk, obj)
         elif action == "update":
             if pk in self.cache["loaded_pks"]:
                 if obj is None:
@@ -618,12 +629,14 @@ class Handler(metaclass=HandlerMetaclass):
                     return (self._meta.handler_name, "delete", pk)
                 else:
                     # Just a normal update to the client.
-                    return self.on_listen_for_active_pk(action, pk, obj)
+                    return self._on_listen_for_active_pk_cached(
+                        action, pk, obj
+                    )
             elif obj is not None:
                 # User just got access to this new object. Send the message to
                 # the client as a create action instead of an update.
                 self.cache["loaded_pks"].add(pk)
-                return self.on_listen_for_active_pk("create", pk, obj)
+                return self._on_listen_for_active_pk_cached("create", pk, obj)
             else:
                 # User doesn't have access to this object, so do nothing.
                 pass
@@ -633,6 +646,42 @@ class Handler(metaclass=HandlerMetaclass):
             pass
         return None
 
+    def _notify_cached(self, key, func, *args):
+        """Return `func(*args)`, memoized in `notify_cache` under `key`.
+
+        When there's no `notify_cache` this simply calls `func`.
+        """
+        if self.notify_cache is None:
+            return func(*args)
+        key = (self._meta.handler_name,) + key
+        try:
+            return self.notify_cache[key]
+        except KeyError:
+            result = self.notify_cache[key] = func(*args)
+            return result
+
+    def _listen_or_none(self, channel, action, pk):
+        """Call `listen`, returning None when the object doesn't exist."""
+        try:
+            return self.listen(channel, action, pk)
+        except HandlerDoesNotExistError:
+            return None
+
+    def _on_listen_for_active_pk_cached(self, action, pk, obj):
+        """Call `on_listen_for_active_pk`, memoized in `notify_cache`.
+
+        Whether `pk` is the active object is part of the key, as that
+        decides if the full or the list representation is sent.
+        """
+        active = self.cache.get("active_pk") == pk
+        return self._notify_cached(
+            ("dehydrate", action, pk, active),
+            self.on_listen_for_active_pk,
+            action,
+            pk,
+            obj,
+        )
+
     def on_listen_for_active_pk(self, action, pk, obj):
         """Return the correct data for `obj` depending on if its the
         active primary key."""
@@ -100,6 +100,7 @@ class DeviceHandler(NodeHandler):
             "status_expires",
             "power_state_queried",
             "power_state_updated",
+            "power_state_changed",
             "osystem",
             "error_description",
             "error",
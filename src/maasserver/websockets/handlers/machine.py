@@ -211,6 +211,7 @@ class MachineHandler(NodeHandler):
             "agent_name",
             "power_state_queried",
             "power_state_updated",
+            "power_state_changed",
             "gateway_link_ipv4",
             "gateway_link_ipv6",
             "enable_ssh",
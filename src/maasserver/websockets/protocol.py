@@ -17,14 +17,23 @@ from django.contrib.auth import BACKEND_SESSION_KEY, load_backend, SESSION_KEY
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.http import HttpRequest
-from twisted.internet import defer
-from twisted.internet.defer import fail, inlineCallbacks
+from twisted.internet import defer, reactor
+from twisted.internet.defer import (
+    Deferred,
+    DeferredLock,
+    fail,
+    inlineCallbacks,
+)
 from twisted.internet.protocol import Factory, Protocol
 from twisted.python.modules import getModule
 from twisted.web.server import NOT_DONE_YET
 
 from maasserver.eventloop import services
-from maasserver.utils.orm import transactional
+from maasserver.utils.orm import (
+    is_retryable_failure,
+    savepoint,
+    transactional,
+)
 from maasserver.utils.threads import deferToDatabase
 from maasserver.websockets import handlers
 from maasserver.websockets.websockets import STATUSES
@@ -405,10 +414,23 @@ class WebSocketFactory(Factory):
 
     protocol = WebSocketProtocol
 
+    # Notifications arriving within this many seconds of each other are
+    # coalesced and sent to clients as one batch.
+    NOTIFY_DELAY = 0.1
+
     def __init__(self, listener):
         self.handlers = {}
         self.clients = []
         self.listener = listener
+        self.clock = reactor
+        # Pending notifications, mapping (handler_class, channel, obj_id) to
+        # the action to send, and the deferreds waiting for them to be sent.
+        self.notifications = {}
+        self.notificationWaiters = []
+        self.notificationCall = None
+        # Batches are processed one at a time so clients always receive
+        # notifications in the order they occurred.
+        self.notificationLock = DeferredLock()
         self.cacheHandlers()
         self.registerNotifiers()
 
@@ -458,23 +480,110 @@ class WebSocketFactory(Factory):
         for handler in self.handlers.values():
             for channel in handler._meta.listen_channels:
                 self.listener.register(
-                    channel, partial(self.onNotify, handler, channel)
+                    channel, partial(self.queueNotify, handler, channel)
                 )
 
-    @inlineCallbacks
+    def queueNotify(self, handler_class, channel, action, obj_id):
+        """Queue a notification from the listener.
+
+        This does not wait for the notification to be sent, so the listener
+        can carry on delivering notifications that will join the same batch.
+        """
+        self.onNotify(handler_class, channel, action, obj_id)
+
     def onNotify(self, handler_class, channel, action, obj_id):
-        for client in self.clients:
-            handler = client.buildHandler(handler_class)
-            data = yield deferToDatabase(
-                self.processNotify, handler, channel, action, obj_id
+        """Queue a notification for all the connected clients.
+
+        Notifications are not sent straight away; they are collected for
+        `NOTIFY_DELAY` seconds, repeated notifications for the same object
+        are coalesced, and then the whole batch is processed at once by
+        `processNotifies`.
+
+        :return: A `Deferred` that fires once the batch containing this
+            notification has been sent to the clients.
+        """
+        key = (handler_class, channel, obj_id)
+        if action == "update" and self.notifications.get(key) == "create":
+            # The clients have not been told about the object yet, so it
+            # is still a create to them.
+            action = "create"
+        self.notifications[key] = action
+        if self.notificationCall is None:
+            self.notificationCall = self.clock.callLater(
+                self.NOTIFY_DELAY, self.flushNotifies
             )
-            if data is not None:
-                (name, client_action, data) = data
-                client.sendNotify(name, client_action, data)
+        d = Deferred()
+        self.notificationWaiters.append(d)
+        return d
+
+    def flushNotifies(self):
+        """Send the pending notifications to the connected clients.
+
+        Notifications queued while an earlier batch is still being sent are
+        collected into the next batch once that one completes.
+        """
+        self.notificationCall = None
+        d = self.notificationLock.run(self.sendNotifies)
+        d.addErrback(log.err, "Failed to send notifications to clients.")
+        return d
+
+    @inlineCallbacks
+    def sendNotifies(self):
+        """Process the pending notifications and send the results."""
+        notifications, self.notifications = self.notifications, {}
+        waiters, self.notificationWaiters = self.notificationWaiters, []
+        try:
+            if len(notifications) != 0 and len(self.clients) != 0:
+                clients = list(self.clients)
+                results = yield deferToDatabase(
+                    self.processNotifies, clients, notifications
+                )
+                for client, (name, client_action, data) in results:
+                    client.sendNotify(name, client_action, data)
+        finally:
+            for waiter in waiters:
+                waiter.callback(None)
 
     @transactional
-    def processNotify(self, handler, channel, action, obj_id):
-        return handler.on_listen(channel, action, obj_id)
+    def processNotifies(self, clients, notifications):
+        """Process a batch of `notifications` for `clients`.
+
+        This is done in a single transaction. Handlers for clients of the
+        same user share a notify cache, so each changed object is loaded and
+        dehydrated once per user instead of once per client. Each
+        notification is processed for each client in its own savepoint, so
+        that one failing doesn't lose the rest of the batch.
+
+        :return: A list of ``(client, (name, action, data))`` tuples.
+        """
+        results = []
+        notify_caches = {}
+        for client in clients:
+            try:
+                client.user.refresh_from_db()
+            except User.DoesNotExist:
+                # The user has been deleted since the client connected.
+                continue
+            notify_cache = notify_caches.setdefault(client.user.id, {})
+            for key, action in notifications.items():
+                handler_class, channel, obj_id = key
+                handler = client.buildHandler(handler_class)
+                handler.notify_cache = notify_cache
+                try:
+                    with savepoint():
+                        data = handler.on_listen(channel, action, obj_id)
+                except Exception as error:
+                    if is_retryable_failure(error):
+                        raise
+                    log.err(
+                        None,
+                        "Failed to process notification %s %s for %s."
+                        % (channel, action, obj_id),
+                    )
+                    continue
+                if data is not None:
+                    results.append((client, data))
+        return results
 
     def registerRPCEvents(self):
         """Register for connected and disconnected events from the RPC
@@ -33,7 +33,11 @@ from maasserver.websockets.base import (
     HandlerPermissionError,
     HandlerValidationError,
 )
-from maastesting.matchers import MockCalledOnceWith, MockNotCalled
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCalledWith,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import asynchronous
@@ -854,6 +858,50 @@ class TestHandler(MAASServerTestCase, FakeNodesHandlerMixin):
             mock_dehydrate, MockCalledOnceWith(node, for_list=False)
         )
 
+    def test_on_listen_with_notify_cache_shares_listen_and_dehydrate(self):
+        node = factory.make_Node()
+        handler = self.make_nodes_handler(fields=["hostname"])
+        other = handler.__class__(handler.user, {}, handler.request)
+        handler.notify_cache = other.notify_cache = {}
+        mock_listen = self.patch(handler.__class__, "listen")
+        mock_listen.return_value = node
+        mock_dehydrate = self.patch(handler.__class__, "full_dehydrate")
+        mock_dehydrate.return_value = sentinel.data
+        expected = (handler._meta.handler_name, "create", sentinel.data)
+        self.expectThat(
+            handler.on_listen(sentinel.channel, "update", node.system_id),
+            Equals(expected),
+        )
+        self.expectThat(
+            other.on_listen(sentinel.channel, "update", node.system_id),
+            Equals(expected),
+        )
+        self.expectThat(mock_listen, MockCalledOnceWith(ANY, ANY, ANY))
+        self.expectThat(
+            mock_dehydrate, MockCalledOnceWith(node, for_list=True)
+        )
+
+    def test_on_listen_with_notify_cache_keys_on_active_pk(self):
+        node = factory.make_Node()
+        handler = self.make_nodes_handler(fields=["hostname"])
+        handler.notify_cache = {}
+        handler.cache["loaded_pks"].add(node.system_id)
+        mock_dehydrate = self.patch(handler, "full_dehydrate")
+        mock_dehydrate.return_value = sentinel.data
+        handler.on_listen(sentinel.channel, "update", node.system_id)
+        handler.cache["active_pk"] = node.system_id
+        handler.on_listen(sentinel.channel, "update", node.system_id)
+        self.assertThat(mock_dehydrate, MockCalledWith(node, for_list=False))
+        self.assertEqual(2, mock_dehydrate.call_count)
+
+    def test_on_listen_with_notify_cache_does_not_refresh_user(self):
+        node = factory.make_Node()
+        handler = self.make_nodes_handler(fields=["hostname"])
+        handler.notify_cache = {}
+        mock_refresh = self.patch(handler.user, "refresh_from_db")
+        handler.on_listen(sentinel.channel, "update", node.system_id)
+        self.assertThat(mock_refresh, MockNotCalled())
+
     def test_listen_calls_get_object_with_pk_on_other_actions(self):
         handler = self.make_nodes_handler()
         mock_get_object = self.patch(handler, "get_object")
@@ -14,7 +14,13 @@ from django.core.exceptions import ValidationError
 from django.http import HttpRequest
 from testtools.matchers import Equals, Is
 from twisted.internet import defer
-from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.internet.defer import (
+    DeferredList,
+    fail,
+    inlineCallbacks,
+    succeed,
+)
+from twisted.internet.task import Clock
 from twisted.web.server import NOT_DONE_YET
 
 from apiclient.utils import ascii_url
@@ -39,6 +45,7 @@ from maastesting.matchers import (
     IsFiredDeferred,
     MockCalledOnceWith,
     MockCalledWith,
+    MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import TwistedLoggerFixture
@@ -901,6 +908,23 @@ class TestWebSocketFactory(MAASTestCase, MakeProtocolFactoryMixin):
         factory = self.make_factory()
         self.assertItemsEqual(ALL_NOTIFIERS, factory.listener.listeners.keys())
 
+    def test_queueNotify_queues_without_waiting_for_batch(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        self.assertIsNone(
+            factory.queueNotify(
+                sentinel.handler, sentinel.channel, "update", sentinel.obj_id
+            )
+        )
+        self.assertEqual(
+            {(sentinel.handler, sentinel.channel, sentinel.obj_id): "update"},
+            factory.notifications,
+        )
+        self.assertEqual(
+            [factory.NOTIFY_DELAY],
+            [call.getTime() for call in factory.clock.getDelayedCalls()],
+        )
+
 
 class TestWebSocketFactoryTransactional(
     MAASTransactionServerTestCase, MakeProtocolFactoryMixin
@@ -979,6 +1003,144 @@ class TestWebSocketFactoryTransactional(
         )
         self.assertThat(mock_sendNotify, MockCalledWith(name, action, data))
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_coalesces_notifications_for_the_same_object(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        mock_class = MagicMock()
+        mock_class.return_value.on_listen.return_value = None
+        yield DeferredList(
+            [
+                factory.onNotify(
+                    mock_class, sentinel.channel, "create", sentinel.obj_id
+                ),
+                factory.onNotify(
+                    mock_class, sentinel.channel, "update", sentinel.obj_id
+                ),
+            ]
+        )
+        self.assertThat(
+            mock_class.return_value.on_listen,
+            MockCalledOnceWith(sentinel.channel, "create", sentinel.obj_id),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_processes_batch_in_one_transaction(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        mock_class = MagicMock()
+        mock_class.return_value.on_listen.return_value = None
+        mock_processNotifies = self.patch(factory, "processNotifies")
+        mock_processNotifies.return_value = []
+        yield DeferredList(
+            [
+                factory.onNotify(
+                    mock_class, sentinel.channel, "update", sentinel.obj_id1
+                ),
+                factory.onNotify(
+                    mock_class, sentinel.channel, "update", sentinel.obj_id2
+                ),
+            ]
+        )
+        self.assertThat(
+            mock_processNotifies,
+            MockCalledOnceWith(
+                [protocol],
+                {
+                    (mock_class, sentinel.channel, sentinel.obj_id1): "update",
+                    (mock_class, sentinel.channel, sentinel.obj_id2): "update",
+                },
+            ),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_shares_notify_cache_between_clients_of_same_user(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        other_protocol = factory.buildProtocol(None)
+        other_protocol.user = user
+        other_protocol.request = protocol.request
+        factory.clients.append(other_protocol)
+        self.addCleanup(factory.clients.remove, other_protocol)
+        handlers = []
+
+        def make_handler(*args):
+            handler = MagicMock()
+            handler.on_listen.return_value = None
+            handlers.append(handler)
+            return handler
+
+        handler_class = MagicMock(side_effect=make_handler)
+        handler_class._meta.handler_name = maas_factory.make_name("handler")
+        yield factory.onNotify(
+            handler_class, sentinel.channel, "update", sentinel.obj_id
+        )
+        self.assertEqual(2, len(handlers))
+        self.assertIs(handlers[0].notify_cache, handlers[1].notify_cache)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_carries_on_after_a_failing_notification(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        name = maas_factory.make_name("name")
+        data = maas_factory.make_name("data")
+
+        def on_listen(channel, action, obj_id):
+            if obj_id is sentinel.obj_id1:
+                raise ZeroDivisionError()
+            return name, action, data
+
+        mock_class = MagicMock()
+        mock_class.return_value.on_listen.side_effect = on_listen
+        mock_sendNotify = self.patch(protocol, "sendNotify")
+        with TwistedLoggerFixture() as logger:
+            yield DeferredList(
+                [
+                    factory.onNotify(
+                        mock_class, sentinel.channel, "update", obj_id
+                    )
+                    for obj_id in (sentinel.obj_id1, sentinel.obj_id2)
+                ]
+            )
+        self.assertThat(
+            mock_sendNotify, MockCalledOnceWith(name, "update", data)
+        )
+        self.assertIn("Failed to process notification", logger.output)
+        self.assertIn("ZeroDivisionError", logger.output)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_skips_clients_of_deleted_users(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        deleted_user = yield deferToDatabase(self.make_user)
+        yield deferToDatabase(transactional(deleted_user.delete))
+        other_protocol = factory.buildProtocol(None)
+        other_protocol.user = deleted_user
+        other_protocol.request = protocol.request
+        factory.clients.insert(0, other_protocol)
+        self.addCleanup(factory.clients.remove, other_protocol)
+        mock_class = MagicMock()
+        mock_class.return_value.on_listen.return_value = (
+            sentinel.name,
+            "update",
+            sentinel.data,
+        )
+        mock_sendNotify = self.patch(protocol, "sendNotify")
+        mock_other_sendNotify = self.patch(other_protocol, "sendNotify")
+        yield factory.onNotify(
+            mock_class, sentinel.channel, "update", sentinel.obj_id
+        )
+        self.assertThat(
+            mock_sendNotify,
+            MockCalledOnceWith(sentinel.name, "update", sentinel.data),
+        )
+        self.assertThat(mock_other_sendNotify, MockNotCalled())
+
     @wait_for_reactor
     @inlineCallbacks
     def test_updateRackController_calls_onNotify_for_controller_update(self):
@@ -62,6 +62,7 @@ from maasserver.models import (
     SSLKey,
 )
 from maasserver.models.event import Event
+from maasserver.models.eventtype import EventType
 from maasserver.models.tag import Tag
 from maasserver.models.timestampedmodel import now
 from maasserver.node_status import (
@@ -192,10 +193,21 @@ def check_version(version):
         raise UnknownMetadataVersion("Unknown metadata version: %s" % version)
 
 
-def add_event_to_node_event_log(
-    node, origin, action, description, event_type, result=None, created=None
+def make_node_event_log_events(
+    node,
+    origin,
+    action,
+    description,
+    event_type,
+    result=None,
+    created=None,
+    event_types=None,
 ):
-    """Add an entry to the node's event log."""
+    """Return unsaved events for an entry in the node's event log.
+
+    The event types are registered as needed. Pass a dict as `event_types`
+    to reuse the types registered for earlier entries.
+    """
     if node.status == NODE_STATUS.COMMISSIONING:
         if result in ["SUCCESS", None]:
             type_name = EVENT_TYPES.NODE_COMMISSIONING_EVENT
@@ -221,28 +233,44 @@ def add_event_to_node_event_log(
     else:
         type_name = EVENT_TYPES.NODE_STATUS_EVENT
 
-    # Create an extra event for the machine status messages.
-    if action in EVENT_STATUS_MESSAGES and event_type == "start":
-        Event.objects.register_event_and_event_type(
-            EVENT_STATUS_MESSAGES[action],
-            type_level=EVENT_DETAILS[EVENT_STATUS_MESSAGES[action]].level,
-            type_description=EVENT_DETAILS[
-                EVENT_STATUS_MESSAGES[action]
-            ].description,
-            event_action=action,
-            system_id=node.system_id,
+    if event_types is None:
+        event_types = {}
+
+    def make_event(type_name, description=""):
+        if type_name not in event_types:
+            event_types[type_name] = EventType.objects.register(
+                type_name,
+                EVENT_DETAILS[type_name].description,
+                EVENT_DETAILS[type_name].level,
+            )
+        return Event(
+            type=event_types[type_name],
+            node=node,
+            node_system_id=node.system_id,
+            node_hostname=node.hostname,
+            action=action,
+            description=description,
             created=created,
         )
 
-    return Event.objects.register_event_and_event_type(
-        type_name,
-        type_level=EVENT_DETAILS[type_name].level,
-        type_description=EVENT_DETAILS[type_name].description,
-        event_action=action,
-        event_description="'%s' %s" % (origin, description),
-        system_id=node.system_id,
-        created=created,
+    events = []
+    # Create an extra event for the machine status messages.
+    if action in EVENT_STATUS_MESSAGES and event_type == "start":
+        events.append(make_event(EVENT_STATUS_MESSAGES[action]))
+    events.append(make_event(type_name, "'%s' %s" % (origin, description)))
+    return events
+
+
+def add_event_to_node_event_log(
+    node, origin, action, description, event_type, result=None, created=None
+):
+    """Add an entry to the node's event log."""
+    events = make_node_event_log_events(
+        node, origin, action, description, event_type, result, created
     )
+    for event in events:
+        event.save()
+    return events[-1]
 
 
 def process_file(
@@ -6,8 +6,10 @@
 import base64
 import bz2
 from collections import defaultdict
+from copy import copy
 from datetime import datetime
 import json
+import time
 
 from django.db.utils import DatabaseError
 from twisted.application.internet import TimerService
@@ -18,20 +20,28 @@ from twisted.web.server import NOT_DONE_YET
 from maasserver.api.utils import extract_oauth_key_from_auth_header
 from maasserver.enum import NODE_STATUS, NODE_TYPE
 from maasserver.forms.pods import PodForm
-from maasserver.models import Node, NodeMetadata
+from maasserver.models import Event, Node, NodeMetadata
+from maasserver.models.timestampedmodel import now
 from maasserver.preseed import CURTIN_INSTALL_LOG
 from maasserver.utils.orm import (
     in_transaction,
+    is_retryable_failure,
+    savepoint,
     transactional,
     TransactionManagementError,
 )
 from maasserver.utils.threads import deferToDatabase
 from metadataserver import logger
-from metadataserver.api import add_event_to_node_event_log, process_file
+from metadataserver.api import (
+    add_event_to_node_event_log,
+    make_node_event_log_events,
+    process_file,
+)
 from metadataserver.enum import SCRIPT_STATUS
 from metadataserver.models import NodeKey
 from provisioningserver.events import EVENT_STATUS_MESSAGES
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import deferred
 
 log = LegacyLogger()
@@ -230,7 +240,10 @@ def _create_pod_for_deployment(node):
 class StatusWorkerService(TimerService, object):
     """Service to update nodes from recieved status messages."""
 
-    check_interval = 60  # Every second.
+    check_interval = 0.5  # Every half second.
+
+    # Process the queue straight away once this many messages are waiting.
+    max_queue_size = 100
 
     def __init__(self, dbtasks, clock=reactor):
         # Call self._tryUpdateNodes() every self.check_interval.
@@ -238,15 +251,44 @@ class StatusWorkerService(TimerService, object):
         self.dbtasks = dbtasks
         self.clock = clock
         self.queue = defaultdict(list)
+        self.queue_size = 0
+        self.queue_started = None
+        self.updating = None
 
     def _tryUpdateNodes(self):
-        if len(self.queue) != 0:
+        # Wait for the previous batch to be handed to the database tasks, so
+        # that each node's messages are still processed in order.
+        if len(self.queue) != 0 and self.updating is None:
             queue, self.queue = self.queue, defaultdict(list)
-            d = deferToDatabase(self._preProcessQueue, queue)
+            self._recordQueue(queue_size=0)
+            d = self.updating = deferToDatabase(self._preProcessQueue, queue)
             d.addCallback(self._processMessagesLater)
             d.addErrback(log.err, "Failed to process node status messages.")
+            d.addBoth(self._doneUpdateNodes)
             return d
 
+    def _doneUpdateNodes(self, result):
+        self.updating = None
+        if self.queue_size >= self.max_queue_size:
+            self._tryUpdateNodes()
+        return result
+
+    def _recordQueue(self, queue_size):
+        """Record the size of the queue and, when it's emptied, its lag."""
+        if queue_size == 0 and self.queue_started is not None:
+            PROMETHEUS_METRICS.update(
+                "maas_status_message_queue_lag",
+                "observe",
+                value=time.monotonic() - self.queue_started,
+            )
+            self.queue_started = None
+        elif queue_size != 0 and self.queue_started is None:
+            self.queue_started = time.monotonic()
+        self.queue_size = queue_size
+        PROMETHEUS_METRICS.update(
+            "maas_status_message_queue_depth", "set", value=queue_size
+        )
+
     @transactional
     def _preProcessQueue(self, queue):
         """Check authorizations.
@@ -278,19 +320,75 @@ class StatusWorkerService(TimerService, object):
             )
         else:
             # Here we're in a database thread, with a database connection.
-            for idx, message in enumerate(messages):
-                try:
-                    exists = self._processMessage(node, message)
-                    if not exists:
-                        # Node has been deleted no reason to continue saving
-                        # the events for this node.
-                        break
-                except Exception:
-                    log.err(
-                        None,
-                        "Failed to process message "
-                        "for node: %s" % node.hostname,
-                    )
+            self._processMessageBatch(node, messages)
+
+    @transactional
+    def _processMessageBatch(self, node, messages):
+        """Process all of `messages` for `node` in one transaction.
+
+        Each message is processed in its own savepoint, so that one bad
+        message doesn't lose the others. The events for the messages are
+        inserted together and the node is saved once, at the end.
+        """
+        # Validate that the node still exists since this is a new transaction.
+        try:
+            node = Node.objects.get(id=node.id)
+        except Node.DoesNotExist:
+            # Node has been deleted no reason to continue saving the events
+            # for this node.
+            return False
+
+        events, event_types = [], {}
+
+        def log_event(*args):
+            events.extend(
+                make_node_event_log_events(*args, event_types=event_types)
+            )
+
+        save_node = False
+        for message in messages:
+            num_events = len(events)
+            node_fields = self._getNodeFields(node)
+            try:
+                with savepoint():
+                    if self._updateNode(node, message, log_event):
+                        save_node = True
+            except Exception as error:
+                if is_retryable_failure(error):
+                    raise
+                # Event types registered in the savepoint are gone too.
+                del events[num_events:]
+                event_types.clear()
+                # Rolling back the savepoint doesn't undo the changes made to
+                # the node in memory, which would be saved below.
+                self._setNodeFields(node, node_fields)
+                log.err(
+                    None,
+                    "Failed to process message for node: %s" % node.hostname,
+                )
+
+        for event in events:
+            event.created = event.updated = event.created or now()
+        Event.objects.bulk_create(events)
+        if save_node:
+            node.save()
+        return True
+
+    def _getNodeFields(self, node):
+        """Return the field values of `node`, for `_setNodeFields`."""
+        values = {
+            field.attname: copy(getattr(node, field.attname))
+            for field in node._meta.concrete_fields
+        }
+        return values, dict(node._state.fields_cache)
+
+    def _setNodeFields(self, node, node_fields):
+        """Put back the field values of `node` from `_getNodeFields`."""
+        values, fields_cache = node_fields
+        for name, value in values.items():
+            setattr(node, name, value)
+        # Related objects are cached separately from their ids.
+        node._state.fields_cache = fields_cache
 
     @transactional
     def _processMessage(self, node, message):
@@ -300,6 +398,17 @@ class StatusWorkerService(TimerService, object):
         except Node.DoesNotExist:
             return False
 
+        if self._updateNode(node, message, add_event_to_node_event_log):
+            node.save()
+        return True
+
+    def _updateNode(self, node, message, log_event):
+        """Update `node` from `message`, without saving it.
+
+        :param log_event: Called like `add_event_to_node_event_log` to add
+            an entry to the node's event log.
+        :return: Whether the node needs to be saved.
+        """
         event_type = message["event_type"]
         origin = message["origin"]
         activity_name = message["name"]
@@ -313,7 +422,7 @@ class StatusWorkerService(TimerService, object):
 
         # Add this event to the node event log if 'start' or a 'failure'.
         if event_type == "start" or failed:
-            add_event_to_node_event_log(
+            log_event(
                 node,
                 origin,
                 activity_name,
@@ -468,9 +577,7 @@ class StatusWorkerService(TimerService, object):
             node.reset_status_expires()
             save_node = True
 
-        if save_node:
-            node.save()
-        return True
+        return save_node
 
     def _retrieve_content(self, compression, encoding, content):
         """Extract the content of the sent file."""
@@ -570,3 +677,6 @@ class StatusWorkerService(TimerService, object):
             return d
         else:
             self.queue[authorization].append(message)
+            self._recordQueue(queue_size=self.queue_size + 1)
+            if self.queue_size >= self.max_queue_size:
+                self._tryUpdateNodes()
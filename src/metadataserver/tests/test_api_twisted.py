@@ -11,7 +11,7 @@ from datetime import datetime, timedelta
 from io import BytesIO
 import json
 import random
-from unittest.mock import call, Mock, sentinel
+from unittest.mock import ANY, call, Mock, sentinel
 
 from crochet import wait_for
 from django.db.utils import DatabaseError
@@ -45,6 +45,7 @@ from maastesting.matchers import (
     MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase
+from maastesting.twisted import TwistedLoggerFixture
 from metadataserver import api
 from metadataserver import api_twisted as api_twisted_module
 from metadataserver.api_twisted import (
@@ -184,7 +185,7 @@ class TestStatusWorkerServiceTransactional(MAASTransactionServerTestCase):
         worker = StatusWorkerService(sentinel.dbtasks, clock=sentinel.reactor)
         self.assertEqual(sentinel.dbtasks, worker.dbtasks)
         self.assertEqual(sentinel.reactor, worker.clock)
-        self.assertEqual(60, worker.step)
+        self.assertEqual(0.5, worker.step)
         self.assertEqual((worker._tryUpdateNodes, tuple(), {}), worker.call)
 
     def test_tryUpdateNodes_returns_None_when_empty_queue(self):
@@ -246,33 +247,95 @@ class TestStatusWorkerServiceTransactional(MAASTransactionServerTestCase):
     @inlineCallbacks
     def test_processMessages_doesnt_call_when_node_deleted(self):
         worker = StatusWorkerService(sentinel.dbtasks)
-        mock_processMessage = self.patch(worker, "_processMessage")
-        mock_processMessage.return_value = False
+        mock_updateNode = self.patch(worker, "_updateNode")
+        nodes_with_tokens = yield deferToDatabase(self.make_nodes_with_tokens)
+        node, _ = nodes_with_tokens[0]
+        yield deferToDatabase(transactional(node.delete))
         yield deferToDatabase(
             worker._processMessages,
-            sentinel.node,
+            node,
             [sentinel.message1, sentinel.message2],
         )
-        self.assertThat(
-            mock_processMessage,
-            MockCalledOnceWith(sentinel.node, sentinel.message1),
-        )
+        self.assertThat(mock_updateNode, MockNotCalled())
 
     @wait_for_reactor
     @inlineCallbacks
-    def test_processMessages_calls_processMessage(self):
+    def test_processMessages_calls_updateNode_in_one_transaction(self):
         worker = StatusWorkerService(sentinel.dbtasks)
-        mock_processMessage = self.patch(worker, "_processMessage")
+        mock_updateNode = self.patch(worker, "_updateNode")
+        mock_updateNode.return_value = False
+        mock_processMessageBatch = self.patch(
+            worker,
+            "_processMessageBatch",
+            Mock(wraps=worker._processMessageBatch),
+        )
+        nodes_with_tokens = yield deferToDatabase(self.make_nodes_with_tokens)
+        node, _ = nodes_with_tokens[0]
         yield deferToDatabase(
             worker._processMessages,
-            sentinel.node,
+            node,
             [sentinel.message1, sentinel.message2],
         )
         self.assertThat(
-            mock_processMessage,
+            mock_processMessageBatch,
+            MockCalledOnceWith(node, [sentinel.message1, sentinel.message2]),
+        )
+        self.assertThat(
+            mock_updateNode,
             MockCallsMatch(
-                call(sentinel.node, sentinel.message1),
-                call(sentinel.node, sentinel.message2),
+                call(node, sentinel.message1, ANY),
+                call(node, sentinel.message2, ANY),
+            ),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_queueMessage_updates_nodes_when_queue_is_full(self):
+        worker = StatusWorkerService(sentinel.dbtasks)
+        worker.max_queue_size = 3
+        mock_tryUpdateNodes = self.patch(worker, "_tryUpdateNodes")
+        for _ in range(2):
+            yield worker.queueMessage(
+                factory.make_name("key"), self.make_message()
+            )
+        self.assertThat(mock_tryUpdateNodes, MockNotCalled())
+        yield worker.queueMessage(
+            factory.make_name("key"), self.make_message()
+        )
+        self.assertThat(mock_tryUpdateNodes, MockCalledOnceWith())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_tryUpdateNodes_waits_for_previous_update(self):
+        nodes_with_tokens = yield deferToDatabase(self.make_nodes_with_tokens)
+        dbtasks = Mock()
+        worker = StatusWorkerService(dbtasks)
+        node, token = nodes_with_tokens[0]
+        yield worker.queueMessage(token.key, self.make_message())
+        d = worker._tryUpdateNodes()
+        yield worker.queueMessage(token.key, self.make_message())
+        self.assertIsNone(worker._tryUpdateNodes())
+        yield d
+        self.assertThat(dbtasks.addTask, MockCalledOnceWith(ANY, node, ANY))
+        self.assertEqual(1, worker.queue_size)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_tryUpdateNodes_records_queue_depth_and_lag(self):
+        metrics = self.patch(api_twisted_module, "PROMETHEUS_METRICS")
+        nodes_with_tokens = yield deferToDatabase(self.make_nodes_with_tokens)
+        worker = StatusWorkerService(Mock())
+        for _, token in nodes_with_tokens:
+            yield worker.queueMessage(token.key, self.make_message())
+        yield worker._tryUpdateNodes()
+        self.assertThat(
+            metrics.update,
+            MockCallsMatch(
+                call("maas_status_message_queue_depth", "set", value=1),
+                call("maas_status_message_queue_depth", "set", value=2),
+                call("maas_status_message_queue_depth", "set", value=3),
+                call("maas_status_message_queue_lag", "observe", value=ANY),
+                call("maas_status_message_queue_depth", "set", value=0),
             ),
         )
 
@@ -1062,6 +1125,94 @@ class TestStatusWorkerService(MAASServerTestCase):
             node.status_expires, expected_time + timedelta(minutes=1)
         )
 
+    def make_batch_message(self, **kwargs):
+        message = {
+            "event_type": "start",
+            "origin": "curtin",
+            "name": "cmd-install/%s" % factory.make_name("stage"),
+            "description": factory.make_name("description"),
+            "timestamp": datetime.utcnow() - timedelta(seconds=5),
+        }
+        message.update(kwargs)
+        return message
+
+    def test_process_message_batch_inserts_events(self):
+        node = factory.make_Node(
+            status=NODE_STATUS.DEPLOYING, with_empty_script_sets=True
+        )
+        messages = [self.make_batch_message() for _ in range(3)]
+        worker = StatusWorkerService(sentinel.dbtasks)
+        self.assertTrue(worker._processMessageBatch(node, messages))
+        self.assertEqual(
+            [
+                ("'curtin' %s" % message["description"], message["timestamp"])
+                for message in messages
+            ],
+            [
+                (event.description, event.created)
+                for event in Event.objects.filter(node=node).order_by("id")
+            ],
+        )
+
+    def test_process_message_batch_skips_failed_messages(self):
+        node = factory.make_Node(
+            status=NODE_STATUS.DEPLOYING, with_empty_script_sets=True
+        )
+        bad_message = self.make_batch_message(
+            files=[
+                {
+                    "path": "sample.txt",
+                    "encoding": "uuencode",
+                    "content": encode_as_base64(b"content"),
+                }
+            ]
+        )
+        messages = [
+            self.make_batch_message(),
+            bad_message,
+            self.make_batch_message(),
+        ]
+        worker = StatusWorkerService(sentinel.dbtasks)
+        with TwistedLoggerFixture() as logger:
+            worker._processMessageBatch(node, messages)
+        self.assertIn(
+            "Failed to process message for node: %s" % node.hostname,
+            logger.output,
+        )
+        self.assertItemsEqual(
+            [
+                "'curtin' %s" % messages[0]["description"],
+                "'curtin' %s" % messages[2]["description"],
+            ],
+            [event.description for event in Event.objects.filter(node=node)],
+        )
+
+    def test_process_message_batch_reverts_node_of_failed_messages(self):
+        node = factory.make_Node(status=NODE_STATUS.DEPLOYING)
+        messages = [self.make_batch_message(), self.make_batch_message()]
+
+        def _updateNode(node, message, log_event):
+            node.description = message["description"]
+            if message is messages[1]:
+                raise ZeroDivisionError()
+            return True
+
+        worker = StatusWorkerService(sentinel.dbtasks)
+        self.patch(worker, "_updateNode").side_effect = _updateNode
+        with TwistedLoggerFixture():
+            worker._processMessageBatch(node, messages)
+        self.assertEqual(
+            messages[0]["description"], reload_object(node).description
+        )
+
+    def test_process_message_batch_returns_false_when_node_deleted(self):
+        node = factory.make_Node(status=NODE_STATUS.DEPLOYING)
+        node.delete()
+        worker = StatusWorkerService(sentinel.dbtasks)
+        self.assertFalse(
+            worker._processMessageBatch(node, [self.make_batch_message()])
+        )
+
 
 class TestCreatePodForDeployment(MAASServerTestCase):
     def setUp(self):
@@ -6,6 +6,7 @@
 __all__ = ["BootMethod", "BootMethodRegistry"]
 
 from abc import ABCMeta, abstractproperty
+from collections import OrderedDict
 from errno import ENOENT
 from functools import lru_cache
 from io import BytesIO
@@ -118,6 +119,112 @@ def get_remote_mac():
     return find_mac_via_arp(remote_host)
 
 
+# The number of rendered configurations to keep.
+RENDERED_CONFIG_CACHE_SIZE = 1024
+
+
+def _get_file_signature(path):
+    """Return a signature for the file or directory at `path` that changes
+    whenever it is modified or replaced, or `None` if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class TemplateCache:
+    """A cache of compiled boot templates.
+
+    Each template is compiled once and used until its file is modified or
+    replaced, which is noticed by comparing the file's inode, size and
+    modification time before each use. The template chosen from a list of
+    candidate filenames is remembered until the directory's modification
+    time changes, i.e. until a template is added, renamed or removed.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._resolved = {}
+
+    def get_template(self, directory, filenames):
+        """Return the first of `filenames` in `directory` that exists,
+        compiled, or `None` if there are none.
+        """
+        filenames = tuple(filenames)
+        signature = _get_file_signature(directory)
+        resolved = self._resolved.get((directory, filenames))
+        if resolved is not None and resolved[0] == signature:
+            template = self._get(resolved[1])
+            if template is not None:
+                return template
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            template = self._get(path)
+            if template is not None:
+                self._resolved[directory, filenames] = signature, path
+                return template
+        return None
+
+    def _get(self, path):
+        signature = _get_file_signature(path)
+        if signature is None:
+            self._templates.pop(path, None)
+            return None
+        cached = self._templates.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            template = tempita.Template.from_filename(path, encoding="UTF-8")
+        except IOError as error:
+            if error.errno != ENOENT:
+                raise
+            return None
+        else:
+            self._templates[path] = signature, template
+            return template
+
+    def clear(self):
+        self._templates.clear()
+        self._resolved.clear()
+
+
+class RenderedConfigCache:
+    """A cache of rendered boot configurations.
+
+    Configurations are keyed by the template they were rendered from, so a
+    template that's changed on disk is rendered afresh. The least recently
+    used configurations are dropped once there are more than `size`.
+    """
+
+    def __init__(self, size=RENDERED_CONFIG_CACHE_SIZE):
+        self.size = size
+        self._configs = OrderedDict()
+
+    def get(self, key, render):
+        """Return the configuration for `key`, calling `render` if it
+        hasn't been rendered yet."""
+        try:
+            config = self._configs.get(key)
+        except TypeError:
+            # Part of the key is unhashable; don't cache.
+            return render()
+        if config is not None:
+            self._configs.move_to_end(key)
+            return config
+        config = self._configs[key] = render()
+        while len(self._configs) > self.size:
+            self._configs.popitem(last=False)
+        return config
+
+    def clear(self):
+        self._configs.clear()
+
+
+template_cache = TemplateCache()
+rendered_config_cache = RenderedConfigCache()
+
+
 class BootMethod(metaclass=ABCMeta):
     """Skeleton for a boot method."""
 
@@ -311,11 +418,11 @@ class BootMethod(metaclass=ABCMeta):
         """Gets the template directory for the boot method."""
         return locate_template("%s" % self.template_subdir)
 
-    @lru_cache(512)
     def get_template(self, purpose, arch, subarch):
         """Gets the best avaliable template for the boot method.
 
-        Templates are loaded each time here so that they can be changed on
+        Templates are compiled once and cached, but a template that is
+        changed on disk is loaded again, so that they can be changed on
         the fly without restarting the provisioning server.
 
         :param purpose: The boot purpose, e.g. "local".
@@ -324,15 +431,11 @@ class BootMethod(metaclass=ABCMeta):
         :return: `tempita.Template`
         """
         pxe_templates_dir = self.get_template_dir()
-        for filename in gen_template_filenames(purpose, arch, subarch):
-            template_name = os.path.join(pxe_templates_dir, filename)
-            try:
-                return tempita.Template.from_filename(
-                    template_name, encoding="UTF-8"
-                )
-            except IOError as error:
-                if error.errno != ENOENT:
-                    raise
+        template = template_cache.get_template(
+            pxe_templates_dir, gen_template_filenames(purpose, arch, subarch)
+        )
+        if template is not None:
+            return template
         else:
             error = (
                 "No PXE template found in %r for:\n"
@@ -423,6 +526,36 @@ class BootMethod(metaclass=ABCMeta):
 
         return namespace
 
+    def render_config(
+        self, template, kernel_params, namespace, passes=1, key=()
+    ):
+        """Render a configuration file from `template` and `namespace`.
+
+        Rendered configurations are cached for the template and the kernel
+        parameters, including attributes set on them like `mac`; anything
+        else that the namespace depends upon must be passed in `key`.
+
+        :param passes: The number of times to substitute `namespace`, for
+            when the substituted values can contain variables themselves.
+        :return: The configuration as bytes.
+        """
+
+        def render():
+            config = template.substitute(namespace)
+            for _ in range(passes - 1):
+                config = tempita.Template(config).substitute(namespace)
+            return config.encode("utf-8")
+
+        cache_key = (
+            self.name,
+            template,
+            kernel_params,
+            tuple(sorted(vars(kernel_params).items())),
+            passes,
+            key,
+        )
+        return rendered_config_cache.get(cache_key, render)
+
 
 class BootMethodRegistry(Registry):
     """Registry for boot method classes."""
@@ -10,8 +10,6 @@ import os
 import re
 from textwrap import dedent
 
-import tempita
-
 from provisioningserver.boot import BootMethod, BytesReader, get_parameters
 from provisioningserver.utils import typed
 
@@ -108,9 +106,8 @@ class IPXEBootMethod(BootMethod):
         # For example, an OS may need a kernel parameter that points back to
         # fs_host and the kernel parameter comes through as part of
         # the simplestream.
-        step1 = template.substitute(namespace)
         return BytesReader(
-            tempita.Template(step1).substitute(namespace).encode("utf-8")
+            self.render_config(template, kernel_params, namespace, passes=2)
         )
 
     @typed
@@ -10,8 +10,6 @@ import os
 import re
 import shutil
 
-import tempita
-
 from provisioningserver.boot import BootMethod, BytesReader, get_parameters
 from provisioningserver.events import EVENT_TYPES, try_send_rack_event
 from provisioningserver.logger import get_maas_logger
@@ -123,9 +121,8 @@ class PXEBootMethod(BootMethod):
         # For example, an OS may need a kernel parameter that points back to
         # fs_host and the kernel parameter comes through as part of the simple
         # stream.
-        step1 = template.substitute(namespace)
         return BytesReader(
-            tempita.Template(step1).substitute(namespace).encode("utf-8")
+            self.render_config(template, kernel_params, namespace, passes=2)
         )
 
     def link_bootloader(self, destination: str):
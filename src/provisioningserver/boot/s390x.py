@@ -146,7 +146,9 @@ class S390XBootMethod(BootMethod):
             return cmd_line
 
         namespace["kernel_command"] = kernel_command
-        return BytesReader(template.substitute(namespace).encode("utf-8"))
+        return BytesReader(
+            self.render_config(template, kernel_params, namespace, key=(mac,))
+        )
 
     @typed
     def link_bootloader(self, destination: str):
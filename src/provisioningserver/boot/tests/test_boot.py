@@ -83,10 +83,13 @@ class TestBootMethod(MAASTestCase):
         self.assertSequenceEqual(expected, list(observed))
 
     def test_get_pxe_template(self):
+        templates_dir = self.make_dir()
         method = FakeBootMethod()
+        method.get_template_dir = lambda: templates_dir
         purpose = factory.make_name("purpose")
         arch, subarch = factory.make_names("arch", "subarch")
         filename = factory.make_name("filename")
+        factory.make_file(templates_dir, filename)
         # Set up the mocks that we've patched in.
         gen_filenames = self.patch(boot, "gen_template_filenames")
         gen_filenames.return_value = [filename]
@@ -100,7 +103,7 @@ class TestBootMethod(MAASTestCase):
         # Tempita.from_filename is called with an absolute path derived from
         # the filename returned from gen_pxe_template_filenames.
         from_filename.assert_called_once_with(
-            os.path.join(method.get_template_dir(), filename), encoding="UTF-8"
+            os.path.join(templates_dir, filename), encoding="UTF-8"
         )
 
     def test_get_template_gets_default_if_available(self):
@@ -134,7 +137,10 @@ class TestBootMethod(MAASTestCase):
     def test_get_templates_only_suppresses_ENOENT(self):
         # The IOError arising from trying to load a template that doesn't
         # exist is suppressed, but other errors are not.
+        templates_dir = self.make_dir()
         method = FakeBootMethod()
+        method.get_template_dir = lambda: templates_dir
+        factory.make_file(templates_dir, "config.template")
         from_filename = self.patch(tempita.Template, "from_filename")
         from_filename.side_effect = IOError()
         from_filename.side_effect.errno = errno.EACCES
@@ -144,6 +150,120 @@ class TestBootMethod(MAASTestCase):
             *factory.make_names("purpose", "arch", "subarch")
         )
 
+    def test_get_template_compiles_template_once(self):
+        templates_dir = self.make_dir()
+        method = FakeBootMethod()
+        method.get_template_dir = lambda: templates_dir
+        factory.make_file(templates_dir, "config.template")
+        from_filename = self.patch(tempita.Template, "from_filename")
+        purpose, arch, subarch = factory.make_names("purpose", "arch", "sub")
+        self.assertIs(
+            method.get_template(purpose, arch, subarch),
+            method.get_template(purpose, arch, subarch),
+        )
+        self.assertThat(from_filename, MockCalledOnce())
+
+    def test_get_template_reloads_changed_template(self):
+        templates_dir = self.make_dir()
+        method = FakeBootMethod()
+        method.get_template_dir = lambda: templates_dir
+        template_path = factory.make_file(
+            templates_dir, "config.template", contents=b"old"
+        )
+        purpose, arch, subarch = factory.make_names("purpose", "arch", "sub")
+        self.assertEqual(
+            "old", method.get_template(purpose, arch, subarch).substitute()
+        )
+        with open(template_path, "w") as fd:
+            fd.write("new template")
+        self.assertEqual(
+            "new template",
+            method.get_template(purpose, arch, subarch).substitute(),
+        )
+
+    def test_get_template_picks_up_new_more_specific_template(self):
+        templates_dir = self.make_dir()
+        method = FakeBootMethod()
+        method.get_template_dir = lambda: templates_dir
+        factory.make_file(templates_dir, "config.template", contents=b"any")
+        purpose, arch, subarch = factory.make_names("purpose", "arch", "sub")
+        self.assertEqual(
+            "any", method.get_template(purpose, arch, subarch).substitute()
+        )
+        factory.make_file(
+            templates_dir, "config.%s.template" % purpose, contents=b"purpose"
+        )
+        # Adding the file changes the directory's modification time, but
+        # make sure that's noticed on filesystems with coarse timestamps.
+        stat = os.stat(templates_dir)
+        os.utime(
+            templates_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)
+        )
+        self.assertEqual(
+            "purpose", method.get_template(purpose, arch, subarch).substitute()
+        )
+
+    def test_render_config_renders_template(self):
+        method = FakeBootMethod()
+        template = tempita.Template("{{greeting}}")
+        kernel_params = make_kernel_parameters()
+        self.assertEqual(
+            b"hello",
+            method.render_config(
+                template, kernel_params, {"greeting": "hello"}
+            ),
+        )
+
+    def test_render_config_substitutes_multiple_times(self):
+        method = FakeBootMethod()
+        template = tempita.Template("{{greeting}}")
+        kernel_params = make_kernel_parameters()
+        namespace = {"greeting": "{{name}}", "name": "hello"}
+        self.assertEqual(
+            b"hello",
+            method.render_config(template, kernel_params, namespace, passes=2),
+        )
+
+    def test_render_config_caches_rendered_config(self):
+        method = FakeBootMethod()
+        template = tempita.Template("{{greeting}}")
+        kernel_params = make_kernel_parameters()
+        substitute = self.patch(template, "substitute")
+        substitute.return_value = "hello"
+        method.render_config(template, kernel_params, {})
+        self.assertEqual(
+            b"hello", method.render_config(template, kernel_params, {})
+        )
+        self.assertThat(substitute, MockCalledOnce())
+
+    def test_render_config_renders_for_different_key(self):
+        method = FakeBootMethod()
+        template = tempita.Template("{{greeting}}")
+        kernel_params = make_kernel_parameters()
+        self.assertEqual(
+            [b"hello", b"goodbye"],
+            [
+                method.render_config(
+                    template, kernel_params, {"greeting": greeting}, key=key
+                )
+                for greeting, key in (("hello", (1,)), ("goodbye", (2,)))
+            ],
+        )
+
+    def test_render_config_renders_for_different_mac(self):
+        method = FakeBootMethod()
+        template = tempita.Template("{{kernel_params.mac}}")
+        kernel_params = make_kernel_parameters()
+        macs = [factory.make_mac_address() for _ in range(2)]
+        rendered = []
+        for mac in macs:
+            kernel_params.mac = mac
+            namespace = {"kernel_params": kernel_params}
+            rendered.append(
+                method.render_config(template, kernel_params, namespace)
+            )
+        self.assertEqual([mac.encode("ascii") for mac in macs], rendered)
+
     def test_link_bootloader_links_simplestream_bootloader_files(self):
         method = FakeBootMethod()
         with tempdir() as tmp:
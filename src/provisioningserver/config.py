@@ -791,6 +791,13 @@ class ClusterConfiguration(Configuration, metaclass=ClusterConfigurationMeta):
         ),
     )
 
+    # Boot image import options.
+    image_download_workers = ConfigurationOption(
+        "image_download_workers",
+        "The number of boot image files to download from the region at once.",
+        Number(min=1, if_missing=4),
+    )
+
     # GRUB options.
 
     @property
@@ -0,0 +1,371 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""In-process client for the ISC DHCP server's OMAPI.
+
+This speaks the OMAPI wire protocol directly over a single TCP connection,
+authenticated with the HMAC-MD5 key configured in dhcpd.conf, so that many
+host map changes can be applied without forking an `omshell` per change.
+"""
+
+__all__ = [
+    "OmapiClient",
+    "OmapiConnectionError",
+    "OmapiError",
+]
+
+import base64
+import hashlib
+import hmac
+import random
+import socket
+import struct
+
+from netaddr import EUI, IPAddress
+
+from provisioningserver.logger import LegacyLogger
+from provisioningserver.utils import typed
+
+log = LegacyLogger()
+
+# Protocol version and header size sent by both ends on connect.
+OMAPI_PROTOCOL_VERSION = 100
+OMAPI_HEADER_SIZE = 24
+
+OMAPI_OP_OPEN = 1
+OMAPI_OP_REFRESH = 2
+OMAPI_OP_UPDATE = 3
+OMAPI_OP_NOTIFY = 4
+OMAPI_OP_STATUS = 5
+OMAPI_OP_DELETE = 6
+
+# Name of the key in the dhcpd configuration templates.
+OMAPI_KEY_NAME = "omapi_key"
+OMAPI_KEY_ALGORITHM = b"hmac-md5.SIG-ALG.REG.INT."
+
+# Header: authid, authlen, opcode, handle, tid, rid.
+_header = struct.Struct("!IIIIII")
+_net16 = struct.Struct("!H")
+_net32 = struct.Struct("!I")
+
+
+class OmapiError(Exception):
+    """The DHCP server rejected or failed an OMAPI request."""
+
+
+class OmapiConnectionError(OmapiError):
+    """The DHCP server could not be reached over OMAPI."""
+
+
+class OmapiMessage:
+    """A single OMAPI message.
+
+    `message` and `obj` are lists of `(name, value)` byte string pairs, in
+    the order they are sent on the wire.
+    """
+
+    def __init__(self, opcode, handle=0, tid=0, rid=0, message=None, obj=None):
+        self.authid = 0
+        self.signature = b""
+        self.opcode = opcode
+        self.handle = handle
+        self.tid = tid
+        self.rid = rid
+        self.message = [] if message is None else message
+        self.obj = [] if obj is None else obj
+
+    def _pack_body(self):
+        """Pack everything covered by the signature."""
+        parts = [
+            _net32.pack(len(self.signature)),
+            _net32.pack(self.opcode),
+            _net32.pack(self.handle),
+            _net32.pack(self.tid),
+            _net32.pack(self.rid),
+        ]
+        for values in (self.message, self.obj):
+            for name, value in values:
+                parts.append(_net16.pack(len(name)))
+                parts.append(name)
+                parts.append(_net32.pack(len(value)))
+                parts.append(value)
+            parts.append(_net16.pack(0))
+        return b"".join(parts)
+
+    def sign(self, authid, key):
+        """Sign this message with `key`, identified by `authid`."""
+        self.authid = authid
+        # The signature length is part of the signed data.
+        self.signature = b"\0" * hashlib.md5().digest_size
+        self.signature = hmac.new(key, self._pack_body(), "md5").digest()
+
+    def verify(self, key):
+        """Return True if this message was signed with `key`."""
+        signature = self.signature
+        expected = hmac.new(key, self._pack_body(), "md5").digest()
+        return hmac.compare_digest(signature, expected)
+
+    def pack(self):
+        return _net32.pack(self.authid) + self._pack_body() + self.signature
+
+    def get_message(self, name, default=None):
+        return dict(self.message).get(name, default)
+
+    def get_obj(self, name, default=None):
+        return dict(self.obj).get(name, default)
+
+
+def read_message(sock):
+    """Read one `OmapiMessage` from `sock`."""
+    authid, authlen, opcode, handle, tid, rid = _header.unpack(
+        _recv_exactly(sock, _header.size)
+    )
+    message = OmapiMessage(opcode, handle=handle, tid=tid, rid=rid)
+    message.authid = authid
+    message.message = _read_values(sock)
+    message.obj = _read_values(sock)
+    message.signature = _recv_exactly(sock, authlen)
+    return message
+
+
+def _read_values(sock):
+    values = []
+    while True:
+        (name_len,) = _net16.unpack(_recv_exactly(sock, _net16.size))
+        if name_len == 0:
+            return values
+        name = _recv_exactly(sock, name_len)
+        (value_len,) = _net32.unpack(_recv_exactly(sock, _net32.size))
+        values.append((name, _recv_exactly(sock, value_len)))
+
+
+def _recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise OmapiConnectionError("Connection closed by DHCP server.")
+        data += chunk
+    return data
+
+
+def _host_name(mac_address):
+    # The "name" is not a host name; it's an identifier used within the
+    # DHCP server. MAAS uses the MAC address; see `Omshell.create`.
+    return mac_address.replace(":", "-").encode("ascii")
+
+
+def _host_object(ip_address, mac_address):
+    return [
+        (b"ip-address", IPAddress(ip_address).packed),
+        (b"hardware-address", EUI(mac_address).packed),
+        (b"hardware-type", _net32.pack(1)),
+    ]
+
+
+class OmapiClient:
+    """Manipulate host maps in a running DHCP server over OMAPI.
+
+    A connection is opened and authenticated once, then every call is sent
+    over it. Use as a context manager::
+
+        with OmapiClient("127.0.0.1", omapi_key) as omapi:
+            for host in hosts:
+                omapi.create(host["ip"], host["mac"])
+
+    :param server_address: The address for the DHCP server.
+    :param shared_key: The base64 encoded HMAC-MD5 key, as generated by
+        `generate_omapi_key`.
+    :param ipv6: Talk to the DHCPv6 server instead of the DHCPv4 server.
+    :param timeout: Seconds to wait for the server on each operation.
+    """
+
+    def __init__(self, server_address, shared_key, ipv6=False, timeout=10):
+        self.server_address = server_address
+        self.shared_key = shared_key
+        self.ipv6 = ipv6
+        self.timeout = timeout
+        if ipv6 is True:
+            self.server_port = 7912
+        else:
+            self.server_port = 7911
+        self._key = base64.b64decode(shared_key)
+        self._sock = None
+        self._authid = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connect(self):
+        """Connect and authenticate to the DHCP server."""
+        try:
+            self._sock = socket.create_connection(
+                (self.server_address, self.server_port), self.timeout
+            )
+            startup = struct.pack(
+                "!II", OMAPI_PROTOCOL_VERSION, OMAPI_HEADER_SIZE
+            )
+            self._sock.sendall(startup)
+            if _recv_exactly(self._sock, len(startup)) != startup:
+                raise OmapiError("Unsupported OMAPI protocol version.")
+        except OSError as error:
+            self.close()
+            raise OmapiConnectionError(str(error)) from error
+        except OmapiError:
+            self.close()
+            raise
+        # Authenticators are opened unsigned; the handle returned is the
+        # id used to sign everything that follows.
+        response = self._query(
+            OmapiMessage(
+                OMAPI_OP_OPEN,
+                message=[(b"type", b"authenticator")],
+                obj=[
+                    (b"name", OMAPI_KEY_NAME.encode("ascii")),
+                    (b"algorithm", OMAPI_KEY_ALGORITHM),
+                ],
+            )
+        )
+        if response.opcode != OMAPI_OP_UPDATE or response.handle == 0:
+            self.close()
+            raise OmapiError(
+                "Authentication failed: %s" % _status_text(response)
+            )
+        self._authid = response.handle
+
+    def close(self):
+        """Close the connection to the DHCP server."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._authid = None
+
+    def _query(self, message):
+        """Send `message` and return the server's response to it."""
+        if self._sock is None:
+            raise OmapiConnectionError("Not connected to the DHCP server.")
+        message.tid = random.getrandbits(32)
+        if self._authid is not None:
+            message.sign(self._authid, self._key)
+        try:
+            self._sock.sendall(message.pack())
+            response = read_message(self._sock)
+        except OSError as error:
+            self.close()
+            raise OmapiConnectionError(str(error)) from error
+        if response.rid != message.tid:
+            self.close()
+            raise OmapiError("Response does not match the request sent.")
+        if self._authid is not None and not response.verify(self._key):
+            self.close()
+            raise OmapiError("Response signature does not match.")
+        return response
+
+    def _open_host(self, mac_address):
+        """Return the handle of the host map for `mac_address`.
+
+        Returns None when no such host map exists.
+        """
+        response = self._query(
+            OmapiMessage(
+                OMAPI_OP_OPEN,
+                message=[(b"type", b"host")],
+                obj=[(b"name", _host_name(mac_address))],
+            )
+        )
+        if response.opcode == OMAPI_OP_UPDATE and response.handle != 0:
+            return response.handle
+        elif b"not found" in _status_message(response):
+            return None
+        else:
+            raise _status_error(response)
+
+    @typed
+    def create(self, ip_address: str, mac_address: str):
+        """Create a host map for `mac_address` -> `ip_address`.
+
+        A host map that already exists is updated instead.
+        """
+        log.debug(
+            "Creating host mapping {mac}->{ip}", mac=mac_address, ip=ip_address
+        )
+        response = self._query(
+            OmapiMessage(
+                OMAPI_OP_OPEN,
+                message=[
+                    (b"type", b"host"),
+                    (b"create", _net32.pack(1)),
+                    (b"exclusive", _net32.pack(1)),
+                ],
+                obj=[(b"name", _host_name(mac_address))]
+                + _host_object(ip_address, mac_address),
+            )
+        )
+        if response.opcode == OMAPI_OP_UPDATE:
+            return
+        elif b"already exists" in _status_message(response):
+            self.modify(ip_address, mac_address)
+        else:
+            raise _status_error(response)
+
+    @typed
+    def modify(self, ip_address: str, mac_address: str):
+        """Point the existing host map for `mac_address` at `ip_address`."""
+        log.debug(
+            "Modifing host mapping {mac}->{ip}", mac=mac_address, ip=ip_address
+        )
+        handle = self._open_host(mac_address)
+        if handle is None:
+            raise OmapiError("Host map for %s not found." % mac_address)
+        response = self._query(
+            OmapiMessage(
+                OMAPI_OP_UPDATE,
+                handle=handle,
+                obj=_host_object(ip_address, mac_address),
+            )
+        )
+        if response.opcode != OMAPI_OP_UPDATE:
+            raise _status_error(response)
+
+    @typed
+    def remove(self, mac_address: str):
+        """Remove the host map for `mac_address`.
+
+        A host map that does not exist is considered already removed.
+        """
+        log.debug("Removing host mapping key={mac}", mac=mac_address)
+        handle = self._open_host(mac_address)
+        if handle is None:
+            return
+        response = self._query(OmapiMessage(OMAPI_OP_DELETE, handle=handle))
+        if response.opcode != OMAPI_OP_STATUS or _status_failed(response):
+            raise _status_error(response)
+
+
+def _status_message(response):
+    """Return the error text sent with a status response, if any."""
+    if response.opcode != OMAPI_OP_STATUS:
+        return b""
+    return response.get_message(b"message", b"")
+
+
+def _status_text(response):
+    """Return text describing a failed `response`."""
+    message = _status_message(response).decode("utf-8", "replace")
+    if not message:
+        message = "Unexpected response (opcode %d)." % response.opcode
+    return message
+
+
+def _status_error(response):
+    """Return an `OmapiError` describing a failed `response`."""
+    return OmapiError(_status_text(response))
+
+
+def _status_failed(response):
+    result = response.get_message(b"result")
+    return result is not None and _net32.unpack(result)[0] != 0
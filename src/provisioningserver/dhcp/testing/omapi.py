@@ -0,0 +1,126 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""A local OMAPI server for testing the OMAPI client against."""
+
+__all__ = ["FakeOmapiServer"]
+
+import base64
+from itertools import count
+import socketserver
+import struct
+import threading
+
+from fixtures import Fixture
+
+from provisioningserver.dhcp.omapi import (
+    OMAPI_HEADER_SIZE,
+    OMAPI_KEY_NAME,
+    OMAPI_OP_DELETE,
+    OMAPI_OP_OPEN,
+    OMAPI_OP_STATUS,
+    OMAPI_OP_UPDATE,
+    OMAPI_PROTOCOL_VERSION,
+    OmapiConnectionError,
+    OmapiMessage,
+    read_message,
+)
+
+
+class _OmapiHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        fake = self.server.fake
+        fake.connections += 1
+        startup = struct.pack("!II", OMAPI_PROTOCOL_VERSION, OMAPI_HEADER_SIZE)
+        self.request.sendall(startup)
+        self.authid = None
+        self.handles = {}
+        self.handle_ids = count(2)
+        try:
+            if self.request.recv(len(startup)) != startup:
+                return
+            while True:
+                request = read_message(self.request)
+                response = self.respond(request)
+                response.rid = request.tid
+                if self.authid is not None:
+                    response.sign(self.authid, fake.key)
+                self.request.sendall(response.pack())
+        except OmapiConnectionError:
+            return
+
+    def status(self, message):
+        return OmapiMessage(
+            OMAPI_OP_STATUS,
+            message=[
+                (b"result", struct.pack("!I", 1)),
+                (b"message", message.encode("ascii")),
+            ],
+        )
+
+    def respond(self, request):
+        fake = self.server.fake
+        if self.authid is not None and not request.verify(fake.key):
+            return self.status("invalid signature")
+        kind = request.get_message(b"type")
+        if request.opcode == OMAPI_OP_OPEN and kind == b"authenticator":
+            if request.get_obj(b"name") != OMAPI_KEY_NAME.encode("ascii"):
+                return self.status("not found")
+            self.authid = 1
+            return OmapiMessage(OMAPI_OP_UPDATE, handle=self.authid)
+        elif self.authid is None:
+            return self.status("no key")
+        elif request.opcode == OMAPI_OP_OPEN and kind == b"host":
+            name = request.get_obj(b"name")
+            create = request.get_message(b"create") is not None
+            if name in fake.hosts and create:
+                return self.status("already exists")
+            elif create:
+                fake.hosts[name] = dict(request.obj)
+            elif name not in fake.hosts:
+                return self.status("not found")
+            handle = next(self.handle_ids)
+            self.handles[handle] = name
+            return OmapiMessage(OMAPI_OP_UPDATE, handle=handle)
+        elif request.opcode == OMAPI_OP_UPDATE:
+            name = self.handles[request.handle]
+            fake.hosts[name].update(dict(request.obj))
+            return OmapiMessage(OMAPI_OP_UPDATE, handle=request.handle)
+        elif request.opcode == OMAPI_OP_DELETE:
+            del fake.hosts[self.handles.pop(request.handle)]
+            return OmapiMessage(
+                OMAPI_OP_STATUS, message=[(b"result", struct.pack("!I", 0))]
+            )
+        else:
+            return self.status("not implemented")
+
+
+class FakeOmapiServer(Fixture):
+    """Serve host maps over OMAPI on a local port, like dhcpd does.
+
+    :ivar hosts: A dict of host maps, keyed by name, of the object values
+        sent by the client.
+    :ivar connections: The number of connections made so far.
+    """
+
+    def __init__(self, shared_key):
+        super().__init__()
+        self.key = base64.b64decode(shared_key)
+        self.hosts = {}
+        self.connections = 0
+
+    def _setUp(self):
+        server = socketserver.ThreadingTCPServer(
+            ("127.0.0.1", 0), _OmapiHandler
+        )
+        server.daemon_threads = True
+        server.fake = self
+        self.port = server.server_address[1]
+        thread = threading.Thread(
+            target=server.serve_forever,
+            kwargs={"poll_interval": 0.01},
+            daemon=True,
+        )
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
@@ -0,0 +1,159 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the OMAPI client."""
+
+import socket
+
+from netaddr import EUI, IPAddress
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.dhcp import omapi
+from provisioningserver.dhcp.omapi import (
+    OMAPI_OP_OPEN,
+    OmapiClient,
+    OmapiConnectionError,
+    OmapiError,
+    OmapiMessage,
+)
+from provisioningserver.dhcp.omshell import generate_omapi_key
+from provisioningserver.dhcp.testing.omapi import FakeOmapiServer
+
+
+class TestOmapiMessage(MAASTestCase):
+    def test_verify_accepts_signed_message(self):
+        key = factory.make_bytes()
+        message = OmapiMessage(
+            OMAPI_OP_OPEN, message=[(b"type", b"host")], obj=[(b"a", b"b")]
+        )
+        message.sign(1, key)
+        self.assertEqual(16, len(message.signature))
+        self.assertTrue(message.verify(key))
+
+    def test_verify_rejects_tampered_message(self):
+        key = factory.make_bytes()
+        message = OmapiMessage(OMAPI_OP_OPEN, obj=[(b"a", b"b")])
+        message.sign(1, key)
+        message.obj = [(b"a", b"c")]
+        self.assertFalse(message.verify(key))
+
+
+class TestOmapiClient(MAASTestCase):
+
+    scenarios = (
+        ("IPv4", {"ipv6": False, "port": 7911}),
+        ("IPv6", {"ipv6": True, "port": 7912}),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.key = generate_omapi_key()
+        self.server = self.useFixture(FakeOmapiServer(self.key))
+
+    def make_client(self, key=None):
+        client = OmapiClient(
+            "127.0.0.1", self.key if key is None else key, ipv6=self.ipv6
+        )
+        client.server_port = self.server.port
+        return client
+
+    def make_ip_address(self):
+        return factory.make_ip_address(ipv6=self.ipv6)
+
+    def test_initialisation(self):
+        client = OmapiClient("127.0.0.1", self.key, ipv6=self.ipv6)
+        self.assertEqual(self.port, client.server_port)
+
+    def test_create(self):
+        ip = self.make_ip_address()
+        mac = factory.make_mac_address()
+        with self.make_client() as client:
+            client.create(ip, mac)
+        name = mac.replace(":", "-").encode("ascii")
+        host = self.server.hosts[name]
+        self.assertEqual(IPAddress(ip).packed, host[b"ip-address"])
+        self.assertEqual(EUI(mac).packed, host[b"hardware-address"])
+
+    def test_create_updates_existing_host(self):
+        ip = self.make_ip_address()
+        mac = factory.make_mac_address()
+        with self.make_client() as client:
+            client.create(self.make_ip_address(), mac)
+            client.create(ip, mac)
+        name = mac.replace(":", "-").encode("ascii")
+        host = self.server.hosts[name]
+        self.assertEqual(IPAddress(ip).packed, host[b"ip-address"])
+
+    def test_modify(self):
+        ip = self.make_ip_address()
+        mac = factory.make_mac_address()
+        with self.make_client() as client:
+            client.create(self.make_ip_address(), mac)
+            client.modify(ip, mac)
+        name = mac.replace(":", "-").encode("ascii")
+        host = self.server.hosts[name]
+        self.assertEqual(IPAddress(ip).packed, host[b"ip-address"])
+
+    def test_modify_raises_error_for_unknown_host(self):
+        with self.make_client() as client:
+            self.assertRaises(
+                OmapiError,
+                client.modify,
+                self.make_ip_address(),
+                factory.make_mac_address(),
+            )
+
+    def test_remove(self):
+        mac = factory.make_mac_address()
+        with self.make_client() as client:
+            client.create(self.make_ip_address(), mac)
+            client.remove(mac)
+        self.assertEqual({}, self.server.hosts)
+
+    def test_remove_ignores_unknown_host(self):
+        with self.make_client() as client:
+            client.remove(factory.make_mac_address())
+
+    def test_uses_one_connection_for_many_changes(self):
+        macs = [factory.make_mac_address() for _ in range(5)]
+        with self.make_client() as client:
+            for mac in macs:
+                client.create(self.make_ip_address(), mac)
+            for mac in macs[:2]:
+                client.remove(mac)
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(3, len(self.server.hosts))
+
+    def test_connect_raises_error_with_wrong_key(self):
+        client = self.make_client(key=generate_omapi_key())
+        client.connect()
+        self.addCleanup(client.close)
+        # The server refuses the request and signs its answer with a key
+        # the client does not share.
+        self.assertRaises(
+            OmapiError,
+            client.create,
+            self.make_ip_address(),
+            factory.make_mac_address(),
+        )
+
+    def test_connect_raises_error_when_authentication_fails(self):
+        self.patch(omapi, "OMAPI_KEY_NAME", factory.make_name("key"))
+        client = self.make_client()
+        error = self.assertRaises(OmapiError, client.connect)
+        self.assertEqual("Authentication failed: not found", str(error))
+
+    def test_connect_raises_connection_error_when_not_listening(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        client = self.make_client()
+        client.server_port = sock.getsockname()[1]
+        sock.close()
+        self.assertRaises(OmapiConnectionError, client.connect)
+
+    def test_query_raises_connection_error_when_not_connected(self):
+        client = self.make_client()
+        self.assertRaises(
+            OmapiConnectionError, client.remove, factory.make_mac_address()
+        )
@@ -4,20 +4,25 @@
 """Low-level actions to manage the DNS service, like reloading zones."""
 
 __all__ = [
+    "bind_freeze_zones",
     "bind_reconfigure",
     "bind_reload",
     "bind_reload_zones",
+    "bind_thaw_zones",
+    "bind_update_zones",
     "bind_write_configuration",
     "bind_write_options",
     "bind_write_zones",
 ]
 
+from collections import defaultdict
 from collections.abc import Sequence
 from subprocess import CalledProcessError, TimeoutExpired
 from time import sleep
 
 from provisioningserver.dns.config import (
     DNSConfig,
+    execute_nsupdate_command,
     execute_rndc_command,
     set_up_options_conf,
 )
@@ -101,6 +106,116 @@ def bind_reload_zones(zone_list):
     return ret
 
 
+def _execute_rndc_zone_command(command, zone_list, description):
+    """Run an rndc `command` for each zone in `zone_list`.
+
+    With no zones, the command is run once for all zones.
+
+    :return: True if success, False otherwise.
+    """
+    ret = True
+    if zone_list is None:
+        zone_list = [None]
+    elif not isinstance(zone_list, list):
+        zone_list = [zone_list]
+    for name in zone_list:
+        arguments = (command,) if name is None else (command, name)
+        try:
+            execute_rndc_command(arguments)
+        except CalledProcessError as exc:
+            maaslog.error(
+                "%s BIND zone %r failed (is it running?): %s",
+                description,
+                "*" if name is None else name,
+                exc,
+            )
+            ret = False
+    return ret
+
+
+def bind_freeze_zones(zone_list=None):
+    """Ask BIND to stop accepting dynamic updates for the given zones.
+
+    Pending updates are written out to the zone files, which can then be
+    safely rewritten. The zones must be thawed afterwards.
+
+    :param zone_list: A list of zone names, or a single name as a string.
+        Defaults to all zones.
+    :return: True if success, False otherwise.
+    """
+    return _execute_rndc_zone_command("freeze", zone_list, "Freezing")
+
+
+def bind_thaw_zones(zone_list=None):
+    """Ask BIND to reload the given frozen zones and accept dynamic updates.
+
+    :param zone_list: A list of zone names, or a single name as a string.
+        Defaults to all zones.
+    :return: True if success, False otherwise.
+    """
+    return _execute_rndc_zone_command("thaw", zone_list, "Thawing")
+
+
+def bind_update_zones(updates, timeout=10):
+    """Send the differences between zones to BIND as dynamic updates.
+
+    This changes host records without rewriting and reloading zone files.
+    One update is sent for each zone name, which BIND applies atomically,
+    and the zone's serial is set to that of the new zone.
+
+    :param updates: A sequence of `(zone, previous_zone)` tuples, where
+        both are :py:class:`DomainConfigBase` that differ only in the
+        records returned by their `get_records` method.
+    :return: True if success, False otherwise.
+    """
+    commands = []
+    for zone, previous_zone in updates:
+        records = zone.get_records()
+        previous_records = previous_zone.get_records()
+        changes = defaultdict(list)
+        for record in sorted(previous_records - records):
+            zone_name, name, ttl, rrtype, rrdata = record
+            changes[zone_name].append(
+                "update delete %s %s %s" % (name, rrtype, rrdata)
+            )
+        for record in sorted(records - previous_records):
+            zone_name, name, ttl, rrtype, rrdata = record
+            changes[zone_name].append(
+                "update add %s %d %s %s" % (name, ttl, rrtype, rrdata)
+            )
+        for zone_info in zone.zone_info:
+            commands.append("zone %s." % zone_info.zone_name)
+            commands.extend(changes[zone_info.zone_name])
+            commands.append(
+                "update add %s. %d SOA %s. nobody.example.com. "
+                "%s 600 1800 604800 %d"
+                % (
+                    zone_info.zone_name,
+                    zone.default_ttl,
+                    zone.domain,
+                    zone.serial,
+                    zone.default_ttl,
+                )
+            )
+            commands.append("send")
+    if len(commands) == 0:
+        return True
+    try:
+        execute_nsupdate_command(commands, timeout=timeout)
+        return True
+    except CalledProcessError as exc:
+        maaslog.error("Updating BIND zones failed (is it running?): %s", exc)
+        return False
+    except TimeoutExpired as exc:
+        maaslog.error("Updating BIND zones timed out (is it locked?): %s", exc)
+        return False
+    except FileNotFoundError as exc:
+        maaslog.error(
+            "Updating BIND zones failed (is nsupdate installed?): %s", exc
+        )
+        return False
+
+
 def bind_write_configuration(zones, trusted_networks):
     """Write BIND's configuration.
 
@@ -18,13 +18,17 @@ import errno
 import os
 import os.path
 import re
+from subprocess import PIPE, Popen, TimeoutExpired
 import sys
 
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils import load_template, locate_config
 from provisioningserver.utils.fs import atomic_write
 from provisioningserver.utils.isc import read_isc_file
-from provisioningserver.utils.shell import call_and_check
+from provisioningserver.utils.shell import (
+    call_and_check,
+    ExternalProcessError,
+)
 from provisioningserver.utils.snappy import running_in_snap
 
 maaslog = get_maas_logger("dns")
@@ -33,6 +37,7 @@ MAAS_NAMED_CONF_NAME = "named.conf.maas"
 MAAS_NAMED_CONF_OPTIONS_INSIDE_NAME = "named.conf.options.inside.maas"
 MAAS_NAMED_RNDC_CONF_NAME = "named.conf.rndc.maas"
 MAAS_RNDC_CONF_NAME = "rndc.conf.maas"
+MAAS_RNDC_KEY_NAME = "rndc-maas-key"
 
 
 def get_dns_config_dir():
@@ -65,6 +70,12 @@ def get_dns_rndc_port():
     return int(setting)
 
 
+def get_dns_port():
+    """Port on which BIND accepts dynamic updates from MAAS."""
+    setting = os.getenv("MAAS_DNS_PORT", "53")
+    return int(setting)
+
+
 def get_dns_default_controls():
     """Include the default RNDC controls (default RNDC key on port 953)?"""
     if running_in_snap():
@@ -118,7 +129,7 @@ def uncomment_named_conf(named_comment):
 
 
 def generate_rndc(
-    port=953, key_name="rndc-maas-key", include_default_controls=True
+    port=953, key_name=MAAS_RNDC_KEY_NAME, include_default_controls=True
 ):
     """Use `rndc-confgen` (from bind9utils) to generate a rndc+named
     configuration.
@@ -188,6 +199,56 @@ def execute_rndc_command(arguments, timeout=None):
     call_and_check(rndc_cmd, timeout=timeout)
 
 
+def get_rndc_key():
+    """Return the `(name, algorithm, secret)` of MAAS's rndc key.
+
+    The same key is used to sign dynamic updates sent to BIND.
+    """
+    rndc_conf = read_isc_file(get_rndc_conf_path())
+    for statement, body in rndc_conf.items():
+        if statement.startswith("key "):
+            name = statement[len("key ") :].strip('"')
+            return name, body["algorithm"], body["secret"].strip('"')
+    raise DNSConfigFail("No key found in %s." % get_rndc_conf_path())
+
+
+def execute_nsupdate_command(commands, timeout=None):
+    """Execute `nsupdate` commands, signed with MAAS's rndc key.
+
+    The commands are given on standard input so that the key's secret does
+    not appear in the process list.
+
+    :param commands: A list of `nsupdate` commands, excluding the `server`
+        and `key` commands, which are added here.
+    :raise FileNotFoundError: If `nsupdate` is not installed.
+    :raise TimeoutExpired: If `nsupdate` takes longer than `timeout`; it
+        is killed.
+    """
+    name, algorithm, secret = get_rndc_key()
+    script = [
+        "server 127.0.0.1 %d" % get_dns_port(),
+        "key %s:%s %s" % (algorithm, name, secret),
+    ]
+    script.extend(commands)
+    script.append("")
+    nsupdate_cmd = ["nsupdate"]
+    process = Popen(nsupdate_cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    try:
+        stdout, stderr = process.communicate(
+            "\n".join(script).encode("ascii"), timeout=timeout
+        )
+    except TimeoutExpired:
+        # Don't leave it behind, possibly halfway through the updates.
+        process.kill()
+        process.communicate()
+        raise
+    if process.returncode != 0:
+        raise ExternalProcessError(
+            process.returncode, nsupdate_cmd, output=stderr.strip()
+        )
+    return stdout
+
+
 def set_up_options_conf(overwrite=True, **kwargs):
     """Write out the named.conf.options.inside.maas file.
 
@@ -312,6 +373,7 @@ class DNSConfig:
             "zones": self.zones,
             "DNS_CONFIG_DIR": get_dns_config_dir(),
             "named_rndc_conf_path": get_named_rndc_conf_path(),
+            "rndc_key_name": MAAS_RNDC_KEY_NAME,
             "trusted_networks": trusted_networks,
             "modified": str(datetime.today()),
         }
@@ -6,6 +6,7 @@
 __all__ = [
     "patch_dns_config_path",
     "patch_dns_default_controls",
+    "patch_dns_port",
     "patch_dns_rndc_port",
 ]
 
@@ -27,6 +28,10 @@ def patch_dns_rndc_port(testcase, port):
     testcase.useFixture(EnvironmentVariable("MAAS_DNS_RNDC_PORT", "%d" % port))
 
 
+def patch_dns_port(testcase, port):
+    testcase.useFixture(EnvironmentVariable("MAAS_DNS_PORT", "%d" % port))
+
+
 def patch_dns_default_controls(testcase, enable):
     testcase.useFixture(
         EnvironmentVariable(
@@ -5,6 +5,8 @@
 
 __all__ = []
 
+from argparse import ArgumentParser
+import errno
 import os
 from os.path import join
 import random
@@ -18,19 +20,30 @@ from netaddr import IPNetwork
 from testtools.matchers import AllMatch, Contains, FileContains, FileExists
 
 from maastesting.factory import factory
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from provisioningserver.dns import actions
+from provisioningserver.dns.commands import get_named_conf, setup_dns
 from provisioningserver.dns.config import (
     MAAS_NAMED_CONF_NAME,
     MAAS_NAMED_CONF_OPTIONS_INSIDE_NAME,
 )
-from provisioningserver.dns.testing import patch_dns_config_path
+from provisioningserver.dns.testing import (
+    patch_dns_config_path,
+    patch_dns_port,
+    patch_dns_rndc_port,
+)
 from provisioningserver.dns.tests.test_zoneconfig import HostnameIPMapping
 from provisioningserver.dns.zoneconfig import (
     DNSForwardZoneConfig,
     DNSReverseZoneConfig,
 )
+from provisioningserver.testing.bindfixture import allocate_ports, BINDServer
+from provisioningserver.testing.tests.test_bindfixture import dig_call
 from provisioningserver.utils.shell import ExternalProcessError
 
 
@@ -153,6 +166,182 @@ class TestReloadZone(MAASTestCase):
         self.assertFalse(actions.bind_reload_zones(sentinel.zone))
 
 
+class TestFreezeAndThawZones(MAASTestCase):
+    """Tests for :py:func:`actions.bind_freeze_zones` and `bind_thaw_zones`."""
+
+    scenarios = (
+        ("freeze", {"func": "bind_freeze_zones", "command": "freeze"}),
+        ("thaw", {"func": "bind_thaw_zones", "command": "thaw"}),
+    )
+
+    def test_executes_rndc_command_for_each_zone(self):
+        self.patch_autospec(actions, "execute_rndc_command")
+        func = getattr(actions, self.func)
+        self.assertTrue(func([sentinel.zone1, sentinel.zone2]))
+        self.assertThat(
+            actions.execute_rndc_command,
+            MockCallsMatch(
+                call((self.command, sentinel.zone1)),
+                call((self.command, sentinel.zone2)),
+            ),
+        )
+
+    def test_executes_rndc_command_for_all_zones(self):
+        self.patch_autospec(actions, "execute_rndc_command")
+        func = getattr(actions, self.func)
+        self.assertTrue(func())
+        self.assertThat(
+            actions.execute_rndc_command, MockCalledOnceWith((self.command,))
+        )
+
+    def test_false_on_subprocess_error(self):
+        erc = self.patch_autospec(actions, "execute_rndc_command")
+        erc.side_effect = factory.make_CalledProcessError()
+        func = getattr(actions, self.func)
+        with FakeLogger("maas") as logger:
+            self.assertFalse(func(sentinel.zone))
+        self.assertDocTestMatches(
+            "... BIND zone ... failed (is it running?): "
+            "Command ... returned non-zero exit status ...",
+            logger.output,
+        )
+
+
+class TestUpdateZones(MAASTestCase):
+    """Tests for :py:func:`actions.bind_update_zones`."""
+
+    def make_forward_zone(self, domain, serial, mapping):
+        return DNSForwardZoneConfig(
+            domain, serial=serial, default_ttl=30, mapping=mapping
+        )
+
+    def test_sends_changed_records_with_serial(self):
+        execute_nsupdate_command = self.patch_autospec(
+            actions, "execute_nsupdate_command"
+        )
+        previous_zone = self.make_forward_zone(
+            "example.com",
+            1,
+            {
+                "old": HostnameIPMapping(None, 60, {"10.0.0.1"}),
+                "same": HostnameIPMapping(None, 60, {"10.0.0.2"}),
+            },
+        )
+        zone = self.make_forward_zone(
+            "example.com",
+            2,
+            {
+                "new": HostnameIPMapping(None, 60, {"10.0.0.3"}),
+                "same": HostnameIPMapping(None, 60, {"10.0.0.2"}),
+            },
+        )
+        self.assertTrue(actions.bind_update_zones([(zone, previous_zone)]))
+        self.assertThat(
+            execute_nsupdate_command,
+            MockCalledOnceWith(
+                [
+                    "zone example.com.",
+                    "update delete old.example.com. A 10.0.0.1",
+                    "update add new.example.com. 60 A 10.0.0.3",
+                    "update add example.com. 30 SOA example.com. "
+                    "nobody.example.com. 2 600 1800 604800 30",
+                    "send",
+                ],
+                timeout=10,
+            ),
+        )
+
+    def test_does_nothing_without_updates(self):
+        execute_nsupdate_command = self.patch_autospec(
+            actions, "execute_nsupdate_command"
+        )
+        self.assertTrue(actions.bind_update_zones([]))
+        self.assertThat(execute_nsupdate_command, MockNotCalled())
+
+    def test_false_on_subprocess_error(self):
+        execute_nsupdate_command = self.patch_autospec(
+            actions, "execute_nsupdate_command"
+        )
+        execute_nsupdate_command.side_effect = (
+            factory.make_CalledProcessError()
+        )
+        zone = self.make_forward_zone("example.com", 1, {})
+        with FakeLogger("maas") as logger:
+            self.assertFalse(actions.bind_update_zones([(zone, zone)]))
+        self.assertDocTestMatches(
+            "Updating BIND zones failed (is it running?): "
+            "Command ... returned non-zero exit status ...",
+            logger.output,
+        )
+
+    def test_false_if_nsupdate_is_not_installed(self):
+        execute_nsupdate_command = self.patch_autospec(
+            actions, "execute_nsupdate_command"
+        )
+        execute_nsupdate_command.side_effect = FileNotFoundError(
+            errno.ENOENT, "No such file or directory", "nsupdate"
+        )
+        zone = self.make_forward_zone("example.com", 1, {})
+        with FakeLogger("maas") as logger:
+            self.assertFalse(actions.bind_update_zones([(zone, zone)]))
+        self.assertDocTestMatches(
+            "Updating BIND zones failed (is nsupdate installed?): ...",
+            logger.output,
+        )
+
+
+class TestUpdateZonesWithBIND(MAASTestCase):
+    """Tests for :py:func:`actions.bind_update_zones` with a real BIND."""
+
+    def setUp(self):
+        super().setUp()
+        self.bind = self.useFixture(BINDServer())
+        patch_dns_config_path(self, self.bind.config.homedir)
+        patch_dns_rndc_port(self, allocate_ports("localhost")[0])
+        patch_dns_port(self, self.bind.config.port)
+        # Set up and include MAAS's configuration, as on installation.
+        parser = ArgumentParser()
+        setup_dns.add_arguments(parser)
+        setup_dns.run(parser.parse_args([]))
+        parser = ArgumentParser()
+        get_named_conf.add_arguments(parser)
+        get_named_conf.run(
+            parser.parse_args(
+                ["--edit", "--config-path", self.bind.config.conf_file]
+            )
+        )
+
+    def make_forward_zone(self, serial, mapping):
+        return DNSForwardZoneConfig(
+            "example.com",
+            serial=serial,
+            default_ttl=30,
+            mapping=mapping,
+            dns_ip_list=["127.0.0.1"],
+        )
+
+    def dig_a(self, fqdn):
+        return dig_call(
+            port=self.bind.config.port, commands=[fqdn, "A", "+short"]
+        )
+
+    def test_serves_records_sent_as_dynamic_updates(self):
+        previous_zone = self.make_forward_zone(
+            1, {"old": HostnameIPMapping(None, 30, {"10.0.0.1"})}
+        )
+        actions.bind_write_zones([previous_zone])
+        actions.bind_write_configuration([previous_zone], trusted_networks=[])
+        self.bind.runner.rndc("reload")
+        self.assertEqual("10.0.0.1", self.dig_a("old.example.com"))
+
+        zone = self.make_forward_zone(
+            2, {"new": HostnameIPMapping(None, 30, {"10.0.0.2"})}
+        )
+        self.assertTrue(actions.bind_update_zones([(zone, previous_zone)]))
+        self.assertEqual("10.0.0.2", self.dig_a("new.example.com"))
+        self.assertEqual("", self.dig_a("old.example.com"))
+
+
 class TestConfiguration(MAASTestCase):
     """Tests for the `bind_write_*` functions."""
 
@@ -8,6 +8,7 @@ __all__ = []
 import errno
 import os.path
 import random
+from subprocess import TimeoutExpired
 from textwrap import dedent
 from unittest.mock import Mock, sentinel
 
@@ -33,6 +34,7 @@ from twisted.python.filepath import FilePath
 
 from maastesting.factory import factory
 from maastesting.fakemethod import FakeMethod
+from maastesting.matchers import MockCalledOnceWith
 from maastesting.testcase import MAASTestCase
 from provisioningserver.dns import config
 from provisioningserver.dns.config import (
@@ -41,6 +43,7 @@ from provisioningserver.dns.config import (
     DNSConfig,
     DNSConfigDirectoryMissing,
     DNSConfigFail,
+    execute_nsupdate_command,
     execute_rndc_command,
     extract_suggested_named_conf,
     generate_rndc,
@@ -58,6 +61,7 @@ from provisioningserver.dns.config import (
 from provisioningserver.dns.testing import (
     patch_dns_config_path,
     patch_dns_default_controls,
+    patch_dns_port,
 )
 from provisioningserver.dns.zoneconfig import (
     DNSForwardZoneConfig,
@@ -65,6 +69,7 @@ from provisioningserver.dns.zoneconfig import (
 )
 from provisioningserver.utils import locate_config
 from provisioningserver.utils.isc import read_isc_file
+from provisioningserver.utils.shell import ExternalProcessError
 
 NAMED_CONF_OPTIONS_CONTENTS = dedent(
     """\
@@ -155,6 +160,15 @@ class TestHelpers(MAASTestCase):
         self.useFixture(EnvironmentVariable("MAAS_DNS_RNDC_PORT", "%d" % port))
         self.assertEqual(port, config.get_dns_rndc_port())
 
+    def test_get_dns_port_defaults_to_53(self):
+        self.useFixture(EnvironmentVariable("MAAS_DNS_PORT"))
+        self.assertEqual(53, config.get_dns_port())
+
+    def test_get_dns_port_checks_environ_first(self):
+        port = factory.pick_port()
+        patch_dns_port(self, port)
+        self.assertEqual(port, config.get_dns_port())
+
     def test_get_dns_default_controls_defaults_to_affirmative(self):
         self.useFixture(EnvironmentVariable("MAAS_DNS_DEFAULT_CONTROLS"))
         self.assertTrue(config.get_dns_default_controls())
@@ -310,6 +324,78 @@ class TestRNDCUtilities(MAASTestCase):
         self.assertEqual((expected_command,), recorder.calls[0][0])
         self.assertEqual({"timeout": sentinel.timeout}, recorder.calls[0][1])
 
+    def write_rndc_conf(self, secret):
+        fake_dir = patch_dns_config_path(self)
+        rndc_conf_path = os.path.join(fake_dir, MAAS_RNDC_CONF_NAME)
+        with open(rndc_conf_path, "w", encoding="ascii") as stream:
+            stream.write(
+                dedent(
+                    """\
+                    key "rndc-maas-key" {
+                        algorithm hmac-sha256;
+                        secret "%s";
+                    };
+                    options {
+                        default-key "rndc-maas-key";
+                    };
+                    """
+                )
+                % secret
+            )
+
+    def test_get_rndc_key_reads_rndc_conf(self):
+        secret = factory.make_name("secret")
+        self.write_rndc_conf(secret)
+        self.assertEqual(
+            ("rndc-maas-key", "hmac-sha256", secret), config.get_rndc_key()
+        )
+
+    def test_execute_nsupdate_command_passes_commands_on_stdin(self):
+        secret = factory.make_name("secret")
+        self.write_rndc_conf(secret)
+        port = factory.pick_port()
+        patch_dns_port(self, port)
+        popen = self.patch(config, "Popen")
+        popen.return_value.communicate.return_value = (b"", b"")
+        popen.return_value.returncode = 0
+        command = factory.make_string()
+        execute_nsupdate_command([command], timeout=sentinel.timeout)
+        [script], kwargs = popen.return_value.communicate.call_args
+        self.assertEqual(
+            (
+                "server 127.0.0.1 %d\n"
+                "key hmac-sha256:rndc-maas-key %s\n"
+                "%s\n" % (port, secret, command)
+            ).encode("ascii"),
+            script,
+        )
+        self.assertEqual({"timeout": sentinel.timeout}, kwargs)
+        self.assertNotIn(secret, " ".join(popen.call_args[0][0]))
+
+    def test_execute_nsupdate_command_raises_on_failure(self):
+        self.write_rndc_conf(factory.make_name("secret"))
+        popen = self.patch(config, "Popen")
+        popen.return_value.communicate.return_value = (b"", b"error")
+        popen.return_value.returncode = 2
+        self.assertRaises(
+            ExternalProcessError, execute_nsupdate_command, ["send"]
+        )
+
+    def test_execute_nsupdate_command_kills_process_on_timeout(self):
+        self.write_rndc_conf(factory.make_name("secret"))
+        popen = self.patch(config, "Popen")
+        process = popen.return_value
+        process.communicate.side_effect = [
+            TimeoutExpired(["nsupdate"], 10),
+            (b"", b""),
+        ]
+        self.assertRaises(
+            TimeoutExpired, execute_nsupdate_command, ["send"], timeout=10
+        )
+        self.assertThat(process.kill, MockCalledOnceWith())
+        # The process is reaped once killed.
+        self.assertEqual(2, process.communicate.call_count)
+
     def test_extract_suggested_named_conf_extracts_section(self):
         named_part = factory.make_string()
         # Actual rndc-confgen output, mildly mangled for testing purposes.
@@ -543,6 +629,7 @@ class TestDNSConfig(MAASTestCase):
                         "zone.%s" % domain,
                         "zone.0.168.192.in-addr.arpa",
                         MAAS_NAMED_RNDC_CONF_NAME,
+                        'allow-update { key "rndc-maas-key"; };',
                     ]
                 )
             ),
@@ -323,6 +323,88 @@ class TestDNSForwardZoneConfig(MAASTestCase):
         filepath = FilePath(dns_zone_config.zone_info[0].target_path)
         self.assertTrue(filepath.getPermissions().other.read)
 
+    def test_has_same_records_ignores_serial(self):
+        domain = factory.make_string()
+        mapping = {factory.make_string(): [factory.make_ipv4_address()]}
+        self.assertTrue(
+            DNSForwardZoneConfig(
+                domain, serial=1, mapping=mapping
+            ).has_same_records(
+                DNSForwardZoneConfig(domain, serial=2, mapping=dict(mapping))
+            )
+        )
+
+    def test_has_same_records_compares_mapping(self):
+        domain = factory.make_string()
+        hostname = factory.make_string()
+        self.assertFalse(
+            DNSForwardZoneConfig(
+                domain, mapping={hostname: [factory.make_ipv4_address()]}
+            ).has_same_records(
+                DNSForwardZoneConfig(
+                    domain, mapping={hostname: [factory.make_ipv6_address()]}
+                )
+            )
+        )
+
+    def test_has_same_records_compares_ttl(self):
+        domain = factory.make_string()
+        self.assertFalse(
+            DNSForwardZoneConfig(domain, default_ttl=30).has_same_records(
+                DNSForwardZoneConfig(domain, default_ttl=60)
+            )
+        )
+
+    def test_has_same_structure_ignores_mapping(self):
+        domain = factory.make_string()
+        hostname = factory.make_string()
+        self.assertTrue(
+            DNSForwardZoneConfig(
+                domain, mapping={hostname: [factory.make_ipv4_address()]}
+            ).has_same_structure(DNSForwardZoneConfig(domain, serial=2))
+        )
+
+    def test_has_same_structure_compares_ttl(self):
+        domain = factory.make_string()
+        self.assertFalse(
+            DNSForwardZoneConfig(domain, default_ttl=30).has_same_structure(
+                DNSForwardZoneConfig(domain, default_ttl=60)
+            )
+        )
+
+    def test_get_records_returns_qualified_records(self):
+        domain = factory.make_name("domain")
+        ipv4 = factory.make_ipv4_address()
+        ipv6 = factory.make_ipv6_address()
+        dns_zone_config = DNSForwardZoneConfig(
+            domain,
+            default_ttl=30,
+            mapping={
+                "host": HostnameIPMapping(None, 60, {ipv4, ipv6}),
+                "@": HostnameIPMapping(None, None, {ipv4}),
+            },
+            other_mapping={
+                "alias": HostnameRRsetMapping(
+                    None, {(90, "CNAME", "host.example.com.")}
+                )
+            },
+        )
+        self.assertEqual(
+            {
+                (domain, "host.%s." % domain, 60, "A", ipv4),
+                (domain, "host.%s." % domain, 60, "AAAA", ipv6),
+                (domain, "%s." % domain, 30, "A", ipv4),
+                (
+                    domain,
+                    "alias.%s." % domain,
+                    90,
+                    "CNAME",
+                    "host.example.com.",
+                ),
+            },
+            dns_zone_config.get_records(),
+        )
+
 
 class TestDNSReverseZoneConfig(MAASTestCase):
     """Tests for DNSReverseZoneConfig."""
@@ -355,6 +437,48 @@ class TestDNSReverseZoneConfig(MAASTestCase):
                 dns_zone_config.zone_info[i].target_path,
             )
 
+    def test_has_same_records_compares_network(self):
+        domain = factory.make_string()
+        self.assertFalse(
+            DNSReverseZoneConfig(
+                domain, network=IPNetwork("10.0.0.0/24")
+            ).has_same_records(
+                DNSReverseZoneConfig(domain, network=IPNetwork("10.0.1.0/24"))
+            )
+        )
+
+    def test_get_records_returns_ptr_records_per_zone(self):
+        domain = factory.make_name("domain")
+        dns_zone_config = DNSReverseZoneConfig(
+            domain,
+            network=IPNetwork("10.0.0.0/23"),
+            mapping={
+                "host.%s"
+                % domain: HostnameIPMapping(
+                    None, 60, {"10.0.0.5", "10.0.1.6", "10.9.0.1"}
+                )
+            },
+        )
+        self.assertEqual(
+            {
+                (
+                    "0.0.10.in-addr.arpa",
+                    "5.0.0.10.in-addr.arpa.",
+                    60,
+                    "PTR",
+                    "host.%s." % domain,
+                ),
+                (
+                    "1.0.10.in-addr.arpa",
+                    "6.1.0.10.in-addr.arpa.",
+                    60,
+                    "PTR",
+                    "host.%s." % domain,
+                ),
+            },
+            dns_zone_config.get_records(),
+        )
+
     def test_computes_dns_config_file_paths_for_small_network(self):
         domain = factory.make_name("zone")
         reverse_file_name = "zone.192-27.0.168.192.in-addr.arpa"
@@ -145,6 +145,64 @@ class DomainConfigBase:
         self.default_ttl = kwargs.pop("default_ttl", 30)
         self.ns_ttl = kwargs.pop("ns_ttl", self.default_ttl)
 
+    def _get_state(self, exclude=()):
+        """Return everything the zone is rendered from, bar the serial.
+
+        :param exclude: Names of further attributes to leave out.
+        """
+        state = dict(vars(self))
+        for name in ("serial", *exclude):
+            state.pop(name, None)
+        state["zone_info"] = [
+            (zi.subnetwork, zi.zone_name, zi.target_path)
+            for zi in self.zone_info
+        ]
+        return type(self), state
+
+    def has_same_records(self, other):
+        """Return True if `other` would be written with the same records.
+
+        The serials of the two zones may differ.
+        """
+        return self._get_state() == other._get_state()
+
+    def has_same_structure(self, other):
+        """Return True if `other` differs at most by its host records.
+
+        Those records are the ones returned by `get_records`, which can be
+        changed with dynamic updates rather than by rewriting the zone file.
+        """
+        exclude = ("_mapping", "_other_mapping")
+        return self._get_state(exclude) == other._get_state(exclude)
+
+    def get_records(self):
+        """Return the host records in this zone.
+
+        :return: A set of `(zone_name, fqdn, ttl, rrtype, rrdata)` tuples,
+            with fully-qualified owner names.
+        """
+        raise NotImplementedError()
+
+    def _qualify(self, name, zone_name):
+        """Return `name`, relative to `zone_name`, as a fully-qualified name."""
+        if name == "@":
+            return "%s." % zone_name
+        elif name.endswith("."):
+            return name
+        else:
+            return "%s.%s." % (name, zone_name)
+
+    def _make_record(self, zone_name, name, ttl, rrtype, rrdata):
+        if ttl is None:
+            ttl = self.default_ttl
+        return (
+            zone_name,
+            self._qualify(name, zone_name),
+            ttl,
+            rrtype,
+            str(rrdata),
+        )
+
     def make_parameters(self):
         """Return a dict of the common template parameters."""
         return {
@@ -282,6 +340,26 @@ class DNSForwardZoneConfig(DomainConfigBase):
 
         return sorted(generate_directives, key=lambda directive: directive[2])
 
+    def get_records(self):
+        """See `DomainConfigBase.get_records`."""
+        zone_name = self.zone_info[0].zone_name
+        records = chain(
+            (
+                (hostname, ttl, "A", ip)
+                for hostname, ttl, ip in self.get_A_mapping(
+                    self._mapping, self._ipv4_ttl
+                )
+            ),
+            (
+                (hostname, ttl, "AAAA", ip)
+                for hostname, ttl, ip in self.get_AAAA_mapping(
+                    self._mapping, self._ipv6_ttl
+                )
+            ),
+            enumerate_rrset_mapping(self._other_mapping),
+        )
+        return {self._make_record(zone_name, *record) for record in records}
+
     def write_config(self):
         """Write the zone file."""
         # Create GENERATE directives for IPv4 ranges.
@@ -534,6 +612,16 @@ class DNSReverseZoneConfig(DomainConfigBase):
                 generate_directives.add((iterator, "${0,1,x}", hostname))
         return sorted(generate_directives)
 
+    def get_records(self):
+        """See `DomainConfigBase.get_records`."""
+        return {
+            self._make_record(zi.zone_name, name, ttl, "PTR", hostname)
+            for zi in self.zone_info
+            for name, ttl, hostname in self.get_PTR_mapping(
+                self._mapping, zi.subnetwork
+            )
+        }
+
     def write_config(self):
         """Write the zone file."""
         # Create GENERATE directives for IPv4 ranges.
@@ -366,3 +366,22 @@ def power_query_seamicro15k_v2(ip, username, password, server_id):
     if server.active:
         return "on"
     return "off"
+
+
+def power_query_seamicro15k_v2_servers(ip, username, password, server_ids):
+    """Return the power states for many servers in one request.
+
+    :param server_ids: The IDs of the servers to query.
+    :return: A dict of "on" or "off", keyed by server ID. Servers that
+        cannot be found are left out.
+    """
+    server_ids = set(server_ids)
+    api = get_seamicro15k_api("v2.0", ip, username, password)
+    if api is None:
+        raise SeaMicroError("Unable to contact BMC controller.")
+    power_states = {}
+    for server in api.servers.list():
+        server_id = server.id.split("/")[0]
+        if server_id in server_ids:
+            power_states[server_id] = "on" if server.active else "off"
+    return power_states
@@ -26,6 +26,7 @@ from provisioningserver.drivers.hardware.seamicro import (
     power_control_seamicro15k_v2,
     power_control_seamicro15k_v09,
     power_query_seamicro15k_v2,
+    power_query_seamicro15k_v2_servers,
     POWER_STATUS,
     probe_seamicro15k_and_enlist,
     SeaMicroAPIV09,
@@ -557,3 +558,28 @@ class TestSeaMicro(MAASTestCase):
             password,
             "0",
         )
+
+    def test_power_query_seamicro15k_v2_servers_lists_servers_once(self):
+        ip = factory.make_ipv4_address()
+        username = factory.make_string()
+        password = factory.make_string()
+
+        fake_client = FakeSeaMicroClient()
+        fake_client.servers = FakeSeaMicroServerManager()
+        for server_id, active in (("0", True), ("1", False), ("2", True)):
+            fake_server = FakeServer("%s/0" % server_id)
+            self.patch(fake_server, "active", active)
+            fake_client.servers.servers.append(fake_server)
+
+        mock_get_api = self.patch(seamicro, "get_seamicro15k_api")
+        mock_get_api.return_value = fake_client
+
+        self.assertEqual(
+            {"0": "on", "1": "off"},
+            power_query_seamicro15k_v2_servers(
+                ip, username, password, ["0", "1", "3"]
+            ),
+        )
+        self.assertThat(
+            mock_get_api, MockCalledOnceWith("v2.0", ip, username, password)
+        )
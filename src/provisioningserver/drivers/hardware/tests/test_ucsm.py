@@ -40,6 +40,7 @@ from provisioningserver.drivers.hardware.ucsm import (
     parse_response,
     power_control_ucsm,
     power_state_ucsm,
+    power_states_ucsm,
     probe_and_enlist_ucsm,
     probe_lan_boot_options,
     probe_servers,
@@ -594,6 +595,32 @@ class TestUCSMPowerState(MAASTestCase):
         )
 
 
+class TestUCSMPowerStates(MAASTestCase):
+    """Tests for `power_states_ucsm`."""
+
+    def test_power_states_logs_in_once_for_all_servers(self):
+        url = factory.make_name("url")
+        username = factory.make_name("username")
+        password = factory.make_name("password")
+        uuids = [factory.make_UUID() for _ in range(3)]
+        api = Mock()
+        self.patch(ucsm, "UCSM_XML_API").return_value = api
+        get_servers_mock = self.patch(ucsm, "get_servers")
+        get_servers_mock.return_value = [
+            {"uuid": uuids[0], "operPower": "on"},
+            {"uuid": uuids[1], "operPower": "off"},
+            {"uuid": uuids[2], "operPower": "unknown"},
+            {"uuid": factory.make_UUID(), "operPower": "on"},
+        ]
+
+        power_states = power_states_ucsm(url, username, password, uuids)
+        self.expectThat(get_servers_mock, MockCalledOnceWith(api))
+        self.expectThat(api.login, MockCalledOnceWith())
+        self.expectThat(
+            power_states, Equals({uuids[0]: "on", uuids[1]: "off"})
+        )
+
+
 class TestProbeAndEnlistUCSM(MAASTestCase):
     """Tests for ``probe_and_enlist_ucsm``."""
 
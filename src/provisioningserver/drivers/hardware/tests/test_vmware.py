@@ -15,6 +15,7 @@ from twisted.internet.defer import inlineCallbacks
 from twisted.internet.threads import deferToThread
 
 from maastesting.factory import factory
+from maastesting.matchers import MockCalledOnce
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
 from provisioningserver.drivers.hardware import vmware
 from provisioningserver.drivers.hardware.vmware import (
@@ -361,6 +362,25 @@ class TestVMwarePyvmomi(MAASTestCase):
         with ExpectedException(VMwareVMNotFound):
             vmware.power_query_vmware(host, username, password, None, None)
 
+    def test_power_query_vms_connects_once(self):
+        mock_vmomi_api = self.configure_vmomi_api(
+            servers=10, has_instance_uuid=False, has_uuid=True
+        )
+        host = factory.make_hostname()
+        username = factory.make_username()
+        password = factory.make_username()
+        search_index = (
+            mock_vmomi_api.SmartConnect.return_value.content.searchIndex
+        )
+        vms = [(None, uuid) for uuid in search_index.vms_by_uuid]
+        missing_vm = (None, factory.make_UUID())
+
+        power_states = vmware.power_query_vmware_vms(
+            host, username, password, vms + [missing_vm]
+        )
+        self.assertItemsEqual(vms, power_states)
+        self.assertThat(mock_vmomi_api.SmartConnect, MockCalledOnce())
+
     def test_power_control(self):
         mock_vmomi_api = self.configure_vmomi_api(servers=100)
 
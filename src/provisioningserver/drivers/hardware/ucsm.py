@@ -60,7 +60,12 @@ UUID - The UUID for a server. MAAS persists the UUID of each UCS managed
 server it enlists, and uses it as a key for looking the server up later.
 """
 
-__all__ = ["power_control_ucsm", "power_state_ucsm", "probe_and_enlist_ucsm"]
+__all__ = [
+    "power_control_ucsm",
+    "power_state_ucsm",
+    "power_states_ucsm",
+    "probe_and_enlist_ucsm",
+]
 
 import contextlib
 from typing import Optional
@@ -413,6 +418,25 @@ def power_state_ucsm(url, username, password, uuid):
         raise UCSM_XML_API_Error("Unknown power state: %s" % power_state, None)
 
 
+def power_states_ucsm(url, username, password, uuids):
+    """Return the power states for many ucsm machines in one session.
+
+    :param uuids: The UUIDs of the servers to query.
+    :return: A dict of power states keyed by UUID. Servers that cannot be
+        found, or are in an unknown power state, are left out.
+    """
+    uuids = set(uuids)
+    with logged_in(url, username, password) as api:
+        # Resolving the class without a filter lists every server at once.
+        power_states = {}
+        for server in get_servers(api):
+            uuid = server.get("uuid")
+            power_state = server.get("operPower")
+            if uuid in uuids and power_state in ("on", "off"):
+                power_states[uuid] = power_state
+        return power_states
+
+
 @synchronous
 @typed
 def probe_and_enlist_ucsm(
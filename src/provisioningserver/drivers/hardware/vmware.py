@@ -4,6 +4,7 @@
 __all__ = [
     "power_control_vmware",
     "power_query_vmware",
+    "power_query_vmware_vms",
     "probe_vmware_and_enlist",
 ]
 
@@ -589,3 +590,34 @@ def power_query_vmware(
             )
         finally:
             api.disconnect()
+
+
+def power_query_vmware_vms(
+    host, username, password, vms, port=None, protocol=None
+):
+    """Return the power states for many VMs over one API connection.
+
+    :param vms: A list of `(vm_name, uuid)` tuples to query.
+    :return: A dict of power states keyed by `(vm_name, uuid)`. VMs that
+        cannot be found are left out.
+    """
+    api = _get_vmware_api(
+        host, username, password, port=port, protocol=protocol
+    )
+
+    power_states = {}
+    if api.connect():
+        try:
+            for vm_name, uuid in vms:
+                vm = _find_vm_by_uuid_or_name(api, uuid, vm_name)
+                if vm is not None:
+                    power_states[vm_name, uuid] = api.get_maas_power_state(vm)
+        except VMwareAPIException:
+            raise
+        except Exception:
+            raise VMwareAPIException(
+                "Failed to get power states", traceback.format_exc()
+            )
+        finally:
+            api.disconnect()
+    return power_states
@@ -129,6 +129,10 @@ class PowerActionError(PowerError):
 class PowerDriverBase(metaclass=ABCMeta):
     """Base driver for a power driver."""
 
+    # Whether the driver implements `chassis_key` and `query_chassis`, to
+    # query the nodes behind one chassis together.
+    can_query_chassis = False
+
     def __init__(self):
         super().__init__()
         validate(
@@ -215,6 +219,29 @@ class PowerDriverBase(metaclass=ABCMeta):
             calling function should ignore this error, and continue on.
         """
 
+    def chassis_key(self, context):
+        """Return what identifies the chassis session for `context`.
+
+        Only used if `can_query_chassis` is set. Nodes with equal keys are
+        queried together with `query_chassis`, so the key should include
+        everything needed to log in to the chassis. Return None, the
+        default, to query each node on its own.
+        """
+        return None
+
+    def query_chassis(self, contexts):
+        """Perform the query action for many nodes behind one chassis.
+
+        Only called if `can_query_chassis` is set, for nodes with equal
+        `chassis_key`.
+
+        :param contexts: Power settings for the nodes, keyed by system ID.
+        :return: Power states of the nodes, keyed by system ID. Nodes that
+            are missing are queried on their own with `query`.
+        :raises PowerError: when unable to get status from the chassis.
+        """
+        raise NotImplementedError()
+
     def get_schema(self, detect_missing_packages=True):
         """Returns the JSON schema for the driver.
 
@@ -346,6 +373,36 @@ class PowerDriver(PowerDriverBase):
         else:
             raise exc_info[0](exc_info[1]).with_traceback(exc_info[2])
 
+    def power_query_chassis(self, contexts):
+        """Implement this method for the actual implementation of the power
+        query command for many nodes behind one chassis, and set
+        `can_query_chassis`; see `chassis_key`.
+        """
+        raise NotImplementedError()
+
+    @inlineCallbacks
+    def query_chassis(self, contexts):
+        """Performs the power query action for nodes behind one chassis."""
+        exc_info = None, None, None
+        for waiting_time in self.wait_time:
+            try:
+                if IAsynchronous.providedBy(self.power_query_chassis):
+                    states = yield self.power_query_chassis(contexts)
+                else:
+                    states = yield deferToThread(
+                        self.power_query_chassis, contexts
+                    )
+            except PowerFatalError:
+                raise  # Don't retry.
+            except PowerError:
+                exc_info = sys.exc_info()
+                # Wait before retrying.
+                yield pause(waiting_time, self.clock)
+            else:
+                returnValue(states)
+        else:
+            raise exc_info[0](exc_info[1]).with_traceback(exc_info[2])
+
     @inlineCallbacks
     def perform_power(self, power_func, state_desired, system_id, context):
         """Provides the logic to perform the power actions.
@@ -57,6 +57,7 @@ class MSCMPowerDriver(PowerDriver):
     name = "mscm"
     chassis = True
     can_probe = True
+    can_query_chassis = True
     description = "HP Moonshot - iLO Chassis Manager"
     settings = [
         make_setting_field(
@@ -89,14 +90,36 @@ class MSCMPowerDriver(PowerDriver):
         **extra
     ):
         """Run a single command on MSCM via SSH and return output."""
+        [output] = self.run_mscm_commands(
+            [command],
+            power_address=power_address,
+            power_user=power_user,
+            power_pass=power_pass,
+        )
+        return output
+
+    def run_mscm_commands(
+        self,
+        commands,
+        power_address=None,
+        power_user=None,
+        power_pass=None,
+        **extra
+    ):
+        """Run commands on MSCM over one SSH connection.
+
+        :return: A list of the commands' outputs, in order.
+        """
+        outputs = []
         try:
             ssh_client = SSHClient()
             ssh_client.set_missing_host_key_policy(AutoAddPolicy())
             ssh_client.connect(
                 power_address, username=power_user, password=power_pass
             )
-            _, stdout, _ = ssh_client.exec_command(command)
-            output = stdout.read().decode("utf-8")
+            for command in commands:
+                _, stdout, _ = ssh_client.exec_command(command)
+                outputs.append(stdout.read().decode("utf-8"))
         except (SSHException, EOFError, SOCKETError) as e:
             raise PowerConnError(
                 "Could not make SSH connection to MSCM for "
@@ -105,7 +128,7 @@ class MSCMPowerDriver(PowerDriver):
         finally:
             ssh_client.close()
 
-        return output
+        return outputs
 
     def power_on(self, system_id, context):
         """Power on MSCM node."""
@@ -155,7 +178,7 @@ class MSCMPowerDriver(PowerDriver):
                 "MSCM Power Driver unable to power query node %s: %s"
                 % (context["node_id"], e)
             )
-        match = re.search(r"Power State:\s*((O[\w]+|U[\w]+))", output)
+        match = _match_power_state(output)
         if match is None:
             raise PowerFatalError(
                 "MSCM Power Driver unable to extract node power state from: %s"
@@ -168,6 +191,51 @@ class MSCMPowerDriver(PowerDriver):
             elif power_state == MSCMState.ON:
                 return "on"
 
+    def chassis_key(self, context):
+        if not context.get("power_address"):
+            return None
+        return (
+            context.get("power_address"),
+            context.get("power_user"),
+            context.get("power_pass"),
+        )
+
+    def power_query_chassis(self, contexts):
+        """Power query MSCM nodes over one SSH connection."""
+        node_ids = {
+            system_id: context["node_id"]
+            for system_id, context in contexts.items()
+        }
+        try:
+            outputs = self.run_mscm_commands(
+                [
+                    "show node power %s" % node_id
+                    for node_id in node_ids.values()
+                ],
+                **next(iter(contexts.values()))
+            )
+        except PowerConnError as e:
+            raise PowerActionError(
+                "MSCM Power Driver unable to power query nodes: %s" % e
+            )
+        power_states = {}
+        for system_id, output in zip(node_ids, outputs):
+            match = _match_power_state(output)
+            # Nodes left out are queried on their own, which reports the
+            # error for them.
+            if match is None:
+                continue
+            elif match.group(1) in MSCMState.OFF:
+                power_states[system_id] = "off"
+            elif match.group(1) == MSCMState.ON:
+                power_states[system_id] = "on"
+        return power_states
+
+
+def _match_power_state(output):
+    """Match the power state in the output of "show node power"."""
+    return re.search(r"Power State:\s*((O[\w]+|U[\w]+))", output)
+
 
 @synchronous
 @typed
@@ -14,6 +14,7 @@ from provisioningserver.drivers.hardware.seamicro import (
     power_control_seamicro15k_v2,
     power_control_seamicro15k_v09,
     power_query_seamicro15k_v2,
+    power_query_seamicro15k_v2_servers,
 )
 from provisioningserver.drivers.power import PowerActionError, PowerDriver
 from provisioningserver.utils import shell
@@ -41,6 +42,7 @@ class SeaMicroPowerDriver(PowerDriver):
     name = "sm15k"
     chassis = True
     can_probe = True
+    can_query_chassis = True
     description = "SeaMicro 15000"
     settings = [
         make_setting_field(
@@ -144,9 +146,37 @@ class SeaMicroPowerDriver(PowerDriver):
             server_id,
             power_control,
         ) = extract_seamicro_parameters(context)
-        if power_control == "restapi2":
+        if ip and power_control == "restapi2":
             return power_query_seamicro15k_v2(
                 ip, username, password, server_id
             )
         else:
             return "unknown"
+
+    def chassis_key(self, context):
+        ip, username, password, _, power_control = extract_seamicro_parameters(
+            context
+        )
+        # Querying is only supported by REST v2.
+        if ip and power_control == "restapi2":
+            return ip, username, password
+        else:
+            return None
+
+    def power_query_chassis(self, contexts):
+        """Power query SeaMicro nodes with one request to the chassis."""
+        server_ids = {
+            system_id: context.get("system_id")
+            for system_id, context in contexts.items()
+        }
+        ip, username, password, _, _ = extract_seamicro_parameters(
+            next(iter(contexts.values()))
+        )
+        power_states = power_query_seamicro15k_v2_servers(
+            ip, username, password, server_ids.values()
+        )
+        return {
+            system_id: power_states[server_id]
+            for system_id, server_id in server_ids.items()
+            if server_id in power_states
+        }
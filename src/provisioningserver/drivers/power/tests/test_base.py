@@ -6,7 +6,7 @@
 __all__ = []
 
 import random
-from unittest.mock import call, sentinel
+from unittest.mock import ANY, call, sentinel
 
 from jsonschema import validate
 from testtools.matchers import Equals
@@ -162,6 +162,20 @@ class TestFakePowerDriverBase(MAASTestCase):
             sentinel.context,
         )
 
+    def test_cannot_query_chassis(self):
+        fake_driver = make_power_driver_base()
+        self.assertFalse(fake_driver.can_query_chassis)
+
+    def test_chassis_key_returns_none(self):
+        fake_driver = make_power_driver_base()
+        self.assertIsNone(fake_driver.chassis_key(sentinel.context))
+
+    def test_query_chassis_raises_not_implemented(self):
+        fake_driver = make_power_driver_base()
+        self.assertRaises(
+            NotImplementedError, fake_driver.query_chassis, sentinel.contexts
+        )
+
 
 class TestPowerDriverBase(MAASTestCase):
     def test_get_schema(self):
@@ -555,3 +569,57 @@ class TestPowerDriverQuery(MAASTestCase):
             power.pause,
             MockCallsMatch(*(call(wait, reactor) for wait in wait_time)),
         )
+
+
+class TestPowerDriverQueryChassis(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def setUp(self):
+        super().setUp()
+        self.patch(power, "pause")
+
+    @inlineCallbacks
+    def test_returns_states(self):
+        contexts = {
+            factory.make_name("system_id"): {
+                "context": factory.make_name("context")
+            }
+        }
+        driver = make_power_driver()
+        states = {system_id: "on" for system_id in contexts}
+        power_query_chassis = self.patch(driver, "power_query_chassis")
+        power_query_chassis.return_value = states
+        output = yield driver.query_chassis(contexts)
+        self.assertEqual(states, output)
+        self.assertThat(power_query_chassis, MockCalledOnceWith(contexts))
+
+    @inlineCallbacks
+    def test_retries_on_failure_then_returns_states(self):
+        driver = make_power_driver()
+        self.patch(driver, "power_query_chassis").side_effect = [
+            PowerError("one"),
+            sentinel.states,
+        ]
+        output = yield driver.query_chassis(sentinel.contexts)
+        self.assertEqual(sentinel.states, output)
+
+    @inlineCallbacks
+    def test_does_not_retry_fatal_errors(self):
+        driver = make_power_driver()
+        power_query_chassis = self.patch(driver, "power_query_chassis")
+        power_query_chassis.side_effect = PowerFatalError
+        with ExpectedException(PowerFatalError):
+            yield driver.query_chassis(sentinel.contexts)
+        self.assertThat(power_query_chassis, MockCalledOnceWith(ANY))
+
+    @inlineCallbacks
+    def test_raises_last_exception_after_all_retries_fail(self):
+        wait_time = [random.randrange(1, 10) for _ in range(3)]
+        driver = make_power_driver(wait_time=wait_time)
+        exception_types = list(
+            factory.make_exception_type((PowerError,)) for _ in wait_time
+        )
+        self.patch(driver, "power_query_chassis").side_effect = exception_types
+        with ExpectedException(exception_types[-1]):
+            yield driver.query_chassis(sentinel.contexts)
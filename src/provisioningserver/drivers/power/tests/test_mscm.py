@@ -21,7 +21,11 @@ from twisted.internet.defer import inlineCallbacks
 from twisted.internet.threads import deferToThread
 
 from maastesting.factory import factory
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    MockCalledOnce,
+    MockCalledOnceWith,
+    MockCallsMatch,
+)
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
 from provisioningserver.drivers.power import (
     PowerActionError,
@@ -237,6 +241,85 @@ class TestMSCMPowerDriver(MAASTestCase):
             PowerFatalError, driver.power_query, system_id, context
         )
 
+    def test_run_mscm_commands_uses_one_connection(self):
+        driver = MSCMPowerDriver()
+        commands = [factory.make_name("command") for _ in range(3)]
+        context = make_context()
+        self.patch(mscm_module, "AutoAddPolicy")
+        SSHClient = self.patch(mscm_module, "SSHClient")
+        ssh_client = SSHClient.return_value
+        outputs = [factory.make_name("output") for _ in commands]
+        ssh_client.exec_command = Mock(
+            side_effect=[
+                factory.make_streams(stdout=BytesIO(output.encode("utf-8")))
+                for output in outputs
+            ]
+        )
+        self.assertEqual(
+            outputs, driver.run_mscm_commands(commands, **context)
+        )
+        self.expectThat(SSHClient, MockCalledOnceWith())
+        self.expectThat(ssh_client.connect, MockCalledOnce())
+        self.expectThat(
+            ssh_client.exec_command,
+            MockCallsMatch(*(call(command) for command in commands)),
+        )
+
+    def test_chassis_key_is_none_without_address(self):
+        driver = MSCMPowerDriver()
+        context = make_context()
+        del context["power_address"]
+        self.assertIsNone(driver.chassis_key(context))
+
+    def test_chassis_key_is_equal_for_nodes_in_chassis(self):
+        driver = MSCMPowerDriver()
+        context = make_context()
+        other_context = dict(context, node_id=make_node_id())
+        self.assertEqual(
+            driver.chassis_key(context), driver.chassis_key(other_context)
+        )
+
+    def test_power_query_chassis_returns_power_states(self):
+        driver = MSCMPowerDriver()
+        context = make_context()
+        contexts = {
+            factory.make_name("system_id"): dict(context, node_id=node_id)
+            for node_id in ("c1n1", "c1n2", "c2n1")
+        }
+        run_mscm_commands = self.patch(driver, "run_mscm_commands")
+        run_mscm_commands.return_value = [
+            "show node power c1n1\r\r\n\r\nCartridge #1\r\n  Node #1\r\n"
+            "        Power State: On\r\n",
+            "show node power c1n2\r\r\n\r\nCartridge #1\r\n  Node #2\r\n"
+            "        Power State: Unavailable\r\n",
+            "Rubbish",
+        ]
+        system_ids = list(contexts)
+        self.assertEqual(
+            {system_ids[0]: "on", system_ids[1]: "off"},
+            driver.power_query_chassis(contexts),
+        )
+        self.assertThat(
+            run_mscm_commands,
+            MockCalledOnceWith(
+                [
+                    "show node power c1n1",
+                    "show node power c1n2",
+                    "show node power c2n1",
+                ],
+                **contexts[system_ids[0]]
+            ),
+        )
+
+    def test_power_query_chassis_crashes_for_connection_error(self):
+        driver = MSCMPowerDriver()
+        contexts = {factory.make_name("system_id"): make_context()}
+        run_mscm_commands = self.patch(driver, "run_mscm_commands")
+        run_mscm_commands.side_effect = PowerConnError("Connection Error")
+        self.assertRaises(
+            PowerActionError, driver.power_query_chassis, contexts
+        )
+
 
 class TestMSCMProbeAndEnlist(MAASTestCase):
 
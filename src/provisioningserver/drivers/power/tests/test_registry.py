@@ -9,7 +9,11 @@ from unittest.mock import sentinel
 
 from maastesting.testcase import MAASTestCase
 from provisioningserver.drivers.pod.tests.test_base import make_pod_driver_base
-from provisioningserver.drivers.power.registry import PowerDriverRegistry
+from provisioningserver.drivers.power import PowerDriver
+from provisioningserver.drivers.power.registry import (
+    power_drivers,
+    PowerDriverRegistry,
+)
 from provisioningserver.drivers.power.tests.test_base import (
     make_power_driver_base,
 )
@@ -77,3 +81,15 @@ class TestPowerDriverRegistry(MAASTestCase):
             ],
             PowerDriverRegistry.get_schema(),
         )
+
+    def test_drivers_that_query_chassis_say_so(self):
+        for driver in power_drivers:
+            implemented = (
+                type(driver).power_query_chassis
+                is not PowerDriver.power_query_chassis
+            )
+            self.assertEqual(
+                implemented,
+                driver.can_query_chassis,
+                "%s has can_query_chassis wrong" % driver.name,
+            )
@@ -6,6 +6,7 @@
 __all__ = []
 
 from random import choice
+from unittest.mock import ANY
 
 from testtools.matchers import Equals
 
@@ -215,3 +216,40 @@ class TestSeaMicroPowerDriver(MAASTestCase):
         )
 
         self.assertThat(power_state, Equals("unknown"))
+
+    def test_chassis_key_is_none_if_not_restapi2(self):
+        _, _, _, _, context = self.make_context()
+        context["power_control"] = choice(["ipmi", "restapi"])
+        seamicro_power_driver = SeaMicroPowerDriver()
+        self.assertIsNone(seamicro_power_driver.chassis_key(context))
+
+    def test_power_query_chassis_calls_power_query_seamicro15k_v2_servers(
+        self,
+    ):
+        ip, username, password, server_id, context = self.make_context()
+        context["power_control"] = "restapi2"
+        other_server_id = factory.make_name("system_id")
+        contexts = {
+            "system_id1": context,
+            "system_id2": dict(context, system_id=other_server_id),
+        }
+        seamicro_power_driver = SeaMicroPowerDriver()
+        self.assertEqual(
+            seamicro_power_driver.chassis_key(contexts["system_id1"]),
+            seamicro_power_driver.chassis_key(contexts["system_id2"]),
+        )
+        power_query_mock = self.patch(
+            seamicro_module, "power_query_seamicro15k_v2_servers"
+        )
+        power_query_mock.return_value = {other_server_id: "off"}
+        power_states = seamicro_power_driver.power_query_chassis(contexts)
+
+        self.expectThat(
+            power_query_mock,
+            MockCalledOnceWith(ip, username, password, ANY),
+        )
+        [(_, _, _, server_ids), _] = power_query_mock.call_args
+        self.expectThat(
+            sorted(server_ids), Equals(sorted([server_id, other_server_id]))
+        )
+        self.expectThat(power_states, Equals({"system_id2": "off"}))
@@ -5,6 +5,8 @@
 
 __all__ = []
 
+from unittest.mock import ANY
+
 from testtools.matchers import Equals
 
 from maastesting.factory import factory
@@ -111,3 +113,32 @@ class TestUCSMPowerDriver(MAASTestCase):
             power_state_ucsm, MockCalledOnceWith(url, username, password, uuid)
         )
         self.expectThat(expected_result, Equals("off"))
+
+    def test_chassis_key_is_equal_for_nodes_in_manager(self):
+        ucsm_power_driver = UCSMPowerDriver()
+        *_, context = self.make_parameters()
+        other_context = dict(context, uuid=factory.make_UUID())
+        self.assertEqual(
+            ucsm_power_driver.chassis_key(context),
+            ucsm_power_driver.chassis_key(other_context),
+        )
+
+    def test_power_query_chassis_calls_power_states_ucsm(self):
+        _, url, username, password, uuid, context = self.make_parameters()
+        other_uuid = factory.make_UUID()
+        contexts = {
+            "system_id1": context,
+            "system_id2": dict(context, uuid=other_uuid),
+        }
+        ucsm_power_driver = UCSMPowerDriver()
+        power_states_ucsm = self.patch(ucsm_module, "power_states_ucsm")
+        power_states_ucsm.return_value = {uuid: "on"}
+        power_states = ucsm_power_driver.power_query_chassis(contexts)
+
+        self.expectThat(
+            power_states_ucsm,
+            MockCalledOnceWith(url, username, password, ANY),
+        )
+        [(_, _, _, uuids), _] = power_states_ucsm.call_args
+        self.expectThat(sorted(uuids), Equals(sorted([uuid, other_uuid])))
+        self.expectThat(power_states, Equals({"system_id1": "on"}))
@@ -192,3 +192,56 @@ class TestVMwarePowerDriver(MAASTestCase):
             ),
         )
         self.expectThat(expected_result, Equals("off"))
+
+    def test_chassis_key_is_equal_for_nodes_in_vcenter(self):
+        vmware_power_driver = VMwarePowerDriver()
+        *_, context = self.make_parameters()
+        other_context = dict(
+            context,
+            power_vm_name=factory.make_name("power_vm_name"),
+            power_uuid=factory.make_name("power_uuid"),
+        )
+        self.assertEqual(
+            vmware_power_driver.chassis_key(context),
+            vmware_power_driver.chassis_key(other_context),
+        )
+
+    def test_power_query_chassis_calls_power_query_vmware_vms(self):
+        (
+            system_id,
+            host,
+            username,
+            password,
+            vm_name,
+            uuid,
+            port,
+            protocol,
+            context,
+        ) = self.make_parameters()
+        other_vm = (
+            factory.make_name("power_vm_name"),
+            factory.make_name("power_uuid"),
+        )
+        other_context = dict(
+            context, power_vm_name=other_vm[0], power_uuid=other_vm[1]
+        )
+        contexts = {"system_id1": context, "system_id2": other_context}
+        vmware_power_driver = VMwarePowerDriver()
+        power_query_vmware_vms = self.patch(
+            vmware_module, "power_query_vmware_vms"
+        )
+        power_query_vmware_vms.return_value = {(vm_name, uuid): "on"}
+        power_states = vmware_power_driver.power_query_chassis(contexts)
+
+        self.expectThat(
+            power_query_vmware_vms,
+            MockCalledOnceWith(
+                host,
+                username,
+                password,
+                [(vm_name, uuid), other_vm],
+                port,
+                protocol,
+            ),
+        )
+        self.expectThat(power_states, Equals({"system_id1": "on"}))
@@ -14,6 +14,7 @@ from provisioningserver.drivers import (
 from provisioningserver.drivers.hardware.ucsm import (
     power_control_ucsm,
     power_state_ucsm,
+    power_states_ucsm,
 )
 from provisioningserver.drivers.power import PowerDriver
 
@@ -31,6 +32,7 @@ class UCSMPowerDriver(PowerDriver):
     name = "ucsm"
     chassis = True
     can_probe = True
+    can_query_chassis = True
     description = "Cisco UCS Manager"
     settings = [
         make_setting_field(
@@ -66,3 +68,27 @@ class UCSMPowerDriver(PowerDriver):
         """Power query UCSM node."""
         url, username, password, uuid = extract_ucsm_parameters(context)
         return power_state_ucsm(url, username, password, uuid)
+
+    def chassis_key(self, context):
+        url, username, password, _ = extract_ucsm_parameters(context)
+        if not url:
+            return None
+        return url, username, password
+
+    def power_query_chassis(self, contexts):
+        """Power query UCSM nodes with one login to the manager."""
+        uuids = {
+            system_id: context.get("uuid")
+            for system_id, context in contexts.items()
+        }
+        url, username, password, _ = extract_ucsm_parameters(
+            next(iter(contexts.values()))
+        )
+        power_states = power_states_ucsm(
+            url, username, password, uuids.values()
+        )
+        return {
+            system_id: power_states[uuid]
+            for system_id, uuid in uuids.items()
+            if uuid in power_states
+        }
@@ -14,6 +14,7 @@ from provisioningserver.drivers.hardware import vmware
 from provisioningserver.drivers.hardware.vmware import (
     power_control_vmware,
     power_query_vmware,
+    power_query_vmware_vms,
 )
 from provisioningserver.drivers.power import PowerDriver
 
@@ -39,6 +40,7 @@ class VMwarePowerDriver(PowerDriver):
     name = "vmware"
     chassis = True
     can_probe = True
+    can_query_chassis = True
     description = "VMware"
     settings = [
         make_setting_field(
@@ -135,3 +137,41 @@ class VMwarePowerDriver(PowerDriver):
         return power_query_vmware(
             host, username, password, vm_name, uuid, port, protocol
         )
+
+    def chassis_key(self, context):
+        (
+            host,
+            username,
+            password,
+            _,
+            _,
+            port,
+            protocol,
+        ) = extract_vmware_parameters(context)
+        if not host:
+            return None
+        return host, username, password, port, protocol
+
+    def power_query_chassis(self, contexts):
+        """Power query VMware nodes over one connection to the API."""
+        vms = {}
+        for system_id, context in contexts.items():
+            _, _, _, vm_name, uuid, _, _ = extract_vmware_parameters(context)
+            vms[system_id] = vm_name, uuid
+        (
+            host,
+            username,
+            password,
+            _,
+            _,
+            port,
+            protocol,
+        ) = extract_vmware_parameters(next(iter(contexts.values())))
+        power_states = power_query_vmware_vms(
+            host, username, password, list(vms.values()), port, protocol
+        )
+        return {
+            system_id: power_states[vm]
+            for system_id, vm in vms.items()
+            if vm in power_states
+        }
@@ -7,15 +7,19 @@ __all__ = [
     "EVENT_DETAILS",
     "EVENT_STATUS_MESSAGES",
     "EVENT_TYPES",
+    "queue_node_event_ip_address",
     "send_node_event",
     "send_node_event_mac_address",
     "send_rack_event",
 ]
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from logging import DEBUG, ERROR, INFO, WARN
+import time
 
-from twisted.internet.defer import maybeDeferred, succeed
+from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, maybeDeferred, succeed
+from twisted.protocols.amp import UnhandledCommand
 
 from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.rpc import getRegionClient
@@ -25,6 +29,7 @@ from provisioningserver.rpc.region import (
     SendEvent,
     SendEventIPAddress,
     SendEventMACAddress,
+    SendIPAddressEvents,
 )
 from provisioningserver.utils.env import get_maas_id
 from provisioningserver.utils.twisted import (
@@ -428,10 +433,20 @@ class NodeEventHub:
     sending logs to the region.
     """
 
-    def __init__(self):
+    # How long queued events wait to be sent, so that events logged in
+    # quick succession are sent to the region together.
+    queue_delay = 1.0
+
+    # The most events sent to the region in one `SendIPAddressEvents` call.
+    batch_size = 100
+
+    def __init__(self, clock=reactor):
         super().__init__()
         self._types_registering = dict()
         self._types_registered = set()
+        self._queued = []
+        self._queued_call = None
+        self.clock = clock
 
     @asynchronous
     def registerEventType(self, event_type):
@@ -605,6 +620,69 @@ class NodeEventHub:
 
         return d
 
+    @asynchronous
+    def queueByIP(self, event_type, ip_address, description=""):
+        """Queue the given node event to be sent to the region.
+
+        The node is specified by its IP address. Queued events are sent a
+        short while later, together with those queued in the meantime and
+        grouped by node, so this suits events that are logged often, like
+        those for files requested by booting nodes.
+
+        :param event_type: The type of the event.
+        :type event_type: unicode
+        :param ip_address: The IP address of the node.
+        :type ip_address: unicode
+        :param description: An optional description of the event.
+        :type description: unicode
+        """
+        self._queued.append(
+            {
+                "ip_address": ip_address,
+                "type_name": event_type,
+                "description": description,
+                "timestamp": time.time(),
+            }
+        )
+        if self._queued_call is None:
+            self._queued_call = self.clock.callLater(
+                self.queue_delay, self._sendQueued
+            )
+
+    def _sendQueued(self):
+        """Send the queued events to the region, grouped by node."""
+        self._queued_call = None
+        queued, self._queued = self._queued, []
+        events_by_ip = OrderedDict()
+        for event in queued:
+            events_by_ip.setdefault(event["ip_address"], []).append(event)
+        events = [
+            event for events in events_by_ip.values() for event in events
+        ]
+        d = self._sendByIP(events)
+        d.addErrback(log.err, "Failed to send queued node events.")
+        return d
+
+    @inlineCallbacks
+    def _sendByIP(self, events):
+        """Send `events` to the region in batches of at most `batch_size`."""
+        for event_type in sorted({event["type_name"] for event in events}):
+            yield self.ensureEventTypeRegistered(event_type)
+        client = getRegionClient()
+        for index in range(0, len(events), self.batch_size):
+            batch = events[index : index + self.batch_size]
+            try:
+                yield client(SendIPAddressEvents, events=batch)
+            except UnhandledCommand:
+                # The region has not been upgraded to support the batch
+                # call, so send the events one at a time.
+                for event in batch:
+                    yield self.logByIP(
+                        event["type_name"],
+                        event["ip_address"],
+                        event["description"],
+                    )
+
 
 # Singleton.
 nodeEventHub = NodeEventHub()
@@ -653,6 +731,21 @@ def send_node_event_ip_address(event_type, ip_address, description=""):
     return nodeEventHub.logByIP(event_type, ip_address, description)
 
 
+@asynchronous
+def queue_node_event_ip_address(event_type, ip_address, description=""):
+    """Queue the given node event to be sent to the region for the given IP
+    address, together with other queued events.
+
+    :param event_type: The type of the event.
+    :type event_type: unicode
+    :param ip_address: The IP Address of the node of the event.
+    :type ip_address: unicode
+    :param description: An optional description of the event.
+    :type description: unicode
+    """
+    nodeEventHub.queueByIP(event_type, ip_address, description)
+
+
 @asynchronous
 def send_rack_event(event_type, description=""):
     """Send an event about the running rack to the region.
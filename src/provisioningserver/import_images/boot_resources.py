@@ -127,11 +127,13 @@ def parse_sources(sources_yaml):
     return BootSources.parse(StringIO(sources_yaml))
 
 
-def import_images(sources):
+def import_images(sources, peer_urls=()):
     """Import images.  Callable from the command line.
 
     :param config: An iterable of dicts representing the sources from
         which boot images will be downloaded.
+    :param peer_urls: URLs of the caches of peer rack controllers to
+        download boot images from instead of the sources.
     """
     if len(sources) == 0:
         msg = "Can't import: region did not provide a source."
@@ -145,6 +147,7 @@ def import_images(sources):
 
     with ClusterConfiguration.open() as config:
         storage = FilePath(config.tftp_root).parent().path
+        max_workers = config.image_download_workers
 
     with tempdir("keyrings") as keyrings_path:
         # XXX: Band-aid to ensure that the keyring_data is bytes. Future task:
@@ -190,7 +193,11 @@ def import_images(sources):
 
         try:
             snapshot_path = download_all_boot_resources(
-                sources, storage, product_mapping
+                sources,
+                storage,
+                product_mapping,
+                max_workers=max_workers,
+                peer_urls=peer_urls,
             )
         except Exception as e:
             try_send_rack_event(
@@ -201,8 +208,9 @@ def import_images(sources):
                 "Unable to import boot images; cleaning up failed snapshot "
                 "and cache."
             )
-            # Cleanup snapshots and cache since download failed.
-            cleanup_snapshots_and_cache(storage)
+            # Cleanup snapshots and cache since download failed, keeping the
+            # partially downloaded files so the next import resumes them.
+            cleanup_snapshots_and_cache(storage, keep_partial=True)
             raise
 
     maaslog.info("Writing boot image metadata.")
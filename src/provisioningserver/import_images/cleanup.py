@@ -8,6 +8,10 @@ __all__ = ["cleanup_snapshots_and_cache"]
 import os
 import shutil
 
+from provisioningserver.import_images.download_resources import (
+    PARTIAL_SUFFIX,
+)
+
 
 def list_old_snapshots(storage):
     """List of snapshot directories that are no longer in use."""
@@ -30,8 +34,12 @@ def cleanup_snapshots(storage):
         shutil.rmtree(snapshot)
 
 
-def list_unused_cache_files(storage):
-    """List of cache files that are no longer being referenced by snapshots."""
+def list_unused_cache_files(storage, keep_partial=False):
+    """List of cache files that are no longer being referenced by snapshots.
+
+    :param keep_partial: Leave out partially downloaded files, so that their
+        download can be resumed.
+    """
     cache_dir = os.path.join(storage, "cache")
     if os.path.exists(cache_dir):
         cache_files = [
@@ -45,17 +53,18 @@ def list_unused_cache_files(storage):
         cache_file
         for cache_file in cache_files
         if os.stat(cache_file).st_nlink == 1
+        and not (keep_partial and cache_file.endswith(PARTIAL_SUFFIX))
     ]
 
 
-def cleanup_cache(storage):
+def cleanup_cache(storage, keep_partial=False):
     """Remove files that are no longer being referenced by snapshots."""
-    cache_files = list_unused_cache_files(storage)
+    cache_files = list_unused_cache_files(storage, keep_partial=keep_partial)
     for cache_file in cache_files:
         os.remove(cache_file)
 
 
-def cleanup_snapshots_and_cache(storage):
+def cleanup_snapshots_and_cache(storage, keep_partial=False):
     """Remove old snapshot directories and old cache files."""
     cleanup_snapshots(storage)
-    cleanup_cache(storage)
+    cleanup_cache(storage, keep_partial=keep_partial)
@@ -5,13 +5,21 @@
 
 __all__ = ["download_all_boot_resources"]
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import http.client
+import json
 import os.path
+import random
+import re
 import tarfile
+import urllib.error
+import urllib.request
 
 from simplestreams.mirrors import BasicMirrorWriter, UrlMirrorReader
 from simplestreams.objectstores import FileStore
 from simplestreams.util import (
+    checksummer,
     item_checksums,
     path_from_mirror_url,
     products_exdata,
@@ -29,8 +37,166 @@ log = LegacyLogger()
 
 DEFAULT_KEYRING_PATH = "/usr/share/keyrings"
 
+# Default number of files downloaded at once.
+DEFAULT_DOWNLOAD_WORKERS = 4
 
-def insert_file(store, name, tag, checksums, size, content_source):
+# Suffix of the files in the cache that are being downloaded.
+PARTIAL_SUFFIX = ".partial"
+
+# Number of times a download is resumed after a failure before giving up.
+DOWNLOAD_ATTEMPTS = 3
+
+DOWNLOAD_READ_SIZE = 1 << 20
+
+DOWNLOAD_TIMEOUT = 60
+
+# Port and path where the rack's HTTP server serves its cache of boot
+# resources to peer rack controllers.
+PEER_HTTP_PORT = 5248
+PEER_CACHE_PATH = "images-cache"
+
+# Files in the cache that hold downloaded content are named by its SHA256.
+SHA256_PATTERN = re.compile("^[0-9a-f]{64}$")
+
+
+def compose_peer_cache_url(address):
+    """Return the URL of the cache of boot resources on a peer rack
+    controller at `address`."""
+    if ":" in address:
+        address = "[%s]" % address
+    return "http://%s:%d/%s/" % (address, PEER_HTTP_PORT, PEER_CACHE_PATH)
+
+
+def get_peer_cache_files(url):
+    """Return the SHA256 of the complete files in the cache at `url`.
+
+    The cache is listed by nginx as JSON. Files that are being downloaded
+    have a suffix, so they're not included. A peer that can't be reached,
+    or that returns something unexpected, has no files.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+            entries = json.loads(response.read().decode("utf-8"))
+        return frozenset(
+            entry["name"]
+            for entry in entries
+            if entry.get("type") == "file"
+            and SHA256_PATTERN.match(entry["name"])
+        )
+    except (
+        OSError,
+        http.client.HTTPException,
+        AttributeError,
+        KeyError,
+        TypeError,
+        ValueError,
+    ) as error:
+        log.info(
+            "Unable to list the boot resources of peer {url}: {error}",
+            url=url,
+            error=error,
+        )
+        return frozenset()
+
+
+def download_file(path, url, checksums, size=None, peer_urls=()):
+    """Download `url` into `path`.
+
+    The content is written to a partial file next to `path`, which is only
+    moved in place once the checksums of the content match. A partial file
+    left by an earlier attempt is resumed with an HTTP Range request, so a
+    failed download doesn't start from scratch. A file already at `path`
+    is reused without downloading anything.
+
+    :param checksums: A Simplestreams checksums dict, mapping hash algorihm
+        names (such as `sha256`) to the file's respective checksums.
+    :param size: Optional size for the file.
+    :param peer_urls: Optional URLs of the same file on peer rack
+        controllers. They are tried in order before `url`, and a peer that
+        fails is skipped.
+    """
+    if os.path.isfile(path):
+        return
+    for peer_url in peer_urls:
+        try:
+            _download_verified_file(path, peer_url, checksums, size, 1)
+        except (OSError, http.client.HTTPException, ValueError) as error:
+            log.info(
+                "Unable to download {url} from peer: {error}",
+                url=peer_url,
+                error=error,
+            )
+        else:
+            return
+    _download_verified_file(path, url, checksums, size, DOWNLOAD_ATTEMPTS)
+
+
+def _download_verified_file(path, url, checksums, size, attempts):
+    """Download `url` into `path`, verifying its checksums.
+
+    The download is resumed up to `attempts` times.
+    """
+    partial_path = path + PARTIAL_SUFFIX
+    # The cache doesn't exist yet on the first import into empty storage.
+    os.makedirs(os.path.dirname(partial_path), exist_ok=True)
+    for attempt in range(1, attempts + 1):
+        try:
+            _download_partial_file(partial_path, url, size)
+        except (OSError, http.client.HTTPException) as error:
+            if attempt == attempts:
+                raise
+            log.debug(
+                "Resuming download of {url} after failure: {error}",
+                url=url,
+                error=error,
+            )
+        else:
+            break
+    cksum = checksummer(checksums)
+    with open(partial_path, "rb") as stream:
+        for data in iter(lambda: stream.read(DOWNLOAD_READ_SIZE), b""):
+            cksum.update(data)
+    if not cksum.check():
+        os.remove(partial_path)
+        raise ValueError(
+            "Invalid %s checksum for %s (found: %s expected: %s)"
+            % (cksum.algorithm, url, cksum.hexdigest(), cksum.expected)
+        )
+    os.rename(partial_path, path)
+
+
+def _download_partial_file(partial_path, url, size):
+    """Download the rest of `url` into `partial_path`."""
+    try:
+        offset = os.path.getsize(partial_path)
+    except FileNotFoundError:
+        offset = 0
+    if size is not None and offset >= int(size):
+        # Whatever is there is either complete or wrong; the checksum tells.
+        return
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header("Range", "bytes=%d-" % offset)
+    try:
+        response = urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as error:
+        if error.code != http.client.REQUESTED_RANGE_NOT_SATISFIABLE:
+            raise
+        # The partial file doesn't match the content; start over.
+        os.remove(partial_path)
+        return _download_partial_file(partial_path, url, size)
+    with response:
+        if offset > 0 and response.getcode() != http.client.PARTIAL_CONTENT:
+            # The whole content was returned instead of the range.
+            offset = 0
+        with open(partial_path, "ab" if offset > 0 else "wb") as stream:
+            for data in iter(lambda: response.read(DOWNLOAD_READ_SIZE), b""):
+                stream.write(data)
+
+
+def insert_file(
+    store, name, tag, checksums, size, content_source, url=None, peer_urls=()
+):
     """Insert a file into `store`.
 
     :param store: A simplestreams `ObjectStore`.
@@ -45,6 +211,10 @@ def insert_file(store, name, tag, checksums, size, content_source):
         to expect.
     :param content_source: A Simplestreams `ContentSource` for reading the
         file.
+    :param url: Optional URL of the file, to download it with
+        `download_file` instead of reading `content_source`.
+    :param peer_urls: Optional URLs of the file on peer rack controllers,
+        passed to `download_file`.
     :return: A list of inserted files (actually, only the one file in this
         case) described as tuples of (path, logical name).  The path lies in
         the directory managed by `store` and has a filename based on `tag`,
@@ -56,12 +226,19 @@ def insert_file(store, name, tag, checksums, size, content_source):
         tag=tag,
         size=size,
     )
-    store.insert(tag, content_source, checksums, mutable=False, size=size)
+    if url is None:
+        store.insert(tag, content_source, checksums, mutable=False, size=size)
+    else:
+        download_file(
+            store._fullpath(tag), url, checksums, size, peer_urls=peer_urls
+        )
     # XXX jtv 2014-04-24 bug=1313580: Isn't _fullpath meant to be private?
     return [(store._fullpath(tag), name)]
 
 
-def extract_archive_tar(store, name, tag, checksums, size, content_source):
+def extract_archive_tar(
+    store, name, tag, checksums, size, content_source, url=None, peer_urls=()
+):
     """Extract an archive.tar.xz into `store`.
 
     :param store: A simplestreams `ObjectStore`.
@@ -77,6 +254,10 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
         to expect.
     :param content_source: A Simplestreams `ContentSource` for reading the
         file.
+    :param url: Optional URL of the file, to download it with
+        `download_file` instead of reading `content_source`.
+    :param peer_urls: Optional URLs of the file on peer rack controllers,
+        passed to `download_file`.
     :return: A list of inserted files (file and archive.tar.xz) described
         as tuples of (path, logical name).  The path lies in the directory
         managed by `store` and has a filename based on `tag`, not logical name.
@@ -113,7 +294,14 @@ def extract_archive_tar(store, name, tag, checksums, size, content_source):
             size=size,
         )
         archive_path = store._fullpath(tag)
-        store.insert(tag, content_source, checksums, mutable=False, size=size)
+        if url is None:
+            store.insert(
+                tag, content_source, checksums, mutable=False, size=size
+            )
+        else:
+            download_file(
+                archive_path, url, checksums, size, peer_urls=peer_urls
+            )
         with tarfile.open(archive_path, "r|*") as tar:
             for member in tar:
                 if member.isfile():
@@ -177,8 +365,7 @@ def link_resources(
             directory = os.path.join(
                 snapshot_path, "bootloader", bootloader_type, arch
             )
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
         for cached_file, logical_name in links:
             link_path = os.path.join(directory, logical_name)
             if os.path.isfile(link_path):
@@ -197,12 +384,36 @@ class RepoWriter(BasicMirrorWriter):
         should be stored.
     :ivar product_mapping: A `ProductMapping` describing the desired boot
         resources.
+    :ivar mirror: Optional URL of the Simplestreams mirror. When given,
+        files are downloaded by `max_workers` threads at once, and resumed
+        after failures.
+    :ivar peer_urls: URLs of the caches of peer rack controllers. Files
+        that a peer already holds are downloaded from it instead of the
+        mirror; only used with a `mirror`.
     """
 
-    def __init__(self, root_path, store, product_mapping):
+    def __init__(
+        self,
+        root_path,
+        store,
+        product_mapping,
+        mirror=None,
+        max_workers=DEFAULT_DOWNLOAD_WORKERS,
+        peer_urls=(),
+    ):
         self.root_path = root_path
         self.store = store
         self.product_mapping = product_mapping
+        self.mirror = mirror
+        self.max_workers = max_workers
+        self.peer_urls = list(peer_urls)
+        self._executor = None
+        # The files each peer holds, as (url, sha256s) tuples.
+        self._peer_files = []
+        # Downloads in progress, by tag, and the links to create once they
+        # are complete, in the order the items were inserted.
+        self._downloads = {}
+        self._pending_links = []
         super().__init__(
             config={
                 # Only download the latest version. Without this all versions
@@ -222,6 +433,58 @@ class RepoWriter(BasicMirrorWriter):
         """Overridable from `BasicMirrorWriter`."""
         return self.product_mapping.contains(products_exdata(src, pedigree))
 
+    def sync(self, reader, path):
+        """Overridable from `BasicMirrorWriter`.
+
+        With a `mirror`, the files are downloaded in a pool of threads while
+        the products are walked, then linked into the snapshot in the order
+        they were inserted.
+        """
+        if self.mirror is None:
+            return super().sync(reader, path)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self._executor = executor
+            self._peer_files = list(
+                zip(
+                    self.peer_urls,
+                    executor.map(get_peer_cache_files, self.peer_urls),
+                )
+            )
+            try:
+                result = super().sync(reader, path)
+            except BaseException:
+                for download in self._downloads.values():
+                    download.cancel()
+                raise
+            finally:
+                self._executor = None
+        try:
+            for download, link_kwargs in self._pending_links:
+                link_resources(links=download.result(), **link_kwargs)
+        finally:
+            self._downloads.clear()
+            self._pending_links.clear()
+            self._peer_files = []
+        return result
+
+    def get_url(self, item):
+        """Return the URL of `item` in the mirror."""
+        return "%s/%s" % (self.mirror.rstrip("/"), item["path"].lstrip("/"))
+
+    def get_peer_urls(self, tag):
+        """Return the URLs of the file `tag` on the peers that hold it.
+
+        The peers are shuffled, so that rack controllers downloading the
+        same files spread the load over all the peers that hold them.
+        """
+        urls = [
+            "%s/%s" % (url.rstrip("/"), tag)
+            for url, files in self._peer_files
+            if tag in files
+        ]
+        random.shuffle(urls)
+        return urls
+
     def insert_item(self, data, src, target, pedigree, contentsource):
         """Overridable from `BasicMirrorWriter`."""
         item = products_exdata(src, pedigree)
@@ -231,13 +494,29 @@ class RepoWriter(BasicMirrorWriter):
         ftype = item["ftype"]
         filename = os.path.basename(item["path"])
         if ftype == "archive.tar.xz":
-            links = extract_archive_tar(
-                self.store, filename, tag, checksums, size, contentsource
-            )
+            insert = extract_archive_tar
         else:
-            links = insert_file(
+            insert = insert_file
+        if self._executor is None:
+            links = insert(
                 self.store, filename, tag, checksums, size, contentsource
             )
+        else:
+            # Items sharing the same content are only downloaded once.
+            download = self._downloads.get((insert, tag))
+            if download is None:
+                download = self._executor.submit(
+                    insert,
+                    self.store,
+                    filename,
+                    tag,
+                    checksums,
+                    size,
+                    None,
+                    url=self.get_url(item),
+                    peer_urls=self.get_peer_urls(tag),
+                )
+                self._downloads[insert, tag] = download
 
         osystem = get_os_from_product(item)
 
@@ -272,9 +551,8 @@ class RepoWriter(BasicMirrorWriter):
             subarch_parts = item["subarch"].split("-")
             subarch_parts[1] = "rolling"
             subarches.add("-".join(subarch_parts))
-        link_resources(
+        link_kwargs = dict(
             snapshot_path=self.root_path,
-            links=links,
             osystem=osystem,
             arch=item["arch"],
             release=item["release"],
@@ -282,10 +560,20 @@ class RepoWriter(BasicMirrorWriter):
             subarches=subarches,
             bootloader_type=item.get("bootloader-type"),
         )
+        if self._executor is None:
+            link_resources(links=links, **link_kwargs)
+        else:
+            self._pending_links.append((download, link_kwargs))
 
 
 def download_boot_resources(
-    path, store, snapshot_path, product_mapping, keyring_file=None
+    path,
+    store,
+    snapshot_path,
+    product_mapping,
+    keyring_file=None,
+    max_workers=DEFAULT_DOWNLOAD_WORKERS,
+    peer_urls=(),
 ):
     """Download boot resources for one simplestreams source.
 
@@ -298,10 +586,20 @@ def download_boot_resources(
         downloaded.
     :param keyring_file: Optional path to a keyring file for verifying
         signatures.
+    :param max_workers: Number of files to download at once.
+    :param peer_urls: URLs of the caches of peer rack controllers to
+        download files from instead of the source.
     """
     maaslog.info("Downloading boot resources from %s", path)
-    writer = RepoWriter(snapshot_path, store, product_mapping)
     (mirror, rpath) = path_from_mirror_url(path, None)
+    writer = RepoWriter(
+        snapshot_path,
+        store,
+        product_mapping,
+        mirror=mirror,
+        max_workers=max_workers,
+        peer_urls=peer_urls,
+    )
     policy = get_signing_policy(rpath, keyring_file)
     reader = UrlMirrorReader(mirror, policy=policy)
     writer.sync(reader, rpath)
@@ -323,7 +621,12 @@ def compose_snapshot_path(storage_path):
 
 
 def download_all_boot_resources(
-    sources, storage_path, product_mapping, store=None
+    sources,
+    storage_path,
+    product_mapping,
+    store=None,
+    max_workers=DEFAULT_DOWNLOAD_WORKERS,
+    peer_urls=(),
 ):
     """Download the actual boot resources.
 
@@ -344,6 +647,9 @@ def download_all_boot_resources(
     :param product_mapping: A `ProductMapping` describing the resources to be
         downloaded.
     :param store: A `FileStore` instance. Used only for testing.
+    :param max_workers: Number of files to download at once.
+    :param peer_urls: URLs of the caches of peer rack controllers to
+        download files from instead of the sources.
     :return: Path to the snapshot directory.
     """
     storage_path = os.path.abspath(storage_path)
@@ -363,6 +669,8 @@ def download_all_boot_resources(
             snapshot_path,
             product_mapping,
             keyring_file=source.get("keyring"),
+            max_workers=max_workers,
+            peer_urls=peer_urls,
         ),
 
     return snapshot_path
@@ -731,7 +731,10 @@ class TestImportImages(MAASTestCase):
             ],
         )
         self.assertRaises(Exception, boot_resources.import_images, sources)
-        self.assertThat(fake_cleanup_snapshots_and_cache, MockCalledOnce())
+        self.assertThat(
+            fake_cleanup_snapshots_and_cache,
+            MockCalledWith(mock.ANY, keep_partial=True),
+        )
 
     def test_runs_import_and_returns_true(self):
         # Stop import_images() from actually doing anything.
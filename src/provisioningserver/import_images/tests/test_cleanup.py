@@ -92,10 +92,24 @@ class TestCleanup(MAASTestCase):
         ]
         self.assertItemsEqual(cache_nlink_greater_than_1, remaining_cache)
 
+    def test_list_unused_cache_files_keeps_partial_files(self):
+        storage = self.make_dir()
+        cache_file = self.make_cache_file(storage)
+        partial_file = cache_file + ".partial"
+        os.rename(cache_file, partial_file)
+        self.assertItemsEqual(
+            [partial_file], cleanup.list_unused_cache_files(storage)
+        )
+        self.assertItemsEqual(
+            [], cleanup.list_unused_cache_files(storage, keep_partial=True)
+        )
+
     def test_cleanup_snapshots_and_cache_calls(self):
         storage = self.make_dir()
         mock_snapshots = self.patch_autospec(cleanup, "cleanup_snapshots")
         mock_cache = self.patch_autospec(cleanup, "cleanup_cache")
         cleanup.cleanup_snapshots_and_cache(storage)
         self.assertThat(mock_snapshots, MockCalledOnceWith(storage))
-        self.assertThat(mock_cache, MockCalledOnceWith(storage))
+        self.assertThat(
+            mock_cache, MockCalledOnceWith(storage, keep_partial=False)
+        )
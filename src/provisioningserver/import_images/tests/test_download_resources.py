@@ -6,17 +6,26 @@
 __all__ = []
 
 from datetime import datetime
+from functools import partial
 import hashlib
+import http.client
+from io import BytesIO
+import json
 import os
 import random
 import tarfile
+import threading
 from unittest import mock
 
+from fixtures import Fixture
 from simplestreams.contentsource import ChecksummingContentSource
 from simplestreams.objectstores import FileStore
 
 from maastesting.factory import factory
+from maastesting.httpd import SilentHTTPRequestHandler, ThreadingHTTPServer
 from maastesting.matchers import (
+    MockAnyCall,
+    MockCalledOnce,
     MockCalledOnceWith,
     MockCalledWith,
     MockNotCalled,
@@ -81,6 +90,8 @@ class TestDownloadAllBootResources(MAASTestCase):
                 snapshot_path,
                 product_mapping,
                 keyring_file=source["keyring"],
+                max_workers=4,
+                peer_urls=(),
             ),
         )
 
@@ -118,6 +129,380 @@ class TestComposeSnapshotPath(MAASTestCase):
         )
 
 
+class FakeResponse(BytesIO):
+    """A fake response from `urlopen`."""
+
+    def __init__(self, content, code=http.client.OK):
+        super().__init__(content)
+        self.code = code
+
+    def getcode(self):
+        return self.code
+
+
+class TestDownloadFile(MAASTestCase):
+    """Tests for `download_file`()."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = factory.make_bytes(1024)
+        self.checksums = {"sha256": hashlib.sha256(self.content).hexdigest()}
+        self.path = os.path.join(self.make_dir(), self.checksums["sha256"])
+        self.partial_path = self.path + download_resources.PARTIAL_SUFFIX
+        self.url = factory.make_simple_http_url()
+        self.urlopen = self.patch(download_resources.urllib.request, "urlopen")
+
+    def download_file(self):
+        download_resources.download_file(
+            self.path, self.url, self.checksums, len(self.content)
+        )
+
+    def read_file(self):
+        with open(self.path, "rb") as stream:
+            return stream.read()
+
+    def test_downloads_file(self):
+        self.urlopen.return_value = FakeResponse(self.content)
+        self.download_file()
+        self.assertEqual(self.content, self.read_file())
+        self.assertFalse(os.path.exists(self.partial_path))
+        [request] = [args[0] for args, _ in self.urlopen.call_args_list]
+        self.assertEqual(self.url, request.full_url)
+        self.assertFalse(request.has_header("Range"))
+
+    def test_creates_cache_directory_in_empty_storage(self):
+        storage_path = self.make_dir()
+        self.path = os.path.join(
+            storage_path, "cache", self.checksums["sha256"]
+        )
+        self.urlopen.return_value = FakeResponse(self.content)
+        self.download_file()
+        self.assertEqual(self.content, self.read_file())
+        self.assertEqual(
+            [self.checksums["sha256"]],
+            os.listdir(os.path.join(storage_path, "cache")),
+        )
+
+    def test_resumes_partial_file(self):
+        with open(self.partial_path, "wb") as stream:
+            stream.write(self.content[:100])
+        self.urlopen.return_value = FakeResponse(
+            self.content[100:], http.client.PARTIAL_CONTENT
+        )
+        self.download_file()
+        self.assertEqual(self.content, self.read_file())
+        [request] = [args[0] for args, _ in self.urlopen.call_args_list]
+        self.assertEqual("bytes=100-", request.get_header("Range"))
+
+    def test_restarts_when_range_is_not_supported(self):
+        with open(self.partial_path, "wb") as stream:
+            stream.write(self.content[:100])
+        self.urlopen.return_value = FakeResponse(self.content)
+        self.download_file()
+        self.assertEqual(self.content, self.read_file())
+
+    def test_resumes_after_failure(self):
+        def urlopen(request, timeout):
+            if request.has_header("Range"):
+                return FakeResponse(
+                    self.content[100:], http.client.PARTIAL_CONTENT
+                )
+            with open(self.partial_path, "wb") as stream:
+                stream.write(self.content[:100])
+            raise ConnectionResetError()
+
+        self.urlopen.side_effect = urlopen
+        self.download_file()
+        self.assertEqual(self.content, self.read_file())
+        self.assertEqual(2, self.urlopen.call_count)
+
+    def test_reuses_existing_file(self):
+        with open(self.path, "wb") as stream:
+            stream.write(self.content)
+        self.download_file()
+        self.assertThat(self.urlopen, MockNotCalled())
+
+    def test_removes_partial_file_with_wrong_checksum(self):
+        self.urlopen.return_value = FakeResponse(
+            factory.make_bytes(len(self.content))
+        )
+        self.assertRaises(ValueError, self.download_file)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.partial_path))
+
+
+class TestDownloadFileFromPeers(MAASTestCase):
+    """Tests for `download_file`() with peer rack controllers."""
+
+    def setUp(self):
+        super().setUp()
+        self.content = factory.make_bytes(1024)
+        self.checksums = {"sha256": hashlib.sha256(self.content).hexdigest()}
+        self.path = os.path.join(self.make_dir(), self.checksums["sha256"])
+        self.url = factory.make_simple_http_url()
+        self.peer_urls = [
+            factory.make_simple_http_url() + self.checksums["sha256"]
+            for _ in range(2)
+        ]
+        self.urlopen = self.patch(download_resources.urllib.request, "urlopen")
+
+    def download_file(self):
+        download_resources.download_file(
+            self.path,
+            self.url,
+            self.checksums,
+            len(self.content),
+            peer_urls=self.peer_urls,
+        )
+        with open(self.path, "rb") as stream:
+            return stream.read()
+
+    def get_requested_urls(self):
+        return [args[0].full_url for args, _ in self.urlopen.call_args_list]
+
+    def test_downloads_from_first_peer(self):
+        self.urlopen.return_value = FakeResponse(self.content)
+        self.assertEqual(self.content, self.download_file())
+        self.assertEqual(self.peer_urls[:1], self.get_requested_urls())
+
+    def test_skips_failing_peers(self):
+        self.urlopen.side_effect = [
+            ConnectionRefusedError(),
+            FakeResponse(factory.make_bytes(len(self.content))),
+            FakeResponse(self.content),
+        ]
+        self.assertEqual(self.content, self.download_file())
+        self.assertEqual(
+            self.peer_urls + [self.url], self.get_requested_urls()
+        )
+
+    def test_resumes_from_next_peer(self):
+        def urlopen(request, timeout):
+            if request.full_url == self.peer_urls[0]:
+                with open(
+                    self.path + download_resources.PARTIAL_SUFFIX, "wb"
+                ) as stream:
+                    stream.write(self.content[:100])
+                raise ConnectionResetError()
+            self.assertEqual("bytes=100-", request.get_header("Range"))
+            return FakeResponse(
+                self.content[100:], http.client.PARTIAL_CONTENT
+            )
+
+        self.urlopen.side_effect = urlopen
+        self.assertEqual(self.content, self.download_file())
+        self.assertEqual(self.peer_urls, self.get_requested_urls())
+
+
+class RackHTTPStandIn(Fixture):
+    """A stand-in for the HTTP server of a rack controller.
+
+    Files in `path` are served like nginx does, and directories are listed
+    as JSON, like nginx does with `autoindex_format json`. The paths that
+    are requested are recorded in `requested`.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.requested = []
+
+    @property
+    def url(self):
+        return "http://%s:%d/" % self.server.server_address
+
+    def setUp(self):
+        super().setUp()
+        requested = self.requested
+
+        class RequestHandler(SilentHTTPRequestHandler):
+            def send_head(self):
+                requested.append(self.path)
+                return super().send_head()
+
+            def list_directory(self, path):
+                entries = [
+                    {
+                        "name": name,
+                        "type": "directory"
+                        if os.path.isdir(os.path.join(path, name))
+                        else "file",
+                    }
+                    for name in sorted(os.listdir(path))
+                ]
+                content = json.dumps(entries).encode("utf-8")
+                self.send_response(http.client.OK)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                return BytesIO(content)
+
+        self.server = ThreadingHTTPServer(
+            ("localhost", 0), partial(RequestHandler, directory=self.path)
+        )
+        threading.Thread(target=self.server.serve_forever).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as stream:
+        stream.write(content)
+
+
+class TestComposePeerCacheURL(MAASTestCase):
+    """Tests for `compose_peer_cache_url`()."""
+
+    def test_ipv4(self):
+        self.assertEqual(
+            "http://10.0.0.1:5248/images-cache/",
+            download_resources.compose_peer_cache_url("10.0.0.1"),
+        )
+
+    def test_ipv6(self):
+        self.assertEqual(
+            "http://[fd00::1]:5248/images-cache/",
+            download_resources.compose_peer_cache_url("fd00::1"),
+        )
+
+
+class TestGetPeerCacheFiles(MAASTestCase):
+    """Tests for `get_peer_cache_files`()."""
+
+    def test_lists_complete_files(self):
+        root = self.make_dir()
+        complete, partial = (
+            hashlib.sha256(factory.make_bytes()).hexdigest() for _ in range(2)
+        )
+        cache = os.path.join(root, "images-cache")
+        write_file(os.path.join(cache, complete), b"")
+        write_file(
+            os.path.join(cache, partial + download_resources.PARTIAL_SUFFIX),
+            b"",
+        )
+        write_file(os.path.join(cache, "boot-kernel-%s" % complete), b"")
+        os.makedirs(os.path.join(cache, partial))
+        peer = self.useFixture(RackHTTPStandIn(root))
+        self.assertEqual(
+            {complete},
+            download_resources.get_peer_cache_files(
+                peer.url + "images-cache/"
+            ),
+        )
+
+    def test_returns_nothing_when_cache_is_missing(self):
+        peer = self.useFixture(RackHTTPStandIn(self.make_dir()))
+        self.assertEqual(
+            frozenset(),
+            download_resources.get_peer_cache_files(
+                peer.url + "images-cache/"
+            ),
+        )
+
+    def test_returns_nothing_for_unexpected_content(self):
+        root = self.make_dir()
+        write_file(os.path.join(root, "index.html"), b"<html></html>")
+        peer = self.useFixture(RackHTTPStandIn(root))
+        self.assertEqual(
+            frozenset(), download_resources.get_peer_cache_files(peer.url)
+        )
+
+
+class TestRepoWriterWithPeers(MAASTestCase):
+    """Tests for `RepoWriter` downloading files from peer rack controllers,
+    using stand-ins for the HTTP servers of the region and the racks."""
+
+    def make_product(self, content):
+        return {
+            "content_id": "maas:v2:download",
+            "product_name": factory.make_string(),
+            "version_name": datetime.utcnow().strftime("%Y%m%d"),
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "size": len(content),
+            "ftype": "boot-kernel",
+            "path": "path/to/%s" % factory.make_name("filename"),
+            "os": factory.make_name("os"),
+            "release": factory.make_name("release"),
+            "arch": factory.make_name("arch"),
+            "label": factory.make_name("label"),
+            "subarch": factory.make_name("subarch"),
+        }
+
+    def make_rack(self, contents=()):
+        root = self.make_dir()
+        for content in contents:
+            sha256 = hashlib.sha256(content).hexdigest()
+            write_file(os.path.join(root, "images-cache", sha256), content)
+        return self.useFixture(RackHTTPStandIn(root))
+
+    def make_region(self, contents):
+        root = self.make_dir()
+        products = []
+        for content in contents:
+            product = self.make_product(content)
+            write_file(os.path.join(root, product["path"]), content)
+            products.append(product)
+        return self.useFixture(RackHTTPStandIn(root)), products
+
+    def sync(self, region, peers, products):
+        product_mapping = ProductMapping()
+        for product in products:
+            product_mapping.add(product, product["subarch"])
+        store = FileStore(self.make_dir())
+        repo_writer = download_resources.RepoWriter(
+            None,
+            store,
+            product_mapping,
+            mirror=region.url,
+            max_workers=2,
+            peer_urls=[peer.url + "images-cache/" for peer in peers],
+        )
+        self.patch(
+            download_resources, "products_exdata"
+        ).side_effect = lambda src, pedigree: src
+        self.patch(download_resources, "link_resources")
+
+        def sync(reader, path):
+            for product in products:
+                repo_writer.insert_item(product, product, None, None, None)
+
+        self.patch(
+            download_resources.BasicMirrorWriter, "sync"
+        ).side_effect = sync
+        repo_writer.sync(None, None)
+        return store
+
+    def test_downloads_files_from_peers_that_hold_them(self):
+        held, missing = factory.make_bytes(1024), factory.make_bytes(1024)
+        region, products = self.make_region([held, missing])
+        holding_rack = self.make_rack([held])
+        empty_rack = self.make_rack()
+        store = self.sync(region, [holding_rack, empty_rack], products)
+        for product, content in zip(products, [held, missing]):
+            with open(store._fullpath(product["sha256"]), "rb") as stream:
+                self.assertEqual(content, stream.read())
+        self.assertEqual(
+            ["/images-cache/", "/images-cache/" + products[0]["sha256"]],
+            holding_rack.requested,
+        )
+        self.assertEqual(["/images-cache/"], empty_rack.requested)
+        self.assertEqual(["/" + products[1]["path"]], region.requested)
+
+    def test_falls_back_to_region_when_peer_content_is_invalid(self):
+        content = factory.make_bytes(1024)
+        region, [product] = self.make_region([content])
+        rack = self.make_rack()
+        write_file(
+            os.path.join(rack.path, "images-cache", product["sha256"]),
+            factory.make_bytes(1024),
+        )
+        store = self.sync(region, [rack], [product])
+        with open(store._fullpath(product["sha256"]), "rb") as stream:
+            self.assertEqual(content, stream.read())
+        self.assertEqual(["/" + product["path"]], region.requested)
+
+
 class TestExtractArchiveTar(MAASTestCase):
     """Tests for `extract_archive_Tar`()."""
 
@@ -564,6 +949,100 @@ class TestRepoWriter(MAASTestCase):
         )
 
 
+class TestRepoWriterWithMirror(MAASTestCase):
+    """Tests for `RepoWriter` downloading files from a mirror."""
+
+    def make_product(self, **kwargs):
+        return {
+            "content_id": "maas:v2:download",
+            "product_name": factory.make_string(),
+            "version_name": datetime.utcnow().strftime("%Y%m%d"),
+            "sha256": factory.make_name("sha256"),
+            "size": random.randint(2, 2 ** 16),
+            "ftype": factory.make_name("ftype"),
+            "path": "path/to/%s" % factory.make_name("filename"),
+            "os": factory.make_name("os"),
+            "release": factory.make_name("release"),
+            "arch": factory.make_name("arch"),
+            "label": factory.make_name("label"),
+            "subarch": factory.make_name("subarch"),
+            **kwargs,
+        }
+
+    def sync(self, products):
+        mirror = "http://example.com/images-stream/"
+        product_mapping = ProductMapping()
+        for product in products:
+            product_mapping.add(product, product["subarch"])
+        repo_writer = download_resources.RepoWriter(
+            None, None, product_mapping, mirror=mirror, max_workers=2
+        )
+        self.patch(
+            download_resources, "products_exdata"
+        ).side_effect = lambda src, pedigree: src
+
+        def sync(reader, path):
+            for product in products:
+                repo_writer.insert_item(product, product, None, None, None)
+
+        self.patch(
+            download_resources.BasicMirrorWriter, "sync"
+        ).side_effect = sync
+        repo_writer.sync(None, None)
+        return mirror
+
+    def test_downloads_files_then_links_them_in_order(self):
+        products = [self.make_product() for _ in range(3)]
+        mock_insert_file = self.patch(download_resources, "insert_file")
+        mock_insert_file.side_effect = lambda store, name, *args, **kw: [
+            (name, name)
+        ]
+        mock_link_resources = self.patch(download_resources, "link_resources")
+        mirror = self.sync(products)
+        for product in products:
+            self.assertThat(
+                mock_insert_file,
+                MockAnyCall(
+                    None,
+                    os.path.basename(product["path"]),
+                    product["sha256"],
+                    {"sha256": product["sha256"]},
+                    product["size"],
+                    None,
+                    url=mirror + product["path"],
+                    peer_urls=[],
+                ),
+            )
+        self.assertEqual(
+            [
+                [(os.path.basename(product["path"]),) * 2]
+                for product in products
+            ],
+            [
+                kwargs["links"]
+                for _, kwargs in mock_link_resources.call_args_list
+            ],
+        )
+
+    def test_downloads_shared_content_once(self):
+        product = self.make_product()
+        other_product = self.make_product(sha256=product["sha256"])
+        mock_insert_file = self.patch(download_resources, "insert_file")
+        mock_link_resources = self.patch(download_resources, "link_resources")
+        self.sync([product, other_product])
+        self.assertThat(mock_insert_file, MockCalledOnce())
+        self.assertEqual(2, mock_link_resources.call_count)
+
+    def test_raises_download_failure(self):
+        exception_type = factory.make_exception_type()
+        self.patch(
+            download_resources, "insert_file"
+        ).side_effect = exception_type()
+        mock_link_resources = self.patch(download_resources, "link_resources")
+        self.assertRaises(exception_type, self.sync, [self.make_product()])
+        self.assertThat(mock_link_resources, MockNotCalled())
+
+
 class TestLinkResources(MAASTestCase):
     """Tests for `LinkResources`()."""
 
@@ -185,6 +185,13 @@ class ProvisioningServiceMaker:
         http_service.setName("http")
         return http_service
 
+    def _makeHTTPLogSocketService(self):
+        from provisioningserver.rackdservices import http
+
+        http_log_socket_service = http.HTTPLogSocketService(reactor)
+        http_log_socket_service.setName("http_log_socket_service")
+        return http_log_socket_service
+
     def _makeExternalService(self, rpc_service):
         from provisioningserver.rackdservices import external
 
@@ -205,6 +212,7 @@ class ProvisioningServiceMaker:
         yield self._makeServiceMonitorService(rpc_service)
         yield self._makeImageDownloadService(rpc_service, tftp_root)
         yield self._makeRackHTTPService(tftp_root, rpc_service)
+        yield self._makeHTTPLogSocketService()
         yield self._makeExternalService(rpc_service)
         # The following are network-accessible services.
         yield self._makeHTTPService()
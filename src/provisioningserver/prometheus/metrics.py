@@ -31,6 +31,25 @@ METRICS_DEFINITIONS = [
         "Latency of TFTP file downloads",
         ["filename"],
     ),
+    MetricDefinition(
+        "Histogram",
+        "maas_power_query_sweep_duration",
+        "Time taken to query the power state of all nodes due a query",
+        buckets=[1, 5, 15, 30, 60, 120, 300, 600, 1800],
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_power_query_queue_lag",
+        "Time a node waited for its power state query to start",
+        ["power_type"],
+        buckets=[0.1, 0.5, 1, 5, 15, 30, 60, 120, 300],
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_rack_boot_config_cache_lookups",
+        "Number of boot config lookups by the rack, by cache result",
+        ["result"],
+    ),
     # regiond metrics
     MetricDefinition(
         "Histogram",
@@ -83,6 +102,46 @@ METRICS_DEFINITIONS = [
         "HTTP request query latency",
         _WEBSOCKET_CALL_LABELS,
     ),
+    MetricDefinition(
+        "Gauge",
+        "maas_listener_notify_queue_depth",
+        "Number of database notifications waiting to be handled",
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_listener_notify_wait_time",
+        "Time a database notification waited before being handled",
+        ["channel"],
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_listener_notify_handler_latency",
+        "Latency of a database notification handler",
+        ["channel"],
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_region_boot_config_cache_lookups",
+        "Number of boot config lookups by the region, by cache result",
+        ["result"],
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_region_free_ip_cache_lookups",
+        "Number of free IP address lookups by the region, by cache result",
+        ["result"],
+    ),
+    MetricDefinition(
+        "Gauge",
+        "maas_status_message_queue_depth",
+        "Number of node status messages waiting to be processed",
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_status_message_queue_lag",
+        "Time the oldest queued node status message waited to be processed",
+        buckets=[0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    ),
     # Common metrics
     *node_metrics_definitions(),
 ]
@@ -3,30 +3,32 @@
 
 """HTTP service for the rack controller."""
 
-__all__ = ["HTTPResource", "RackHTTPService"]
+__all__ = ["HTTPLogSocketService", "HTTPResource", "RackHTTPService"]
 
 from collections import defaultdict
 from datetime import timedelta
+import json
 import os
 import sys
 
 import attr
 from netaddr import IPAddress
+from tftp.backend import FilesystemReader
 from tftp.errors import AccessViolation, FileNotFound
 from twisted.application.internet import TimerService
-from twisted.internet import reactor
+from twisted.application.service import Service
 from twisted.internet.defer import maybeDeferred
-from twisted.internet.task import deferLater
+from twisted.internet.protocol import DatagramProtocol
 from twisted.internet.threads import deferToThread
 from twisted.python import context
-from twisted.web import resource
+from twisted.web import http, resource, static
 from twisted.web.server import NOT_DONE_YET
 from twisted.web.static import NoRangeStaticProducer
 
 from provisioningserver import services
-from provisioningserver.events import EVENT_TYPES, send_node_event_ip_address
+from provisioningserver.events import EVENT_TYPES, queue_node_event_ip_address
 from provisioningserver.logger import LegacyLogger
-from provisioningserver.path import get_tentative_data_path
+from provisioningserver.path import get_maas_data_path, get_tentative_data_path
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.prometheus.resource import PrometheusMetricsResource
 from provisioningserver.service_monitor import service_monitor
@@ -54,6 +56,31 @@ def compose_http_config_path(filename):
     return os.path.join(get_http_config_dir(), filename)
 
 
+def get_http_log_socket_path():
+    """Return the path to the socket that nginx sends requests log to."""
+    return get_maas_data_path("http-log.sock")
+
+
+def log_request(path, remote_host):
+    """Log a request for `path` by `remote_host`.
+
+    The request is logged to rackd.log, and queued to be sent to the region
+    controller as an event for the node with that IP address.
+    """
+    log.info(
+        "{path} requested by {remote_host}", path=path, remote_host=remote_host
+    )
+    queue_node_event_ip_address(
+        event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
+        ip_address=remote_host,
+        description=path,
+    )
+    if "squashfs" in path:
+        queue_node_event_ip_address(
+            event_type=EVENT_TYPES.LOADING_EPHEMERAL, ip_address=remote_host
+        )
+
+
 class HTTPConfigFail(Exception):
     """Raised if there's a problem with a HTTP config."""
 
@@ -80,6 +107,11 @@ class RackHTTPService(TimerService):
         # Nginx requires the that root have an ending slash.
         if not self._resource_root.endswith("/"):
             self._resource_root += "/"
+        # The cache of downloaded boot resources is next to the current
+        # snapshot; it's served to peer rack controllers.
+        self._cache_root = os.path.join(
+            os.path.dirname(self._resource_root.rstrip("/")), "cache", ""
+        )
         self._rpc_service = rpc_service
         self.clock = reactor
 
@@ -176,6 +208,8 @@ class RackHTTPService(TimerService):
                 {
                     "upstream_http": list(sorted(upstream_http)),
                     "resource_root": self._resource_root,
+                    "cache_root": self._cache_root,
+                    "log_socket": get_http_log_socket_path(),
                     "machine_resources": os.path.join(
                         snappy.get_snap_path(), "usr/share/maas"
                     )
@@ -203,38 +237,64 @@ class _Configuration:
     upstream_http = attr.ib(converter=frozenset)
 
 
+class HTTPLogSocketService(Service, DatagramProtocol):
+    """Service for receiving nginx's log of requests for boot images.
+
+    nginx sends each entry to the socket as a syslog message, so that
+    serving images doesn't wait for the requests to be logged.
+    """
+
+    # The syslog tag that nginx sends entries with.
+    tag = b"maas_http"
+
+    def __init__(self, reactor):
+        self.reactor = reactor
+        self.address = get_http_log_socket_path()
+
+    def startService(self):
+        """Start the service."""
+        super().startService()
+        # Remove a socket left behind if rackd was not stopped cleanly.
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.port = self.reactor.listenUNIXDatagram(self.address, self)
+
+    def stopService(self):
+        """Stop the service."""
+        super().stopService()
+        d = maybeDeferred(self.port.stopListening)
+        del self.port
+        # Remove the socket on the filesystem.
+        d.addCallback(callOut, os.remove, self.address)
+        return d
+
+    def datagramReceived(self, data, addr):
+        """Received a log entry from nginx.
+
+        The entry is a JSON object, after the syslog header. If it fails to
+        convert, twisted will handle this gracefully and not cause the
+        reactor to crash.
+        """
+        _, tag, entry = data.partition(self.tag + b": ")
+        if tag:
+            entry = json.loads(entry.decode("utf-8"))
+            log_request(entry["request_uri"], entry["remote_addr"])
+
+
 class HTTPLogResource(resource.Resource):
+    """Logs requests that nginx sends as sub-requests.
+
+    nginx no longer sends these, but one still running with a configuration
+    written by an earlier version of MAAS can.
+    """
+
     isLeaf = True
 
     def render_GET(self, request):
         # Extract the original path and original IP of the request.
         path = request.getHeader("X-Original-URI")
         remote_host = request.getHeader("X-Original-Remote-IP")
-
-        def log_event_ephemeral_loading(result):
-            if "squashfs" in path:
-                send_node_event_ip_address(
-                    event_type=EVENT_TYPES.LOADING_EPHEMERAL,
-                    ip_address=remote_host,
-                )
-
-        # Log the HTTP request to rackd.log and push that event to the
-        # region controller.
-        log.info(
-            "{path} requested by {remote_host}",
-            path=path,
-            remote_host=remote_host,
-        )
-        d = deferLater(
-            reactor,
-            0,
-            send_node_event_ip_address,
-            event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
-            ip_address=remote_host,
-            description=path,
-        )
-        d.addCallback(log_event_ephemeral_loading)
-        d.addErrback(log.err, "Logging HTTP request failed.")
+        log_request(path, remote_host)
         # Respond empty to nginx.
         return b""
 
@@ -283,7 +343,34 @@ class HTTPBootResource(resource.Resource):
                 request.write(str(failure.value).encode("utf-8"))
             request.finish()
 
+        def writeFileResponse(reader):
+            # Files from the filesystem are served with validators, so that
+            # clients and proxies can cache them, and support for ranges, so
+            # that interrupted downloads can be resumed.
+            stat = os.fstat(reader.file_obj.fileno())
+            request.setHeader(b"Accept-Ranges", b"bytes")
+            request.setHeader(b"Cache-Control", b"no-cache")
+            request.setHeader(
+                b"Last-Modified", http.datetimeToString(stat.st_mtime)
+            )
+            etag = '"%x-%x-%x"' % (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if request.setETag(etag.encode("ascii")) == http.CACHED:
+                reader.finish()
+                request.finish()
+                return
+
+            # This producer handles any range in the request. It will call
+            # `close` on the file and `finish` on the request when done.
+            staticFile = static.File(reader.file_path.path)
+            staticFile.type = "application/octet-stream"
+            staticFile.encoding = None
+            producer = staticFile.makeProducer(request, reader.file_obj)
+            producer.start()
+
         def writeResponse(reader):
+            if isinstance(reader, FilesystemReader):
+                return writeFileResponse(reader)
+
             # Some readers from `tftp` do not provide a way to get the size
             # of the generated content. Only set `Content-Length` when size
             # can be determined for the response.
@@ -314,23 +401,9 @@ class HTTPBootResource(resource.Resource):
         d.addErrback(handleFailure)
         d.addErrback(log.err, "Failed to handle boot HTTP request.")
 
-        # Log the HTTP request to rackd.log and push that event to the
-        # region controller.
-        log_path = path.decode("utf-8")
-        log.info(
-            "{path} requested by {remoteHost}",
-            path=log_path,
-            remoteHost=remoteHost,
-        )
-        d = deferLater(
-            reactor,
-            0,
-            send_node_event_ip_address,
-            event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
-            ip_address=remoteHost,
-            description=log_path,
-        )
-        d.addErrback(log.err, "Logging HTTP request failed.")
+        # Log the HTTP request to rackd.log and queue that event to be sent
+        # to the region controller.
+        log_request(path.decode("utf-8"), remoteHost)
 
         # Response is handled in the defer.
         return NOT_DONE_YET
@@ -11,13 +11,14 @@ import os
 
 from twisted.application.service import Service
 from twisted.internet import reactor, task
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 from twisted.internet.protocol import DatagramProtocol
+from twisted.protocols.amp import UnhandledCommand
 
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.path import get_maas_data_path
 from provisioningserver.rpc.exceptions import NoConnectionsAvailable
-from provisioningserver.rpc.region import UpdateLease
+from provisioningserver.rpc.region import UpdateLease, UpdateLeases
 from provisioningserver.utils.twisted import pause, retries
 
 maaslog = get_maas_logger("lease_socket_service")
@@ -34,6 +35,9 @@ class LeaseSocketService(Service, DatagramProtocol):
     # None, or a Deferred that will fire when the processor exits.
     done = None
 
+    # The most lease updates sent to the region in one `UpdateLeases` call.
+    batch_size = 100
+
     def __init__(self, client_service, reactor):
         self.client_service = client_service
         self.reactor = reactor
@@ -85,32 +89,74 @@ class LeaseSocketService(Service, DatagramProtocol):
         self.notifications.append(notification)
 
     def processNotifications(self, clock=reactor):
-        """Process all notifications."""
+        """Process all notifications.
+
+        Queued notifications are coalesced so that only the latest for each
+        MAC address and address family is sent, then sent to the region in
+        batches of at most `batch_size`.
+        """
 
-        def gen_notifications(notifications):
+        def gen_batches(notifications):
             while len(notifications) != 0:
-                yield notifications.popleft()
+                # Replacing an earlier notification keeps its place in the
+                # queue, so that an address released by one client is still
+                # released before it is reported as leased by another.
+                pending = {}
+                while len(notifications) != 0:
+                    notification = notifications.popleft()
+                    key = (
+                        notification.get("mac"),
+                        notification.get("ip_family"),
+                    )
+                    pending[key] = notification
+                pending = list(pending.values())
+                for index in range(0, len(pending), self.batch_size):
+                    yield pending[index : index + self.batch_size]
 
         return task.coiterate(
-            self.processNotification(notification, clock=clock)
-            for notification in gen_notifications(self.notifications)
+            self.processNotificationBatch(batch, clock=clock)
+            for batch in gen_batches(self.notifications)
         )
 
     @inlineCallbacks
-    def processNotification(self, notification, clock=reactor):
-        """Send a notification to the region."""
-        client = None
+    def _getClient(self, clock):
+        """Return a client to the region, or None if there is none."""
         for elapsed, remaining, wait in retries(30, 10, clock):
             try:
                 client = yield self.client_service.getClientNow()
-                break
             except NoConnectionsAvailable:
-                yield pause(wait, self.clock)
-        else:
-            maaslog.error(
-                "Can't send DHCP lease information, no RPC "
-                "connection to region."
+                yield pause(wait, clock)
+            else:
+                returnValue(client)
+        maaslog.error(
+            "Can't send DHCP lease information, no RPC connection to region."
+        )
+        returnValue(None)
+
+    @inlineCallbacks
+    def processNotificationBatch(self, notifications, clock=reactor):
+        """Send a batch of notifications to the region."""
+        client = yield self._getClient(clock)
+        if client is None:
+            return
+
+        try:
+            yield client(
+                UpdateLeases,
+                cluster_uuid=client.localIdent,
+                updates=notifications,
             )
+        except UnhandledCommand:
+            # Region has not been upgraded to support the batch call, so send
+            # the notifications one at a time.
+            for notification in notifications:
+                yield self.processNotification(notification, clock=clock)
+
+    @inlineCallbacks
+    def processNotification(self, notification, clock=reactor):
+        """Send a notification to the region."""
+        client = yield self._getClient(clock)
+        if client is None:
             return
 
         # Notification contains all the required data except for the cluster
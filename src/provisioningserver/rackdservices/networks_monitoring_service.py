@@ -5,9 +5,11 @@
 
 __all__ = ["RackNetworksMonitoringService"]
 
+from collections import OrderedDict
+
 from twisted.internet.defer import inlineCallbacks
 
-from provisioningserver.logger import get_maas_logger
+from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.rpc.exceptions import NoConnectionsAvailable
 from provisioningserver.rpc.region import (
     GetDiscoveryState,
@@ -20,14 +22,42 @@ from provisioningserver.utils.services import NetworksMonitoringService
 from provisioningserver.utils.twisted import pause
 
 maaslog = get_maas_logger("networks.monitor")
+log = LegacyLogger()
+
+
+def aggregate_observation(pending, key, observation):
+    """Add `observation` to `pending`, coalescing it with an earlier one.
+
+    Observations with the same `key` are coalesced into one, with a
+    ``count`` of the sightings and the latest ``time``, if observations have
+    one. The coalesced observation moves to the end of `pending`, so that
+    the region processes the observations in the order they were last seen.
+    """
+    observation = dict(observation, count=observation.get("count", 1))
+    previous = pending.pop(key, None)
+    if previous is not None:
+        observation["count"] += previous["count"]
+        if "time" in previous and "time" in observation:
+            observation["time"] = max(previous["time"], observation["time"])
+    pending[key] = observation
 
 
 class RackNetworksMonitoringService(NetworksMonitoringService):
     """Rack service to monitor network interfaces for configuration changes."""
 
+    # How long observed neighbours and mDNS entries are held before being
+    # reported to the region, so that repeated sightings are reported once.
+    report_delay = 5.0
+
+    # The most neighbours or mDNS entries reported to the region in one call.
+    batch_size = 200
+
     def __init__(self, clientService, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.clientService = clientService
+        self._neighbours = OrderedDict()
+        self._mdns = OrderedDict()
+        self._report_call = None
 
     def getDiscoveryState(self):
         """Get the discovery state from the region."""
@@ -64,24 +94,80 @@ class RackNetworksMonitoringService(NetworksMonitoringService):
             )
             break
 
+    def stopService(self):
+        """Stop the service, reporting what has been observed so far."""
+        self.flushReports()
+        return super().stopService()
+
     def reportNeighbours(self, neighbours):
-        """Report neighbour information to the region."""
-        d = self.clientService.getClientNow()
-        d.addCallback(
-            lambda client: client(
-                ReportNeighbours,
-                system_id=client.localIdent,
-                neighbours=neighbours,
+        """Queue neighbour information to be reported to the region.
+
+        Repeated sightings of the same (IP, MAC, VID) binding on an interface
+        within `report_delay` are reported once.
+        """
+        for neighbour in neighbours:
+            key = (
+                neighbour.get("interface"),
+                neighbour.get("ip"),
+                neighbour.get("mac"),
+                neighbour.get("vid"),
             )
-        )
-        return d
+            aggregate_observation(self._neighbours, key, neighbour)
+        self._scheduleReport()
 
     def reportMDNSEntries(self, mdns):
-        """Report mDNS entries to the region."""
-        d = self.clientService.getClientNow()
-        d.addCallback(
-            lambda client: client(
-                ReportMDNSEntries, system_id=client.localIdent, mdns=mdns
+        """Queue mDNS entries to be reported to the region.
+
+        Repeated sightings of the same entry within `report_delay` are
+        reported once.
+        """
+        for entry in mdns:
+            key = (
+                entry.get("interface"),
+                entry.get("hostname"),
+                entry.get("address"),
             )
-        )
+            aggregate_observation(self._mdns, key, entry)
+        self._scheduleReport()
+
+    def _scheduleReport(self):
+        if self._report_call is None:
+            clock = self.clock
+            if clock is None:
+                from twisted.internet import reactor as clock
+            self._report_call = clock.callLater(
+                self.report_delay, self.flushReports
+            )
+
+    def flushReports(self):
+        """Report the queued neighbours and mDNS entries to the region now."""
+        if self._report_call is not None:
+            if self._report_call.active():
+                self._report_call.cancel()
+            self._report_call = None
+        neighbours = list(self._neighbours.values())
+        mdns = list(self._mdns.values())
+        self._neighbours.clear()
+        self._mdns.clear()
+        d = self._sendReports(neighbours, mdns)
+        d.addErrback(log.err, "Failed to report neighbours or mDNS entries.")
         return d
+
+    @inlineCallbacks
+    def _sendReports(self, neighbours, mdns):
+        """Send `neighbours` and `mdns` to the region in batches."""
+        if len(neighbours) == 0 and len(mdns) == 0:
+            return
+        client = yield self.clientService.getClientNow()
+        for index in range(0, len(neighbours), self.batch_size):
+            yield client(
+                ReportNeighbours,
+                system_id=client.localIdent,
+                neighbours=neighbours[index : index + self.batch_size],
+            )
+        for index in range(0, len(mdns), self.batch_size):
+            yield client(
+                ReportMDNSEntries,
+                system_id=client.localIdent,
+                mdns=mdns[index : index + self.batch_size],
+            )
@@ -6,13 +6,16 @@
 
 __all__ = ["NodePowerMonitorService"]
 
+from collections import deque
 from datetime import timedelta
 
 from twisted.application.internet import TimerService
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet import reactor
+from twisted.internet.defer import DeferredList, inlineCallbacks
 from twisted.internet.error import ConnectionDone
 
 from provisioningserver.logger import get_maas_logger, LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc import getRegionClient
 from provisioningserver.rpc.exceptions import (
     NoConnectionsAvailable,
@@ -29,12 +32,20 @@ class NodePowerMonitorService(TimerService, object):
     """Service to monitor the power status of all nodes in this cluster."""
 
     check_interval = timedelta(seconds=15).total_seconds()
+    # The most nodes of each power type to query at once, either a number
+    # or a dict of numbers keyed by power type.
     max_nodes_at_once = 5
+    # The most pages of nodes from the region to be querying at once. Each
+    # page is marked as queried by the region when it is handed out, so this
+    # should not be so large that nodes wait long for their turn.
+    max_pages_at_once = 10
 
     def __init__(self, clock=None):
         # Call self.query_nodes() every self.check_interval.
         super().__init__(self.check_interval, self.try_query_nodes)
         self.clock = clock
+        # Concurrency limits for each power type, shared across pages.
+        self.semaphores = {}
 
     def try_query_nodes(self):
         """Attempt to query nodes' power states.
@@ -55,21 +66,39 @@ class NodePowerMonitorService(TimerService, object):
 
     @inlineCallbacks
     def query_nodes(self, client):
+        timer = reactor if self.clock is None else self.clock
+        started = timer.seconds()
         # Get the nodes' power parameters from the region. Keep getting more
-        # power parameters until the region returns an empty list.
+        # power parameters until the region returns an empty list, querying
+        # each page while fetching the next, so that one slow BMC does not
+        # hold up the rest of the sweep.
+        pages = deque()
         while True:
             response = yield client(
-                ListNodePowerParameters, uuid=client.localIdent
+                ListNodePowerParameters,
+                uuid=client.localIdent,
+                streaming=True,
             )
             power_parameters = response["nodes"]
             if len(power_parameters) > 0:
-                yield query_all_nodes(
-                    power_parameters,
-                    max_concurrency=self.max_nodes_at_once,
-                    clock=self.clock,
+                pages.append(
+                    query_all_nodes(
+                        power_parameters,
+                        max_concurrency=self.max_nodes_at_once,
+                        clock=self.clock,
+                        semaphores=self.semaphores,
+                    )
                 )
+                if len(pages) >= self.max_pages_at_once:
+                    yield pages.popleft()
             else:
                 break
+        yield DeferredList(pages)
+        PROMETHEUS_METRICS.update(
+            "maas_power_query_sweep_duration",
+            "observe",
+            value=timer.seconds() - started,
+        )
 
     def query_nodes_failed(self, failure, localIdent):
         if failure.check(NoSuchCluster):
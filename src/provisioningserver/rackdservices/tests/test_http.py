@@ -5,8 +5,10 @@
 
 __all__ = []
 
+import json
+import os
 import random
-from unittest.mock import ANY, Mock
+from unittest.mock import call, Mock
 
 import attr
 from testtools.matchers import (
@@ -16,17 +18,24 @@ from testtools.matchers import (
     IsInstance,
     MatchesStructure,
 )
+from tftp.backend import FilesystemReader
 from tftp.errors import AccessViolation, FileNotFound
 from twisted.application.service import Service
 from twisted.internet import reactor
 from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.python.filepath import FilePath
 from twisted.web.http_headers import Headers
 from twisted.web.server import NOT_DONE_YET, Request
 from twisted.web.test.test_web import DummyChannel, DummyRequest
 
 from maastesting.factory import factory
 from maastesting.fixtures import MAASRootFixture
-from maastesting.matchers import DocTestMatches, MockCalledOnceWith
+from maastesting.matchers import (
+    DocTestMatches,
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
 from maastesting.twisted import always_succeed_with, TwistedLoggerFixture
 from provisioningserver import services
@@ -137,6 +146,11 @@ class TestRackHTTPService(MAASTestCase):
             target_path,
             FileContains(matcher=Contains("alias %s;" % resource_root)),
         )
+        cache_root = os.path.join(os.path.dirname(resource_root[:-1]), "cache")
+        self.assertThat(
+            target_path,
+            FileContains(matcher=Contains("alias %s/;" % cache_root)),
+        )
         for region_ip in region_ips:
             self.assertThat(
                 target_path,
@@ -148,6 +162,14 @@ class TestRackHTTPService(MAASTestCase):
                 matcher=Contains("proxy_pass http://maas-regions/MAAS/;")
             ),
         )
+        self.assertThat(
+            target_path,
+            FileContains(
+                matcher=Contains(
+                    "syslog:server=unix:%s," % http.get_http_log_socket_path()
+                )
+            ),
+        )
         self.assertThat(mock_reloadService, MockCalledOnceWith("http"))
 
         # If the configuration has not changed then a second call to
@@ -278,21 +300,14 @@ class TestRackHTTPService_Errors(MAASTestCase):
         )
 
 
-class TestHTTPLogResource(MAASTestCase):
-    def test_render_GET_logs_node_event_with_original_path_ip(self):
+class TestLogRequest(MAASTestCase):
+    def test_logs_and_queues_node_event(self):
         path = factory.make_name("path")
         ip = factory.make_ip_address()
-        request = Request(DummyChannel(), False)
-        request.requestHeaders = Headers(
-            {"X-Original-URI": [path], "X-Original-Remote-IP": [ip]}
-        )
-
         log_info = self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        mock_queue_event = self.patch(http, "queue_node_event_ip_address")
 
-        resource = http.HTTPLogResource()
-        resource.render_GET(request)
+        http.log_request(path, ip)
 
         self.assertThat(
             log_info,
@@ -301,51 +316,97 @@ class TestHTTPLogResource(MAASTestCase):
             ),
         )
         self.assertThat(
-            mock_deferLater,
+            mock_queue_event,
             MockCalledOnceWith(
-                ANY,
-                0,
-                http.send_node_event_ip_address,
                 event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
                 ip_address=ip,
                 description=path,
             ),
         )
 
-    def test_render_GET_logs_node_event_status_message(self):
+    def test_queues_node_event_status_message(self):
         path = factory.make_name("squashfs")
         ip = factory.make_ip_address()
+        self.patch(http.log, "info")
+        mock_queue_event = self.patch(http, "queue_node_event_ip_address")
+
+        http.log_request(path, ip)
+
+        self.assertThat(
+            mock_queue_event,
+            MockCallsMatch(
+                call(
+                    event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
+                    ip_address=ip,
+                    description=path,
+                ),
+                call(event_type=EVENT_TYPES.LOADING_EPHEMERAL, ip_address=ip),
+            ),
+        )
+
+
+class TestHTTPLogSocketService(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def setUp(self):
+        super().setUp()
+        self.socket_path = os.path.join(self.make_dir(), "http-log.sock")
+        self.patch(
+            http, "get_http_log_socket_path"
+        ).return_value = self.socket_path
+
+    def make_entry(self, path, ip):
+        entry = json.dumps({"remote_addr": ip, "request_uri": path})
+        return ("<190>Jun  8 12:00:00 maas_http: %s" % entry).encode("utf-8")
+
+    @inlineCallbacks
+    def test_startService_and_stopService_manage_socket(self):
+        service = http.HTTPLogSocketService(reactor)
+        service.startService()
+        self.assertTrue(os.path.exists(self.socket_path))
+        yield service.stopService()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    @inlineCallbacks
+    def test_startService_replaces_stale_socket(self):
+        factory.make_file(*os.path.split(self.socket_path))
+        service = http.HTTPLogSocketService(reactor)
+        service.startService()
+        yield service.stopService()
+
+    def test_datagramReceived_logs_request(self):
+        mock_log_request = self.patch(http, "log_request")
+        path = "/images/%s" % factory.make_name("path")
+        ip = factory.make_ip_address()
+        service = http.HTTPLogSocketService(reactor)
+        service.datagramReceived(self.make_entry(path, ip), self.socket_path)
+        self.assertThat(mock_log_request, MockCalledOnceWith(path, ip))
+
+    def test_datagramReceived_ignores_other_messages(self):
+        mock_log_request = self.patch(http, "log_request")
+        service = http.HTTPLogSocketService(reactor)
+        service.datagramReceived(
+            b"<190>Jun  8 12:00:00 other: {}", self.socket_path
+        )
+        self.assertThat(mock_log_request, MockNotCalled())
+
+
+class TestHTTPLogResource(MAASTestCase):
+    def test_render_GET_logs_request_with_original_path_ip(self):
+        path = factory.make_name("path")
+        ip = factory.make_ip_address()
         request = Request(DummyChannel(), False)
         request.requestHeaders = Headers(
             {"X-Original-URI": [path], "X-Original-Remote-IP": [ip]}
         )
 
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
-        mock_send_node_event_ip_address = self.patch(
-            http, "send_node_event_ip_address"
-        )
+        mock_log_request = self.patch(http, "log_request")
 
         resource = http.HTTPLogResource()
         resource.render_GET(request)
 
-        self.assertThat(
-            mock_deferLater,
-            MockCalledOnceWith(
-                ANY,
-                0,
-                http.send_node_event_ip_address,
-                event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
-                ip_address=ip,
-                description=path,
-            ),
-        )
-        self.assertThat(
-            mock_send_node_event_ip_address,
-            MockCalledOnceWith(
-                event_type=EVENT_TYPES.LOADING_EPHEMERAL, ip_address=ip
-            ),
-        )
+        self.assertThat(mock_log_request, MockCalledOnceWith(path, ip))
 
 
 class TestHTTPBootResource(MAASTestCase):
@@ -400,8 +461,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -424,8 +484,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -445,8 +504,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -472,8 +530,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         self.tftp.backend.get_reader.return_value = fail(AccessViolation())
 
@@ -498,8 +555,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         self.tftp.backend.get_reader.return_value = fail(FileNotFound(path))
 
@@ -524,8 +580,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         exc = factory.make_exception("internal error")
         self.tftp.backend.get_reader.return_value = fail(exc)
@@ -551,8 +606,7 @@ class TestHTTPBootResource(MAASTestCase):
         )
 
         self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        self.patch(http, "queue_node_event_ip_address")
 
         content = factory.make_string(size=100).encode("utf-8")
         reader = BytesReader(content)
@@ -567,7 +621,7 @@ class TestHTTPBootResource(MAASTestCase):
         self.assertEquals(content, b"".join(request.written))
 
     @inlineCallbacks
-    def test_render_GET_logs_node_event_with_original_path_ip(self):
+    def test_render_GET_logs_request_with_original_path_ip(self):
         path = factory.make_name("path")
         ip = factory.make_ip_address()
         request = DummyRequest([path.encode("utf-8")])
@@ -580,29 +634,106 @@ class TestHTTPBootResource(MAASTestCase):
             }
         )
 
-        log_info = self.patch(http.log, "info")
-        mock_deferLater = self.patch(http, "deferLater")
-        mock_deferLater.side_effect = always_succeed_with(None)
+        mock_log_request = self.patch(http, "log_request")
 
         self.tftp.backend.get_reader.return_value = fail(AccessViolation())
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
 
-        self.assertThat(
-            log_info,
-            MockCalledOnceWith(
-                "{path} requested by {remoteHost}", path=path, remoteHost=ip
-            ),
+        self.assertThat(mock_log_request, MockCalledOnceWith(path, ip))
+
+    def make_file_request(self, path, headers=None):
+        # Keep the channel; the request forgets it once it has finished.
+        self.channel = DummyChannel()
+        request = Request(self.channel, False)
+        request.method = b"GET"
+        request.postpath = [path.encode("utf-8")]
+        request.requestHeaders = Headers(
+            {
+                "X-Server-Addr": ["192.168.1.1"],
+                "X-Server-Port": ["5248"],
+                "X-Forwarded-For": [factory.make_ip_address()],
+                "X-Forwarded-Port": ["%s" % factory.pick_port()],
+                **(headers or {}),
+            }
         )
-        self.assertThat(
-            mock_deferLater,
-            MockCalledOnceWith(
-                ANY,
-                0,
-                http.send_node_event_ip_address,
-                event_type=EVENT_TYPES.NODE_HTTP_REQUEST,
-                ip_address=ip,
-                description=path,
-            ),
+        return request
+
+    def make_file_reader(self, content):
+        path = self.make_file(contents=content)
+        self.tftp.backend.get_reader.side_effect = lambda *args, **kwargs: (
+            succeed(FilesystemReader(FilePath(path)))
+        )
+        return path
+
+    def render_file_GET(self, request):
+        http.HTTPBootResource().render_GET(request)
+        # Pull the response from the file's producer, as a transport would.
+        for producer, _ in self.channel.transport.producers:
+            while not request.finished:
+                producer.resumeProducing()
+
+    def get_response(self, request):
+        # Drop the headers from the response.
+        response = self.channel.transport.written.getvalue()
+        return response.split(b"\r\n\r\n", 1)[1]
+
+    def test_render_GET_produces_file_with_validators(self):
+        self.patch(http, "log_request")
+        content = factory.make_bytes(100)
+        path = self.make_file_reader(content)
+        request = self.make_file_request(factory.make_name("path"))
+
+        self.render_file_GET(request)
+
+        self.assertEquals(200, request.code)
+        self.assertEquals(content, self.get_response(request))
+        stat = os.stat(path)
+        self.assertEquals(
+            [
+                (
+                    '"%x-%x-%x"'
+                    % (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                ).encode("ascii")
+            ],
+            request.responseHeaders.getRawHeaders(b"ETag"),
+        )
+        self.assertEquals(
+            [b"bytes"], request.responseHeaders.getRawHeaders(b"Accept-Ranges")
         )
+        self.assertIsNotNone(
+            request.responseHeaders.getRawHeaders(b"Last-Modified")
+        )
+
+    def test_render_GET_produces_range_of_file(self):
+        self.patch(http, "log_request")
+        content = factory.make_bytes(100)
+        self.make_file_reader(content)
+        request = self.make_file_request(
+            factory.make_name("path"), {"Range": ["bytes=10-19"]}
+        )
+
+        self.render_file_GET(request)
+
+        self.assertEquals(206, request.code)
+        self.assertEquals(content[10:20], self.get_response(request))
+        self.assertEquals(
+            [b"bytes 10-19/100"],
+            request.responseHeaders.getRawHeaders(b"Content-Range"),
+        )
+
+    def test_render_GET_304_when_file_not_modified(self):
+        self.patch(http, "log_request")
+        self.make_file_reader(factory.make_bytes(100))
+        request = self.make_file_request(factory.make_name("path"))
+        self.render_file_GET(request)
+        [etag] = request.responseHeaders.getRawHeaders(b"ETag")
+
+        request = self.make_file_request(
+            factory.make_name("path"), {"If-None-Match": [etag]}
+        )
+        self.render_file_GET(request)
+
+        self.assertEquals(304, request.code)
+        self.assertEquals(b"", self.get_response(request))
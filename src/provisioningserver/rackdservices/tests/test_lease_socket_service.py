@@ -7,9 +7,10 @@ __all__ = []
 
 import json
 import os
+import random
 import socket
 import time
-from unittest.mock import MagicMock, sentinel
+from unittest.mock import call, MagicMock, sentinel
 
 from testtools.matchers import Not, PathExists
 from twisted.application.service import Service
@@ -18,14 +19,14 @@ from twisted.internet.protocol import DatagramProtocol
 from twisted.internet.threads import deferToThread
 
 from maastesting.factory import factory
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
 from provisioningserver.rackdservices import lease_socket_service
 from provisioningserver.rackdservices.lease_socket_service import (
     LeaseSocketService,
 )
 from provisioningserver.rpc import getRegionClient
-from provisioningserver.rpc.region import UpdateLease
+from provisioningserver.rpc.region import UpdateLease, UpdateLeases
 from provisioningserver.rpc.testing import MockLiveClusterToRegionRPCFixture
 from provisioningserver.utils.twisted import DeferredValue, pause, retries
 
@@ -108,16 +109,18 @@ class TestLeaseSocketService(MAASTestCase):
         self.assertEquals([packet], list(service.notifications))
 
     @defer.inlineCallbacks
-    def test_processNotification_gets_called_with_notification(self):
+    def test_processNotificationBatch_gets_called_with_notification(self):
         socket_path = self.patch_socket_path()
         service = LeaseSocketService(sentinel.service, reactor)
         dv = DeferredValue()
 
-        # Mock processNotifcation to catch the call.
-        def mock_processNotification(*args, **kwargs):
+        # Mock processNotificationBatch to catch the call.
+        def mock_processNotificationBatch(*args, **kwargs):
             dv.set(args)
 
-        self.patch(service, "processNotification", mock_processNotification)
+        self.patch(
+            service, "processNotificationBatch", mock_processNotificationBatch
+        )
 
         # Start the service and stop it at the end of the test.
         service.startService()
@@ -130,42 +133,119 @@ class TestLeaseSocketService(MAASTestCase):
         yield deferToThread(self.send_notification, socket_path, packet)
         yield dv.get(timeout=10)
 
-        # Packet should be the argument passed to processNotifcation
-        self.assertEquals((packet,), dv.value)
+        # Packet should be in the batch passed to processNotificationBatch.
+        self.assertEquals(([packet],), dv.value)
+
+    def make_notification(self, mac=None, ip_family="ipv4"):
+        return {
+            "action": random.choice(["commit", "expiry", "release"]),
+            "mac": factory.make_mac_address() if mac is None else mac,
+            "ip_family": ip_family,
+            "ip": factory.make_ip_address(ipv6=(ip_family == "ipv6")),
+            "timestamp": int(time.time()),
+        }
 
     @defer.inlineCallbacks
-    def test_processNotification_gets_called_multiple_times(self):
-        socket_path = self.patch_socket_path()
+    def test_processNotifications_keeps_latest_per_mac_and_family(self):
         service = LeaseSocketService(sentinel.service, reactor)
-        dvs = [DeferredValue(), DeferredValue()]
+        processNotificationBatch = self.patch(
+            service, "processNotificationBatch"
+        )
+        mac1 = factory.make_mac_address()
+        mac2 = factory.make_mac_address()
+        first_mac1 = self.make_notification(mac1)
+        mac1_v6 = self.make_notification(mac1, "ipv6")
+        mac2_v4 = self.make_notification(mac2)
+        latest_mac1 = self.make_notification(mac1)
+        service.notifications.extend(
+            [first_mac1, mac1_v6, mac2_v4, latest_mac1]
+        )
 
-        # Mock processNotifcation to catch the call.
-        def mock_processNotification(*args, **kwargs):
-            for dv in dvs:
-                if not dv.isSet:
-                    dv.set(args)
-                    break
+        yield service.processNotifications(clock=reactor)
 
-        self.patch(service, "processNotification", mock_processNotification)
+        # The latest notification for mac1 takes the place of the first.
+        self.assertThat(
+            processNotificationBatch,
+            MockCalledOnceWith([latest_mac1, mac1_v6, mac2_v4], clock=reactor),
+        )
+        self.assertEqual(0, len(service.notifications))
 
-        # Start the service and stop it at the end of the test.
-        service.startService()
-        self.addCleanup(service.stopService)
+    @defer.inlineCallbacks
+    def test_processNotifications_sends_bounded_batches(self):
+        service = LeaseSocketService(sentinel.service, reactor)
+        service.batch_size = 3
+        processNotificationBatch = self.patch(
+            service, "processNotificationBatch"
+        )
+        notifications = [self.make_notification() for _ in range(7)]
+        service.notifications.extend(notifications)
 
-        # Create test payload to send.
-        packet1 = {"test1": factory.make_name("test1")}
-        packet2 = {"test2": factory.make_name("test2")}
-
-        # Send notifications to the socket and wait for notifications.
-        yield deferToThread(self.send_notification, socket_path, packet1)
-        yield deferToThread(self.send_notification, socket_path, packet2)
-        yield dvs[0].get(timeout=10)
-        yield dvs[1].get(timeout=10)
-
-        # Packet should be the argument passed to processNotification in
-        # order.
-        self.assertEquals((packet1,), dvs[0].value)
-        self.assertEquals((packet2,), dvs[1].value)
+        yield service.processNotifications(clock=reactor)
+
+        self.assertThat(
+            processNotificationBatch,
+            MockCallsMatch(
+                call(notifications[:3], clock=reactor),
+                call(notifications[3:6], clock=reactor),
+                call(notifications[6:], clock=reactor),
+            ),
+        )
+
+    @defer.inlineCallbacks
+    def test_processNotificationBatch_send_to_region(self):
+        fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
+        protocol, connecting = fixture.makeEventLoop(UpdateLeases)
+        protocol.UpdateLeases.return_value = {}
+        self.addCleanup((yield connecting))
+
+        client = getRegionClient()
+        rpc_service = MagicMock()
+        rpc_service.getClientNow.return_value = defer.succeed(client)
+        service = LeaseSocketService(rpc_service, reactor)
+
+        notifications = [self.make_notification() for _ in range(3)]
+        notifications[0].update(
+            {"action": "commit", "lease_time": 30, "hostname": "host"}
+        )
+        # Optional fields are sent as None when a notification lacks them.
+        expected_updates = [
+            {"lease_time": None, "hostname": None, **notification}
+            for notification in notifications
+        ]
+        yield service.processNotificationBatch(notifications, clock=reactor)
+        self.assertThat(
+            protocol.UpdateLeases,
+            MockCalledOnceWith(
+                protocol,
+                cluster_uuid=client.localIdent,
+                updates=expected_updates,
+            ),
+        )
+
+    @defer.inlineCallbacks
+    def test_processNotificationBatch_falls_back_to_UpdateLease(self):
+        protocol, connecting = self.patch_rpc_UpdateLease()
+        protocol.UpdateLease.return_value = {}
+        self.addCleanup((yield connecting))
+
+        client = getRegionClient()
+        rpc_service = MagicMock()
+        rpc_service.getClientNow.side_effect = lambda: defer.succeed(client)
+        service = LeaseSocketService(rpc_service, reactor)
+
+        notifications = [self.make_notification() for _ in range(2)]
+        expected_calls = [
+            call(
+                protocol,
+                cluster_uuid=client.localIdent,
+                lease_time=None,
+                hostname=None,
+                **notification
+            )
+            for notification in notifications
+        ]
+        yield service.processNotificationBatch(notifications, clock=reactor)
+        self.assertThat(protocol.UpdateLease, MockCallsMatch(*expected_calls))
 
     @defer.inlineCallbacks
     def test_processNotification_send_to_region(self):
@@ -7,17 +7,29 @@ __all__ = []
 
 from unittest.mock import call, Mock
 
-from twisted.internet.defer import inlineCallbacks, maybeDeferred, succeed
+from testtools.matchers import Equals, HasLength
+from twisted.internet.defer import (
+    fail,
+    inlineCallbacks,
+    maybeDeferred,
+    succeed,
+)
 from twisted.internet.task import Clock
 
 from maastesting.factory import factory
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
+from maastesting.twisted import TwistedLoggerFixture
 from provisioningserver import services
 from provisioningserver.rackdservices.networks_monitoring_service import (
     RackNetworksMonitoringService,
 )
 from provisioningserver.rpc import region
+from provisioningserver.rpc.exceptions import NoConnectionsAvailable
 from provisioningserver.rpc.testing import MockLiveClusterToRegionRPCFixture
 from provisioningserver.utils import services as services_module
 
@@ -171,13 +183,14 @@ class TestRackNetworksMonitoringService(MAASTestCase):
             enable_beaconing=False,
         )
         neighbours = [{"ip": factory.make_ip_address()}]
-        yield service.reportNeighbours(neighbours)
+        service.reportNeighbours(neighbours)
+        yield service.flushReports()
         self.assertThat(
             protocol.ReportNeighbours,
             MockCalledOnceWith(
                 protocol,
                 system_id=rpc_service.getClient().localIdent,
-                neighbours=neighbours,
+                neighbours=[dict(neighbours[0], count=1)],
             ),
         )
 
@@ -202,16 +215,159 @@ class TestRackNetworksMonitoringService(MAASTestCase):
                 "address": factory.make_ip_address(),
             }
         ]
-        yield service.reportMDNSEntries(mdns)
+        service.reportMDNSEntries(mdns)
+        yield service.flushReports()
         self.assertThat(
             protocol.ReportMDNSEntries,
             MockCalledOnceWith(
                 protocol,
                 system_id=rpc_service.getClient().localIdent,
-                mdns=mdns,
+                mdns=[dict(mdns[0], count=1)],
+            ),
+        )
+
+    def make_neighbour(self, **kwargs):
+        neighbour = {
+            "interface": "eth0",
+            "ip": factory.make_ip_address(),
+            "mac": factory.make_mac_address(),
+            "vid": None,
+            "time": 1,
+            "event": "NEW",
+        }
+        neighbour.update(kwargs)
+        return neighbour
+
+    def test_reports_neighbours_after_delay(self):
+        clock = Clock()
+        service = RackNetworksMonitoringService(
+            Mock(), clock, enable_monitoring=False, enable_beaconing=False
+        )
+        send = self.patch(service, "_sendReports")
+        send.return_value = succeed(None)
+        neighbour = self.make_neighbour()
+        service.reportNeighbours([neighbour])
+        service.reportNeighbours([self.make_neighbour()])
+        self.assertThat(clock.getDelayedCalls(), HasLength(1))
+        clock.advance(service.report_delay - 1)
+        self.assertThat(send, MockNotCalled())
+        clock.advance(1)
+        self.assertThat(send.call_count, Equals(1))
+        [neighbours, mdns] = send.call_args[0]
+        self.assertThat(neighbours, HasLength(2))
+        self.assertThat(mdns, Equals([]))
+        self.assertThat(clock.getDelayedCalls(), Equals([]))
+
+    def test_coalesces_repeated_neighbours(self):
+        service = RackNetworksMonitoringService(
+            Mock(), Clock(), enable_monitoring=False, enable_beaconing=False
+        )
+        send = self.patch(service, "_sendReports")
+        send.return_value = succeed(None)
+        first = self.make_neighbour(time=10)
+        other = self.make_neighbour(ip=first["ip"])
+        again = dict(first, time=20, event="REFRESHED")
+        tagged = dict(first, vid=42)
+        service.reportNeighbours([first, other])
+        service.reportNeighbours([again, tagged])
+        service.flushReports()
+        [neighbours, _] = send.call_args[0]
+        self.assertThat(
+            neighbours,
+            Equals(
+                [
+                    dict(other, count=1),
+                    dict(again, count=2),
+                    dict(tagged, count=1),
+                ]
             ),
         )
 
+    def test_coalesces_repeated_mdns_entries(self):
+        service = RackNetworksMonitoringService(
+            Mock(), Clock(), enable_monitoring=False, enable_beaconing=False
+        )
+        send = self.patch(service, "_sendReports")
+        send.return_value = succeed(None)
+        entry = {
+            "interface": "eth0",
+            "hostname": factory.make_name("host"),
+            "address": factory.make_ip_address(),
+        }
+        service.reportMDNSEntries([entry])
+        service.reportMDNSEntries([entry, entry])
+        service.flushReports()
+        [_, mdns] = send.call_args[0]
+        self.assertThat(mdns, Equals([dict(entry, count=3)]))
+
+    @inlineCallbacks
+    def test_reports_in_batches(self):
+        client = Mock(localIdent=factory.make_name("system_id"))
+        client.return_value = succeed({})
+        rpc_service = Mock()
+        rpc_service.getClientNow.return_value = succeed(client)
+        service = RackNetworksMonitoringService(
+            rpc_service,
+            Clock(),
+            enable_monitoring=False,
+            enable_beaconing=False,
+        )
+        service.batch_size = 2
+        neighbours = [self.make_neighbour() for _ in range(3)]
+        service.reportNeighbours(neighbours)
+        yield service.flushReports()
+        self.assertThat(
+            client,
+            MockCallsMatch(
+                call(
+                    region.ReportNeighbours,
+                    system_id=client.localIdent,
+                    neighbours=[
+                        dict(neighbour, count=1)
+                        for neighbour in neighbours[:2]
+                    ],
+                ),
+                call(
+                    region.ReportNeighbours,
+                    system_id=client.localIdent,
+                    neighbours=[dict(neighbours[2], count=1)],
+                ),
+            ),
+        )
+
+    def test_logs_report_failures(self):
+        rpc_service = Mock()
+        rpc_service.getClientNow.return_value = fail(NoConnectionsAvailable())
+        service = RackNetworksMonitoringService(
+            rpc_service,
+            Clock(),
+            enable_monitoring=False,
+            enable_beaconing=False,
+        )
+        service.reportNeighbours([self.make_neighbour()])
+        with TwistedLoggerFixture() as logger:
+            service.flushReports()
+        self.assertIn(
+            "Failed to report neighbours or mDNS entries.", logger.output
+        )
+
+    def test_stopService_flushes_reports(self):
+        clock = Clock()
+        service = RackNetworksMonitoringService(
+            Mock(), clock, enable_monitoring=False, enable_beaconing=False
+        )
+        self.patch(service, "_releaseSoleResponsibility")
+        send = self.patch(service, "_sendReports")
+        send.return_value = succeed(None)
+        service.startService()
+        neighbour = self.make_neighbour()
+        service.reportNeighbours([neighbour])
+        service.stopService()
+        self.assertThat(
+            send, MockCalledOnceWith([dict(neighbour, count=1)], [])
+        )
+        self.assertThat(clock.getDelayedCalls(), Equals([]))
+
     @inlineCallbacks
     def test_asks_region_for_monitoring_state(self):
         fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
@@ -10,7 +10,7 @@ from unittest.mock import ANY, Mock, sentinel
 
 from fixtures import FakeLogger
 from testtools.matchers import MatchesStructure
-from twisted.internet.defer import fail, succeed
+from twisted.internet.defer import Deferred, fail, succeed
 from twisted.internet.error import ConnectionDone
 from twisted.internet.task import Clock
 
@@ -60,7 +60,7 @@ class TestNodePowerMonitorService(MAASTestCase):
         self.assertEqual(None, extract_result(d))
         self.assertThat(
             proto_region.ListNodePowerParameters,
-            MockCalledOnceWith(ANY, uuid=client.localIdent),
+            MockCalledOnceWith(ANY, uuid=client.localIdent, streaming=True),
         )
 
     def test_query_nodes_calls_query_all_nodes(self):
@@ -85,6 +85,7 @@ class TestNodePowerMonitorService(MAASTestCase):
         ]
 
         query_all_nodes = self.patch(npms, "query_all_nodes")
+        query_all_nodes.return_value = succeed(None)
 
         d = service.query_nodes(getRegionClient())
         io.flush()
@@ -96,6 +97,94 @@ class TestNodePowerMonitorService(MAASTestCase):
                 [example_power_parameters],
                 max_concurrency=sentinel.max_nodes_at_once,
                 clock=service.clock,
+                semaphores=service.semaphores,
+            ),
+        )
+
+    def make_power_parameters(self):
+        return {
+            "system_id": factory.make_UUID(),
+            "hostname": factory.make_hostname(),
+            "power_state": factory.make_name("power_state"),
+            "power_type": factory.make_name("power_type"),
+            "context": {},
+        }
+
+    def test_query_nodes_fetches_next_page_while_querying(self):
+        service = self.make_monitor_service()
+        pages = [[self.make_power_parameters()] for _ in range(3)]
+
+        rpc_fixture = self.useFixture(MockClusterToRegionRPCFixture())
+        proto_region, io = rpc_fixture.makeEventLoop(
+            region.ListNodePowerParameters
+        )
+        proto_region.ListNodePowerParameters.side_effect = [
+            succeed({"nodes": page}) for page in pages
+        ] + [succeed({"nodes": []})]
+
+        queries = [Deferred() for _ in pages]
+        query_all_nodes = self.patch(npms, "query_all_nodes")
+        query_all_nodes.side_effect = queries
+
+        d = service.query_nodes(getRegionClient())
+        io.flush()
+
+        # Every page is being queried, and the sweep is waiting for them.
+        self.assertEqual(len(pages), len(query_all_nodes.mock_calls))
+        self.assertFalse(d.called)
+        for query in queries:
+            query.callback(None)
+        self.assertEqual(None, extract_result(d))
+
+    def test_query_nodes_limits_pages_at_once(self):
+        service = self.make_monitor_service()
+        service.max_pages_at_once = 2
+        pages = [[self.make_power_parameters()] for _ in range(3)]
+
+        rpc_fixture = self.useFixture(MockClusterToRegionRPCFixture())
+        proto_region, io = rpc_fixture.makeEventLoop(
+            region.ListNodePowerParameters
+        )
+        proto_region.ListNodePowerParameters.side_effect = [
+            succeed({"nodes": page}) for page in pages
+        ] + [succeed({"nodes": []})]
+
+        queries = [Deferred() for _ in pages]
+        query_all_nodes = self.patch(npms, "query_all_nodes")
+        query_all_nodes.side_effect = queries
+
+        d = service.query_nodes(getRegionClient())
+        io.flush()
+        self.assertEqual(2, len(query_all_nodes.mock_calls))
+
+        # Once the first page is done the next is fetched.
+        queries[0].callback(None)
+        io.flush()
+        self.assertEqual(3, len(query_all_nodes.mock_calls))
+        for query in queries[1:]:
+            query.callback(None)
+        io.flush()
+        self.assertEqual(None, extract_result(d))
+
+    def test_query_nodes_records_sweep_duration(self):
+        service = self.make_monitor_service()
+        metrics = self.patch(npms, "PROMETHEUS_METRICS")
+
+        rpc_fixture = self.useFixture(MockClusterToRegionRPCFixture())
+        proto_region, io = rpc_fixture.makeEventLoop(
+            region.ListNodePowerParameters
+        )
+        proto_region.ListNodePowerParameters.return_value = succeed(
+            {"nodes": []}
+        )
+
+        d = service.query_nodes(getRegionClient())
+        io.flush()
+        extract_result(d)
+        self.assertThat(
+            metrics.update,
+            MockCalledOnceWith(
+                "maas_power_query_sweep_duration", "observe", value=0
             ),
         )
 
@@ -45,7 +45,7 @@ from zope.interface.verify import verifyObject
 from maastesting.factory import factory
 from maastesting.matchers import MockCalledOnceWith, MockNotCalled
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
-from maastesting.twisted import TwistedLoggerFixture
+from maastesting.twisted import extract_result, TwistedLoggerFixture
 from provisioningserver import boot
 from provisioningserver.boot import BytesReader
 from provisioningserver.boot.pxe import PXEBootMethod
@@ -863,6 +863,90 @@ class TestTFTPBackend(MAASTestCase):
             MockCalledOnceWith(client, GetBootConfig, **params_okay),
         )
 
+    def make_backend_for_boot_config(self, result):
+        prometheus_metrics = create_metrics(
+            METRICS_DEFINITIONS, registry=prometheus_client.CollectorRegistry()
+        )
+        self.patch(tftp_module, "PROMETHEUS_METRICS", prometheus_metrics)
+        backend = TFTPBackend(self.make_dir(), Mock())
+        backend.clock = Clock()
+        backend.fetcher = Mock(side_effect=lambda *args, **kwargs: result())
+        params = {
+            "system_id": factory.make_name("system_id"),
+            "remote_ip": factory.make_ip_address(),
+            "mac": factory.make_mac_address(),
+        }
+        return backend, params, prometheus_metrics
+
+    def test_get_boot_config_caches_response(self):
+        response = {"purpose": factory.make_name("purpose")}
+        (
+            backend,
+            params,
+            prometheus_metrics,
+        ) = self.make_backend_for_boot_config(lambda: succeed(response.copy()))
+        client = Mock()
+
+        first = extract_result(backend.get_boot_config(client, params))
+        # Changes made by the caller don't leak into the cache.
+        first["label"] = factory.make_name("label")
+        second = extract_result(backend.get_boot_config(client, params))
+
+        self.assertEqual(response, second)
+        self.assertThat(
+            backend.fetcher,
+            MockCalledOnceWith(client, GetBootConfig, **params),
+        )
+        metrics = prometheus_metrics.generate_latest().decode("ascii")
+        self.assertIn(
+            'maas_rack_boot_config_cache_lookups_total{result="hit"} 1.0',
+            metrics,
+        )
+        self.assertIn(
+            'maas_rack_boot_config_cache_lookups_total{result="miss"} 1.0',
+            metrics,
+        )
+
+    def test_get_boot_config_caches_no_response(self):
+        backend, params, _ = self.make_backend_for_boot_config(
+            lambda: fail(BootConfigNoResponse())
+        )
+        client = Mock()
+
+        for _ in range(2):
+            d = backend.get_boot_config(client, params)
+            self.assertRaises(BootConfigNoResponse, extract_result, d)
+
+        self.assertThat(
+            backend.fetcher,
+            MockCalledOnceWith(client, GetBootConfig, **params),
+        )
+
+    def test_get_boot_config_fetches_again_once_expired(self):
+        backend, params, _ = self.make_backend_for_boot_config(
+            lambda: succeed({})
+        )
+        client = Mock()
+
+        backend.get_boot_config(client, params)
+        backend.clock.advance(tftp_module.BOOT_CONFIG_CACHE_TTL)
+        backend.get_boot_config(client, params)
+
+        self.assertEqual(2, backend.fetcher.call_count)
+        self.assertEqual(1, len(backend.boot_config_cache))
+
+    def test_get_boot_config_does_not_cache_errors(self):
+        backend, params, _ = self.make_backend_for_boot_config(
+            lambda: fail(factory.make_exception())
+        )
+        client = Mock()
+
+        for _ in range(2):
+            backend.get_boot_config(client, params).addErrback(lambda _: None)
+
+        self.assertEqual(2, backend.fetcher.call_count)
+        self.assertEqual({}, backend.boot_config_cache)
+
 
 class TestTFTPService(MAASTestCase):
     def test_tftp_service(self):
@@ -19,6 +19,7 @@ from twisted.internet import reactor, udp
 from twisted.internet.abstract import isIPv6Address
 from twisted.internet.address import IPv4Address, IPv6Address
 from twisted.internet.defer import (
+    fail,
     inlineCallbacks,
     maybeDeferred,
     returnValue,
@@ -45,6 +46,11 @@ from provisioningserver.utils.twisted import deferred, RPCFetcher
 maaslog = get_maas_logger("tftp")
 log = LegacyLogger()
 
+# Seconds a boot configuration fetched from the region is reused for. This is
+# kept short as the rack is not told when the configuration changes; it only
+# needs to cover the bursts of requests a booting machine makes.
+BOOT_CONFIG_CACHE_TTL = 5
+
 
 def get_boot_image(params):
     """Get the boot image for the params on this rack controller."""
@@ -145,6 +151,10 @@ class TFTPBackend(FilesystemSynchronousBackend):
         self.client_to_remote = {}
         self.client_service = client_service
         self.fetcher = RPCFetcher()
+        # Maps the GetBootConfig arguments to (expires, response), where
+        # response is None if the region had no response for them.
+        self.boot_config_cache = {}
+        self.clock = reactor
 
     def _get_new_client_for_remote(self, remote_ip):
         """Return a new client for the `remote_ip`.
@@ -274,6 +284,53 @@ class TFTPBackend(FilesystemSynchronousBackend):
                 params["label"] = boot_image["label"]
             return params
 
+    def get_boot_config(self, client, params):
+        """Get the boot configuration for `params` from the region.
+
+        Responses are cached for `BOOT_CONFIG_CACHE_TTL` seconds, so repeated
+        requests from the same machine are answered locally.
+        """
+        key = tuple(sorted(params.items()))
+        now = self.clock.seconds()
+        cached = self.boot_config_cache.get(key)
+        if cached is not None and cached[0] > now:
+            self._record_boot_config_lookup("hit")
+            response = cached[1]
+            if response is None:
+                return fail(BootConfigNoResponse())
+            else:
+                return succeed(response.copy())
+
+        self._record_boot_config_lookup("miss")
+        # Prune expired entries so the cache does not grow unbounded.
+        self.boot_config_cache = {
+            other_key: entry
+            for other_key, entry in self.boot_config_cache.items()
+            if entry[0] > now
+        }
+
+        def store(response):
+            expires = self.clock.seconds() + BOOT_CONFIG_CACHE_TTL
+            self.boot_config_cache[key] = (expires, response.copy())
+            return response
+
+        def store_no_response(failure):
+            failure.trap(BootConfigNoResponse)
+            expires = self.clock.seconds() + BOOT_CONFIG_CACHE_TTL
+            self.boot_config_cache[key] = (expires, None)
+            return failure
+
+        d = self.fetcher(client, GetBootConfig, **params)
+        d.addCallbacks(store, store_no_response)
+        return d
+
+    def _record_boot_config_lookup(self, result):
+        PROMETHEUS_METRICS.update(
+            "maas_rack_boot_config_cache_lookups",
+            "inc",
+            labels={"result": result},
+        )
+
     @deferred
     def get_kernel_params(self, params):
         """Return kernel parameters obtained from the API.
@@ -292,7 +349,7 @@ class TFTPBackend(FilesystemSynchronousBackend):
 
         def fetch(client, params):
             params["system_id"] = client.localIdent
-            d = self.fetcher(client, GetBootConfig, **params)
+            d = self.get_boot_config(client, params)
             d.addCallback(self.get_boot_image, client, params["remote_ip"])
             d.addCallback(lambda data: KernelParameters(**data))
             return d
@@ -9,6 +9,7 @@ __all__ = [
     "IPAddress",
     "IPNetwork",
     "ParsedURL",
+    "Streamed",
     "StructureAsJSON",
 ]
 
@@ -169,6 +170,47 @@ class CompressedAmpList(AmpList):
         return fromStringProto(zlib.decompress(inString), proto)
 
 
+# The suffix of the key that marks a value in a box as streamed.
+STREAM_SUFFIX = b".stream"
+
+
+class Streamed(amp.Argument):
+    """Stream an argument on the wire if it's too big to send in one go.
+
+    AMP limits each value in a box to
+    :py:data:`~twisted.protocols.amp.MAX_VALUE_LENGTH` bytes. When `argument`
+    encodes to fewer bytes than that it is sent exactly as `argument` would
+    send it. When it doesn't, a second key, the argument's name followed by
+    :py:data:`STREAM_SUFFIX`, is added to the box. The protocol sending the
+    box then sends only the first chunk of the value and holds onto the rest,
+    which the remote side fetches chunk by chunk before handling the box; see
+    :py:class:`~provisioningserver.rpc.common.RPCProtocol`.
+    """
+
+    def __init__(self, argument, optional=False):
+        """Create a streamed argument.
+
+        :param argument: The :py:class:`amp.Argument` used to encode and
+            decode the value.
+        :param optional: Whether this argument can be omitted in the protocol.
+        :type optional: bool
+        """
+        super().__init__(optional=optional)
+        self.argument = argument
+
+    def toBox(self, name, strings, objects, proto):
+        super().toBox(name, strings, objects, proto)
+        value = strings.get(name)
+        if value is not None and len(value) > amp.MAX_VALUE_LENGTH:
+            strings[name + STREAM_SUFFIX] = b""
+
+    def toStringProto(self, inObject, proto):
+        return self.argument.toStringProto(inObject, proto)
+
+    def fromStringProto(self, inString, proto):
+        return self.argument.fromStringProto(inString, proto)
+
+
 class IPAddress(amp.Argument):
     """Encode a `netaddr.IPAddress` object on the wire."""
 
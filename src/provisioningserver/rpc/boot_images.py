@@ -9,19 +9,27 @@ __all__ = [
     "is_import_boot_images_running",
 ]
 
+from operator import itemgetter
 from urllib.parse import urlparse
 
-from twisted.internet.defer import fail, inlineCallbacks
+from twisted.internet.defer import fail, inlineCallbacks, succeed
 from twisted.internet.threads import deferToThread
+from twisted.protocols.amp import UnhandledCommand
 
 from provisioningserver import concurrency
 from provisioningserver.auth import get_maas_user_gpghome
 from provisioningserver.boot import tftppath
 from provisioningserver.config import ClusterConfiguration
 from provisioningserver.import_images import boot_resources
+from provisioningserver.import_images.download_resources import (
+    compose_peer_cache_url,
+)
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.rpc import getRegionClient
-from provisioningserver.rpc.region import UpdateLastImageSync
+from provisioningserver.rpc.region import (
+    GetBootImagePeers,
+    UpdateLastImageSync,
+)
 from provisioningserver.utils.env import environment_variables, get_maas_id
 from provisioningserver.utils.twisted import synchronous
 
@@ -95,14 +103,20 @@ def fix_sources_for_cluster(sources, maas_url):
 
 
 @synchronous
-def _run_import(sources, maas_url, http_proxy=None, https_proxy=None):
+def _run_import(
+    sources, maas_url, http_proxy=None, https_proxy=None, peers=None
+):
     """Run the import.
 
     This is function is synchronous so it must be called with deferToThread.
+
+    :param peers: Optional addresses of peer rack controllers to download
+        boot images from, when they already hold them, instead of the region.
     """
     # Fix the sources to download from the IP address defined in the cluster
     # configuration, instead of the URL that the region asked it to use.
     sources = fix_sources_for_cluster(sources, maas_url)
+    peer_urls = [compose_peer_cache_url(peer) for peer in peers or ()]
     variables = {"GNUPGHOME": get_maas_user_gpghome()}
     if http_proxy is not None:
         variables["http_proxy"] = http_proxy
@@ -118,9 +132,13 @@ def _run_import(sources, maas_url, http_proxy=None, https_proxy=None):
         "[::1]",
     ]
     no_proxy_hosts += list(get_hosts_from_sources(sources))
+    # Peers are rack controllers on the same network; don't proxy them.
+    no_proxy_hosts += list(
+        get_hosts_from_sources({"url": url} for url in peer_urls)
+    )
     variables["no_proxy"] = ",".join(no_proxy_hosts)
     with environment_variables(variables):
-        imported = boot_resources.import_images(sources)
+        imported = boot_resources.import_images(sources, peer_urls=peer_urls)
 
     # Update the boot images cache so `list_boot_images` returns the
     # correct information.
@@ -155,8 +173,11 @@ def _import_boot_images(sources, maas_url, http_proxy=None, https_proxy=None):
 
     Helper for `import_boot_images`.
     """
+    # Ask for the peers only once the import is about to start, so that
+    # racks that finished importing in the meantime are included.
+    peers = yield get_boot_image_peers()
     proxies = dict(http_proxy=http_proxy, https_proxy=https_proxy)
-    yield deferToThread(_run_import, sources, maas_url, **proxies)
+    yield deferToThread(_run_import, sources, maas_url, peers=peers, **proxies)
     yield touch_last_image_sync_timestamp().addErrback(
         log.err, "Failure touching last image sync timestamp."
     )
@@ -167,6 +188,30 @@ def is_import_boot_images_running():
     return concurrency.boot_images.locked
 
 
+def get_boot_image_peers():
+    """Ask the region for the peer rack controllers to download boot images
+    from.
+
+    :return: :class:`Deferred` that fires with a list of addresses. The list
+        is empty when the region can't be asked, so that boot images are
+        downloaded from the region instead.
+    """
+    try:
+        client = getRegionClient()
+    except Exception:
+        return succeed([])
+
+    def no_peers(failure):
+        if not failure.check(UnhandledCommand):
+            log.err(failure, "Failure getting boot image peers.")
+        return []
+
+    d = client(GetBootImagePeers, system_id=get_maas_id())
+    d.addCallback(itemgetter("peers"))
+    d.addErrback(no_peers)
+    return d
+
+
 def touch_last_image_sync_timestamp():
     """Inform the region that images have just been synchronised.
 
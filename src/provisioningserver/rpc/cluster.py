@@ -27,6 +27,8 @@ __all__ = [
     "PowerOn",
     "PowerQuery",
     "ScanNetworks",
+    "UpdateDHCPv4Hosts",
+    "UpdateDHCPv6Hosts",
     "ValidateDHCPv4Config",
     "ValidateDHCPv4Config_V2",
     "ValidateDHCPv6Config",
@@ -48,6 +50,7 @@ from provisioningserver.rpc.arguments import (
     IPAddress,
     IPNetwork,
     ParsedURL,
+    Streamed,
     StructureAsJSON,
 )
 from provisioningserver.rpc.common import Authenticate, Identify
@@ -448,79 +451,97 @@ class _ConfigureDHCP_V2(amp.Command):
         ),
         (
             b"shared_networks",
-            CompressedAmpList(
-                [
-                    (b"name", amp.Unicode()),
-                    (
-                        b"subnets",
-                        AmpList(
-                            [
-                                (b"subnet", amp.Unicode()),
-                                (b"subnet_mask", amp.Unicode()),
-                                (b"subnet_cidr", amp.Unicode()),
-                                (b"broadcast_ip", amp.Unicode()),
-                                (b"router_ip", amp.Unicode()),
-                                (b"dns_servers", amp.ListOf(IPAddress())),
-                                (b"ntp_servers", amp.ListOf(amp.Unicode())),
-                                (b"domain_name", amp.Unicode()),
-                                (
-                                    b"search_list",
-                                    amp.ListOf(amp.Unicode(), optional=True),
-                                ),
-                                (
-                                    b"pools",
-                                    AmpList(
-                                        [
-                                            (b"ip_range_low", amp.Unicode()),
-                                            (b"ip_range_high", amp.Unicode()),
-                                            (
-                                                b"failover_peer",
-                                                amp.Unicode(optional=True),
-                                            ),
-                                        ]
+            Streamed(
+                CompressedAmpList(
+                    [
+                        (b"name", amp.Unicode()),
+                        (
+                            b"subnets",
+                            AmpList(
+                                [
+                                    (b"subnet", amp.Unicode()),
+                                    (b"subnet_mask", amp.Unicode()),
+                                    (b"subnet_cidr", amp.Unicode()),
+                                    (b"broadcast_ip", amp.Unicode()),
+                                    (b"router_ip", amp.Unicode()),
+                                    (b"dns_servers", amp.ListOf(IPAddress())),
+                                    (
+                                        b"ntp_servers",
+                                        amp.ListOf(amp.Unicode()),
                                     ),
-                                ),
-                                (
-                                    b"dhcp_snippets",
-                                    AmpList(
-                                        [
-                                            (b"name", amp.Unicode()),
-                                            (
-                                                b"description",
-                                                amp.Unicode(optional=True),
-                                            ),
-                                            (b"value", amp.Unicode()),
-                                        ],
-                                        optional=True,
+                                    (b"domain_name", amp.Unicode()),
+                                    (
+                                        b"search_list",
+                                        amp.ListOf(
+                                            amp.Unicode(), optional=True
+                                        ),
                                     ),
-                                ),
-                            ]
+                                    (
+                                        b"pools",
+                                        AmpList(
+                                            [
+                                                (
+                                                    b"ip_range_low",
+                                                    amp.Unicode(),
+                                                ),
+                                                (
+                                                    b"ip_range_high",
+                                                    amp.Unicode(),
+                                                ),
+                                                (
+                                                    b"failover_peer",
+                                                    amp.Unicode(optional=True),
+                                                ),
+                                            ]
+                                        ),
+                                    ),
+                                    (
+                                        b"dhcp_snippets",
+                                        AmpList(
+                                            [
+                                                (b"name", amp.Unicode()),
+                                                (
+                                                    b"description",
+                                                    amp.Unicode(optional=True),
+                                                ),
+                                                (b"value", amp.Unicode()),
+                                            ],
+                                            optional=True,
+                                        ),
+                                    ),
+                                ]
+                            ),
                         ),
-                    ),
-                    (b"mtu", amp.Integer(optional=True)),
-                    (b"interface", amp.Unicode(optional=True)),
-                ]
+                        (b"mtu", amp.Integer(optional=True)),
+                        (b"interface", amp.Unicode(optional=True)),
+                    ]
+                )
             ),
         ),
         (
             b"hosts",
-            CompressedAmpList(
-                [
-                    (b"host", amp.Unicode()),
-                    (b"mac", amp.Unicode()),
-                    (b"ip", amp.Unicode()),
-                    (
-                        b"dhcp_snippets",
-                        AmpList(
-                            [
-                                (b"name", amp.Unicode()),
-                                (b"description", amp.Unicode(optional=True)),
-                                (b"value", amp.Unicode()),
-                            ],
-                            optional=True,
+            Streamed(
+                CompressedAmpList(
+                    [
+                        (b"host", amp.Unicode()),
+                        (b"mac", amp.Unicode()),
+                        (b"ip", amp.Unicode()),
+                        (
+                            b"dhcp_snippets",
+                            AmpList(
+                                [
+                                    (b"name", amp.Unicode()),
+                                    (
+                                        b"description",
+                                        amp.Unicode(optional=True),
+                                    ),
+                                    (b"value", amp.Unicode()),
+                                ],
+                                optional=True,
+                            ),
                         ),
-                    ),
-                ]
+                    ]
+                )
             ),
         ),
         (b"interfaces", AmpList([(b"name", amp.Unicode())])),
@@ -626,6 +647,64 @@ class ConfigureDHCPv6_V2(_ConfigureDHCP_V2):
     """
 
 
+class _UpdateDHCPHosts(amp.Command):
+    """Update the hosts of a configured DHCP server.
+
+    Only the hosts that are new or have changed, and the MAC addresses of
+    the hosts that were removed, are sent. The remaining configuration is
+    that set by the last `ConfigureDHCPv4_V2` or `ConfigureDHCPv6_V2`.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        (b"omapi_key", amp.Unicode()),
+        (
+            b"hosts",
+            Streamed(
+                CompressedAmpList(
+                    [
+                        (b"host", amp.Unicode()),
+                        (b"mac", amp.Unicode()),
+                        (b"ip", amp.Unicode()),
+                        (
+                            b"dhcp_snippets",
+                            AmpList(
+                                [
+                                    (b"name", amp.Unicode()),
+                                    (
+                                        b"description",
+                                        amp.Unicode(optional=True),
+                                    ),
+                                    (b"value", amp.Unicode()),
+                                ],
+                                optional=True,
+                            ),
+                        ),
+                    ]
+                )
+            ),
+        ),
+        (b"removed_macs", amp.ListOf(amp.Unicode())),
+    ]
+    response = []
+    errors = {exceptions.CannotConfigureDHCP: b"CannotConfigureDHCP"}
+
+
+class UpdateDHCPv4Hosts(_UpdateDHCPHosts):
+    """Update the hosts of the DHCPv4 server.
+
+    :since: 2.9
+    """
+
+
+class UpdateDHCPv6Hosts(_UpdateDHCPHosts):
+    """Update the hosts of the DHCPv6 server.
+
+    :since: 2.9
+    """
+
+
 class ValidateDHCPv6Config(_ValidateDHCPConfig):
     """Configure the DHCPv6 server.
 
@@ -38,7 +38,7 @@ from zope.interface import implementer
 
 from apiclient.creds import convert_string_to_tuple
 from apiclient.utils import ascii_url
-from provisioningserver import concurrency
+from provisioningserver import concurrency, tags
 from provisioningserver.config import ClusterConfiguration, is_dev_environment
 from provisioningserver.drivers import ArchitectureRegistry
 from provisioningserver.drivers.hardware.seamicro import (
@@ -543,6 +543,37 @@ class Cluster(RPCProtocol):
 
         return d
 
+    @cluster.UpdateDHCPv4Hosts.responder
+    def update_dhcpv4_hosts(self, omapi_key, hosts, removed_macs):
+        server = dhcp.DHCPv4Server(omapi_key)
+        if concurrency.dhcpv4.locked:
+            log.debug(
+                "DHCPv4 host update triggered; another is already "
+                "processing, scheduled next"
+            )
+        else:
+            log.debug("DHCPv4 host update triggered; processing immediately")
+
+        d = concurrency.dhcpv4.run(
+            deferWithTimeout,
+            DHCP_TIMEOUT,
+            dhcp.update_hosts,
+            server,
+            hosts,
+            removed_macs,
+        )
+        d.addCallback(lambda _: {})
+
+        # Catch the cancelled error, which means the work timed out.
+        def _timeoutEb(failure):
+            failure.trap(CancelledError)
+            log.err(failure, "DHCPv4 host update timed out")
+            raise CannotConfigureDHCP("timed out") from failure.value
+
+        d.addErrback(_timeoutEb)
+
+        return d
+
     @cluster.ValidateDHCPv4Config.responder
     def validate_dhcpv4_config(
         self,
@@ -651,6 +682,37 @@ class Cluster(RPCProtocol):
 
         return d
 
+    @cluster.UpdateDHCPv6Hosts.responder
+    def update_dhcpv6_hosts(self, omapi_key, hosts, removed_macs):
+        server = dhcp.DHCPv6Server(omapi_key)
+        if concurrency.dhcpv6.locked:
+            log.debug(
+                "DHCPv6 host update triggered; another is already "
+                "processing, scheduled next"
+            )
+        else:
+            log.debug("DHCPv6 host update triggered; processing immediately")
+
+        d = concurrency.dhcpv6.run(
+            deferWithTimeout,
+            DHCP_TIMEOUT,
+            dhcp.update_hosts,
+            server,
+            hosts,
+            removed_macs,
+        )
+        d.addCallback(lambda _: {})
+
+        # Catch the cancelled error, which means the work timed out.
+        def _timeoutEb(failure):
+            failure.trap(CancelledError)
+            log.err(failure, "DHCPv6 host update timed out")
+            raise CannotConfigureDHCP("timed out") from failure.value
+
+        d.addErrback(_timeoutEb)
+
+        return d
+
     @cluster.ValidateDHCPv6Config.responder
     def validate_dhcpv6_config(
         self,
@@ -1084,6 +1146,14 @@ class ClusterClient(Cluster):
         """The ident of the remote event-loop."""
         return self.eventloop
 
+    def remoteAuthenticated(self):
+        """Return a `Deferred` that fires with whether the region has been
+        authenticated.
+
+        Overrides `RPCProtocol.remoteAuthenticated`.
+        """
+        return self.authenticated.get()
+
     @inlineCallbacks
     def authenticateRegion(self):
         """Authenticate the region."""
@@ -1306,6 +1376,14 @@ class ClusterClientService(TimerService, object):
         self.time_started = self.clock.seconds()
         super().startService()
 
+    def stopService(self):
+        d = maybeDeferred(super().stopService)
+        # Evaluating tags may have left processes running; see `EvaluateTag`.
+        d.addCallback(
+            lambda _: deferToThread(tags.evaluation_processes.shutdown)
+        )
+        return d
+
     def getClient(self):
         """Returns a :class:`common.Client` connected to a region.
 
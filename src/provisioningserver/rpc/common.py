@@ -3,17 +3,27 @@
 
 """Common RPC classes and utilties."""
 
-__all__ = ["Authenticate", "Client", "Identify", "RPCProtocol"]
-
+__all__ = [
+    "Authenticate",
+    "Client",
+    "FetchStreamChunk",
+    "Identify",
+    "RPCProtocol",
+]
+
+from itertools import count
 from os import getpid
 from socket import gethostname
 
-from twisted.internet.defer import Deferred
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, fail, inlineCallbacks, succeed
 from twisted.protocols import amp
 from twisted.python.failure import Failure
 
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
+from provisioningserver.rpc.arguments import Bytes, STREAM_SUFFIX, Streamed
+from provisioningserver.rpc.exceptions import BadStream, NoSuchStream
 from provisioningserver.rpc.interfaces import IConnection, IConnectionToRegion
 from provisioningserver.utils.twisted import asynchronous, deferWithTimeout
 
@@ -78,6 +88,24 @@ class Ping(amp.Command):
     errors = []
 
 
+class FetchStreamChunk(amp.Command):
+    """Fetch a chunk of a value too big to send in one box.
+
+    See :py:class:`~provisioningserver.rpc.arguments.Streamed`.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        # The stream, as given in the streamed box.
+        (b"stream", amp.Integer()),
+        # The offset into the value to start the chunk at.
+        (b"offset", amp.Integer()),
+    ]
+    response = [(b"data", Bytes())]
+    errors = {NoSuchStream: b"NoSuchStream"}
+
+
 class Client:
     """Wrapper around an :class:`amp.AMP` instance.
 
@@ -228,6 +256,13 @@ def make_command_ref(box):
     )
 
 
+def _streamedNames(arguments):
+    """Return the names of the `Streamed` values among `arguments`."""
+    return frozenset(
+        name for name, argument in arguments if isinstance(argument, Streamed)
+    )
+
+
 class RPCProtocol(amp.AMP, object):
     """A specialisation of `amp.AMP`.
 
@@ -240,12 +275,36 @@ class RPCProtocol(amp.AMP, object):
         been called, i.e. this protocol is now connected.
     :ivar onConnectionLost: A `Deferred` that fires when `connectionLost` has
         been called, i.e. this protocol is no longer connected.
+
+    It also streams values too big to send in one box, as marked by
+    :py:class:`~provisioningserver.rpc.arguments.Streamed`, in commands and
+    answers alike. Only the first chunk of such a value is sent in the box;
+    the rest is kept here until the remote side fetches it with
+    `FetchStreamChunk`. The remote side fetches one chunk at a time, so it
+    sets the pace, and other commands can be sent in between chunks. It
+    handles the box once the whole value has been fetched.
+
+    Only the values that a command declares as streamed, in its arguments or
+    its response, are fetched, and only up to `maxStreamLength` bytes in all
+    for each box. Values streamed in commands are fetched only once the
+    remote side has been authenticated.
     """
 
+    # How long to keep a streamed value for the remote side to fetch.
+    streamTimeout = 120
+
+    # How many bytes the remote side can stream in one box, in all.
+    maxStreamLength = 64 * 1024 * 1024
+
     def __init__(self):
         super().__init__()
         self.onConnectionMade = Deferred()
         self.onConnectionLost = Deferred()
+        self.clock = reactor
+        self._streams = {}
+        self._streamIDs = count(1)
+        self._streamedResponses = {}
+        self._answerStreams = {}
 
     def connectionMade(self):
         super().connectionMade()
@@ -253,15 +312,160 @@ class RPCProtocol(amp.AMP, object):
 
     def connectionLost(self, reason):
         super().connectionLost(reason)
+        for _, expiry in self._streams.values():
+            expiry.cancel()
+        self._streams.clear()
+        self._answerStreams.clear()
         self.onConnectionLost.callback(None)
 
+    def _startStreams(self, box):
+        """Keep back the parts of streamed values too big to send in `box`.
+
+        Each streamed value is cut down to its first chunk, and its stream
+        key set to the stream ID and the length of the whole value.
+        """
+        for key in [key for key in box if key.endswith(STREAM_SUFFIX)]:
+            name = key[: -len(STREAM_SUFFIX)]
+            value = box[name]
+            stream = next(self._streamIDs)
+            expiry = self.clock.callLater(
+                self.streamTimeout, self._streams.pop, stream, None
+            )
+            self._streams[stream] = value, expiry
+            box[name] = value[: amp.MAX_VALUE_LENGTH]
+            box[key] = b"%d %d" % (stream, len(value))
+
+    def remoteAuthenticated(self):
+        """Return a `Deferred` that fires with whether the remote side has
+        been authenticated.
+
+        The remote side is trusted here. Protocols that authenticate it
+        override this.
+        """
+        return succeed(True)
+
+    def _receiveCommandStreams(self, box):
+        """Fetch the rest of the streamed values in the command `box`.
+
+        :return: A `Deferred` that fires with `box` once it holds the whole
+            of each streamed value, or fails with `BadStream` if the remote
+            side has not been authenticated.
+        """
+        if not any(key.endswith(STREAM_SUFFIX) for key in box):
+            return succeed(box)
+
+        dispatch = self._commandDispatch.get(box[amp.COMMAND])
+        if dispatch is None:
+            names = frozenset()
+        else:
+            command, _ = dispatch
+            names = _streamedNames(command.arguments)
+
+        def receive(authenticated):
+            if authenticated is True:
+                return self._receiveStreams(box, names)
+            else:
+                raise BadStream(
+                    "Values cannot be streamed before authentication."
+                )
+
+        return self.remoteAuthenticated().addCallback(receive)
+
+    def _receiveStreams(self, box, names):
+        """Fetch the rest of the streamed values in `box`.
+
+        :param names: The names of the values that can be streamed in `box`.
+        :return: A `Deferred` that fires with `box` once it holds the whole
+            of each streamed value, or fails with `BadStream` if `box`
+            streams any other value, more than `maxStreamLength` bytes in
+            all, or a value that is not as long as advertised.
+        """
+        streams = []
+        for key in [key for key in box if key.endswith(STREAM_SUFFIX)]:
+            name = key[: -len(STREAM_SUFFIX)]
+            if name not in names:
+                return fail(BadStream("%r cannot be streamed." % name))
+            try:
+                stream, length = map(int, box.pop(key).split())
+            except ValueError:
+                return fail(BadStream("%r is badly streamed." % name))
+            streams.append((name, stream, length))
+        if sum(length for _, _, length in streams) > self.maxStreamLength:
+            return fail(
+                BadStream(
+                    "Streamed values exceed %d bytes." % self.maxStreamLength
+                )
+            )
+        if len(streams) == 0:
+            return succeed(box)
+        else:
+            return self._fetchStreams(box, streams)
+
+    @inlineCallbacks
+    def _fetchStreams(self, box, streams):
+        for name, stream, length in streams:
+            chunks = [box[name]]
+            received = len(box[name])
+            while received < length:
+                response = yield self.callRemote(
+                    FetchStreamChunk, stream=stream, offset=received
+                )
+                if len(response["data"]) == 0:
+                    raise BadStream(
+                        "Stream %d ended at %d of %d bytes."
+                        % (stream, received, length)
+                    )
+                chunks.append(response["data"])
+                received += len(response["data"])
+            if received > length:
+                raise BadStream(
+                    "Stream %d went past its %d bytes." % (stream, length)
+                )
+            box[name] = b"".join(chunks)
+        return box
+
+    @FetchStreamChunk.responder
+    def fetchStreamChunk(self, stream, offset):
+        """fetchStreamChunk(stream, offset)
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.common.FetchStreamChunk`.
+        """
+        try:
+            value, expiry = self._streams[stream]
+        except KeyError:
+            raise NoSuchStream.from_stream(stream)
+        end = offset + amp.MAX_VALUE_LENGTH
+        if end >= len(value):
+            # That's the last chunk, so the stream is done with.
+            del self._streams[stream]
+            expiry.cancel()
+        return {"data": value[offset:end]}
+
+    def callRemote(self, command, *args, **kwargs):
+        """Call up, noting which values can be streamed in the answer."""
+        if command.commandName not in self._streamedResponses:
+            self._streamedResponses[command.commandName] = _streamedNames(
+                command.response
+            )
+        return super().callRemote(command, *args, **kwargs)
+
     def _sendBoxCommand(self, command, box, requiresAnswer=True):
-        """Override `_sendBoxCommand` to log the sent RPC message."""
+        """Override `_sendBoxCommand` to log the sent RPC message.
+
+        This also starts streaming any values too big to send in one box.
+        """
         box[amp.COMMAND] = command
+        self._startStreams(box)
         log.debug("[RPC -> sent] {box}", box=box)
-        return super()._sendBoxCommand(
+        result = super()._sendBoxCommand(
             command, box, requiresAnswer=requiresAnswer
         )
+        if amp.ASK in box:
+            self._answerStreams[box[amp.ASK]] = self._streamedResponses.get(
+                command, frozenset()
+            )
+        return result
 
     def dispatchCommand(self, box):
         """Call up, but coerce errors into non-fatal failures.
@@ -277,7 +481,8 @@ class RPCProtocol(amp.AMP, object):
         """
         log.debug("[RPC <- received] {box}", box=box)
 
-        d = super().dispatchCommand(box)
+        d = self._receiveCommandStreams(box)
+        d.addCallback(super().dispatchCommand)
 
         def coerce_error(failure):
             if failure.check(amp.RemoteAmpError):
@@ -309,22 +514,41 @@ class RPCProtocol(amp.AMP, object):
     def _safeEmit(self, box):
         """
         Override `_safeEmit` to log the RPC response.
+
+        This also starts streaming any values too big to send in one box.
         """
+        self._startStreams(box)
         log.debug("[RPC -> responding] {box}", box=box)
         return super()._safeEmit(box)
 
     def _answerReceived(self, box):
         """
         Override `_answerRecieved` to log recieving RPC response.
+
+        The answer is passed on once any values streamed in it have been
+        fetched, or the request fails if they could not be.
         """
         log.debug("[RPC <- recieved] {box}", box=box)
-        return super()._answerReceived(box)
+        names = self._answerStreams.pop(box[amp.ANSWER], frozenset())
+        d = self._receiveStreams(box, names)
+        d.addCallbacks(
+            super()._answerReceived, self._streamFailed, errbackArgs=[box]
+        )
+        d.addErrback(self.unhandledError)
+
+    def _streamFailed(self, failure, box):
+        """Fail the request answered by `box`, as its streams were lost."""
+        question = self._outstandingRequests.pop(box[amp.ANSWER], None)
+        if question is not None:
+            question.addErrback(self.unhandledError)
+            question.errback(failure)
 
     def _errorReceived(self, box):
         """
         Override `_errorReceived` to log recieving RPC response.
         """
         log.debug("[RPC <- error] {box}", box=box)
+        self._answerStreams.pop(box[amp.ERROR], None)
         return super()._errorReceived(box)
 
     def unhandledError(self, failure):
@@ -8,6 +8,7 @@ __all__ = [
     "DHCPv4Server",
     "DHCPv6Server",
     "downgrade_shared_networks",
+    "update_hosts",
     "upgrade_shared_networks",
 ]
 
@@ -23,7 +24,11 @@ from twisted.internet.threads import deferToThread
 
 from provisioningserver.dhcp import DHCPv4Server, DHCPv6Server
 from provisioningserver.dhcp.config import get_config
-from provisioningserver.dhcp.omshell import Omshell
+from provisioningserver.dhcp.omapi import (
+    OmapiClient,
+    OmapiConnectionError,
+    OmapiError,
+)
 from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.rpc.exceptions import (
     CannotConfigureDHCP,
@@ -187,51 +192,49 @@ def _delete_config(server):
         sudo_delete_file(server.config_filename)
 
 
-def _remove_host_map(omshell, mac):
+def _describe_omapi_error(error):
+    if isinstance(error, OmapiConnectionError):
+        return "The DHCP server could not be reached."
+    else:
+        return str(error)
+
+
+def _remove_host_map(omapi, mac):
     """Remove host by `mac`."""
     try:
-        omshell.remove(mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
-        err = "Could not remove host map for %s: %s" % (mac, msg)
+        omapi.remove(mac)
+    except OmapiError as e:
+        err = "Could not remove host map for %s: %s" % (
+            mac,
+            _describe_omapi_error(e),
+        )
         maaslog.error(err)
         raise CannotRemoveHostMap(err)
 
 
-def _create_host_map(omshell, mac, ip_address):
+def _create_host_map(omapi, mac, ip_address):
     """Create host with `mac` -> `ip_address`."""
     try:
-        omshell.create(ip_address, mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
+        omapi.create(ip_address, mac)
+    except OmapiError as e:
         err = "Could not create host map for %s -> %s: %s" % (
             mac,
             ip_address,
-            msg,
+            _describe_omapi_error(e),
         )
         maaslog.error(err)
         raise CannotCreateHostMap(err)
 
 
-def _modify_host_map(omshell, mac, ip_address):
+def _modify_host_map(omapi, mac, ip_address):
     """Modify host with `mac` -> `ip_address`."""
     try:
-        omshell.modify(ip_address, mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
+        omapi.modify(ip_address, mac)
+    except OmapiError as e:
         err = "Could not modify host map for %s -> %s: %s" % (
             mac,
             ip_address,
-            msg,
+            _describe_omapi_error(e),
         )
         maaslog.error(err)
         raise CannotModifyHostMap(err)
@@ -239,18 +242,22 @@ def _modify_host_map(omshell, mac, ip_address):
 
 @synchronous
 def _update_hosts(server, remove, add, modify):
-    """Update the hosts using the OMAPI."""
-    omshell = Omshell(
+    """Update the hosts using the OMAPI.
+
+    All changes are sent over a single authenticated connection.
+    """
+    omapi = OmapiClient(
         server_address="127.0.0.1",
         shared_key=server.omapi_key,
         ipv6=server.ipv6,
     )
-    for host in remove:
-        _remove_host_map(omshell, host["mac"])
-    for host in add:
-        _create_host_map(omshell, host["mac"], host["ip"])
-    for host in modify:
-        _modify_host_map(omshell, host["mac"], host["ip"])
+    with omapi:
+        for host in remove:
+            _remove_host_map(omapi, host["mac"])
+        for host in add:
+            _create_host_map(omapi, host["mac"], host["ip"])
+        for host in modify:
+            _modify_host_map(omapi, host["mac"], host["ip"])
 
 
 @asynchronous
@@ -306,6 +313,125 @@ def _debug_hostmap_msg(hosts):
     return _inner
 
 
+@asynchronous
+@inlineCallbacks
+def _apply_state(server, new_state):
+    """Write `new_state` for the DHCPv6/DHCPv4 server and bring the running
+    server in line with it, restarting it only when required."""
+    # Always write the config, that way its always up-to-date. Even if
+    # we are not going to restart the services. This makes sure that even
+    # the comments in the file are updated.
+    log.debug(
+        "Writing updated DHCP configuration for {name} service.",
+        name=server.descriptive_name,
+    )
+    yield deferToThread(_write_config, server, new_state)
+
+    # Service should always be on if shared_networks exists.
+    service = service_monitor.getServiceByName(server.dhcp_service)
+    service.on()
+
+    # Perform the required action based on the state change.
+    current_state = _current_server_state.get(server.dhcp_service, None)
+    if current_state is None:
+        log.debug(
+            "Unknown previous state; restarting {name} service.",
+            name=server.descriptive_name,
+        )
+        yield _catch_service_error(
+            server,
+            "restart",
+            service_monitor.restartService,
+            server.dhcp_service,
+        )
+    elif new_state.requires_restart(current_state):
+        log.debug(
+            "Restarting {name} service; configuration change requires "
+            "full restart.",
+            name=server.descriptive_name,
+        )
+        yield _catch_service_error(
+            server,
+            "restart",
+            service_monitor.restartService,
+            server.dhcp_service,
+        )
+    else:
+        # No restart required update the host mappings if needed.
+        remove, add, modify = new_state.host_diff(current_state)
+        if len(remove) + len(add) + len(modify) == 0:
+            # Nothing has changed, do nothing but make sure its running.
+            log.debug(
+                "Doing nothing; {name} service configuration has not "
+                "changed.",
+                name=server.descriptive_name,
+            )
+            yield _catch_service_error(
+                server,
+                "start",
+                service_monitor.ensureService,
+                server.dhcp_service,
+            )
+        else:
+            log.debug(
+                "Ensuring {name} service is running before updating "
+                "using the OMAPI.",
+                name=server.descriptive_name,
+            )
+            # Check the state of the service. Only if the services was on
+            # should the host maps be updated over the OMAPI.
+            before_state = yield service_monitor.getServiceState(
+                server.dhcp_service, now=True
+            )
+            yield _catch_service_error(
+                server,
+                "start",
+                service_monitor.ensureService,
+                server.dhcp_service,
+            )
+            if before_state.active_state == SERVICE_STATE.ON:
+                # Was already running, so update host maps over OMAPI
+                # instead of performing a full restart.
+                log.debug(
+                    "Writing to OMAPI for {name} service:\n"
+                    "\tremove: {remove()}\n"
+                    "\tadd: {add()}\n"
+                    "\tmodify: {modify()}\n",
+                    name=server.descriptive_name,
+                    remove=_debug_hostmap_msg_remove(remove),
+                    add=_debug_hostmap_msg(add),
+                    modify=_debug_hostmap_msg(modify),
+                )
+                try:
+                    yield deferToThread(
+                        _update_hosts, server, remove, add, modify
+                    )
+                except Exception:
+                    # Error updating the host maps over the OMAPI.
+                    # Restart the DHCP service so that the host maps
+                    # are in-sync with what MAAS expects.
+                    maaslog.warning(
+                        "Failed to update all host maps. Restarting %s "
+                        "service to ensure host maps are in-sync."
+                        % (server.descriptive_name)
+                    )
+                    yield _catch_service_error(
+                        server,
+                        "restart",
+                        service_monitor.restartService,
+                        server.dhcp_service,
+                    )
+            else:
+                log.debug(
+                    "Usage of OMAPI skipped; {name} service was started "
+                    "with new configuration.",
+                    name=server.descriptive_name,
+                )
+
+    # Update the current state to the new state.
+    _current_server_state[server.dhcp_service] = new_state
+
+
 @asynchronous
 @inlineCallbacks
 def configure(
@@ -365,118 +491,43 @@ def configure(
             global_dhcp_snippets,
         )
 
-        # Always write the config, that way its always up-to-date. Even if
-        # we are not going to restart the services. This makes sure that even
-        # the comments in the file are updated.
-        log.debug(
-            "Writing updated DHCP configuration for {name} service.",
-            name=server.descriptive_name,
-        )
-        yield deferToThread(_write_config, server, new_state)
+        yield _apply_state(server, new_state)
 
-        # Service should always be on if shared_networks exists.
-        service = service_monitor.getServiceByName(server.dhcp_service)
-        service.on()
 
-        # Perform the required action based on the state change.
-        current_state = _current_server_state.get(server.dhcp_service, None)
-        if current_state is None:
-            log.debug(
-                "Unknown previous state; restarting {name} service.",
-                name=server.descriptive_name,
-            )
-            yield _catch_service_error(
-                server,
-                "restart",
-                service_monitor.restartService,
-                server.dhcp_service,
-            )
-        elif new_state.requires_restart(current_state):
-            log.debug(
-                "Restarting {name} service; configuration change requires "
-                "full restart.",
-                name=server.descriptive_name,
-            )
-            yield _catch_service_error(
-                server,
-                "restart",
-                service_monitor.restartService,
-                server.dhcp_service,
-            )
-        else:
-            # No restart required update the host mappings if needed.
-            remove, add, modify = new_state.host_diff(current_state)
-            if len(remove) + len(add) + len(modify) == 0:
-                # Nothing has changed, do nothing but make sure its running.
-                log.debug(
-                    "Doing nothing; {name} service configuration has not "
-                    "changed.",
-                    name=server.descriptive_name,
-                )
-                yield _catch_service_error(
-                    server,
-                    "start",
-                    service_monitor.ensureService,
-                    server.dhcp_service,
-                )
-            else:
-                log.debug(
-                    "Ensuring {name} service is running before updating "
-                    "using the OMAPI.",
-                    name=server.descriptive_name,
-                )
-                # Check the state of the service. Only if the services was on
-                # should the host maps be updated over the OMAPI.
-                before_state = yield service_monitor.getServiceState(
-                    server.dhcp_service, now=True
-                )
-                yield _catch_service_error(
-                    server,
-                    "start",
-                    service_monitor.ensureService,
-                    server.dhcp_service,
-                )
-                if before_state.active_state == SERVICE_STATE.ON:
-                    # Was already running, so update host maps over OMAPI
-                    # instead of performing a full restart.
-                    log.debug(
-                        "Writing to OMAPI for {name} service:\n"
-                        "\tremove: {remove()}\n"
-                        "\tadd: {add()}\n"
-                        "\tmodify: {modify()}\n",
-                        name=server.descriptive_name,
-                        remove=_debug_hostmap_msg_remove(remove),
-                        add=_debug_hostmap_msg(add),
-                        modify=_debug_hostmap_msg(modify),
-                    )
-                    try:
-                        yield deferToThread(
-                            _update_hosts, server, remove, add, modify
-                        )
-                    except Exception:
-                        # Error updating the host maps over the OMAPI.
-                        # Restart the DHCP service so that the host maps
-                        # are in-sync with what MAAS expects.
-                        maaslog.warning(
-                            "Failed to update all host maps. Restarting %s "
-                            "service to ensure host maps are in-sync."
-                            % (server.descriptive_name)
-                        )
-                        yield _catch_service_error(
-                            server,
-                            "restart",
-                            service_monitor.restartService,
-                            server.dhcp_service,
-                        )
-                else:
-                    log.debug(
-                        "Usage of OMAPI skipped; {name} service was started "
-                        "with new configuration.",
-                        name=server.descriptive_name,
-                    )
+@asynchronous
+def update_hosts(server, hosts, removed_macs):
+    """Apply a change to the hosts of the DHCPv6/DHCPv4 server.
+
+    The change is applied to the state set by the last call to `configure`,
+    so only the hosts that changed need to be sent. The server is updated
+    over the OMAPI, or restarted when the change requires it.
 
-        # Update the current state to the new state.
-        _current_server_state[server.dhcp_service] = new_state
+    This method is not safe to call concurrently with itself or `configure`.
+
+    :param server: A `DHCPServer` instance.
+    :param hosts: List of dicts with host parameters of new hosts and of
+        hosts that have changed.
+    :param removed_macs: List of MAC addresses of hosts to remove.
+    :raises CannotConfigureDHCP: When the state of the server is not known,
+        so a full configuration is required.
+    """
+    current_state = _current_server_state.get(server.dhcp_service, None)
+    if current_state is None:
+        raise CannotConfigureDHCP(
+            "%s server has not been configured; cannot update hosts."
+            % server.descriptive_name
+        )
+    new_hosts = dict(current_state.hosts)
+    for mac in removed_macs:
+        new_hosts.pop(mac, None)
+    for host in hosts:
+        new_hosts[host["mac"]] = host
+    # `_replace` skips `DHCPState.__new__`; all other fields are already
+    # normalised and `hosts` is given keyed by MAC address.
+    new_state = current_state._replace(
+        omapi_key=server.omapi_key, hosts=new_hosts
+    )
+    return _apply_state(server, new_state)
 
 
 def _parse_dhcpd_errors(error_str):
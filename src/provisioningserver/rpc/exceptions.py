@@ -5,6 +5,7 @@
 
 __all__ = [
     "AuthenticationFailed",
+    "BadStream",
     "CannotConfigureDHCP",
     "CannotCreateHostMap",
     "CannotDisableAndShutoffRackd",
@@ -20,6 +21,7 @@ __all__ = [
     "NoSuchEventType",
     "NoSuchNode",
     "NoSuchOperatingSystem",
+    "NoSuchStream",
     "PowerActionAlreadyInProgress",
     "PowerActionFail",
     "UnknownPowerType",
@@ -76,6 +78,18 @@ class NoSuchOperatingSystem(Exception):
     """The specified OS was not found."""
 
 
+class NoSuchStream(Exception):
+    """The specified stream was not found, or has expired."""
+
+    @classmethod
+    def from_stream(cls, stream):
+        return cls("Stream %d could not be found." % stream)
+
+
+class BadStream(Exception):
+    """A value streamed by the remote side was refused."""
+
+
 class CommissionNodeFailed(Exception):
     """Failure to commission node."""
 
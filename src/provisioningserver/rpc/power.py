@@ -6,6 +6,7 @@
 __all__ = [
     "power_action_registry",
     "power_state_update",
+    "power_states_update",
     "maybe_change_power_state",
 ]
 
@@ -18,23 +19,32 @@ from twisted.internet.defer import (
     CancelledError,
     DeferredList,
     DeferredSemaphore,
+    fail,
     inlineCallbacks,
+    maybeDeferred,
     returnValue,
     succeed,
 )
 from twisted.internet.task import deferLater
+from twisted.protocols.amp import UnhandledCommand
+from twisted.python.failure import Failure
 
 from provisioningserver.drivers.power import get_error_message, PowerError
 from provisioningserver.drivers.power.registry import PowerDriverRegistry
 from provisioningserver.events import EVENT_TYPES, send_node_event
 from provisioningserver.logger import get_maas_logger, LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc import getRegionClient
 from provisioningserver.rpc.exceptions import (
     NoSuchNode,
     PowerActionAlreadyInProgress,
     PowerActionFail,
 )
-from provisioningserver.rpc.region import MarkNodeFailed, UpdateNodePowerState
+from provisioningserver.rpc.region import (
+    MarkNodeFailed,
+    UpdateNodePowerState,
+    UpdateNodePowerStates,
+)
 from provisioningserver.utils.twisted import (
     asynchronous,
     callOut,
@@ -65,6 +75,27 @@ def power_state_update(system_id, state):
     return client(UpdateNodePowerState, system_id=system_id, power_state=state)
 
 
+@asynchronous
+@inlineCallbacks
+def power_states_update(power_states):
+    """Report to the region about many nodes' power states at once.
+
+    :param power_states: A list of dicts with "system_id" and "power_state"
+        keys; see `power_state_update`.
+    """
+    client = getRegionClient()
+    try:
+        yield client(UpdateNodePowerStates, power_states=power_states)
+    except UnhandledCommand:
+        # Region has not been upgraded to support the batch call, so report
+        # each node on its own.
+        for power_state in power_states:
+            try:
+                yield client(UpdateNodePowerState, **power_state)
+            except NoSuchNode:
+                pass  # The node was deleted since it was queried.
+
+
 @asynchronous(timeout=15)
 @inlineCallbacks
 def power_change_failure(system_id, hostname, power_change, message):
@@ -330,6 +361,30 @@ def perform_power_driver_query(system_id, hostname, power_type, context):
     return power_driver.query(system_id, context)
 
 
+def check_power_state(state):
+    if state not in ("on", "off", "unknown"):
+        # This is considered an error.
+        raise PowerActionFail(state)
+    return state
+
+
+def get_power_driver(power_type):
+    """Return the power driver for `power_type`, ready to query.
+
+    :raises PowerActionFail: When the driver is unknown or its packages
+        are missing.
+    """
+    power_driver = PowerDriverRegistry.get_item(power_type)
+    if power_driver is None:
+        raise PowerActionFail("Unknown power_type '%s'" % power_type)
+    missing_packages = power_driver.detect_missing_packages()
+    if len(missing_packages):
+        raise PowerActionFail(
+            "'%s' package(s) are not installed" % ", ".join(missing_packages)
+        )
+    return power_driver
+
+
 @asynchronous
 @inlineCallbacks
 def get_power_state(system_id, hostname, power_type, context, clock=reactor):
@@ -340,22 +395,10 @@ def get_power_state(system_id, hostname, power_type, context, clock=reactor):
         power state.
     """
 
-    def check_power_state(state):
-        if state not in ("on", "off", "unknown"):
-            # This is considered an error.
-            raise PowerActionFail(state)
-
     # Capture errors as we go along.
     exc_info = None, None, None
 
-    power_driver = PowerDriverRegistry.get_item(power_type)
-    if power_driver is None:
-        raise PowerActionFail("Unknown power_type '%s'" % power_type)
-    missing_packages = power_driver.detect_missing_packages()
-    if len(missing_packages):
-        raise PowerActionFail(
-            "'%s' package(s) are not installed" % ", ".join(missing_packages)
-        )
+    get_power_driver(power_type)
     try:
         power_state = yield perform_power_driver_query(
             system_id, hostname, power_type, context
@@ -374,20 +417,32 @@ def get_power_state(system_id, hostname, power_type, context, clock=reactor):
 
 
 @inlineCallbacks
-def power_query_success(system_id, hostname, state):
-    """Report a node that for which power querying has succeeded."""
+def power_query_success(system_id, hostname, state, report=None):
+    """Report a node that for which power querying has succeeded.
+
+    :param report: The function to report the power state with; defaults
+        to `power_state_update`.
+    """
     log.debug(f"Power state queried for node {system_id}: {state}")
-    yield power_state_update(system_id, state)
+    if report is None:
+        report = power_state_update
+    yield report(system_id, state)
 
 
 @inlineCallbacks
-def power_query_failure(system_id, hostname, failure):
-    """Report a node that for which power querying has failed."""
+def power_query_failure(system_id, hostname, failure, report=None):
+    """Report a node that for which power querying has failed.
+
+    :param report: The function to report the power state with; defaults
+        to `power_state_update`.
+    """
     maaslog.error(
         "%s: Power state could not be queried: %s"
         % (hostname, failure.getErrorMessage())
     )
-    yield power_state_update(system_id, "error")
+    if report is None:
+        report = power_state_update
+    yield report(system_id, "error")
     yield send_node_event(
         EVENT_TYPES.NODE_POWER_QUERY_FAILED,
         system_id,
@@ -397,21 +452,23 @@ def power_query_failure(system_id, hostname, failure):
 
 
 @asynchronous
-def report_power_state(d, system_id, hostname):
+def report_power_state(d, system_id, hostname, report=None):
     """Report the result of a power query.
 
     :param d: A `Deferred` that will fire with the node's updated power state,
         or an error condition. The callback/errback values are passed through
         unaltered. See `get_power_state` for details.
+    :param report: The function to report the power state with; defaults
+        to `power_state_update`.
     """
 
     def cb(state):
-        d = power_query_success(system_id, hostname, state)
+        d = power_query_success(system_id, hostname, state, report)
         d.addCallback(lambda _: state)
         return d
 
     def eb(failure):
-        d = power_query_failure(system_id, hostname, failure)
+        d = power_query_failure(system_id, hostname, failure, report)
         d.addCallback(lambda _: failure)
         return d
 
@@ -456,10 +513,13 @@ def maaslog_report_failure(node, failure):
         # log.err(failure, "Failed to refresh power state.")
 
 
-def query_node(node, clock):
+def query_node(node, clock, report=None):
     """Calls `get_power_state` on the given node.
 
     Logs to maaslog as errors and power states change.
+
+    :param report: The function to report the power state with; defaults
+        to `power_state_update`.
     """
     if node["system_id"] in power_action_registry:
         log.debug(
@@ -476,26 +536,157 @@ def query_node(node, clock):
             node["context"],
             clock=clock,
         )
-        d = report_power_state(d, node["system_id"], node["hostname"])
-        d.addCallbacks(
-            partial(maaslog_report_success, node),
-            partial(maaslog_report_failure, node),
-        )
-        return d
+        return report_node_query(node, d, report=report)
 
 
-def query_all_nodes(nodes, max_concurrency=5, clock=reactor):
-    """Queries the given nodes for their power state.
+def report_node_query(node, d, report=None):
+    """Report and log the result of querying `node`.
+
+    :param d: A `Deferred` that will fire with the node's power state, or
+        an error condition; see `report_power_state`.
+    """
+    d = report_power_state(
+        d, node["system_id"], node["hostname"], report=report
+    )
+    d.addCallbacks(
+        partial(maaslog_report_success, node),
+        partial(maaslog_report_failure, node),
+    )
+    return d
+
+
+@asynchronous
+def get_chassis_power_states(power_type, contexts):
+    """Return the power states of nodes behind one chassis.
+
+    :param contexts: Power settings for the nodes, keyed by system ID.
+    :return: A `Deferred` firing with a dict of power states keyed by
+        system ID. Nodes the chassis did not report on are missing.
+    """
+    power_driver = get_power_driver(power_type)
+    return power_driver.query_chassis(contexts)
 
-    Nodes' states are reported back to the region.
 
+def query_chassis_nodes(nodes, clock, report=None):
+    """Query the power state of nodes behind the same chassis together.
+
+    The chassis is queried once for all `nodes`, then each node's state is
+    reported and logged as `query_node` does. Nodes for which the chassis
+    returns no state are queried on their own.
+    """
+
+    def fan_out(power_states):
+        queries = []
+        for node in nodes:
+            if isinstance(power_states, Failure):
+                d = fail(power_states)
+            elif node["system_id"] in power_states:
+                d = maybeDeferred(
+                    check_power_state, power_states[node["system_id"]]
+                )
+            else:
+                queries.append(query_node(node, clock, report=report))
+                continue
+            queries.append(report_node_query(node, d, report=report))
+        return DeferredList(queries, consumeErrors=True)
+
+    d = maybeDeferred(
+        get_chassis_power_states,
+        nodes[0]["power_type"],
+        {node["system_id"]: node["context"] for node in nodes},
+    )
+    return d.addBoth(fan_out)
+
+
+def group_by_chassis(nodes):
+    """Group `nodes` into those to query together.
+
+    Nodes are grouped by power type and `PowerDriverBase.chassis_key`, so
+    that a chassis is logged in to once for all of the nodes behind it.
+    Only drivers that set `can_query_chassis` are grouped. Nodes of unknown
+    power types are left out.
+
+    :return: An iterable of lists of nodes.
+    """
+    chassis = {}
+    for node in nodes:
+        power_driver = PowerDriverRegistry.get_item(node["power_type"])
+        if power_driver is None:
+            continue
+        elif not power_driver.can_query_chassis:
+            key = None
+        elif node["system_id"] in power_action_registry:
+            key = None  # query_node() will skip it.
+        else:
+            key = power_driver.chassis_key(node["context"])
+        if key is None:
+            yield [node]
+        else:
+            chassis.setdefault((node["power_type"], key), []).append(node)
+    yield from chassis.values()
+
+
+def query_all_nodes(nodes, max_concurrency=5, clock=reactor, semaphores=None):
+    """Queries the given nodes for their power state.
+
+    At most `max_concurrency` nodes of each power type are queried at once,
+    so that slow BMCs of one type do not hold up the others. Nodes behind
+    the same chassis are queried together, taking one of those places; see
+    `group_by_chassis`. Nodes' states are reported back to the region
+    together once all have been queried.
+
+    :param max_concurrency: The number of concurrent queries for each power
+        type, or a dict of these keyed by power type. Power types missing
+        from the dict are limited to 5.
+    :param semaphores: A dict of `DeferredSemaphore`, keyed by power type,
+        which limit the concurrent queries. Pass the same dict to several
+        calls to limit their queries together. Missing semaphores are added.
     :return: A deferred, which fires once all nodes have been queried,
-        successfully or not.
+        successfully or not, and their states reported.
     """
-    semaphore = DeferredSemaphore(tokens=max_concurrency)
+    if semaphores is None:
+        semaphores = {}
+    power_states = []
+    timer = reactor if clock is None else clock
+    queued_at = timer.seconds()
+
+    def get_semaphore(power_type):
+        if power_type not in semaphores:
+            if isinstance(max_concurrency, dict):
+                tokens = max_concurrency.get(power_type, 5)
+            else:
+                tokens = max_concurrency
+            semaphores[power_type] = DeferredSemaphore(tokens)
+        return semaphores[power_type]
+
+    def report(system_id, state):
+        power_states.append({"system_id": system_id, "power_state": state})
+        return succeed(None)
+
+    def query(nodes):
+        PROMETHEUS_METRICS.update(
+            "maas_power_query_queue_lag",
+            "observe",
+            value=timer.seconds() - queued_at,
+            labels={"power_type": nodes[0]["power_type"]},
+        )
+        if len(nodes) == 1:
+            return query_node(nodes[0], clock, report=report)
+        else:
+            return query_chassis_nodes(nodes, clock, report=report)
+
+    def report_all(results):
+        if len(power_states) == 0:
+            return results
+        d = power_states_update(power_states)
+        d.addErrback(log.err, "Failed to report nodes' power states.")
+        d.addCallback(lambda _: results)
+        return d
+
     queries = (
-        semaphore.run(query_node, node, clock)
-        for node in nodes
-        if node["power_type"] in PowerDriverRegistry
+        get_semaphore(chassis[0]["power_type"]).run(query, chassis)
+        for chassis in group_by_chassis(nodes)
     )
-    return DeferredList(queries, consumeErrors=True)
+    d = DeferredList(queries, consumeErrors=True)
+    d.addCallback(report_all)
+    return d
@@ -12,6 +12,7 @@ __all__ = [
     "CreateNode",
     "GetArchiveMirrors",
     "GetBootConfig",
+    "GetBootImagePeers",
     "GetBootSources",
     "GetBootSourcesV2",
     "GetControllerType",
@@ -31,9 +32,11 @@ __all__ = [
     "RequestNodeInfoByMACAddress",
     "SendEvent",
     "SendEventMACAddress",
+    "SendIPAddressEvents",
     "UpdateInterfaces",
     "UpdateLastImageSync",
     "UpdateNodePowerState",
+    "UpdateNodePowerStates",
 ]
 
 from twisted.protocols import amp
@@ -41,7 +44,9 @@ from twisted.protocols import amp
 from provisioningserver.rpc.arguments import (
     AmpList,
     Bytes,
+    CompressedAmpList,
     ParsedURL,
+    Streamed,
     StructureAsJSON,
 )
 from provisioningserver.rpc.common import Authenticate, Identify
@@ -69,7 +74,7 @@ class RegisterRackController(amp.Command):
     arguments = [
         (b"system_id", amp.Unicode(optional=True)),
         (b"hostname", amp.Unicode()),
-        (b"interfaces", StructureAsJSON()),
+        (b"interfaces", Streamed(StructureAsJSON())),
         # The URL for the region as seen by the rack controller.
         (b"url", ParsedURL(optional=True)),
         # The old nodegroup UUID.
@@ -232,6 +237,21 @@ class GetBootSourcesV2(amp.Command):
     errors = []
 
 
+class GetBootImagePeers(amp.Command):
+    """Get the addresses of the rack controllers that a rack controller can
+    download boot images from instead of the region.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        # A rack controller's system_id.
+        (b"system_id", amp.Unicode())
+    ]
+    response = [(b"peers", amp.ListOf(amp.Unicode()))]
+    errors = {NoSuchNode: b"NoSuchNode"}
+
+
 class GetArchiveMirrors(amp.Command):
     """Return the Main and Port mirrors to use.
 
@@ -293,21 +313,27 @@ class ListNodePowerParameters(amp.Command):
 
     arguments = [
         # The cluster UUID.
-        (b"uuid", amp.Unicode())
+        (b"uuid", amp.Unicode()),
+        # Whether the rack controller can fetch streamed values. Those that
+        # can't, before 2.9, get only as many nodes as fit into a single AMP
+        # value.
+        (b"streaming", amp.Boolean(optional=True)),
     ]
     response = [
         (
             b"nodes",
-            AmpList(
-                [
-                    (b"system_id", amp.Unicode()),
-                    (b"hostname", amp.Unicode()),
-                    (b"power_state", amp.Unicode()),
-                    (b"power_type", amp.Unicode()),
-                    # We can't define a tighter schema here because this is a highly
-                    # variable bag of arguments from a variety of sources.
-                    (b"context", StructureAsJSON()),
-                ]
+            Streamed(
+                AmpList(
+                    [
+                        (b"system_id", amp.Unicode()),
+                        (b"hostname", amp.Unicode()),
+                        (b"power_state", amp.Unicode()),
+                        (b"power_type", amp.Unicode()),
+                        # We can't define a tighter schema here because this is a highly
+                        # variable bag of arguments from a variety of sources.
+                        (b"context", StructureAsJSON()),
+                    ]
+                )
             ),
         )
     ]
@@ -344,6 +370,31 @@ class UpdateNodePowerState(amp.Command):
     errors = {NoSuchNode: b"NoSuchNode"}
 
 
+class UpdateNodePowerStates(amp.Command):
+    """Update many nodes' power states at once.
+
+    Nodes that no longer exist are ignored.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        (
+            b"power_states",
+            AmpList(
+                [
+                    # The node's system_id.
+                    (b"system_id", amp.Unicode()),
+                    # The node's power_state.
+                    (b"power_state", amp.Unicode()),
+                ]
+            ),
+        )
+    ]
+    response = []
+    errors = []
+
+
 class RegisterEventType(amp.Command):
     """Register an event type.
 
@@ -416,6 +467,32 @@ class SendEventIPAddress(amp.Command):
     errors = {NoSuchNode: b"NoSuchNode", NoSuchEventType: b"NoSuchEventType"}
 
 
+class SendIPAddressEvents(amp.Command):
+    """Send many events by IP address at once.
+
+    Events are recorded against the node with the given IP address; those
+    for unknown IP addresses or event types are discarded.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        (
+            b"events",
+            CompressedAmpList(
+                [
+                    (b"ip_address", amp.Unicode()),
+                    (b"type_name", amp.Unicode()),
+                    (b"description", amp.Unicode()),
+                    (b"timestamp", amp.Float()),
+                ]
+            ),
+        )
+    ]
+    response = []
+    errors = []
+
+
 class ReportForeignDHCPServer(amp.Command):
     """Report a foreign DHCP server on a rack controller's interface.
 
@@ -493,7 +570,7 @@ class UpdateInterfaces(amp.Command):
 
     arguments = [
         (b"system_id", amp.Unicode()),
-        (b"interfaces", StructureAsJSON()),
+        (b"interfaces", Streamed(StructureAsJSON())),
         (b"topology_hints", StructureAsJSON(optional=True)),
     ]
     response = []
@@ -552,6 +629,37 @@ class UpdateLease(amp.Command):
     errors = {NoSuchCluster: b"NoSuchCluster"}
 
 
+class UpdateLeases(amp.Command):
+    """Report many DHCP lease updates from a cluster controller at once.
+
+    The updates are processed in order, in a single transaction. Different
+    from `UpdateLease` as a lease that cannot be processed is skipped
+    rather than failing the call.
+
+    :since: 2.9
+    """
+
+    arguments = [
+        (b"cluster_uuid", amp.Unicode()),
+        (
+            b"updates",
+            CompressedAmpList(
+                [
+                    (b"action", amp.Unicode()),
+                    (b"mac", amp.Unicode()),
+                    (b"ip_family", amp.Unicode()),
+                    (b"ip", amp.Unicode()),
+                    (b"timestamp", amp.Integer()),
+                    (b"lease_time", amp.Integer(optional=True)),
+                    (b"hostname", amp.Unicode(optional=True)),
+                ]
+            ),
+        ),
+    ]
+    response = []
+    errors = {NoSuchCluster: b"NoSuchCluster"}
+
+
 class UpdateServices(amp.Command):
     """Report service statuses that are monitored on the rackd.
 
@@ -154,6 +154,29 @@ class TestCompressedAmpList(MAASTestCase):
         self.expectThat(len(encoded_compressed), LessThan(2 ** 16))
 
 
+class TestStreamed(MAASTestCase):
+    def test_round_trip(self):
+        argument = arguments.Streamed(arguments.StructureAsJSON())
+        example = {"thing": factory.make_name("thing")}
+        strings = amp.AmpBox()
+        argument.toBox(b"thing", strings, {"thing": example}, proto=None)
+        self.assertEqual([b"thing"], list(strings))
+        objects = {}
+        argument.fromBox(b"thing", strings, objects, proto=None)
+        self.assertEqual({"thing": example}, objects)
+
+    def test_marks_values_too_big_for_one_box_as_streamed(self):
+        argument = arguments.Streamed(arguments.Bytes())
+        example = factory.make_bytes(amp.MAX_VALUE_LENGTH + 1)
+        strings = amp.AmpBox()
+        argument.toBox(b"thing", strings, {"thing": example}, proto=None)
+        self.assertEqual({b"thing": example, b"thing.stream": b""}, strings)
+        # The value still decodes, e.g. when it was never on the wire.
+        objects = {}
+        argument.fromBox(b"thing", strings, objects, proto=None)
+        self.assertEqual({"thing": example}, objects)
+
+
 class TestIPAddress(MAASTestCase):
 
     argument = arguments.IPAddress()
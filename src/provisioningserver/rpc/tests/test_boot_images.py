@@ -12,8 +12,9 @@ from urllib.parse import urlparse
 
 from testtools.matchers import Equals, Is
 from twisted.internet import defer
-from twisted.internet.defer import inlineCallbacks, succeed
+from twisted.internet.defer import fail, inlineCallbacks, succeed
 from twisted.internet.task import Clock
+from twisted.protocols.amp import UnhandledCommand
 
 from maastesting.factory import factory
 from maastesting.matchers import MockCalledOnceWith, MockNotCalled
@@ -25,6 +26,7 @@ from provisioningserver.rpc import boot_images, region
 from provisioningserver.rpc.boot_images import (
     _run_import,
     fix_sources_for_cluster,
+    get_boot_image_peers,
     get_hosts_from_sources,
     import_boot_images,
     is_import_boot_images_running,
@@ -245,7 +247,33 @@ class TestRunImport(MAASTestCase):
         fake = self.patch(boot_resources, "import_images")
         sources, _ = make_sources()
         _run_import(sources=sources, maas_url=factory.make_simple_http_url())
-        self.assertThat(fake, MockCalledOnceWith(sources))
+        self.assertThat(fake, MockCalledOnceWith(sources, peer_urls=[]))
+
+    def test_run_import_passes_peer_urls(self):
+        fake = self.patch(boot_resources, "import_images")
+        sources, _ = make_sources()
+        peer = factory.make_ipv4_address()
+        _run_import(
+            sources=sources,
+            maas_url=factory.make_simple_http_url(),
+            peers=[peer],
+        )
+        self.assertThat(
+            fake,
+            MockCalledOnceWith(
+                sources, peer_urls=["http://%s:5248/images-cache/" % peer]
+            ),
+        )
+
+    def test_run_import_sets_proxy_for_peers(self):
+        peers = [factory.make_ipv4_address(), factory.make_ipv6_address()]
+        fake = self.patch_boot_resources_function()
+        _run_import(
+            sources=[], maas_url=factory.make_simple_http_url(), peers=peers
+        )
+        no_proxy = fake.env["no_proxy"].split(",")
+        self.assertIn(peers[0], no_proxy)
+        self.assertIn("[%s]" % peers[1], no_proxy)
 
     def test_run_import_calls_reload_boot_images(self):
         fake_reload = self.patch(boot_images, "reload_boot_images")
@@ -261,6 +289,9 @@ class TestImportBootImages(MAASTestCase):
 
     @defer.inlineCallbacks
     def test_add_to_waiting_if_lock_already_held(self):
+        self.patch(boot_images, "get_boot_image_peers").return_value = succeed(
+            [sentinel.peer]
+        )
         yield concurrency.boot_images.acquire()
         deferToThread = self.patch(boot_images, "deferToThread")
         deferToThread.return_value = defer.succeed(None)
@@ -277,11 +308,15 @@ class TestImportBootImages(MAASTestCase):
                 maas_url,
                 http_proxy=None,
                 https_proxy=None,
+                peers=[sentinel.peer],
             ),
         )
 
     @defer.inlineCallbacks
     def test_never_more_than_one_waiting(self):
+        self.patch(boot_images, "get_boot_image_peers").return_value = succeed(
+            [sentinel.peer]
+        )
         yield concurrency.boot_images.acquire()
         deferToThread = self.patch(boot_images, "deferToThread")
         deferToThread.return_value = defer.succeed(None)
@@ -299,6 +334,7 @@ class TestImportBootImages(MAASTestCase):
                 maas_url,
                 http_proxy=None,
                 https_proxy=None,
+                peers=[sentinel.peer],
             ),
         )
 
@@ -317,6 +353,9 @@ class TestImportBootImages(MAASTestCase):
 
     @inlineCallbacks
     def test_update_last_image_sync(self):
+        self.patch(boot_images, "get_boot_image_peers").return_value = succeed(
+            [sentinel.peer]
+        )
         get_maas_id = self.patch(boot_images, "get_maas_id")
         get_maas_id.return_value = factory.make_string()
         getRegionClient = self.patch(boot_images, "getRegionClient")
@@ -326,7 +365,9 @@ class TestImportBootImages(MAASTestCase):
         yield boot_images._import_boot_images(sentinel.sources, maas_url)
         self.assertThat(
             _run_import,
-            MockCalledOnceWith(sentinel.sources, maas_url, None, None),
+            MockCalledOnceWith(
+                sentinel.sources, maas_url, None, None, peers=[sentinel.peer]
+            ),
         )
         self.assertThat(getRegionClient, MockCalledOnceWith())
         self.assertThat(get_maas_id, MockCalledOnceWith())
@@ -338,6 +379,9 @@ class TestImportBootImages(MAASTestCase):
 
     @inlineCallbacks
     def test_update_last_image_sync_always_updated(self):
+        self.patch(boot_images, "get_boot_image_peers").return_value = succeed(
+            [sentinel.peer]
+        )
         get_maas_id = self.patch(boot_images, "get_maas_id")
         get_maas_id.return_value = factory.make_string()
         getRegionClient = self.patch(boot_images, "getRegionClient")
@@ -347,7 +391,9 @@ class TestImportBootImages(MAASTestCase):
         yield boot_images._import_boot_images(sentinel.sources, maas_url)
         self.assertThat(
             _run_import,
-            MockCalledOnceWith(sentinel.sources, maas_url, None, None),
+            MockCalledOnceWith(
+                sentinel.sources, maas_url, None, None, peers=[sentinel.peer]
+            ),
         )
         self.assertThat(getRegionClient, MockCalledOnceWith())
         self.assertThat(get_maas_id, MockCalledOnceWith())
@@ -363,8 +409,9 @@ class TestImportBootImages(MAASTestCase):
         get_maas_id.return_value = factory.make_string()
         fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
         protocol, connecting = fixture.makeEventLoop(
-            region.UpdateLastImageSync
+            region.GetBootImagePeers, region.UpdateLastImageSync
         )
+        protocol.GetBootImagePeers.return_value = succeed({"peers": []})
         protocol.UpdateLastImageSync.return_value = succeed({})
         self.addCleanup((yield connecting))
         self.patch_autospec(boot_resources, "import_images")
@@ -374,7 +421,9 @@ class TestImportBootImages(MAASTestCase):
         yield boot_images.import_boot_images(sources, maas_url)
         self.assertThat(
             boot_resources.import_images,
-            MockCalledOnceWith(fix_sources_for_cluster(sources, maas_url)),
+            MockCalledOnceWith(
+                fix_sources_for_cluster(sources, maas_url), peer_urls=[]
+            ),
         )
         self.assertThat(
             protocol.UpdateLastImageSync,
@@ -385,8 +434,9 @@ class TestImportBootImages(MAASTestCase):
     def test_update_last_image_sync_end_to_end_import_not_performed(self):
         fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
         protocol, connecting = fixture.makeEventLoop(
-            region.UpdateLastImageSync
+            region.GetBootImagePeers, region.UpdateLastImageSync
         )
+        protocol.GetBootImagePeers.return_value = succeed({"peers": []})
         protocol.UpdateLastImageSync.return_value = succeed({})
         self.addCleanup((yield connecting))
         self.patch_autospec(boot_resources, "import_images")
@@ -396,11 +446,47 @@ class TestImportBootImages(MAASTestCase):
         yield boot_images.import_boot_images(sources, maas_url)
         self.assertThat(
             boot_resources.import_images,
-            MockCalledOnceWith(fix_sources_for_cluster(sources, maas_url)),
+            MockCalledOnceWith(
+                fix_sources_for_cluster(sources, maas_url), peer_urls=[]
+            ),
         )
         self.assertThat(protocol.UpdateLastImageSync, MockNotCalled())
 
 
+class TestGetBootImagePeers(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    @inlineCallbacks
+    def test_returns_peers_from_region(self):
+        get_maas_id = self.patch(boot_images, "get_maas_id")
+        get_maas_id.return_value = factory.make_string()
+        peers = [factory.make_ipv4_address(), factory.make_ipv6_address()]
+        fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
+        protocol, connecting = fixture.makeEventLoop(region.GetBootImagePeers)
+        protocol.GetBootImagePeers.return_value = succeed({"peers": peers})
+        self.addCleanup((yield connecting))
+        observed = yield get_boot_image_peers()
+        self.assertEqual(peers, observed)
+        self.assertThat(
+            protocol.GetBootImagePeers,
+            MockCalledOnceWith(protocol, system_id=get_maas_id()),
+        )
+
+    @inlineCallbacks
+    def test_returns_no_peers_without_region(self):
+        observed = yield get_boot_image_peers()
+        self.assertEqual([], observed)
+
+    @inlineCallbacks
+    def test_returns_no_peers_when_region_is_too_old(self):
+        self.patch(boot_images, "get_maas_id")
+        getRegionClient = self.patch(boot_images, "getRegionClient")
+        getRegionClient.return_value.return_value = fail(UnhandledCommand())
+        observed = yield get_boot_image_peers()
+        self.assertEqual([], observed)
+
+
 class TestIsImportBootImagesRunning(MAASTestCase):
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
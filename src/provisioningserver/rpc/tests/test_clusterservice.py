@@ -503,6 +503,17 @@ class TestClusterClientService(MAASTestCase):
         self.assertThat(service, IsInstance(TimerService))
         self.assertThat(service.clock, Is(sentinel.reactor))
 
+    @inlineCallbacks
+    def test_stopService_shuts_down_tag_evaluation_processes(self):
+        shutdown = self.patch(
+            clusterservice.tags.evaluation_processes, "shutdown"
+        )
+        service = ClusterClientService(Clock())
+        self.patch(service, "_tryUpdate").return_value = succeed(None)
+        service.startService()
+        yield service.stopService()
+        self.assertThat(shutdown, MockCalledOnceWith())
+
     def test_get_config_rpc_info_urls(self):
         maas_urls = [factory.make_simple_http_url() for _ in range(3)]
         self.useFixture(ClusterConfigurationFixture(maas_url=maas_urls))
@@ -1516,6 +1527,13 @@ class TestClusterClient(MAASTestCase):
             client.service.connections, {client.eventloop: client}
         )
 
+    def test_remoteAuthenticated_waits_for_authentication(self):
+        client = self.make_running_client()
+        wait_for_authenticated = client.remoteAuthenticated()
+        self.assertThat(wait_for_authenticated, IsUnfiredDeferred())
+        client.authenticated.set(True)
+        self.assertIs(True, extract_result(wait_for_authenticated))
+
     def test_disconnects_when_there_is_an_existing_connection(self):
         client = self.make_running_client()
 
@@ -2746,6 +2764,99 @@ class TestClusterProtocol_ConfigureDHCP(MAASTestCase):
             )
 
 
+class TestClusterProtocol_UpdateDHCPHosts(MAASTestCase):
+
+    scenarios = (
+        (
+            "DHCPv4",
+            {
+                "dhcp_server": (dhcp, "DHCPv4Server"),
+                "command": cluster.UpdateDHCPv4Hosts,
+                "concurrency_lock": concurrency.dhcpv4,
+            },
+        ),
+        (
+            "DHCPv6",
+            {
+                "dhcp_server": (dhcp, "DHCPv6Server"),
+                "command": cluster.UpdateDHCPv6Hosts,
+                "concurrency_lock": concurrency.dhcpv6,
+            },
+        ),
+    )
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def test_is_registered(self):
+        self.assertIsNotNone(
+            Cluster().locateResponder(self.command.commandName)
+        )
+
+    @inlineCallbacks
+    def test_executes_update_hosts(self):
+        DHCPServer = self.patch_autospec(*self.dhcp_server)
+        update_hosts = self.patch_autospec(dhcp, "update_hosts")
+
+        omapi_key = factory.make_name("key")
+        hosts = [make_host()]
+        removed_macs = [factory.make_mac_address()]
+
+        yield call_responder(
+            Cluster(),
+            self.command,
+            {
+                "omapi_key": omapi_key,
+                "hosts": hosts,
+                "removed_macs": removed_macs,
+            },
+        )
+
+        self.assertThat(DHCPServer, MockCalledOnceWith(omapi_key))
+        self.assertThat(
+            update_hosts,
+            MockCalledOnceWith(DHCPServer.return_value, hosts, removed_macs),
+        )
+
+    @inlineCallbacks
+    def test_limits_concurrency(self):
+        self.patch_autospec(*self.dhcp_server)
+
+        def check_dhcp_locked(server, hosts, removed_macs):
+            self.assertTrue(self.concurrency_lock.locked)
+
+        self.patch(dhcp, "update_hosts", check_dhcp_locked)
+
+        self.assertFalse(self.concurrency_lock.locked)
+        yield call_responder(
+            Cluster(),
+            self.command,
+            {
+                "omapi_key": factory.make_name("key"),
+                "hosts": [],
+                "removed_macs": [],
+            },
+        )
+        self.assertFalse(self.concurrency_lock.locked)
+
+    @inlineCallbacks
+    def test_propagates_CannotConfigureDHCP(self):
+        update_hosts = self.patch_autospec(dhcp, "update_hosts")
+        update_hosts.side_effect = exceptions.CannotConfigureDHCP(
+            "Deliberate failure"
+        )
+
+        with ExpectedException(exceptions.CannotConfigureDHCP):
+            yield call_responder(
+                Cluster(),
+                self.command,
+                {
+                    "omapi_key": factory.make_name("key"),
+                    "hosts": [make_host()],
+                    "removed_macs": [],
+                },
+            )
+
+
 class TestClusterProtocol_ValidateDHCP(MAASTestCase):
 
     scenarios = (
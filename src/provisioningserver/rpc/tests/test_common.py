@@ -10,10 +10,12 @@ import re
 from unittest.mock import ANY, sentinel
 
 from testtools import ExpectedException
-from testtools.matchers import Equals, Is, IsInstance, Not
-from twisted.internet.defer import Deferred
+from testtools.matchers import Equals, HasLength, Is, IsInstance, Not
+from twisted.internet.defer import Deferred, succeed
 from twisted.internet.protocol import connectionDone
+from twisted.internet.task import Clock
 from twisted.protocols import amp
+from twisted.test import iosim
 from twisted.test.proto_helpers import StringTransport
 
 from maastesting.factory import factory
@@ -21,6 +23,7 @@ from maastesting.matchers import (
     IsFiredDeferred,
     IsUnfiredDeferred,
     MockCalledOnceWith,
+    MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import (
@@ -30,6 +33,8 @@ from maastesting.twisted import (
 )
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.rpc import common
+from provisioningserver.rpc.arguments import Bytes, Streamed
+from provisioningserver.rpc.exceptions import BadStream, NoSuchStream
 from provisioningserver.rpc.testing.doubles import (
     DummyConnection,
     FakeConnection,
@@ -328,6 +333,189 @@ class TestRPCProtocol_UnhandledErrorsWhenHandlingCommands(MAASTestCase):
         self.assertThat(observed_boxes_sent, Equals(expected_boxes_sent))
 
 
+class Echo(amp.Command):
+    arguments = [(b"data", Streamed(Bytes()))]
+    response = [(b"data", Streamed(Bytes()))]
+
+
+class EchoProtocol(common.RPCProtocol):
+    @Echo.responder
+    def echo(self, data):
+        return {"data": data}
+
+
+class TestRPCProtocol_Streams(MAASTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch(common.log, "debug")
+
+    def connect(self):
+        client, server = common.RPCProtocol(), EchoProtocol()
+        client.clock, server.clock = Clock(), Clock()
+        pump = iosim.connect(
+            server,
+            iosim.makeFakeServer(server),
+            client,
+            iosim.makeFakeClient(client),
+            debug=False,
+        )
+        return client, server, pump
+
+    def test_sends_small_values_in_one_box(self):
+        client, server, pump = self.connect()
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH)
+        d = client.callRemote(Echo, data=data)
+        pump.flush()
+        self.assertEqual({"data": data}, extract_result(d))
+        self.assertEqual(1, next(client._streamIDs))
+        self.assertEqual(1, next(server._streamIDs))
+
+    def test_streams_big_values_in_commands_and_answers(self):
+        client, server, pump = self.connect()
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH * 3 + 1)
+        d = client.callRemote(Echo, data=data)
+        pump.flush()
+        self.assertEqual({"data": data}, extract_result(d))
+        # Both sides have given up their streams once they've been fetched.
+        self.assertEqual({}, client._streams)
+        self.assertEqual({}, server._streams)
+
+    def test_request_fails_when_answer_stream_is_gone(self):
+        client, server, pump = self.connect()
+        startStreams = server._startStreams
+
+        def startStreamsThenForget(box):
+            startStreams(box)
+            server._streams.clear()
+
+        self.patch(server, "_startStreams", startStreamsThenForget)
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH * 2)
+        d = client.callRemote(Echo, data=data)
+        failures = []
+        d.addErrback(failures.append)
+        pump.flush()
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(NoSuchStream))
+
+    def test_startStreams_keeps_back_the_rest_of_the_value(self):
+        protocol = common.RPCProtocol()
+        protocol.clock = Clock()
+        data = factory.make_bytes(amp.MAX_VALUE_LENGTH * 2)
+        box = amp.AmpBox(data=data)
+        box[b"data.stream"] = b""
+        protocol._startStreams(box)
+        self.assertEqual(
+            amp.AmpBox(
+                {
+                    b"data": data[: amp.MAX_VALUE_LENGTH],
+                    b"data.stream": b"1 %d" % len(data),
+                }
+            ),
+            box,
+        )
+        self.assertEqual([1], list(protocol._streams))
+
+    def test_streams_expire(self):
+        protocol = common.RPCProtocol()
+        protocol.clock = Clock()
+        box = amp.AmpBox(data=factory.make_bytes(amp.MAX_VALUE_LENGTH * 2))
+        box[b"data.stream"] = b""
+        protocol._startStreams(box)
+        protocol.clock.advance(protocol.streamTimeout)
+        self.assertEqual({}, protocol._streams)
+        self.assertRaises(NoSuchStream, protocol.fetchStreamChunk, 1, 0)
+
+    def test_streams_are_dropped_when_connection_is_lost(self):
+        protocol = common.RPCProtocol()
+        protocol.clock = Clock()
+        protocol.makeConnection(StringTransport())
+        box = amp.AmpBox(data=factory.make_bytes(amp.MAX_VALUE_LENGTH * 2))
+        box[b"data.stream"] = b""
+        protocol._startStreams(box)
+        protocol.connectionLost(connectionDone)
+        self.assertEqual({}, protocol._streams)
+        self.assertEqual([], protocol.clock.getDelayedCalls())
+
+    def make_streamed_box(self, data, length, name=b"data"):
+        box = amp.AmpBox({name: data})
+        box[name + b".stream"] = b"1 %d" % length
+        return box
+
+    def receive_streams(self, protocol, box, names=frozenset([b"data"])):
+        failures = []
+        d = protocol._receiveStreams(box, names)
+        d.addErrback(failures.append)
+        return failures
+
+    def test_notes_values_streamed_in_answers(self):
+        client, server, pump = self.connect()
+        client.callRemote(Echo, data=b"")
+        self.assertEqual({b"1": frozenset([b"data"])}, client._answerStreams)
+        pump.flush()
+        self.assertEqual({}, client._answerStreams)
+
+    def test_refuses_values_not_declared_as_streamed(self):
+        protocol = common.RPCProtocol()
+        box = self.make_streamed_box(b"x", 2, name=b"other")
+        failures = self.receive_streams(protocol, box)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+
+    def test_refuses_streams_longer_than_maxStreamLength(self):
+        protocol = common.RPCProtocol()
+        protocol.maxStreamLength = 10
+        callRemote = self.patch(protocol, "callRemote")
+        box = self.make_streamed_box(b"x", 11)
+        failures = self.receive_streams(protocol, box)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+        self.assertThat(callRemote, MockNotCalled())
+
+    def test_fails_when_a_stream_ends_early(self):
+        protocol = common.RPCProtocol()
+        callRemote = self.patch(protocol, "callRemote")
+        callRemote.return_value = succeed({"data": b""})
+        box = self.make_streamed_box(b"x", 2)
+        failures = self.receive_streams(protocol, box)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+        self.assertThat(
+            callRemote,
+            MockCalledOnceWith(common.FetchStreamChunk, stream=1, offset=1),
+        )
+
+    def test_fails_when_a_stream_goes_past_its_length(self):
+        protocol = common.RPCProtocol()
+        callRemote = self.patch(protocol, "callRemote")
+        callRemote.return_value = succeed({"data": b"yz"})
+        box = self.make_streamed_box(b"x", 2)
+        failures = self.receive_streams(protocol, box)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+
+    def test_refuses_streams_in_commands_that_do_not_declare_them(self):
+        protocol = EchoProtocol()
+        box = self.make_streamed_box(b"x", 2, name=b"other")
+        box[amp.COMMAND] = Echo.commandName
+        failures = []
+        protocol._receiveCommandStreams(box).addErrback(failures.append)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+
+    def test_refuses_streams_in_commands_before_authentication(self):
+        protocol = EchoProtocol()
+        remoteAuthenticated = self.patch(protocol, "remoteAuthenticated")
+        remoteAuthenticated.return_value = succeed(False)
+        callRemote = self.patch(protocol, "callRemote")
+        box = self.make_streamed_box(b"x", 2)
+        box[amp.COMMAND] = Echo.commandName
+        failures = []
+        protocol._receiveCommandStreams(box).addErrback(failures.append)
+        self.assertThat(failures, HasLength(1))
+        self.assertIsNotNone(failures[0].check(BadStream))
+        self.assertThat(callRemote, MockNotCalled())
+
+
 class TestMakeCommandRef(MAASTestCase):
     """Tests for `common.make_command_ref`."""
 
@@ -11,6 +11,7 @@ from unittest.mock import ANY, call, Mock, sentinel
 
 from fixtures import FakeLogger
 from testtools import ExpectedException
+from netaddr import IPAddress
 from testtools.matchers import MatchesStructure
 from twisted.internet.defer import inlineCallbacks
 
@@ -21,6 +22,12 @@ from maastesting.matchers import (
     MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
+from provisioningserver.dhcp.omapi import (
+    OmapiClient,
+    OmapiConnectionError,
+    OmapiError,
+)
+from provisioningserver.dhcp.omshell import generate_omapi_key
 from provisioningserver.dhcp.testing.config import (
     DHCPConfigNameResolutionDisabled,
     fix_shared_networks_failover,
@@ -32,6 +39,7 @@ from provisioningserver.dhcp.testing.config import (
     make_shared_network,
     make_subnet_dhcp_snippets,
 )
+from provisioningserver.dhcp.testing.omapi import FakeOmapiServer
 from provisioningserver.rpc import dhcp, exceptions
 from provisioningserver.utils.service_monitor import (
     SERVICE_STATE,
@@ -435,48 +443,46 @@ class TestDHCPState(MAASTestCase):
 
 
 class TestRemoveHostMap(MAASTestCase):
-    def test_calls_omshell_remove(self):
-        omshell = Mock()
+    def test_calls_omapi_remove(self):
+        omapi = Mock()
         mac = factory.make_mac_address()
-        dhcp._remove_host_map(omshell, mac)
-        self.assertThat(omshell.remove, MockCalledOnceWith(mac))
+        dhcp._remove_host_map(omapi, mac)
+        self.assertThat(omapi.remove, MockCalledOnceWith(mac))
 
-    def test_raises_error_when_omshell_crashes(self):
-        error_message = factory.make_name("error").encode("ascii")
-        omshell = Mock()
-        omshell.remove.side_effect = ExternalProcessError(
-            returncode=2, cmd=("omshell",), output=error_message
-        )
+    def test_raises_error_when_omapi_fails(self):
+        error_message = factory.make_name("error")
+        omapi = Mock()
+        omapi.remove.side_effect = OmapiError(error_message)
         mac = factory.make_mac_address()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
                 exceptions.CannotRemoveHostMap,
                 dhcp._remove_host_map,
-                omshell,
+                omapi,
                 mac,
             )
         # The CannotRemoveHostMap exception includes a message describing the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not remove host map for %s: ..." % mac, str(error)
+            "Could not remove host map for %s: %s" % (mac, error_message),
+            str(error),
         )
         # A message is also written to the maas.dhcp logger that describes the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not remove host map for %s: ..." % mac, logger.output
+            "Could not remove host map for %s: %s" % (mac, error_message),
+            logger.output,
         )
 
-    def test_raises_error_when_omshell_not_connected(self):
-        error = ExternalProcessError(returncode=2, cmd=("omshell",), output="")
-        self.patch(ExternalProcessError, "output_as_unicode", "not connected.")
-        omshell = Mock()
-        omshell.remove.side_effect = error
+    def test_raises_error_when_omapi_not_connected(self):
+        omapi = Mock()
+        omapi.remove.side_effect = OmapiConnectionError()
         mac = factory.make_mac_address()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
                 exceptions.CannotRemoveHostMap,
                 dhcp._remove_host_map,
-                omshell,
+                omapi,
                 mac,
             )
         # The CannotCreateHostMap exception includes a message describing the
@@ -496,54 +502,52 @@ class TestRemoveHostMap(MAASTestCase):
 
 
 class TestCreateHostMap(MAASTestCase):
-    def test_calls_omshell_create(self):
-        omshell = Mock()
+    def test_calls_omapi_create(self):
+        omapi = Mock()
         mac = factory.make_mac_address()
         ip = factory.make_ip_address()
-        dhcp._create_host_map(omshell, mac, ip)
-        self.assertThat(omshell.create, MockCalledOnceWith(ip, mac))
+        dhcp._create_host_map(omapi, mac, ip)
+        self.assertThat(omapi.create, MockCalledOnceWith(ip, mac))
 
-    def test_raises_error_when_omshell_crashes(self):
-        error_message = factory.make_name("error").encode("ascii")
-        omshell = Mock()
-        omshell.create.side_effect = ExternalProcessError(
-            returncode=2, cmd=("omshell",), output=error_message
-        )
+    def test_raises_error_when_omapi_fails(self):
+        error_message = factory.make_name("error")
+        omapi = Mock()
+        omapi.create.side_effect = OmapiError(error_message)
         mac = factory.make_mac_address()
         ip = factory.make_ip_address()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
                 exceptions.CannotCreateHostMap,
                 dhcp._create_host_map,
-                omshell,
+                omapi,
                 mac,
                 ip,
             )
         # The CannotCreateHostMap exception includes a message describing the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not create host map for %s -> %s: ..." % (mac, ip),
+            "Could not create host map for %s -> %s: %s"
+            % (mac, ip, error_message),
             str(error),
         )
         # A message is also written to the maas.dhcp logger that describes the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not create host map for %s -> %s: ..." % (mac, ip),
+            "Could not create host map for %s -> %s: %s"
+            % (mac, ip, error_message),
             logger.output,
         )
 
-    def test_raises_error_when_omshell_not_connected(self):
-        error = ExternalProcessError(returncode=2, cmd=("omshell",), output="")
-        self.patch(ExternalProcessError, "output_as_unicode", "not connected.")
-        omshell = Mock()
-        omshell.create.side_effect = error
+    def test_raises_error_when_omapi_not_connected(self):
+        omapi = Mock()
+        omapi.create.side_effect = OmapiConnectionError()
         mac = factory.make_mac_address()
         ip = factory.make_ip_address()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
                 exceptions.CannotCreateHostMap,
                 dhcp._create_host_map,
-                omshell,
+                omapi,
                 mac,
                 ip,
             )
@@ -564,13 +568,43 @@ class TestCreateHostMap(MAASTestCase):
 
 
 class TestUpdateHost(MAASTestCase):
-    def test_creates_omshell_with_correct_arguments(self):
-        omshell = self.patch(dhcp, "Omshell")
-        server = Mock()
-        server.ipv6 = factory.pick_bool()
+
+    scenarios = (
+        ("DHCPv4", {"server": dhcp.DHCPv4Server}),
+        ("DHCPv6", {"server": dhcp.DHCPv6Server}),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.omapi_key = generate_omapi_key()
+        self.omapi = self.useFixture(FakeOmapiServer(self.omapi_key))
+        self.patch(dhcp, "OmapiClient", self.make_client)
+
+    def make_client(self, **kwargs):
+        client = OmapiClient(**kwargs)
+        client.server_port = self.omapi.port
+        return client
+
+    def make_host(self):
+        return make_host(ipv6=self.server.ipv6, dhcp_snippets=[])
+
+    def get_host_ips(self):
+        return {
+            name.decode("ascii").replace("-", ":"): str(
+                IPAddress(
+                    int.from_bytes(host[b"ip-address"], "big"),
+                    6 if self.server.ipv6 else 4,
+                )
+            )
+            for name, host in self.omapi.hosts.items()
+        }
+
+    def test_creates_client_with_correct_arguments(self):
+        client = self.patch(dhcp, "OmapiClient")
+        server = self.server(self.omapi_key)
         dhcp._update_hosts(server, [], [], [])
         self.assertThat(
-            omshell,
+            client,
             MockCallsMatch(
                 call(
                     ipv6=server.ipv6,
@@ -580,26 +614,22 @@ class TestUpdateHost(MAASTestCase):
             ),
         )
 
-    def test_performs_operations(self):
-        omshell = Mock()
-        self.patch(dhcp, "Omshell").return_value = omshell
-        remove_host = make_host()
-        add_host = make_host()
-        modify_host = make_host()
-        server = Mock()
-        server.ipv6 = factory.pick_bool()
+    def test_performs_operations_over_one_connection(self):
+        remove_host, modify_host = self.make_host(), self.make_host()
+        server = self.server(self.omapi_key)
+        dhcp._update_hosts(server, [], [remove_host, modify_host], [])
+        modify_host["ip"] = factory.make_ip_address(ipv6=self.server.ipv6)
+        add_host = self.make_host()
         dhcp._update_hosts(server, [remove_host], [add_host], [modify_host])
-        self.assertThat(
-            omshell.remove, MockCallsMatch(call(remove_host["mac"]))
-        )
-        self.assertThat(
-            omshell.create,
-            MockCallsMatch(call(add_host["ip"], add_host["mac"])),
-        )
-        self.assertThat(
-            omshell.modify,
-            MockCallsMatch(call(modify_host["ip"], modify_host["mac"])),
+        self.assertEqual(
+            {
+                add_host["mac"]: add_host["ip"],
+                modify_host["mac"]: modify_host["ip"],
+            },
+            self.get_host_ips(),
         )
+        # One connection for each call.
+        self.assertEqual(2, self.omapi.connections)
 
 
 class TestConfigureDHCP(MAASTestCase):
@@ -1330,6 +1360,70 @@ class TestConfigureDHCP(MAASTestCase):
         )
 
 
+class TestUpdateHosts(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    scenarios = (
+        ("DHCPv4", {"server": dhcp.DHCPv4Server}),
+        ("DHCPv6", {"server": dhcp.DHCPv6Server}),
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(dhcp._current_server_state.clear)
+
+    def make_state(self, omapi_key, hosts):
+        failover_peers = make_failover_peer_config()
+        shared_network = make_shared_network()
+        [shared_network] = fix_shared_networks_failover(
+            [shared_network], [failover_peers]
+        )
+        return dhcp.DHCPState(
+            omapi_key,
+            [failover_peers],
+            [shared_network],
+            hosts,
+            [make_interface()],
+            make_global_dhcp_snippets(),
+        )
+
+    def test_raises_error_when_not_configured(self):
+        server = self.server(factory.make_name("key"))
+        apply_state = self.patch(dhcp, "_apply_state")
+        with ExpectedException(exceptions.CannotConfigureDHCP):
+            dhcp.update_hosts(server, [make_host()], [])
+        self.assertThat(apply_state, MockNotCalled())
+
+    def test_applies_changes_to_current_state(self):
+        omapi_key = factory.make_name("key")
+        server = self.server(omapi_key)
+        old_hosts = [make_host(dhcp_snippets=[]) for _ in range(3)]
+        old_state = self.make_state(omapi_key, old_hosts)
+        dhcp._current_server_state[server.dhcp_service] = old_state
+        apply_state = self.patch(dhcp, "_apply_state")
+
+        modified_host = copy.deepcopy(old_hosts[0])
+        modified_host["ip"] = factory.make_ip_address()
+        added_host = make_host(dhcp_snippets=[])
+        dhcp.update_hosts(
+            server, [modified_host, added_host], [old_hosts[1]["mac"]]
+        )
+
+        expected_state = dhcp.DHCPState(
+            omapi_key,
+            old_state.failover_peers,
+            old_state.shared_networks,
+            [modified_host, old_hosts[2], added_host],
+            [{"name": name} for name in old_state.interfaces],
+            old_state.global_dhcp_snippets,
+        )
+        self.assertThat(apply_state, MockCalledOnceWith(server, ANY))
+        [_, new_state] = apply_state.call_args[0]
+        self.assertEqual(expected_state, new_state)
+        self.assertFalse(new_state.requires_restart(old_state))
+
+
 class TestValidateDHCP(MAASTestCase):
 
     scenarios = (
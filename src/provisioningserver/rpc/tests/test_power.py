@@ -27,6 +27,7 @@ from twisted.python.failure import Failure
 
 from maastesting.factory import factory
 from maastesting.matchers import (
+    MockCalledOnce,
     MockCalledOnceWith,
     MockCalledWith,
     MockCallsMatch,
@@ -57,7 +58,7 @@ from provisioningserver.testing.events import EventTypesAllRegistered
 def suppress_reporting(test):
     # Skip telling the region; just pass-through the query result.
     report_power_state = test.patch(power, "report_power_state")
-    report_power_state.side_effect = lambda d, system_id, hostname: d
+    report_power_state.side_effect = lambda d, system_id, hostname, report: d
 
 
 class TestPowerHelpers(MAASTestCase):
@@ -90,6 +91,47 @@ class TestPowerHelpers(MAASTestCase):
             MockCalledOnceWith(ANY, system_id=system_id, power_state=state),
         )
 
+    def test_power_states_update_calls_UpdateNodePowerStates(self):
+        power_states = [
+            {
+                "system_id": factory.make_name("system_id"),
+                "power_state": random.choice(["on", "off"]),
+            }
+            for _ in range(3)
+        ]
+        fixture = self.useFixture(MockClusterToRegionRPCFixture())
+        protocol, io = fixture.makeEventLoop(region.UpdateNodePowerStates)
+        protocol.UpdateNodePowerStates.return_value = {}
+        d = power.power_states_update(power_states)
+        # This blocks until the deferred is complete
+        io.flush()
+        extract_result(d)
+        self.assertThat(
+            protocol.UpdateNodePowerStates,
+            MockCalledOnceWith(ANY, power_states=power_states),
+        )
+
+    def test_power_states_update_falls_back_to_UpdateNodePowerState(self):
+        power_states = [
+            {
+                "system_id": factory.make_name("system_id"),
+                "power_state": random.choice(["on", "off"]),
+            }
+            for _ in range(2)
+        ]
+        protocol, io = self.patch_rpc_methods()
+        protocol.UpdateNodePowerState.return_value = {}
+        d = power.power_states_update(power_states)
+        # This blocks until the deferred is complete
+        io.flush()
+        extract_result(d)
+        self.assertThat(
+            protocol.UpdateNodePowerState,
+            MockCallsMatch(
+                *(call(ANY, **power_state) for power_state in power_states)
+            ),
+        )
+
     def test_power_change_success_emits_event(self):
         system_id = factory.make_name("system_id")
         hostname = factory.make_name("hostname")
@@ -1071,7 +1113,7 @@ class TestPowerQueryAsync(MAASTestCase):
         get_power_state = self.patch(power, "get_power_state")
         get_power_state.side_effect = queries
         report_power_state = self.patch(power, "report_power_state")
-        report_power_state.side_effect = lambda d, sid, hn: d
+        report_power_state.side_effect = lambda d, sid, hn, report: d
 
         yield power.query_all_nodes(nodes)
         self.assertThat(
@@ -1093,7 +1135,9 @@ class TestPowerQueryAsync(MAASTestCase):
             report_power_state,
             MockCallsMatch(
                 *(
-                    call(query, node["system_id"], node["hostname"])
+                    call(
+                        query, node["system_id"], node["hostname"], report=ANY
+                    )
                     for query, node in zip(queries, nodes)
                 )
             ),
@@ -1289,3 +1333,213 @@ class TestPowerQueryAsync(MAASTestCase):
             [(True, node1["power_state"]), (True, node2["power_state"])],
             results,
         )
+
+    @inlineCallbacks
+    def test_query_all_nodes_reports_power_states_together(self):
+        node1, node2 = self.make_nodes(2)
+        new_state_1 = self.pick_alternate_state(node1["power_state"])
+        get_power_state = self.patch(power, "get_power_state")
+        get_power_state.side_effect = [
+            succeed(new_state_1),
+            fail(exceptions.PowerActionFail()),
+        ]
+        self.patch(power, "send_node_event").return_value = succeed(None)
+        power_state_update = self.patch(power, "power_state_update")
+        power_states_update = self.patch(power, "power_states_update")
+        power_states_update.return_value = succeed(None)
+
+        yield power.query_all_nodes([node1, node2])
+        self.assertThat(power_state_update, MockNotCalled())
+        self.assertThat(
+            power_states_update,
+            MockCalledOnceWith(
+                [
+                    {
+                        "system_id": node1["system_id"],
+                        "power_state": new_state_1,
+                    },
+                    {"system_id": node2["system_id"], "power_state": "error"},
+                ]
+            ),
+        )
+
+    def make_chassis_nodes(self, count=3):
+        context = {
+            "power_address": factory.make_ipv4_address(),
+            "power_user": factory.make_name("power_user"),
+            "power_pass": factory.make_name("power_pass"),
+        }
+        nodes = []
+        for index in range(count):
+            node = self.make_node(power_type="mscm")
+            node["context"] = dict(context, node_id="c%dn1" % (index + 1))
+            nodes.append(node)
+        return nodes
+
+    def test_group_by_chassis_groups_nodes_with_equal_chassis_keys(self):
+        chassis_nodes = self.make_chassis_nodes()
+        other_chassis_nodes = self.make_chassis_nodes()
+        node = self.make_node(power_type="manual")
+        unknown_node = self.make_node(power_type=factory.make_name("type"))
+        groups = power.group_by_chassis(
+            chassis_nodes + [node, unknown_node] + other_chassis_nodes
+        )
+        self.assertItemsEqual(
+            [chassis_nodes, [node], other_chassis_nodes], groups
+        )
+
+    def test_group_by_chassis_ignores_drivers_that_cant_query_chassis(self):
+        nodes = self.make_chassis_nodes()
+        driver = PowerDriverRegistry.get_item("mscm")
+        self.patch(driver, "can_query_chassis", False)
+        chassis_key = self.patch(driver, "chassis_key")
+        groups = power.group_by_chassis(nodes)
+        self.assertItemsEqual([[node] for node in nodes], groups)
+        self.assertThat(chassis_key, MockNotCalled())
+
+    def test_group_by_chassis_leaves_out_nodes_in_action_registry(self):
+        nodes = self.make_chassis_nodes()
+        power.power_action_registry[nodes[0]["system_id"]] = sentinel.action
+        self.addCleanup(power.power_action_registry.clear)
+        groups = power.group_by_chassis(nodes)
+        self.assertItemsEqual([[nodes[0]], nodes[1:]], groups)
+
+    @inlineCallbacks
+    def test_query_all_nodes_queries_chassis_once(self):
+        nodes = self.make_chassis_nodes()
+        get_chassis_power_states = self.patch(
+            power, "get_chassis_power_states"
+        )
+        get_chassis_power_states.return_value = succeed(
+            {node["system_id"]: "on" for node in nodes}
+        )
+        get_power_state = self.patch(power, "get_power_state")
+        power_states_update = self.patch(power, "power_states_update")
+        power_states_update.return_value = succeed(None)
+
+        yield power.query_all_nodes(nodes)
+        self.assertThat(
+            get_chassis_power_states,
+            MockCalledOnceWith(
+                "mscm",
+                {node["system_id"]: node["context"] for node in nodes},
+            ),
+        )
+        self.assertThat(get_power_state, MockNotCalled())
+        self.assertThat(
+            power_states_update,
+            MockCalledOnceWith(
+                [
+                    {"system_id": node["system_id"], "power_state": "on"}
+                    for node in nodes
+                ]
+            ),
+        )
+
+    @inlineCallbacks
+    def test_query_all_nodes_queries_nodes_missed_by_chassis(self):
+        nodes = self.make_chassis_nodes()
+        get_chassis_power_states = self.patch(
+            power, "get_chassis_power_states"
+        )
+        get_chassis_power_states.return_value = succeed(
+            {node["system_id"]: "on" for node in nodes[1:]}
+        )
+        get_power_state = self.patch(power, "get_power_state")
+        get_power_state.return_value = succeed("off")
+        suppress_reporting(self)
+
+        results = yield power.query_all_nodes(nodes)
+        self.assertThat(
+            get_power_state,
+            MockCalledOnceWith(
+                nodes[0]["system_id"],
+                nodes[0]["hostname"],
+                nodes[0]["power_type"],
+                nodes[0]["context"],
+                clock=reactor,
+            ),
+        )
+        [(success, chassis_results)] = results
+        self.assertEqual(
+            [(True, "off"), (True, "on"), (True, "on")], chassis_results
+        )
+
+    @inlineCallbacks
+    def test_query_all_nodes_reports_chassis_failure_for_each_node(self):
+        nodes = self.make_chassis_nodes()
+        error_msg = factory.make_name("error")
+        get_chassis_power_states = self.patch(
+            power, "get_chassis_power_states"
+        )
+        get_chassis_power_states.return_value = fail(PowerError(error_msg))
+        self.patch(power, "send_node_event").return_value = succeed(None)
+        power_states_update = self.patch(power, "power_states_update")
+        power_states_update.return_value = succeed(None)
+
+        with FakeLogger("maas.power", level=logging.DEBUG) as maaslog:
+            yield power.query_all_nodes(nodes)
+
+        self.assertThat(
+            power_states_update,
+            MockCalledOnceWith(
+                [
+                    {"system_id": node["system_id"], "power_state": "error"}
+                    for node in nodes
+                ]
+            ),
+        )
+        for node in nodes:
+            self.assertIn(
+                "%s: Could not query power state: %s."
+                % (node["hostname"], error_msg),
+                maaslog.output,
+            )
+
+    @inlineCallbacks
+    def test_query_all_nodes_limits_concurrency_per_power_type(self):
+        power_types = [
+            driver.name
+            for _, driver in PowerDriverRegistry
+            if driver.queryable
+        ][:2]
+        nodes = [
+            self.make_node(power_type=power_type)
+            for power_type in power_types
+            for _ in range(3)
+        ]
+        queries = {node["system_id"]: Deferred() for node in nodes}
+        get_power_state = self.patch(power, "get_power_state")
+        get_power_state.side_effect = (
+            lambda system_id, *args, **kwargs: queries[system_id]
+        )
+        suppress_reporting(self)
+
+        semaphores = {}
+        d = power.query_all_nodes(
+            nodes, max_concurrency=2, semaphores=semaphores
+        )
+        # Two nodes of each power type are queried at once.
+        self.assertEqual(4, len(get_power_state.mock_calls))
+        self.assertItemsEqual(power_types, list(semaphores))
+        for node in nodes:
+            queries[node["system_id"]].callback(node["power_state"])
+        yield d
+        self.assertEqual(6, len(get_power_state.mock_calls))
+
+    @inlineCallbacks
+    def test_query_all_nodes_takes_concurrency_for_each_power_type(self):
+        nodes = self.make_nodes(3)
+        power_type = nodes[0]["power_type"]
+        for node in nodes:
+            node["power_type"] = power_type
+        queries = [Deferred() for _ in nodes]
+        get_power_state = self.patch(power, "get_power_state")
+        get_power_state.side_effect = queries
+        suppress_reporting(self)
+
+        d = power.query_all_nodes(nodes, max_concurrency={power_type: 1})
+        self.assertThat(get_power_state, MockCalledOnce())
+        for query in queries:
+            query.callback("on")
+        yield d
@@ -3,12 +3,22 @@
 
 """Cluster-side evaluation of tags."""
 
-__all__ = ["merge_details", "merge_details_cleanly", "process_node_tags"]
+__all__ = [
+    "classify_node_details",
+    "merge_details",
+    "merge_details_cleanly",
+    "process_node_tags",
+]
 
 from collections import OrderedDict
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import hashlib
 import http.client
 import json
+import multiprocessing
+import os
+import threading
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -17,7 +27,6 @@ import bson
 from lxml import etree
 
 from provisioningserver.logger import get_maas_logger, LegacyLogger
-from provisioningserver.utils import classify
 from provisioningserver.utils.xpath import try_match_xpath
 
 log = LegacyLogger()
@@ -31,6 +40,23 @@ maaslog = get_maas_logger("tag_processing")
 # face of it, appears excessive.
 DEFAULT_BATCH_SIZE = 100
 
+# The most bytes of details XML whose merged documents are kept parsed in
+# each process. A parsed document takes several times the memory of its
+# XML, so this keeps each process's cache to a few hundred MB, however big
+# the details of the nodes are.
+DEFAULT_DETAILS_CACHE_SIZE = 64 * 1024 * 1024
+
+# The number of processes that evaluate tag expressions, when there are at
+# least PARALLEL_EVALUATION_THRESHOLD different documents to evaluate them
+# against. Fewer documents are evaluated in-process, which is faster than
+# sending them to another process.
+DEFAULT_EVALUATION_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_EVALUATION_THRESHOLD = 50
+
+# The seconds after the last evaluation that the evaluation processes, and
+# the documents cached in them, are kept for.
+EVALUATION_PROCESSES_IDLE_TIMEOUT = 300
+
 
 def process_response(response):
     """All responses should be httplib.OK.
@@ -267,18 +293,220 @@ def gen_batches(things, batch_size):
     return (things[s] for s in slices)
 
 
-def gen_node_details(client, batches):
-    """Fetch node details.
+def get_details_hash(details):
+    """Return a hash of the content of node details.
+
+    Nodes with the same details have the same hash, whatever order the
+    details are in.
+
+    :param details: A ``{"name": xml-as-bytes, ...}`` dict, as passed to
+        `merge_details`.
+    """
+    digest = hashlib.sha256()
+    for namespace in sorted(details):
+        xmldata = details[namespace]
+        if xmldata is not None:
+            digest.update(namespace.encode("utf-8"))
+            digest.update(b"\0%d\0" % len(xmldata))
+            digest.update(xmldata)
+    return digest.hexdigest()
+
+
+class MergedDetailsCache:
+    """A cache of merged details documents, keyed by the hash of the
+    details they were merged from.
+
+    Parsing and merging the details of a node is what evaluating a tag
+    expression spends most of its time on, so documents are kept to
+    evaluate the next expressions against. The least recently used
+    documents are dropped once they were merged from more than `size`
+    bytes of details.
+    """
+
+    def __init__(self, size=DEFAULT_DETAILS_CACHE_SIZE):
+        self.size = size
+        self._documents = OrderedDict()
+        self._documents_size = 0
+        self._lock = threading.Lock()
+
+    def get(self, details, details_hash=None):
+        """Return the merged document for `details`.
+
+        :param details_hash: The hash of `details`, if it's already known.
+        """
+        if details_hash is None:
+            details_hash = get_details_hash(details)
+        with self._lock:
+            cached = self._documents.get(details_hash)
+            if cached is not None:
+                self._documents.move_to_end(details_hash)
+                return cached[0]
+        document = merge_details(details)
+        size = sum(
+            len(xmldata) for xmldata in details.values() if xmldata is not None
+        )
+        with self._lock:
+            if details_hash not in self._documents:
+                self._documents[details_hash] = document, size
+                self._documents_size += size
+            while self._documents_size > self.size:
+                _, (_, dropped_size) = self._documents.popitem(last=False)
+                self._documents_size -= dropped_size
+        return document
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._documents_size = 0
+
+
+merged_details_cache = MergedDetailsCache()
 
-    This lazily fetches data in batches, but this detail is hidden
-    from callers.
 
-    :return: An iterator of ``(system-id, details-document)`` tuples.
+def _match_details(tag_definition, tag_nsmap, hashed_details):
+    """Return the hashes of the details that `tag_definition` matches.
+
+    This is where tag expressions are evaluated, whether in this process or
+    in one of the evaluation processes.
+
+    :param tag_nsmap: The namespaces for the expression, as a tuple of
+        ``(prefix, uri)`` tuples.
+    :param hashed_details: A list of ``(details-hash, details)`` tuples.
+    """
+    xpath = etree.XPath(tag_definition, namespaces=dict(tag_nsmap))
+    return [
+        details_hash
+        for details_hash, details in hashed_details
+        if try_match_xpath(
+            xpath,
+            merged_details_cache.get(details, details_hash),
+            logger=maaslog,
+        )
+    ]
+
+
+class EvaluationProcesses:
+    """Processes to evaluate tag expressions in.
+
+    Each process has its own `merged_details_cache`, so details are always
+    sent to the same process, and the processes are kept for the next
+    evaluations. They're shut down, freeing the documents cached in them,
+    once nothing has used them for `idle_timeout` seconds. The processes
+    are spawned rather than forked, because the calling process has
+    threads.
+    """
+
+    def __init__(self, idle_timeout=EVALUATION_PROCESSES_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._executors = []
+        self._users = 0
+        self._idle_timer = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def use(self, workers):
+        """Use `workers` executors, each with a single process."""
+        with self._lock:
+            self._users += 1
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            context = multiprocessing.get_context("spawn")
+            while len(self._executors) < workers:
+                self._executors.append(
+                    ProcessPoolExecutor(max_workers=1, mp_context=context)
+                )
+            executors = self._executors[:workers]
+        try:
+            yield executors
+        finally:
+            with self._lock:
+                self._users -= 1
+                if self._users == 0:
+                    self._idle_timer = threading.Timer(
+                        self.idle_timeout, self._shutdown_if_idle
+                    )
+                    self._idle_timer.daemon = True
+                    self._idle_timer.start()
+
+    def _shutdown_if_idle(self):
+        with self._lock:
+            if self._users > 0:
+                return
+            executors, self._executors = self._executors, []
+        for executor in executors:
+            executor.shutdown()
+
+    def shutdown(self):
+        """Shut down the processes, waiting for evaluations to finish."""
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            executors, self._executors = self._executors, []
+        for executor in executors:
+            executor.shutdown()
+
+
+evaluation_processes = EvaluationProcesses()
+
+
+def classify_node_details(
+    tag_definition, tag_nsmap, node_details, workers=None
+):
+    """Classify nodes by whether `tag_definition` matches their details.
+
+    Nodes with the same details are only evaluated once, and merged details
+    documents are reused from `merged_details_cache`. When there are many
+    different details, they're evaluated by `workers` processes at once.
+
+    :param tag_nsmap: The namespaces for `tag_definition`.
+    :param node_details: An iterable of ``(node, details)`` tuples, where
+        `details` are in the form accepted by `merge_details`.
+    :param workers: The number of processes to evaluate the expression in.
+        Defaults to `DEFAULT_EVALUATION_WORKERS`.
+    :return: A ``(matched, unmatched)`` tuple of lists of nodes.
     """
-    get_details = partial(get_details_for_nodes, client)
-    for batch in batches:
-        for system_id, details in get_details(batch).items():
-            yield system_id, merge_details(details)
+    if workers is None:
+        workers = DEFAULT_EVALUATION_WORKERS
+    tag_nsmap = tuple(sorted(tag_nsmap.items()))
+    nodes_by_hash = OrderedDict()
+    details_by_hash = {}
+    for node, details in node_details:
+        details_hash = get_details_hash(details)
+        nodes_by_hash.setdefault(details_hash, []).append(node)
+        details_by_hash[details_hash] = details
+    if workers > 1 and len(details_by_hash) >= PARALLEL_EVALUATION_THRESHOLD:
+        with evaluation_processes.use(workers) as processes:
+            hashed_details = [[] for _ in processes]
+            for details_hash, details in details_by_hash.items():
+                index = int(details_hash[:8], 16) % len(processes)
+                hashed_details[index].append((details_hash, details))
+            futures = [
+                process.submit(
+                    _match_details, tag_definition, tag_nsmap, process_details
+                )
+                for process, process_details in zip(processes, hashed_details)
+                if len(process_details) > 0
+            ]
+            matched_hashes = {
+                details_hash
+                for future in futures
+                for details_hash in future.result()
+            }
+    else:
+        matched_hashes = set(
+            _match_details(
+                tag_definition, tag_nsmap, list(details_by_hash.items())
+            )
+        )
+    matched, unmatched = [], []
+    for details_hash, nodes in nodes_by_hash.items():
+        if details_hash in matched_hashes:
+            matched.extend(nodes)
+        else:
+            unmatched.extend(nodes)
+    return matched, unmatched
 
 
 def process_all(
@@ -287,7 +515,7 @@ def process_all(
     tag_name,
     tag_definition,
     system_ids,
-    xpath,
+    tag_nsmap,
     batch_size=None,
 ):
     log.debug(
@@ -299,11 +527,14 @@ def process_all(
     if batch_size is None:
         batch_size = DEFAULT_BATCH_SIZE
 
-    batches = gen_batches(system_ids, batch_size)
-    node_details = gen_node_details(client, batches)
-    nodes_matched, nodes_unmatched = classify(
-        partial(try_match_xpath, xpath, logger=maaslog), node_details
-    )
+    nodes_matched, nodes_unmatched = [], []
+    for batch in gen_batches(system_ids, batch_size):
+        node_details = get_details_for_nodes(client, batch)
+        matched, unmatched = classify_node_details(
+            tag_definition, tag_nsmap, node_details.items()
+        )
+        nodes_matched.extend(matched)
+        nodes_unmatched.extend(unmatched)
     post_updated_nodes(
         client,
         rack_id,
@@ -335,7 +566,7 @@ def process_node_tags(
     """
     # We evaluate this early, so we can fail before sending a bunch of data to
     # the server
-    xpath = etree.XPath(tag_definition, namespaces=tag_nsmap)
+    etree.XPath(tag_definition, namespaces=tag_nsmap)
     system_ids = [node["system_id"] for node in nodes]
     process_all(
         client,
@@ -343,6 +574,6 @@ def process_node_tags(
         tag_name,
         tag_definition,
         system_ids,
-        xpath,
+        tag_nsmap,
         batch_size=batch_size,
     )
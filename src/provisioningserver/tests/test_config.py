@@ -663,6 +663,17 @@ class TestClusterConfiguration(MAASTestCase):
         # It's also stored in the configuration database.
         self.assertEqual({"tftp_root": example_dir}, config.store)
 
+    def test_default_image_download_workers(self):
+        config = ClusterConfiguration({})
+        self.assertEqual(4, config.image_download_workers)
+
+    def test_set_and_get_image_download_workers(self):
+        config = ClusterConfiguration({})
+        config.image_download_workers = 8
+        self.assertEqual(8, config.image_download_workers)
+        # It's also stored in the configuration database.
+        self.assertEqual({"image_download_workers": 8}, config.store)
+
     def test_default_cluster_uuid(self):
         config = ClusterConfiguration({})
         self.assertIsNone(config.cluster_uuid)
@@ -6,16 +6,18 @@
 __all__ = []
 
 import random
-from unittest.mock import ANY, sentinel
+from unittest.mock import ANY, call, sentinel
 
 from testtools import ExpectedException
 from testtools.matchers import AllMatch, Equals, HasLength, Is, IsInstance
 from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.internet.task import Clock
 
 from maastesting.factory import factory
 from maastesting.matchers import (
     MockCalledOnce,
     MockCalledOnceWith,
+    MockCallsMatch,
     MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
@@ -25,6 +27,7 @@ from provisioningserver.events import (
     EventDetail,
     nodeEventHub,
     NodeEventHub,
+    queue_node_event_ip_address,
     send_node_event,
     send_node_event_ip_address,
     send_node_event_mac_address,
@@ -100,6 +103,22 @@ class TestSendEventNodeIPAddress(MAASTestCase):
         )
 
 
+class TestQueueNodeEventIPAddress(MAASTestCase):
+    """Tests for `queue_node_event_ip_address`."""
+
+    def test_calls_singleton_hub_queueByIP_directly(self):
+        self.patch(nodeEventHub, "queueByIP")
+        queue_node_event_ip_address(
+            sentinel.event_type, sentinel.ip_address, sentinel.description
+        )
+        self.assertThat(
+            nodeEventHub.queueByIP,
+            MockCalledOnceWith(
+                sentinel.event_type, sentinel.ip_address, sentinel.description
+            ),
+        )
+
+
 class TestSendRackEvent(MAASTestCase):
     """Tests for `send_rack_event`."""
 
@@ -439,3 +458,111 @@ class TestSendEventIPAddress(MAASTestCase):
             yield event_hub.logByIP(event_name, ip_address, description)
         # The event has been removed from the cache.
         self.assertThat(event_hub._types_registered, HasLength(0))
+
+
+class TestQueueByIP(MAASTestCase):
+    """Tests for `NodeEventHub.queueByIP`."""
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def patch_rpc_methods(self, *commands):
+        fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
+        protocol, connecting = fixture.makeEventLoop(
+            region.RegisterEventType, *commands
+        )
+        return protocol, connecting
+
+    def test_sends_queued_events_after_delay(self):
+        clock = Clock()
+        event_hub = NodeEventHub(clock)
+        sendQueued = self.patch(event_hub, "_sendQueued")
+        for _ in range(3):
+            event_hub.queueByIP(
+                EVENT_TYPES.NODE_HTTP_REQUEST, factory.make_ip_address()
+            )
+        clock.advance(event_hub.queue_delay - 0.1)
+        self.assertThat(sendQueued, MockNotCalled())
+        clock.advance(0.1)
+        self.assertThat(sendQueued, MockCalledOnceWith())
+
+    @inlineCallbacks
+    def test_sends_events_grouped_by_node(self):
+        protocol, connecting = self.patch_rpc_methods(
+            region.SendIPAddressEvents
+        )
+        protocol.SendIPAddressEvents.return_value = {}
+        self.addCleanup((yield connecting))
+
+        event_hub = NodeEventHub(Clock())
+        ip_addresses = [factory.make_ip_address() for _ in range(2)]
+        for index in range(4):
+            event_hub.queueByIP(
+                EVENT_TYPES.NODE_HTTP_REQUEST,
+                ip_addresses[index % 2],
+                "path-%d" % index,
+            )
+        queued = list(event_hub._queued)
+        yield event_hub._sendQueued()
+
+        self.assertThat(
+            protocol.SendIPAddressEvents,
+            MockCalledOnceWith(
+                ANY, events=[queued[0], queued[2], queued[1], queued[3]]
+            ),
+        )
+        self.assertEqual([], event_hub._queued)
+
+    @inlineCallbacks
+    def test_sends_events_in_batches(self):
+        protocol, connecting = self.patch_rpc_methods(
+            region.SendIPAddressEvents
+        )
+        protocol.SendIPAddressEvents.return_value = {}
+        self.addCleanup((yield connecting))
+
+        event_hub = NodeEventHub(Clock())
+        event_hub.batch_size = 2
+        ip_address = factory.make_ip_address()
+        for _ in range(3):
+            event_hub.queueByIP(EVENT_TYPES.NODE_HTTP_REQUEST, ip_address)
+        queued = list(event_hub._queued)
+        yield event_hub._sendQueued()
+
+        self.assertThat(
+            protocol.SendIPAddressEvents,
+            MockCallsMatch(
+                call(ANY, events=queued[:2]), call(ANY, events=queued[2:])
+            ),
+        )
+
+    @inlineCallbacks
+    def test_falls_back_to_SendEventIPAddress(self):
+        protocol, connecting = self.patch_rpc_methods(
+            region.SendEventIPAddress
+        )
+        protocol.SendEventIPAddress.return_value = {}
+        self.addCleanup((yield connecting))
+
+        event_hub = NodeEventHub(Clock())
+        ip_address = factory.make_ip_address()
+        descriptions = [factory.make_name("path") for _ in range(2)]
+        for description in descriptions:
+            event_hub.queueByIP(
+                EVENT_TYPES.NODE_HTTP_REQUEST, ip_address, description
+            )
+        yield event_hub._sendQueued()
+
+        self.assertThat(
+            protocol.SendEventIPAddress,
+            MockCallsMatch(
+                *(
+                    call(
+                        ANY,
+                        type_name=EVENT_TYPES.NODE_HTTP_REQUEST,
+                        ip_address=ip_address,
+                        description=description,
+                    )
+                    for description in descriptions
+                )
+            ),
+        )
@@ -37,6 +37,7 @@ from provisioningserver.rackdservices.dhcp_probe_service import (
     DHCPProbeService,
 )
 from provisioningserver.rackdservices.external import RackExternalService
+from provisioningserver.rackdservices.http import HTTPLogSocketService
 from provisioningserver.rackdservices.image_download_service import (
     ImageDownloadService,
 )
@@ -116,6 +117,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
             "rpc",
             "rpc-ping",
             "http",
+            "http_log_socket_service",
             "http_service",
             "tftp",
             "service_monitor",
@@ -155,6 +157,7 @@ class TestProvisioningServiceMaker(MAASTestCase):
             "rpc",
             "rpc-ping",
             "http",
+            "http_log_socket_service",
             "http_service",
             "tftp",
             "service_monitor",
@@ -290,6 +293,15 @@ class TestProvisioningServiceMaker(MAASTestCase):
             MatchesStructure(backend=expected_backend, port=Equals(tftp_port)),
         )
 
+    def test_http_log_socket_service(self):
+        options = Options()
+        service_maker = ProvisioningServiceMaker("Harry", "Hill")
+        service = service_maker.makeService(options, clock=None)
+        http_log_socket_service = service.getServiceNamed(
+            "http_log_socket_service"
+        )
+        self.assertIsInstance(http_log_socket_service, HTTPLogSocketService)
+
     def test_lease_socket_service(self):
         options = Options()
         service_maker = ProvisioningServiceMaker("Harry", "Hill")
@@ -10,7 +10,7 @@ import http.client
 from itertools import chain
 import json
 from textwrap import dedent
-from unittest.mock import call, MagicMock, sentinel
+from unittest.mock import call, MagicMock
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -22,9 +22,15 @@ from testtools.matchers import DocTestMatches, Equals, MatchesStructure
 
 from apiclient.maas_client import MAASClient
 from maastesting.factory import factory
-from maastesting.matchers import IsCallable, MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    IsCallable,
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from provisioningserver import tags
+from provisioningserver.utils import classify
 from provisioningserver.testing.config import ClusterConfigurationFixture
 
 
@@ -455,44 +461,189 @@ class TestGenBatches(MAASTestCase):
             self.assertIn(max(lens) - min(lens), (0, 1))
 
 
-class TestGenNodeDetails(MAASTestCase):
-    def fake_merge_details(self):
-        """Modify `merge_details` to return a simple textual token.
+class TestGetDetailsHash(MAASTestCase):
+    def test_same_details_have_same_hash(self):
+        details = {"lshw": b"<node />", "lldp": b"<lldp />"}
+        self.assertEqual(
+            tags.get_details_hash(details),
+            tags.get_details_hash(dict(reversed(list(details.items())))),
+        )
 
-        Specifically, it will return `merged:n1+n2+...`, where `n1`,
-        `n2` and `...` are the names of the details passed into
-        `merge_details`.
+    def test_different_details_have_different_hashes(self):
+        self.assertNotEqual(
+            tags.get_details_hash({"lshw": b"<node />"}),
+            tags.get_details_hash({"lldp": b"<node />"}),
+        )
+        self.assertNotEqual(
+            tags.get_details_hash({"lshw": b"<node />"}),
+            tags.get_details_hash({"lshw": b"<other />"}),
+        )
 
-        This means we can test code that uses `merge_details` without
-        having to come up with example XML and match on it later.
-        """
-        self.patch(
-            tags,
-            "merge_details",
-            lambda mapping: "merged:" + "+".join(mapping),
+    def test_ignores_missing_details(self):
+        self.assertEqual(
+            tags.get_details_hash({"lshw": b"<node />"}),
+            tags.get_details_hash({"lshw": b"<node />", "lldp": None}),
         )
 
-    def test_generates_node_details(self):
-        batches = [["s1", "s2"], ["s3"]]
-        responses = [
-            {
-                "s1": {"foo": "<node>s1</node>"},
-                "s2": {"bar": "<node>s2</node>"},
-            },
-            {"s3": {"cob": "<node>s3</node>"}},
+
+class TestMergedDetailsCache(MAASTestCase):
+    def test_returns_merged_details(self):
+        cache = tags.MergedDetailsCache()
+        details = {"lshw": b"<node />"}
+        self.assertThat(
+            cache.get(details), EqualsXML(tags.merge_details(details))
+        )
+
+    def test_reuses_merged_details(self):
+        cache = tags.MergedDetailsCache()
+        details = {"lshw": b"<node />"}
+        self.assertIs(cache.get(details), cache.get(dict(details)))
+
+    def test_drops_least_recently_used_details(self):
+        details1, details2, details3 = (
+            {"lshw": ("<node%d />" % i).encode("ascii")} for i in range(3)
+        )
+        # Room for the documents merged from two of the details.
+        cache = tags.MergedDetailsCache(size=2 * len(details1["lshw"]))
+        document1 = cache.get(details1)
+        document2 = cache.get(details2)
+        cache.get(details1)
+        cache.get(details3)
+        self.assertIs(document1, cache.get(details1))
+        self.assertIsNot(document2, cache.get(details2))
+
+    def test_drops_details_bigger_than_the_cache(self):
+        details = {"lshw": b"<node />"}
+        cache = tags.MergedDetailsCache(size=len(details["lshw"]) - 1)
+        self.assertIsNot(cache.get(details), cache.get(details))
+
+
+class TestEvaluationProcesses(MAASTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ProcessPoolExecutor = self.patch(tags, "ProcessPoolExecutor")
+        self.ProcessPoolExecutor.side_effect = lambda **kwargs: MagicMock()
+        self.processes = tags.EvaluationProcesses()
+        self.addCleanup(self.processes.shutdown)
+
+    def test_use_creates_executors_with_one_process(self):
+        with self.processes.use(3) as executors:
+            self.assertEqual(3, len(executors))
+        self.assertEqual(3, self.ProcessPoolExecutor.call_count)
+        for args, kwargs in self.ProcessPoolExecutor.call_args_list:
+            self.assertEqual(1, kwargs["max_workers"])
+
+    def test_use_reuses_executors(self):
+        with self.processes.use(2) as executors1:
+            pass
+        with self.processes.use(3) as executors2:
+            pass
+        self.assertEqual(executors1, executors2[:2])
+        self.assertEqual(3, self.ProcessPoolExecutor.call_count)
+
+    def test_shuts_down_executors_once_idle(self):
+        self.processes.idle_timeout = 0
+        with self.processes.use(2) as executors:
+            pass
+        self.processes._idle_timer.join()
+        for executor in executors:
+            self.assertThat(executor.shutdown, MockCalledOnceWith())
+        with self.processes.use(2) as new_executors:
+            self.assertNotIn(new_executors[0], executors)
+
+    def test_does_not_shut_down_executors_in_use(self):
+        self.processes.idle_timeout = 0
+        with self.processes.use(1):
+            with self.processes.use(1) as executors:
+                pass
+            self.assertIsNone(self.processes._idle_timer)
+            self.processes._shutdown_if_idle()
+        self.processes._idle_timer.cancel()
+        self.assertThat(executors[0].shutdown, MockNotCalled())
+
+    def test_shutdown_shuts_down_executors(self):
+        with self.processes.use(2) as executors:
+            pass
+        self.processes.shutdown()
+        self.assertIsNone(self.processes._idle_timer)
+        for executor in executors:
+            self.assertThat(executor.shutdown, MockCalledOnceWith())
+
+
+class TestClassifyNodeDetails(MAASTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(tags.merged_details_cache.clear)
+
+    def test_classifies_nodes(self):
+        node_details = [
+            ("a", {"lshw": b"<node />"}),
+            ("b", {"lshw": b"<not-node />"}),
+            ("c", {"lshw": b"<parent><node /></parent>"}),
+        ]
+        self.assertEqual(
+            (["a", "c"], ["b"]),
+            tags.classify_node_details(
+                "//lshw:node", {"lshw": "lshw"}, node_details, workers=1
+            ),
+        )
+
+    def test_evaluates_same_details_once(self):
+        merge_details = self.patch(tags, "merge_details")
+        merge_details.side_effect = lambda details: etree.ElementTree(
+            etree.fromstring(details["lshw"])
+        )
+        node_details = [
+            ("a", {"lshw": b"<node />"}),
+            ("b", {"lshw": b"<node />"}),
+            ("c", {"lshw": b"<other />"}),
+        ]
+        self.assertEqual(
+            (["a", "b"], ["c"]),
+            tags.classify_node_details("//node", {}, node_details, workers=1),
+        )
+        self.assertEqual(2, merge_details.call_count)
+
+    def test_reuses_merged_details_between_expressions(self):
+        merge_details = self.patch(tags, "merge_details")
+        merge_details.side_effect = lambda details: etree.ElementTree(
+            etree.fromstring(details["lshw"])
+        )
+        node_details = [("a", {"lshw": b"<node />"})]
+        tags.classify_node_details("//node", {}, node_details, workers=1)
+        tags.classify_node_details("//other", {}, node_details, workers=1)
+        self.assertEqual(1, merge_details.call_count)
+
+    def test_classifies_invalid_expression_as_unmatched(self):
+        self.useFixture(FakeLogger())
+        node_details = [("a", {"lshw": b"<node />"})]
+        self.assertEqual(
+            ([], ["a"]),
+            tags.classify_node_details(
+                "//foo:node", {}, node_details, workers=1
+            ),
+        )
+
+    def test_evaluates_in_processes(self):
+        self.patch(tags, "PARALLEL_EVALUATION_THRESHOLD", 1)
+        processes = self.patch(
+            tags, "evaluation_processes", tags.EvaluationProcesses()
+        )
+        self.addCleanup(processes.shutdown)
+        node_details = [
+            ("node%d" % i, {"lshw": ("<node%d />" % (i % 3)).encode()})
+            for i in range(12)
         ]
-        get_details_for_nodes = self.patch(tags, "get_details_for_nodes")
-        get_details_for_nodes.side_effect = lambda *args: responses.pop(0)
-        self.fake_merge_details()
-        node_details = tags.gen_node_details(sentinel.client, batches)
+        matched, unmatched = tags.classify_node_details(
+            "//node0 or //node2", {}, node_details, workers=2
+        )
         self.assertItemsEqual(
-            [("s1", "merged:foo"), ("s2", "merged:bar"), ("s3", "merged:cob")],
-            node_details,
+            ["node%d" % i for i in range(12) if i % 3 != 1], matched
         )
-        self.assertSequenceEqual(
-            [call(sentinel.client, batch) for batch in batches],
-            get_details_for_nodes.mock_calls,
+        self.assertItemsEqual(
+            ["node%d" % i for i in range(12) if i % 3 == 1], unmatched
         )
+        self.assertEqual(2, len(processes._executors))
 
 
 class TestTagUpdating(MAASTestCase):
@@ -617,9 +768,7 @@ class TestTagUpdating(MAASTestCase):
             ("b", xml("<not-node />")),
             ("c", xml("<parent><node /></parent>")),
         ]
-        self.assertEqual(
-            (["a", "c"], ["b"]), tags.classify(xpath, node_details)
-        )
+        self.assertEqual((["a", "c"], ["b"]), classify(xpath, node_details))
 
     def test_process_node_tags_integration(self):
         self.useFixture(
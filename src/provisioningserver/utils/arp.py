@@ -285,19 +285,73 @@ def update_bindings_and_get_event(bindings, vid, ip, mac, time):
         )
 
 
-def update_and_print_bindings(bindings, arp, out=sys.stdout):
+def update_bindings_and_get_events(bindings, arp):
     """Update the specified bindings dictionary with the given ARP packet.
 
-    Output a JSON object on the specified stream (defaults to stdout) based on
-    the results of updating the binding.
+    :return: A list of the events (see `update_bindings_and_get_event`) that
+        resulted from updating the bindings.
     """
+    events = []
     for ip, mac in arp.bindings():
         event = update_bindings_and_get_event(
             bindings, arp.vid, ip, mac, arp.time
         )
         if event is not None:
-            out.write("%s\n" % json.dumps(event))
-            out.flush()
+            events.append(event)
+    return events
+
+
+def update_and_print_bindings(bindings, arp, out=sys.stdout):
+    """Update the specified bindings dictionary with the given ARP packet.
+
+    Output a JSON object on the specified stream (defaults to stdout) based on
+    the results of updating the binding.
+    """
+    for event in update_bindings_and_get_events(bindings, arp):
+        out.write("%s\n" % json.dumps(event))
+        out.flush()
+
+
+def decode_arp_packet(packet, time=None):
+    """Decode the ARP packet in the specified Ethernet frame.
+
+    :param packet: The bytes of the Ethernet frame.
+    :param time: Timestamp packet was seen (seconds since epoch)
+    :return: An `ARP` object, or None if the frame does not hold a valid
+        ARP packet.
+    """
+    ethernet = Ethernet(packet, time=time)
+    if not ethernet.is_valid():
+        # Ignore packets with a truncated Ethernet header.
+        return None
+    if len(ethernet.payload) < SIZEOF_ARP_PACKET:
+        # Ignore truncated ARP packets.
+        return None
+    if ethernet.ethertype != ETHERTYPE.ARP:
+        # Ignore non-ARP packets.
+        return None
+    return ARP(
+        ethernet.payload,
+        src_mac=ethernet.src_mac,
+        dst_mac=ethernet.dst_mac,
+        vid=ethernet.vid,
+        time=ethernet.time,
+    )
+
+
+def get_binding_events(packet, time, bindings):
+    """Decode the specified Ethernet frame and update `bindings` with it.
+
+    This is the per-packet part of `maas-rack observe-arp`, for use with
+    :py:class:`~provisioningserver.utils.capture.PacketCapture`.
+
+    :return: A list of the events that resulted from updating the bindings.
+    """
+    arp = decode_arp_packet(packet, time)
+    if arp is None:
+        return []
+    else:
+        return update_bindings_and_get_events(bindings, arp)
 
 
 def observe_arp_packets(
@@ -324,23 +378,9 @@ def observe_arp_packets(
             # assumptions about the link layer header won't be correct.
             return 4
         for header, packet in pcap:
-            ethernet = Ethernet(packet, time=header.timestamp_seconds)
-            if not ethernet.is_valid():
-                # Ignore packets with a truncated Ethernet header.
+            arp = decode_arp_packet(packet, header.timestamp_seconds)
+            if arp is None:
                 continue
-            if len(ethernet.payload) < SIZEOF_ARP_PACKET:
-                # Ignore truncated ARP packets.
-                continue
-            if ethernet.ethertype != ETHERTYPE.ARP:
-                # Ignore non-ARP packets.
-                continue
-            arp = ARP(
-                ethernet.payload,
-                src_mac=ethernet.src_mac,
-                dst_mac=ethernet.dst_mac,
-                vid=ethernet.vid,
-                time=ethernet.time,
-            )
             if bindings is not None:
                 update_and_print_bindings(bindings, arp, output)
             if verbose:
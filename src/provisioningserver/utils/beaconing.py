@@ -33,17 +33,20 @@ from bson import BSON
 from bson.errors import BSONError
 from cryptography.fernet import InvalidToken
 
+from provisioningserver.logger import LegacyLogger
 from provisioningserver.path import get_path
 from provisioningserver.security import fernet_decrypt_psk, fernet_encrypt_psk
 from provisioningserver.utils import sudo
 from provisioningserver.utils.network import format_eui
-from provisioningserver.utils.pcap import PCAP, PCAPError
+from provisioningserver.utils.pcap import PCAP, PCAPError, PCAPPacketHeader
 from provisioningserver.utils.script import ActionScriptError
 from provisioningserver.utils.tcpip import (
     decode_ethernet_udp_packet,
     PacketProcessingError,
 )
 
+log = LegacyLogger()
+
 BEACON_PORT = 5240
 BEACON_IPV4_MULTICAST = "224.0.0.118"
 BEACON_IPV6_MULTICAST = "ff02::15a"
@@ -258,6 +261,58 @@ class BeaconingPacket:
             return None
 
 
+def decode_beacon_packet(packet_bytes, pcap_header):
+    """Decode the beacon in the specified Ethernet frame.
+
+    :param packet_bytes: The bytes of the Ethernet frame.
+    :param pcap_header: The `PCAPPacketHeader` for the frame.
+    :return: A dictionary describing the beacon and the packet that carried
+        it, or None if the packet does not hold a valid beacon.
+    :raise PacketProcessingError: If the frame is not a valid UDP packet.
+    """
+    packet = decode_ethernet_udp_packet(packet_bytes, pcap_header)
+    beacon = BeaconingPacket(packet.payload)
+    if not beacon.valid:
+        return None
+    output_json = {
+        "source_mac": format_eui(packet.l2.src_eui),
+        "destination_mac": format_eui(packet.l2.dst_eui),
+        "source_ip": str(packet.l3.src_ip),
+        "destination_ip": str(packet.l3.dst_ip),
+        "source_port": packet.l4.packet.src_port,
+        "destination_port": packet.l4.packet.dst_port,
+        "time": pcap_header.timestamp_seconds,
+    }
+    if packet.l2.vid is not None:
+        output_json["vid"] = packet.l2.vid
+    if beacon.data is not None:
+        output_json.update(beacon_to_json(beacon.data))
+    return output_json
+
+
+def get_beacon_events(packet_bytes, time, state=None):
+    """Decode the beacon in the specified Ethernet frame.
+
+    This is the per-packet part of `maas-rack observe-beacons`, for use with
+    :py:class:`~provisioningserver.utils.capture.PacketCapture`.
+
+    :return: A list holding the beacon (see `decode_beacon_packet`), or an
+        empty list if the packet does not hold a valid beacon.
+    """
+    pcap_header = PCAPPacketHeader(
+        time, 0, len(packet_bytes), len(packet_bytes)
+    )
+    try:
+        output_json = decode_beacon_packet(packet_bytes, pcap_header)
+    except PacketProcessingError as e:
+        log.msg("Invalid beacon packet: %s" % e.error)
+        return []
+    if output_json is None:
+        return []
+    else:
+        return [output_json]
+
+
 def observe_beaconing_packets(input=sys.stdin.buffer, out=sys.stdout):
     """Read stdin and look for tcpdump binary beaconing output.
 
@@ -275,23 +330,9 @@ def observe_beaconing_packets(input=sys.stdin.buffer, out=sys.stdout):
             return 4
         for pcap_header, packet_bytes in pcap:
             try:
-                packet = decode_ethernet_udp_packet(packet_bytes, pcap_header)
-                beacon = BeaconingPacket(packet.payload)
-                if not beacon.valid:
+                output_json = decode_beacon_packet(packet_bytes, pcap_header)
+                if output_json is None:
                     continue
-                output_json = {
-                    "source_mac": format_eui(packet.l2.src_eui),
-                    "destination_mac": format_eui(packet.l2.dst_eui),
-                    "source_ip": str(packet.l3.src_ip),
-                    "destination_ip": str(packet.l3.dst_ip),
-                    "source_port": packet.l4.packet.src_port,
-                    "destination_port": packet.l4.packet.dst_port,
-                    "time": pcap_header.timestamp_seconds,
-                }
-                if packet.l2.vid is not None:
-                    output_json["vid"] = packet.l2.vid
-                if beacon.data is not None:
-                    output_json.update(beacon_to_json(beacon.data))
                 out.write(json.dumps(output_json))
                 out.write("\n")
                 out.flush()
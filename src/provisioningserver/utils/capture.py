@@ -0,0 +1,350 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""In-process packet capture with AF_PACKET sockets.
+
+This does the job of running `tcpdump` with a filter on an interface, but for
+any number of interfaces at once, in-process: a single AF_PACKET socket, with
+a classic BPF program attached so that the kernel only passes on packets of
+interest, is read from the reactor. Packets are read and decoded in batches,
+and the resulting events are delivered to callbacks per interface.
+"""
+
+__all__ = [
+    "can_capture",
+    "make_arp_filter",
+    "make_udp_dst_port_filter",
+    "PacketCapture",
+]
+
+import ctypes
+import socket
+import struct
+import time
+
+from twisted.internet.interfaces import IReadDescriptor
+from zope.interface import implementer
+
+from provisioningserver.logger import LegacyLogger
+
+log = LegacyLogger()
+
+# Linux constants not defined by the `socket` module.
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_8021Q = 0x8100
+ETH_P_IPV6 = 0x86DD
+SOL_PACKET = 263
+PACKET_AUXDATA = 8
+PACKET_OUTGOING = 4
+SO_ATTACH_FILTER = 26
+TP_STATUS_VLAN_VALID = 0x10
+TP_STATUS_VLAN_TPID_VALID = 0x40
+
+# struct tpacket_auxdata, as passed with PACKET_AUXDATA.
+TPACKET_AUXDATA = "IIIHHHH"
+TPACKET_AUXDATA_SPACE = socket.CMSG_SPACE(struct.calcsize(TPACKET_AUXDATA))
+
+# Classic BPF instructions; see linux/filter.h.
+BPF_LD_H_ABS = 0x28  # A <- P[k:2]
+BPF_LD_B_ABS = 0x30  # A <- P[k:1]
+BPF_LD_H_IND = 0x48  # A <- P[X+k:2]
+BPF_LDX_B_MSH = 0xB1  # X <- 4*(P[k:1]&0xf)
+BPF_JEQ_K = 0x15  # pc += (A == k) ? jt : jf
+BPF_JSET_K = 0x45  # pc += (A & k) ? jt : jf
+BPF_RET_K = 0x06  # return k
+
+# struct sock_filter.
+SOCK_FILTER = "HBBI"
+
+
+def assemble_filter(program):
+    """Assemble a classic BPF program.
+
+    :param program: A sequence of instructions and labels. An instruction is
+        a ``(code, k)`` or ``(code, k, jt, jf)`` tuple, where `jt` and `jf`
+        are the labels to jump to if the condition is true or false, or None
+        to carry on with the next instruction. A label is a string, naming
+        the instruction that follows it.
+    :return: The program as bytes, an array of ``struct sock_filter``.
+    """
+    labels, instructions = {}, []
+    for item in program:
+        if isinstance(item, str):
+            labels[item] = len(instructions)
+        else:
+            code, k, jt, jf = item + (None,) * (4 - len(item))
+            instructions.append((code, k, jt, jf))
+
+    def offset(index, label):
+        return 0 if label is None else labels[label] - index - 1
+
+    return b"".join(
+        struct.pack(SOCK_FILTER, code, offset(index, jt), offset(index, jf), k)
+        for index, (code, k, jt, jf) in enumerate(instructions)
+    )
+
+
+def make_arp_filter(snaplen=64):
+    """Make a BPF program that accepts ARP packets, tagged or not.
+
+    This is the equivalent of ``tcpdump -s $snaplen 'arp or (vlan and arp)'``.
+    """
+    return assemble_filter(
+        [
+            (BPF_LD_H_ABS, 12),
+            (BPF_JEQ_K, ETH_P_ARP, "accept", None),
+            (BPF_JEQ_K, ETH_P_8021Q, None, "reject"),
+            (BPF_LD_H_ABS, 16),
+            (BPF_JEQ_K, ETH_P_ARP, "accept", "reject"),
+            "accept",
+            (BPF_RET_K, snaplen),
+            "reject",
+            (BPF_RET_K, 0),
+        ]
+    )
+
+
+def make_udp_dst_port_filter(port, snaplen=16384):
+    """Make a BPF program that accepts UDP packets to `port`, tagged or not.
+
+    This is the equivalent of ``tcpdump -s $snaplen '(udp dst port $port) or
+    (vlan and udp dst port $port)'``. Fragments other than the first are not
+    accepted, since they don't have a UDP header.
+    """
+    program = [
+        (BPF_LD_H_ABS, 12),
+        (BPF_JEQ_K, ETH_P_IP, "ipv4", None),
+        (BPF_JEQ_K, ETH_P_IPV6, "ipv6", None),
+        (BPF_JEQ_K, ETH_P_8021Q, None, "reject"),
+        (BPF_LD_H_ABS, 16),
+        (BPF_JEQ_K, ETH_P_IP, "vlan-ipv4", None),
+        (BPF_JEQ_K, ETH_P_IPV6, "vlan-ipv6", "reject"),
+    ]
+    for label, offset in (("ipv4", 14), ("vlan-ipv4", 18)):
+        program += [
+            label,
+            (BPF_LD_B_ABS, offset + 9),
+            (BPF_JEQ_K, socket.IPPROTO_UDP, None, "reject"),
+            (BPF_LD_H_ABS, offset + 6),
+            (BPF_JSET_K, 0x1FFF, "reject", None),
+            (BPF_LDX_B_MSH, offset),
+            (BPF_LD_H_IND, offset + 2),
+            (BPF_JEQ_K, port, "accept", "reject"),
+        ]
+    for label, offset in (("ipv6", 14), ("vlan-ipv6", 18)):
+        program += [
+            label,
+            (BPF_LD_B_ABS, offset + 6),
+            (BPF_JEQ_K, socket.IPPROTO_UDP, None, "reject"),
+            (BPF_LD_H_ABS, offset + 40 + 2),
+            (BPF_JEQ_K, port, "accept", "reject"),
+        ]
+    program += ["accept", (BPF_RET_K, snaplen), "reject", (BPF_RET_K, 0)]
+    return assemble_filter(program)
+
+
+def attach_filter(sock, program):
+    """Attach the assembled BPF `program` to `sock`."""
+    buffer = ctypes.create_string_buffer(program, len(program))
+    # struct sock_fprog; the kernel copies the program.
+    fprog = struct.pack(
+        "HL",
+        len(program) // struct.calcsize(SOCK_FILTER),
+        ctypes.addressof(buffer),
+    )
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def can_capture():
+    """Return whether this process is allowed to capture packets.
+
+    That needs the CAP_NET_RAW capability.
+    """
+    try:
+        # Protocol 0 means that this socket receives no packets at all.
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+    except (AttributeError, OSError):
+        return False
+    else:
+        return True
+
+
+def open_capture_socket(program):
+    """Open a non-blocking AF_PACKET socket filtered by `program`.
+
+    The socket captures packets on every interface.
+    """
+    sock = socket.socket(
+        socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL)
+    )
+    try:
+        attach_filter(sock, program)
+        sock.setsockopt(SOL_PACKET, PACKET_AUXDATA, 1)
+        sock.setblocking(False)
+        # Discard any packets received before the filter was attached.
+        while True:
+            try:
+                sock.recv(1)
+            except BlockingIOError:
+                break
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def restore_vlan_tag(packet, ancdata):
+    """Put back the 802.1q tag that Linux took out of `packet`, if any.
+
+    Linux strips VLAN tags from received frames, at least when the interface
+    offloads VLAN handling, and reports them in the PACKET_AUXDATA ancillary
+    data instead. The tag is put back here, as libpcap does, so that the
+    frame looks as it would when read from `tcpdump`.
+    """
+    for level, kind, data in ancdata:
+        if level == SOL_PACKET and kind == PACKET_AUXDATA:
+            status, _, _, _, _, tci, tpid = struct.unpack_from(
+                TPACKET_AUXDATA, data
+            )
+            if tci != 0 or status & TP_STATUS_VLAN_VALID:
+                if not status & TP_STATUS_VLAN_TPID_VALID:
+                    tpid = ETH_P_8021Q
+                return (
+                    packet[:12] + struct.pack("!HH", tpid, tci) + packet[12:]
+                )
+    return packet
+
+
+@implementer(IReadDescriptor)
+class PacketCapture:
+    """Capture packets matching a BPF program, on any number of interfaces.
+
+    The socket is opened when the first interface is added, and closed when
+    the last one is removed. When the socket is readable, up to `batch_size`
+    packets are read from it. Those captured on interfaces that have been
+    added are decoded, and each interface's callback is called once with a
+    list of the resulting events.
+
+    :ivar decode: A callable taking an Ethernet frame, the time (in seconds
+        since the epoch) it was seen, and a dictionary that the callable can
+        keep state in for the frame's interface. It returns a list of events,
+        which are dictionaries; the ``interface`` key is set on each.
+    """
+
+    batch_size = 256
+
+    def __init__(
+        self, program, decode, snaplen, incoming_only=False, reactor=None
+    ):
+        """
+        :param program: The assembled BPF program to filter packets with.
+        :param decode: See `decode`.
+        :param snaplen: The most bytes of each packet to read.
+        :param incoming_only: Whether to ignore packets sent from this host.
+        """
+        super().__init__()
+        self.program = program
+        self.decode = decode
+        self.snaplen = snaplen
+        self.incoming_only = incoming_only
+        if reactor is None:
+            from twisted.internet import reactor
+        self.reactor = reactor
+        self.interfaces = {}
+        self.socket = None
+
+    def addInterface(self, ifname, callback):
+        """Start capturing packets on `ifname`, passing events to `callback`.
+
+        :raise OSError: If the socket could not be opened.
+        """
+        if self.socket is None:
+            self.socket = open_capture_socket(self.program)
+            self.reactor.addReader(self)
+        self.interfaces[ifname] = callback, {}
+
+    def removeInterface(self, ifname):
+        """Stop capturing packets on `ifname`."""
+        self.interfaces.pop(ifname, None)
+        if len(self.interfaces) == 0 and self.socket is not None:
+            self.reactor.removeReader(self)
+            self.socket.close()
+            self.socket = None
+
+    def fileno(self):
+        """Return the fileno of the socket.
+
+        This is required to satisfy `IReadDescriptor`.
+        """
+        return -1 if self.socket is None else self.socket.fileno()
+
+    def logPrefix(self):
+        """Return nice name for twisted logging.
+
+        This is required to satisfy `IReadDescriptor`, which inherits from
+        `ILoggingContext`.
+        """
+        return "packet-capture"
+
+    def connectionLost(self, reason):
+        """Stop capturing on all interfaces.
+
+        This is required to satisfy `IReadDescriptor`.
+        """
+        log.err(reason, "Packet capture stopped.")
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        self.interfaces.clear()
+
+    def doRead(self):
+        """Read a batch of packets from the socket and process them."""
+        packets = []
+        for _ in range(self.batch_size):
+            try:
+                packet, ancdata, _, address = self.socket.recvmsg(
+                    self.snaplen, TPACKET_AUXDATA_SPACE
+                )
+            except BlockingIOError:
+                break
+            except OSError as e:
+                # For example, the interface went down. Carry on with the
+                # packets already read.
+                log.msg("Error reading captured packets: %s" % e)
+                break
+            ifname, _, pkttype = address[:3]
+            if self.incoming_only and pkttype == PACKET_OUTGOING:
+                continue
+            packets.append((ifname, restore_vlan_tag(packet, ancdata)))
+        self.processPackets(packets, int(time.time()))
+
+    def processPackets(self, packets, time):
+        """Decode `packets` and pass the events to the interfaces' callbacks.
+
+        :param packets: A sequence of ``(ifname, packet)`` tuples, where the
+            packet is the bytes of an Ethernet frame.
+        :param time: The time the packets were seen, in seconds since the
+            epoch.
+        """
+        batches = {}
+        for ifname, packet in packets:
+            try:
+                callback, state = self.interfaces[ifname]
+            except KeyError:
+                continue
+            try:
+                events = self.decode(packet, time, state)
+            except Exception:
+                # Carry on with the rest of the batch.
+                log.err(None, "Failed to decode captured packet.")
+                continue
+            for event in events:
+                event["interface"] = ifname
+                batches.setdefault(callback, []).append(event)
+        for callback, events in batches.items():
+            try:
+                callback(events)
+            except Exception:
+                log.err(None, "Failed to process captured packets.")
@@ -19,7 +19,7 @@ import time
 
 from netaddr import IPAddress
 from twisted.application.internet import TimerService
-from twisted.application.service import MultiService
+from twisted.application.service import MultiService, Service
 from twisted.internet.defer import Deferred, inlineCallbacks, maybeDeferred
 from twisted.internet.error import ProcessDone, ProcessTerminated
 from twisted.internet.interfaces import IReactorMulticast
@@ -30,6 +30,7 @@ from zope.interface.verify import verifyObject
 
 from provisioningserver.config import is_dev_environment
 from provisioningserver.logger import get_maas_logger, LegacyLogger
+from provisioningserver.utils.arp import get_binding_events
 from provisioningserver.utils.beaconing import (
     age_out_uuid_queue,
     BEACON_IPV4_MULTICAST,
@@ -37,10 +38,17 @@ from provisioningserver.utils.beaconing import (
     BEACON_PORT,
     beacon_to_json,
     create_beacon_payload,
+    get_beacon_events,
     read_beacon_payload,
     ReceivedBeacon,
     TopologyHint,
 )
+from provisioningserver.utils.capture import (
+    can_capture,
+    make_arp_filter,
+    make_udp_dst_port_filter,
+    PacketCapture,
+)
 from provisioningserver.utils.fs import get_maas_common_command, NamedLock
 from provisioningserver.utils.network import (
     enumerate_ipv4_addresses,
@@ -301,6 +309,29 @@ class BeaconingService(ProcessProtocolService):
         return ProtocolForObserveBeacons(self.ifname, callback=self.callback)
 
 
+class InterfaceCaptureService(Service):
+    """Service to capture packets on an interface in-process.
+
+    This does the job of `NeighbourDiscoveryService` or `BeaconingService`
+    without a subprocess, by adding the interface to a shared
+    `PacketCapture` while the service is running.
+    """
+
+    def __init__(self, ifname: str, callback: callable, capture):
+        self.ifname = ifname
+        self.callback = callback
+        self.capture = capture
+
+    def startService(self):
+        self.capture.addInterface(self.ifname, self.callback)
+        log.msg("Packet capture started for %s." % self.ifname)
+        return super().startService()
+
+    def stopService(self):
+        self.capture.removeInterface(self.ifname)
+        return super().stopService()
+
+
 class MDNSResolverService(ProcessProtocolService):
     """Service to spawn the per-interface device discovery subprocess."""
 
@@ -1000,6 +1031,26 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
         self.interface_monitor.clock = self.clock
         self.interface_monitor.setServiceParent(self)
         self.beaconing_protocol = None
+        # Neighbours and beacons are observed with in-process packet capture
+        # when this process is allowed to, with a single socket each for all
+        # interfaces. Otherwise a `tcpdump` subprocess is spawned for each
+        # interface.
+        self._can_capture = None
+        self.arp_capture = PacketCapture(
+            make_arp_filter(), get_binding_events, snaplen=64
+        )
+        self.beacon_capture = PacketCapture(
+            make_udp_dst_port_filter(BEACON_PORT),
+            get_beacon_events,
+            snaplen=16384,
+            incoming_only=True,
+        )
+
+    def _canCapture(self):
+        """Return whether packets can be captured in-process."""
+        if self._can_capture is None:
+            self._can_capture = can_capture()
+        return self._can_capture
 
     @inlineCallbacks
     def updateInterfaces(self):
@@ -1184,14 +1235,24 @@ class NetworksMonitoringService(MultiService, metaclass=ABCMeta):
 
     def _startNeighbourDiscovery(self, ifname):
         """"Start neighbour discovery service on the specified interface."""
-        service = NeighbourDiscoveryService(ifname, self.reportNeighbours)
+        if self._canCapture():
+            service = InterfaceCaptureService(
+                ifname, self.reportNeighbours, self.arp_capture
+            )
+        else:
+            service = NeighbourDiscoveryService(ifname, self.reportNeighbours)
         service.clock = self.clock
         service.setName("neighbour_discovery:" + ifname)
         service.setServiceParent(self)
 
     def _startBeaconing(self, ifname):
-        """"Start neighbour discovery service on the specified interface."""
-        service = BeaconingService(ifname, self.reportBeacons)
+        """"Start beaconing service on the specified interface."""
+        if self._canCapture():
+            service = InterfaceCaptureService(
+                ifname, self.reportBeacons, self.beacon_capture
+            )
+        else:
+            service = BeaconingService(ifname, self.reportBeacons)
         service.clock = self.clock
         service.setName("beaconing:" + ifname)
         service.setServiceParent(self)
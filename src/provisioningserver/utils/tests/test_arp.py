@@ -27,6 +27,7 @@ from provisioningserver.utils.arp import (
     add_arguments,
     ARP,
     ARP_OPERATION,
+    get_binding_events,
     run,
     SEEN_AGAIN_THRESHOLD,
     update_and_print_bindings,
@@ -37,7 +38,9 @@ from provisioningserver.utils.network import (
     hex_str_to_bytes,
     ipv4_to_bytes,
 )
+from provisioningserver.utils.ethernet import ETHERTYPE
 from provisioningserver.utils.script import ActionScriptError
+from provisioningserver.utils.tests.test_ethernet import make_ethernet_packet
 
 
 def make_arp_packet(
@@ -550,6 +553,48 @@ class TestUpdateAndPrintBindings(MAASTestCase):
         )
 
 
+class TestGetBindingEvents(MAASTestCase):
+    def test_returns_events_and_updates_bindings(self):
+        bindings = {}
+        packet = make_ethernet_packet(
+            vid=42,
+            payload=make_arp_packet(
+                "192.168.0.1", "00:01:02:03:04:05", "192.168.0.2"
+            ),
+        )
+        self.assertThat(
+            get_binding_events(packet, 10, bindings),
+            Equals(
+                [
+                    {
+                        "ip": "192.168.0.1",
+                        "mac": "00:01:02:03:04:05",
+                        "time": 10,
+                        "event": "NEW",
+                        "vid": 42,
+                    }
+                ]
+            ),
+        )
+        self.assertThat(bindings, HasLength(1))
+        self.assertThat(get_binding_events(packet, 11, bindings), Equals([]))
+
+    def test_ignores_other_packets(self):
+        bindings = {}
+        arp_packet = make_arp_packet(
+            "192.168.0.1", "00:01:02:03:04:05", "192.168.0.2"
+        )
+        for packet in (
+            make_ethernet_packet(ethertype=ETHERTYPE.IPV4, payload=arp_packet),
+            make_ethernet_packet(payload=arp_packet[:-1]),
+            make_ethernet_packet()[:10],
+        ):
+            self.assertThat(
+                get_binding_events(packet, 10, bindings), Equals([])
+            )
+        self.assertThat(bindings, Equals({}))
+
+
 # Test data expected from an input PCAP file.
 test_input = (
     b"\xd4\xc3\xb2\xa1\x02\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00"
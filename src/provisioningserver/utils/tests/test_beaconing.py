@@ -32,6 +32,7 @@ from testtools.testcase import ExpectedException
 from maastesting.factory import factory
 from maastesting.matchers import MockCalledOnceWith
 from maastesting.testcase import MAASTestCase
+from maastesting.twisted import TwistedLoggerFixture
 from provisioningserver.security import fernet_encrypt_psk, MissingSharedSecret
 from provisioningserver.tests.test_security import SharedSecretTestCase
 from provisioningserver.utils import beaconing as beaconing_module
@@ -44,12 +45,19 @@ from provisioningserver.utils.beaconing import (
     BeaconingPacket,
     BeaconPayload,
     create_beacon_payload,
+    get_beacon_events,
     InvalidBeaconingPacket,
     read_beacon_payload,
     run,
     uuid_to_timestamp,
 )
+from provisioningserver.utils.ethernet import ETHERTYPE
 from provisioningserver.utils.script import ActionScriptError
+from provisioningserver.utils.tests.test_ethernet import make_ethernet_packet
+from provisioningserver.utils.tests.test_tcpip import (
+    make_ipv4_packet,
+    make_udp_packet,
+)
 
 
 class TestUUIDToTimestamp(MAASTestCase):
@@ -203,6 +211,31 @@ class TestBeaconingPacket(MAASTestCase):
         self.assertFalse(beacon.valid)
 
 
+class TestGetBeaconEvents(MAASTestCase):
+    def make_packet(self, payload):
+        return make_ethernet_packet(
+            ethertype=ETHERTYPE.IPV4,
+            payload=make_ipv4_packet(payload=make_udp_packet(payload=payload)),
+        )
+
+    def test_returns_beacon(self):
+        beacon = create_beacon_payload("solicitation")
+        [event] = get_beacon_events(self.make_packet(beacon.bytes), 10)
+        self.assertThat(event["type"], Equals("solicitation"))
+        self.assertThat(event["time"], Equals(10))
+
+    def test_ignores_packets_without_beacons(self):
+        self.assertThat(
+            get_beacon_events(self.make_packet(b"\n\n\n\n"), 10), Equals([])
+        )
+
+    def test_logs_invalid_packets(self):
+        packet = make_ethernet_packet(ethertype=ETHERTYPE.IPV4)
+        with TwistedLoggerFixture() as logger:
+            self.assertThat(get_beacon_events(packet, 10), Equals([]))
+        self.assertThat(logger.output, Contains("Invalid beacon packet"))
+
+
 BEACON_PCAP = (
     b"\xd4\xc3\xb2\xa1\x02\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00"
     b"\x00@\x00\x00\x01\x00\x00\x00v\xe19Y\xadF\x08\x00^\x00\x00\x00^\x00\x00"
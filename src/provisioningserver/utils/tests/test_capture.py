@@ -0,0 +1,565 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for ``provisioningserver.utils.capture``."""
+
+__all__ = []
+
+import io
+import socket
+import struct
+from unittest import skipIf
+from unittest.mock import call, Mock
+
+from testtools.matchers import Equals, HasLength, Is
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
+
+from maastesting.factory import factory
+from maastesting.matchers import MockCalledOnceWith, MockNotCalled
+from maastesting.testcase import MAASTestCase
+from maastesting.twisted import TwistedLoggerFixture
+from provisioningserver.utils import capture as capture_module
+from provisioningserver.utils.arp import get_binding_events
+from provisioningserver.utils.beaconing import (
+    create_beacon_payload,
+    get_beacon_events,
+)
+from provisioningserver.utils.capture import (
+    assemble_filter,
+    attach_filter,
+    BPF_JEQ_K,
+    BPF_LD_H_ABS,
+    BPF_RET_K,
+    can_capture,
+    make_arp_filter,
+    make_udp_dst_port_filter,
+    PACKET_AUXDATA,
+    PACKET_OUTGOING,
+    PacketCapture,
+    restore_vlan_tag,
+    SOL_PACKET,
+    TP_STATUS_VLAN_TPID_VALID,
+    TP_STATUS_VLAN_VALID,
+    TPACKET_AUXDATA,
+)
+from provisioningserver.utils.pcap import PCAP
+from provisioningserver.utils.tests.test_arp import make_arp_packet
+from provisioningserver.utils.tests.test_arp import (
+    test_input as ARP_PCAP,
+)
+
+
+def make_frame(ethertype, payload, vid=None):
+    """Make an Ethernet frame, tagged with `vid` if it's not None."""
+    header = b"\xff" * 6 + b"\x02\x00\x00\x00\x00\x01"
+    if vid is not None:
+        header += struct.pack("!HH", 0x8100, vid)
+    return header + struct.pack("!H", ethertype) + payload
+
+
+def make_udp_frame(
+    port, ipv6=False, vid=None, protocol=17, fragment=0, payload=b"data"
+):
+    """Make an Ethernet frame holding a UDP packet to `port`."""
+    udp = struct.pack("!HHHH", 1234, port, 8 + len(payload), 0) + payload
+    if ipv6:
+        ip = struct.pack("!IHBB", 6 << 28, len(udp), protocol, 64) + b"\0" * 32
+        return make_frame(0x86DD, ip + udp, vid)
+    else:
+        # An IPv4 header with options, to check that the UDP header is found
+        # from the header length.
+        ip = struct.pack(
+            "!BBHHHBBH4s4s4s",
+            (4 << 4) | 6,
+            0,
+            24 + len(udp),
+            0,
+            fragment,
+            64,
+            protocol,
+            0,
+            b"\x0a\0\0\x01",
+            b"\x0a\0\0\x02",
+            b"\x01\x01\x01\x00",
+        )
+        return make_frame(0x0800, ip + udp, vid)
+
+
+def make_arp_frame(vid=None):
+    return make_frame(
+        0x0806,
+        make_arp_packet("192.168.0.1", "02:00:00:00:00:01", "192.168.0.2"),
+        vid,
+    )
+
+
+def make_auxdata(status=0, tci=0, tpid=0):
+    return (
+        SOL_PACKET,
+        PACKET_AUXDATA,
+        struct.pack(TPACKET_AUXDATA, status, 0, 0, 0, 0, tci, tpid),
+    )
+
+
+def read_pcap(data):
+    """Return the ``(time, packet)`` tuples in the PCAP file `data`."""
+    return [
+        (header.timestamp_seconds, packet)
+        for header, packet in PCAP(io.BytesIO(data))
+    ]
+
+
+class TestAssembleFilter(MAASTestCase):
+    def test_resolves_jumps_to_labels(self):
+        program = assemble_filter(
+            [
+                (BPF_LD_H_ABS, 12),
+                (BPF_JEQ_K, 0x0806, "yes", None),
+                (BPF_JEQ_K, 0x0800, None, "no"),
+                "yes",
+                (BPF_RET_K, 64),
+                "no",
+                (BPF_RET_K, 0),
+            ]
+        )
+        self.assertThat(
+            list(struct.iter_unpack("HBBI", program)),
+            Equals(
+                [
+                    (BPF_LD_H_ABS, 0, 0, 12),
+                    (BPF_JEQ_K, 1, 0, 0x0806),
+                    (BPF_JEQ_K, 0, 1, 0x0800),
+                    (BPF_RET_K, 0, 0, 64),
+                    (BPF_RET_K, 0, 0, 0),
+                ]
+            ),
+        )
+
+
+class FilterTestCase(MAASTestCase):
+    """Run frames through BPF programs.
+
+    The programs are attached to one end of a datagram socket pair, which
+    doesn't need any privileges, unlike an AF_PACKET socket.
+    """
+
+    def filter(self, program, frame):
+        """Return what of `frame` passes through `program`, or None."""
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        attach_filter(receiver, program)
+        receiver.setblocking(False)
+        sender.send(frame)
+        try:
+            return receiver.recv(65536)
+        except BlockingIOError:
+            return None
+
+
+class TestMakeARPFilter(FilterTestCase):
+    def test_accepts_arp(self):
+        frame = make_arp_frame()
+        self.assertThat(self.filter(make_arp_filter(), frame), Equals(frame))
+
+    def test_accepts_tagged_arp(self):
+        frame = make_arp_frame(vid=42)
+        self.assertThat(self.filter(make_arp_filter(), frame), Equals(frame))
+
+    def test_truncates_to_snaplen(self):
+        frame = make_arp_frame()
+        self.assertThat(
+            self.filter(make_arp_filter(snaplen=20), frame),
+            Equals(frame[:20]),
+        )
+
+    def test_rejects_other_packets(self):
+        self.assertThat(
+            self.filter(make_arp_filter(), make_udp_frame(5240)), Is(None)
+        )
+        self.assertThat(
+            self.filter(make_arp_filter(), make_udp_frame(5240, vid=42)),
+            Is(None),
+        )
+
+
+class TestMakeUDPDstPortFilter(FilterTestCase):
+    def test_accepts_udp_to_port(self):
+        program = make_udp_dst_port_filter(5240)
+        for ipv6 in (False, True):
+            for vid in (None, 42):
+                frame = make_udp_frame(5240, ipv6=ipv6, vid=vid)
+                self.expectThat(
+                    self.filter(program, frame),
+                    Equals(frame),
+                    "ipv6=%r, vid=%r" % (ipv6, vid),
+                )
+
+    def test_rejects_udp_to_other_ports(self):
+        program = make_udp_dst_port_filter(5240)
+        for ipv6 in (False, True):
+            for vid in (None, 42):
+                frame = make_udp_frame(5241, ipv6=ipv6, vid=vid)
+                self.expectThat(
+                    self.filter(program, frame),
+                    Is(None),
+                    "ipv6=%r, vid=%r" % (ipv6, vid),
+                )
+
+    def test_rejects_other_protocols(self):
+        program = make_udp_dst_port_filter(5240)
+        for ipv6 in (False, True):
+            frame = make_udp_frame(5240, ipv6=ipv6, protocol=6)
+            self.expectThat(self.filter(program, frame), Is(None))
+        self.expectThat(self.filter(program, make_arp_frame()), Is(None))
+
+    def test_rejects_later_fragments(self):
+        program = make_udp_dst_port_filter(5240)
+        frame = make_udp_frame(5240, fragment=0x2000 | 185)
+        self.assertThat(self.filter(program, frame), Is(None))
+        frame = make_udp_frame(5240, fragment=0x2000)
+        self.assertThat(self.filter(program, frame), Equals(frame))
+
+    def test_truncates_to_snaplen(self):
+        frame = make_udp_frame(5240)
+        self.assertThat(
+            self.filter(make_udp_dst_port_filter(5240, snaplen=40), frame),
+            Equals(frame[:40]),
+        )
+
+
+class TestRestoreVLANTag(MAASTestCase):
+    def test_returns_packet_without_auxdata(self):
+        frame = make_arp_frame()
+        self.assertThat(restore_vlan_tag(frame, []), Is(frame))
+
+    def test_returns_packet_when_not_tagged(self):
+        frame = make_arp_frame()
+        self.assertThat(
+            restore_vlan_tag(frame, [make_auxdata()]), Equals(frame)
+        )
+
+    def test_inserts_tag(self):
+        self.assertThat(
+            restore_vlan_tag(
+                make_arp_frame(), [make_auxdata(TP_STATUS_VLAN_VALID, 42)]
+            ),
+            Equals(make_arp_frame(vid=42)),
+        )
+
+    def test_inserts_tag_for_vid_0(self):
+        frame = restore_vlan_tag(
+            make_arp_frame(), [make_auxdata(TP_STATUS_VLAN_VALID, 0)]
+        )
+        self.assertThat(frame[12:16], Equals(b"\x81\x00\x00\x00"))
+
+    def test_inserts_tag_with_tpid(self):
+        frame = restore_vlan_tag(
+            make_arp_frame(),
+            [
+                make_auxdata(
+                    TP_STATUS_VLAN_VALID | TP_STATUS_VLAN_TPID_VALID,
+                    42,
+                    0x88A8,
+                )
+            ],
+        )
+        self.assertThat(frame[12:16], Equals(b"\x88\xa8\x00\x2a"))
+
+
+class FakeSocket:
+    """A non-blocking socket that has `packets` waiting to be read."""
+
+    def __init__(self, packets):
+        self.packets = list(packets)
+        self.closed = False
+
+    def recvmsg(self, bufsize, ancbufsize):
+        if len(self.packets) == 0:
+            raise BlockingIOError()
+        packet = self.packets.pop(0)
+        if isinstance(packet, Exception):
+            raise packet
+        ifname, pkttype, data, ancdata = packet
+        return data[:bufsize], ancdata, 0, (ifname, 0x0806, pkttype, 1, b"")
+
+    def fileno(self):
+        return 42
+
+    def close(self):
+        self.closed = True
+
+
+class TestPacketCapture(MAASTestCase):
+    def make_capture(self, decode=get_binding_events, **kwargs):
+        reactor = Mock()
+        sockets = []
+
+        def open_capture_socket(program):
+            sockets.append(FakeSocket([]))
+            return sockets[-1]
+
+        self.patch(capture_module, "open_capture_socket", open_capture_socket)
+        capture = PacketCapture(
+            make_arp_filter(), decode, snaplen=64, reactor=reactor, **kwargs
+        )
+        return capture, sockets
+
+    def test_opens_socket_for_first_interface(self):
+        capture, sockets = self.make_capture()
+        capture.addInterface("eth0", Mock())
+        capture.addInterface("eth1", Mock())
+        self.assertThat(sockets, HasLength(1))
+        self.assertThat(capture.fileno(), Equals(42))
+        self.assertThat(capture.reactor.addReader, MockCalledOnceWith(capture))
+
+    def test_closes_socket_after_last_interface(self):
+        capture, sockets = self.make_capture()
+        capture.addInterface("eth0", Mock())
+        capture.addInterface("eth1", Mock())
+        capture.removeInterface("eth0")
+        self.assertFalse(sockets[0].closed)
+        self.assertThat(capture.reactor.removeReader, MockNotCalled())
+        capture.removeInterface("eth1")
+        self.assertTrue(sockets[0].closed)
+        self.assertThat(
+            capture.reactor.removeReader, MockCalledOnceWith(capture)
+        )
+        self.assertThat(capture.fileno(), Equals(-1))
+
+    def test_replays_arp_capture(self):
+        capture, _ = self.make_capture()
+        callback = Mock()
+        capture.addInterface("eth0", callback)
+        packets = read_pcap(ARP_PCAP)
+        for time, packet in packets:
+            capture.processPackets([("eth0", packet)], time)
+        self.assertThat(
+            callback.call_args_list,
+            Equals(
+                [
+                    call(
+                        [
+                            {
+                                "ip": "172.16.42.1",
+                                "mac": "00:24:a5:af:24:85",
+                                "time": packets[0][0],
+                                "event": "NEW",
+                                "vid": None,
+                                "interface": "eth0",
+                            }
+                        ]
+                    ),
+                    call(
+                        [
+                            {
+                                "ip": "172.16.42.109",
+                                "mac": "80:fa:5b:0c:46:4e",
+                                "time": packets[1][0],
+                                "event": "NEW",
+                                "vid": None,
+                                "interface": "eth0",
+                            }
+                        ]
+                    ),
+                ]
+            ),
+        )
+
+    def test_decodes_beacons(self):
+        capture, _ = self.make_capture(decode=get_beacon_events)
+        callback = Mock()
+        capture.addInterface("eth0", callback)
+        beacon = create_beacon_payload("solicitation")
+        packet = make_udp_frame(5240, vid=42, payload=beacon.bytes)
+        capture.processPackets([("eth0", packet)], 1234)
+        self.assertThat(
+            callback,
+            MockCalledOnceWith(
+                [
+                    {
+                        "source_mac": "02:00:00:00:00:01",
+                        "destination_mac": "ff:ff:ff:ff:ff:ff",
+                        "source_ip": "10.0.0.1",
+                        "destination_ip": "10.0.0.2",
+                        "source_port": 1234,
+                        "destination_port": 5240,
+                        "time": 1234,
+                        "vid": 42,
+                        "version": beacon.version,
+                        "type": beacon.type,
+                        "payload": beacon.payload,
+                        "interface": "eth0",
+                    }
+                ]
+            ),
+        )
+
+    def test_batches_events_per_interface(self):
+        capture, _ = self.make_capture()
+        eth0, eth1 = Mock(), Mock()
+        capture.addInterface("eth0", eth0)
+        capture.addInterface("eth1", eth1)
+        packets = [packet for _, packet in read_pcap(ARP_PCAP)]
+        capture.processPackets(
+            [("eth0", packets[0]), ("eth1", packets[0]), ("eth0", packets[1])],
+            0,
+        )
+        self.assertThat(eth0.call_count, Equals(1))
+        [events] = eth0.call_args[0]
+        self.assertThat(
+            [(event["ip"], event["interface"]) for event in events],
+            Equals([("172.16.42.1", "eth0"), ("172.16.42.109", "eth0")]),
+        )
+        self.assertThat(eth1.call_count, Equals(1))
+        [events] = eth1.call_args[0]
+        self.assertThat(
+            [(event["ip"], event["interface"]) for event in events],
+            Equals([("172.16.42.1", "eth1")]),
+        )
+
+    def test_keeps_bindings_per_interface(self):
+        capture, _ = self.make_capture()
+        callback = Mock()
+        capture.addInterface("eth0", callback)
+        capture.addInterface("eth1", callback)
+        packet = make_arp_frame()
+        capture.processPackets([("eth0", packet), ("eth0", packet)], 0)
+        capture.processPackets([("eth1", packet)], 0)
+        self.assertThat(
+            [
+                [(event["interface"], event["event"]) for event in events]
+                for (events,), _ in callback.call_args_list
+            ],
+            Equals([[("eth0", "NEW")], [("eth1", "NEW")]]),
+        )
+
+    def test_ignores_other_interfaces(self):
+        capture, _ = self.make_capture()
+        callback = Mock()
+        capture.addInterface("eth0", callback)
+        capture.processPackets([("eth1", make_arp_frame())], 0)
+        self.assertThat(callback, MockNotCalled())
+
+    def test_logs_callback_errors(self):
+        capture, _ = self.make_capture()
+        capture.addInterface("eth0", Mock(side_effect=ZeroDivisionError()))
+        with TwistedLoggerFixture() as logger:
+            capture.processPackets([("eth0", make_arp_frame())], 0)
+        self.assertIn("Failed to process captured packets.", logger.output)
+        self.assertIn("ZeroDivisionError", logger.output)
+
+    def test_logs_decode_errors_and_carries_on(self):
+        def decode(packet, time, state):
+            if packet == b"bad":
+                raise ZeroDivisionError()
+            return get_binding_events(packet, time, state)
+
+        capture, _ = self.make_capture(decode=decode)
+        callback = Mock()
+        capture.addInterface("eth0", callback)
+        with TwistedLoggerFixture() as logger:
+            capture.processPackets(
+                [("eth0", b"bad"), ("eth0", make_arp_frame())], 0
+            )
+        self.assertIn("Failed to decode captured packet.", logger.output)
+        self.assertIn("ZeroDivisionError", logger.output)
+        self.assertThat(callback.call_count, Equals(1))
+        [events] = callback.call_args[0]
+        self.assertThat(
+            [event["interface"] for event in events], Equals(["eth0"])
+        )
+
+    def test_doRead_reads_a_batch(self):
+        capture, sockets = self.make_capture()
+        capture.batch_size = 2
+        process = self.patch(capture, "processPackets")
+        capture.addInterface("eth0", Mock())
+        frames = [make_arp_frame(vid=vid) for vid in range(3)]
+        sockets[0].packets = [("eth0", 0, frame, []) for frame in frames]
+        capture.doRead()
+        [[packets, _]] = [args for args, _ in process.call_args_list]
+        self.assertThat(
+            packets, Equals([("eth0", frame) for frame in frames[:2]])
+        )
+        self.assertThat(sockets[0].packets, HasLength(1))
+
+    def test_doRead_restores_vlan_tags(self):
+        capture, sockets = self.make_capture()
+        process = self.patch(capture, "processPackets")
+        capture.addInterface("eth0", Mock())
+        sockets[0].packets = [
+            (
+                "eth0",
+                0,
+                make_arp_frame(),
+                [make_auxdata(TP_STATUS_VLAN_VALID, 42)],
+            )
+        ]
+        capture.doRead()
+        [packets, _] = process.call_args[0]
+        self.assertThat(packets, Equals([("eth0", make_arp_frame(vid=42))]))
+
+    def test_doRead_skips_outgoing_packets_if_incoming_only(self):
+        capture, sockets = self.make_capture(incoming_only=True)
+        process = self.patch(capture, "processPackets")
+        capture.addInterface("eth0", Mock())
+        frame = make_arp_frame()
+        sockets[0].packets = [
+            ("eth0", PACKET_OUTGOING, frame, []),
+            ("eth0", 0, frame, []),
+        ]
+        capture.doRead()
+        [packets, _] = process.call_args[0]
+        self.assertThat(packets, Equals([("eth0", frame)]))
+
+    def test_doRead_logs_read_errors(self):
+        capture, sockets = self.make_capture()
+        process = self.patch(capture, "processPackets")
+        capture.addInterface("eth0", Mock())
+        frame = make_arp_frame()
+        sockets[0].packets = [("eth0", 0, frame, []), OSError("network down")]
+        with TwistedLoggerFixture() as logger:
+            capture.doRead()
+        [packets, _] = process.call_args[0]
+        self.assertThat(packets, Equals([("eth0", frame)]))
+        self.assertIn("network down", logger.output)
+
+    def test_connectionLost_closes_socket(self):
+        capture, sockets = self.make_capture()
+        capture.addInterface("eth0", Mock())
+        with TwistedLoggerFixture():
+            capture.connectionLost(Failure(ConnectionDone()))
+        self.assertTrue(sockets[0].closed)
+        self.assertThat(capture.interfaces, Equals({}))
+
+
+class TestPacketCaptureLive(MAASTestCase):
+    """Capture packets for real, on the loopback interface."""
+
+    @skipIf(not can_capture(), "Packet capture needs CAP_NET_RAW.")
+    def test_captures_udp_on_loopback(self):
+        port = factory.pick_port()
+        capture = PacketCapture(
+            make_udp_dst_port_filter(port),
+            lambda packet, time, state: [{"packet": packet}],
+            snaplen=16384,
+            incoming_only=True,
+            reactor=Mock(),
+        )
+        callback = Mock()
+        capture.addInterface("lo", callback)
+        self.addCleanup(capture.removeInterface, "lo")
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        sender.sendto(b"beacon", ("127.0.0.1", port))
+        sender.sendto(b"beacon", ("127.0.0.1", port + 1))
+        capture.doRead()
+        [[events]] = [args for args, _ in callback.call_args_list]
+        # Loopback packets are seen going out and coming back in; only the
+        # latter are captured.
+        self.assertThat(events, HasLength(1))
+        [event] = events
+        self.assertThat(event["interface"], Equals("lo"))
+        self.assertTrue(event["packet"].endswith(b"beacon"))
@@ -51,6 +51,7 @@ from provisioningserver.utils.beaconing import (
 from provisioningserver.utils.services import (
     BeaconingService,
     BeaconingSocketProtocol,
+    InterfaceCaptureService,
     JSONPerLineProtocol,
     MDNSResolverService,
     NeighbourDiscoveryService,
@@ -303,6 +304,38 @@ class TestNetworksMonitoringService(MAASTestCase):
         # ... interfaces ARE recorded.
         self.assertThat(service.interfaces, Not(Equals([])))
 
+    def test_neighbour_discovery_captures_in_process_if_possible(self):
+        service = self.makeService()
+        self.patch(services, "can_capture").return_value = True
+        service._startNeighbourDiscovery("eth0")
+        child = service.getServiceNamed("neighbour_discovery:eth0")
+        self.assertThat(child, IsInstance(InterfaceCaptureService))
+        self.assertThat(child.capture, Is(service.arp_capture))
+        self.assertThat(child.callback, Equals(service.reportNeighbours))
+
+    def test_neighbour_discovery_spawns_process_otherwise(self):
+        service = self.makeService()
+        self.patch(services, "can_capture").return_value = False
+        service._startNeighbourDiscovery("eth0")
+        child = service.getServiceNamed("neighbour_discovery:eth0")
+        self.assertThat(child, IsInstance(NeighbourDiscoveryService))
+
+    def test_beaconing_captures_in_process_if_possible(self):
+        service = self.makeService()
+        self.patch(services, "can_capture").return_value = True
+        service._startBeaconing("eth0")
+        child = service.getServiceNamed("beaconing:eth0")
+        self.assertThat(child, IsInstance(InterfaceCaptureService))
+        self.assertThat(child.capture, Is(service.beacon_capture))
+        self.assertThat(child.callback, Equals(service.reportBeacons))
+
+    def test_beaconing_spawns_process_otherwise(self):
+        service = self.makeService()
+        self.patch(services, "can_capture").return_value = False
+        service._startBeaconing("eth0")
+        child = service.getServiceNamed("beaconing:eth0")
+        self.assertThat(child, IsInstance(BeaconingService))
+
 
 class TestJSONPerLineProtocol(MAASTestCase):
     """Tests for `JSONPerLineProtocol`."""
@@ -683,6 +716,22 @@ class TestBeaconingService(MAASTestCase):
         )
 
 
+class TestInterfaceCaptureService(MAASTestCase):
+    """Tests for `InterfaceCaptureService`."""
+
+    def test_adds_and_removes_interface(self):
+        capture = Mock()
+        callback = Mock()
+        service = InterfaceCaptureService("eth0", callback, capture)
+        service.startService()
+        self.assertThat(
+            capture.addInterface, MockCalledOnceWith("eth0", callback)
+        )
+        self.assertThat(capture.removeInterface, MockNotCalled())
+        service.stopService()
+        self.assertThat(capture.removeInterface, MockCalledOnceWith("eth0"))
+
+
 class TestMDNSResolverService(MAASTestCase):
     """Tests for `MDNSResolverService`."""
 